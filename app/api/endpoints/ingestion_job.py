@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+from fastapi import Depends, HTTPException
+from app.api.depend import authenticate_access_token
+from app.models.requests.ingestion_job_request import IngestionJobRequest
+from app.services.ingestion_job_service import IngestionJobService
+from app.middlewares.request_wrapper import request_rapper
+from app.middlewares.response_wrapper import response_rapper
+
+
+ingestion_job_router = APIRouter()
+
+
+@ingestion_job_router.post("/ingestion/jobs")
+@response_rapper()
+@request_rapper()
+def enqueue_job(
+    request: IngestionJobRequest,
+    company_id: int = Depends(authenticate_access_token)):
+    """
+    マニュアルの取り込みジョブを登録します。
+
+    取り込みは取り込みワーカーがバックグラウンドで行うため、登録したジョブの進捗をすぐに返却します。
+    同じ対象で完了していないジョブがある場合は、新しく登録せずにそのジョブを返却します。
+    """
+    response = IngestionJobService().enqueue(
+        job_request=request,
+        company_id=company_id,
+    )
+    if response is None:
+        raise HTTPException(status_code=404, detail="取り込み対象のマニュアルが存在しません。")
+    return response
+
+
+@ingestion_job_router.get("/ingestion/jobs/{job_id}")
+@response_rapper()
+@request_rapper()
+def read_job(
+    job_id: int,
+    company_id: int = Depends(authenticate_access_token)):
+    """
+    取り込みジョブの進捗（マニュアル毎の状態の件数・エラー）を返却します。
+    """
+    response = IngestionJobService().get_progress(
+        job_id=job_id,
+        company_id=company_id,
+    )
+    if response is None:
+        raise HTTPException(status_code=404, detail="取り込みジョブが存在しません。")
+    return response
@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+from app.middlewares.response_wrapper import response_rapper
+from app.core.metrics import NaviApiMetrics
+from app.core.cache.semantic_answer_cache import SemanticAnswerCache
+from app.core.cache.exact_answer_cache import ExactAnswerCache
+from app.core.cache.faq_store import FaqStore
+from app.models.llm.llm_client import LLMClientManager
+from app.core.utils.admission_controller import AdmissionController
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics")
+@response_rapper()
+def read_metrics():
+    """
+    プロセス内で集計しているメトリクスを返却します。
+    テナントを特定できる情報は含めないため、監視用途で認証なしに参照できます。
+    """
+    return {
+        "metrics": NaviApiMetrics.snapshot(),
+        "answer_cache": {
+            "exact": ExactAnswerCache.stats(),
+            "semantic": SemanticAnswerCache.stats(),
+        },
+        "faq": FaqStore.stats(),
+        "llm_client": LLMClientManager.stats(),
+        "llm_admission": AdmissionController.stats(),
+    }
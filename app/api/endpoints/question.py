@@ -1,14 +1,20 @@
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi.responses import StreamingResponse
 from app.models.requests.question_request import QuestionRequest
+from app.models.requests.question_batch_request import QuestionBatchRequest
 from app.api.depend import authenticate_access_token
 from app.services.question_service import QuestionService
 from app.middlewares.request_wrapper import request_rapper
 from app.middlewares.response_wrapper import response_rapper
+from app.core.utils.sse_util import SseUtil
 
 
 question_router = APIRouter()
 
+# LLMの最初のトークンを待つ間にプロキシ等で接続が切られないよう送信するkeep-aliveの間隔（秒）
+STREAM_KEEPALIVE_SECONDS = 15
+
 @question_router.post("/ask")
 @response_rapper()
 @request_rapper()
@@ -26,3 +32,65 @@ def read_root(
         question_request=request,
         company_id=company_id,
     )
+
+
+@question_router.post("/ask/async")
+@response_rapper()
+@request_rapper()
+async def read_root_async(
+    request: QuestionRequest,
+    company_id: int = Depends(authenticate_access_token)):
+    """
+    質問に対する回答を生成します（非同期版）。
+
+    マニュアル取得・ベクトル検索・LLM呼び出しをイベントループ上で待機するため、
+    1ワーカーで多数の生成待ちリクエストを同時に保持できます。
+    レスポンス形式は /ask と同じです。
+    """
+
+    return await QuestionService().aanswer(
+        question_request=request,
+        company_id=company_id,
+    )
+
+
+@question_router.post("/ask/batch")
+@response_rapper()
+@request_rapper()
+async def read_root_batch(
+    request: QuestionBatchRequest,
+    company_id: int = Depends(authenticate_access_token)):
+    """
+    同じアプリケーションに対する複数の質問にまとめて回答します。
+
+    認証・マニュアル取得・質問の埋め込みは1回だけ行い、回答の生成は同時実行数の上限付きで並行に行います。
+    結果は質問毎に {"index", "question", "answer", "error"} の形式で、リクエストと同じ順序で返却します。
+    """
+
+    return await QuestionService().aanswer_batch(
+        batch_request=request,
+        company_id=company_id,
+    )
+
+
+@question_router.post("/ask/stream")
+@request_rapper()
+def stream_root(
+    request: QuestionRequest,
+    company_id: int = Depends(authenticate_access_token)):
+    """
+    質問に対する回答をServer-Sent Events形式で逐次返却します。
+
+    token イベントで回答の断片を、done イベントで完了とメタデータを通知します。
+    生成待ちの間は keep-alive のコメント行を定期的に送信します。
+    統一形式のレスポンスが必要なクライアントは /ask を使用してください。
+    """
+    events = QuestionService().answer_stream(
+        question_request=request,
+        company_id=company_id,
+    )
+    return StreamingResponse(
+        SseUtil.with_keepalive(events, interval_seconds=STREAM_KEEPALIVE_SECONDS),
+        media_type=SseUtil.MEDIA_TYPE,
+        headers=SseUtil.HEADERS,
+    )
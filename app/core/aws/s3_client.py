@@ -1,6 +1,49 @@
 import boto3
+import io
+import mmap
 import os
+import queue
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, Optional, Union
 from urllib.parse import urlparse
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from app.core.logging import NaviApiLog
+
+
+# list_objects_v2 の1回で取得する件数の上限（S3の上限は1000件）
+DEFAULT_PAGE_SIZE = 1000
+# iter_objects_sharded でプレフィックス毎に一覧を取得するスレッド数
+DEFAULT_LIST_WORKERS = 8
+# fetch_objects で同時にダウンロードするオブジェクト数
+DEFAULT_FETCH_WORKERS = 8
+# このサイズ以上のオブジェクトは part_size 毎の Range 指定で並行にダウンロードする
+DEFAULT_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+# 1オブジェクトあたりの Range ダウンロードの並列数
+DEFAULT_PART_CONCURRENCY = 4
+
+# fetch_objects の受け取り方
+# bytes: メモリ上の bytes / file: ローカルファイル（削除は呼び出し側で行う） / mmap: 一時ファイルをメモリマップした読み取り専用のバッファ
+FETCH_MODES = ("bytes", "file", "mmap")
+
+
+@dataclass
+class S3FetchResult:
+    """fetch_objects で取得したオブジェクト1件分の結果（失敗した場合は error を設定する）"""
+    key: str
+    body: Optional[Union[bytes, mmap.mmap]] = None
+    path: Optional[str] = None
+    size: int = 0
+    error: Optional[BaseException] = None
+
+    def close(self) -> None:
+        """mmap のバッファを解放する"""
+        if isinstance(self.body, mmap.mmap):
+            self.body.close()
 
 
 class S3Client:
@@ -21,24 +64,233 @@ class S3Client:
     def get_objects(
         self,
         bucket_name: str,
-        object_paths: list[str]) -> list[bytes]:
+        object_paths: list[str],
+        max_workers: int = DEFAULT_FETCH_WORKERS) -> list[bytes]:
+        """
+        指定されたオブジェクトを並行に取得し、object_paths の順に bytes で返す。
+        1件でも取得に失敗した場合は例外を送出する（ファイル毎に結果を受け取る場合は fetch_objects を使用すること）。
+        """
+        results = {
+            result.key: result
+            for result in self.fetch_objects(bucket_name, object_paths, max_workers=max_workers)
+        }
         objects = []
         for path in object_paths:
-            parsed_url = urlparse(path)
-            key = parsed_url.path.lstrip('/')
-            
-            response = self.client.get_object(Bucket=bucket_name, Key=key)
-            objects.append(response['Body'].read())
-            
+            result = results[self._to_key(path)]
+            if result.error is not None:
+                raise result.error
+            objects.append(result.body)
         return objects
 
-    def list_objects(self, bucket_name: str, prefix: str = '') -> list[dict]:
+    @staticmethod
+    def _to_key(path: str) -> str:
+        """s3://バケット名/キー 形式のパスをキーに変換する（キーはそのまま）"""
+        return urlparse(path).path.lstrip('/')
+
+    def fetch_objects(
+        self,
+        bucket_name: str,
+        object_paths: Iterable[str],
+        mode: str = "bytes",
+        directory: Optional[str] = None,
+        max_workers: int = DEFAULT_FETCH_WORKERS,
+        multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+        part_size: int = DEFAULT_PART_SIZE,
+        part_concurrency: int = DEFAULT_PART_CONCURRENCY) -> Iterator[S3FetchResult]:
         """
-        指定されたバケット内のオブジェクト一覧を取得する。
+        指定されたオブジェクトを max_workers 件ずつ並行に取得し、完了した順に1件ずつ返す。
+
+        - multipart_threshold 以上のオブジェクトは part_size 毎の Range 指定で並行にダウンロードする
+        - mode が file・mmap の場合は bytes を作らずにファイルへ書き込む（file は directory に保存する）
+        - object_paths は取得の進み具合に合わせて読むため、iter_objects のジェネレーターを渡せる
+        - 失敗したオブジェクトは error を設定した結果として返し、残りの取得を続ける
         """
+        if mode not in FETCH_MODES:
+            raise ValueError(f"modeは{FETCH_MODES}のいずれかを指定してください: {mode}")
+        transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=part_size,
+            max_concurrency=part_concurrency,
+        )
+        keys = iter(object_paths)
+        pending: set[Future] = set()
+        executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="s3-fetch")
+
+        def submit_next() -> bool:
+            path = next(keys, None)
+            if path is None:
+                return False
+            key = self._to_key(path)
+            pending.add(executor.submit(self._fetch_object, bucket_name, key, mode, directory, transfer_config))
+            return True
+
+        try:
+            # 同時に取得・保持するオブジェクトは max_workers 件まで（受け取り側が遅い場合は取得を待たせる）
+            while len(pending) < max(1, max_workers) and submit_next():
+                pass
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    yield future.result()
+                    submit_next()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            # 途中で読むのをやめた場合、返していない結果のファイル・バッファを解放する
+            for future in pending:
+                if future.cancelled():
+                    continue
+                result = future.result()
+                result.close()
+                if result.path is not None:
+                    self._remove(result.path)
+
+    def _fetch_object(
+        self,
+        bucket_name: str,
+        key: str,
+        mode: str,
+        directory: Optional[str],
+        transfer_config: TransferConfig) -> S3FetchResult:
         try:
-            response = self.client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-            return response.get('Contents', [])
+            if mode == "bytes":
+                buffer = io.BytesIO()
+                self.client.download_fileobj(bucket_name, key, buffer, Config=transfer_config)
+                body = buffer.getvalue()
+                return S3FetchResult(key=key, body=body, size=len(body))
+
+            fd, local_path = tempfile.mkstemp(suffix=os.path.splitext(key)[1], dir=directory)
+            os.close(fd)
+            try:
+                self.client.download_file(bucket_name, key, local_path, Config=transfer_config)
+                size = os.path.getsize(local_path)
+                if mode == "file":
+                    return S3FetchResult(key=key, path=local_path, size=size)
+                return S3FetchResult(key=key, body=self._map_file(local_path, size), size=size)
+            except BaseException:
+                self._remove(local_path)
+                raise
+            finally:
+                if mode == "mmap":
+                    # マップした後はファイルを削除してもバッファは読める
+                    self._remove(local_path)
         except Exception as e:
-            print(f"Error listing objects: {e}")
-            return []
+            NaviApiLog.error(f"S3のオブジェクトの取得に失敗しました: bucket={bucket_name} key={key} error={e}")
+            return S3FetchResult(key=key, error=e)
+
+    @staticmethod
+    def _map_file(local_path: str, size: int) -> Union[bytes, mmap.mmap]:
+        if size == 0:
+            # 空のファイルはメモリマップできない
+            return b""
+        with open(local_path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _remove(local_path: str) -> None:
+        try:
+            os.remove(local_path)
+        except OSError:
+            pass
+
+    def list_objects(self, bucket_name: str, prefix: str = '') -> list[dict]:
+        """
+        指定されたバケット内のオブジェクト一覧を取得する（1000件を超える場合も全件を返す）。
+        件数の多いバケットでは iter_objects・iter_objects_sharded を使用すること。
+        """
+        return list(self.iter_objects(bucket_name, prefix))
+
+    def _paginate(self, bucket_name: str, prefix: str, page_size: int, **kwargs: Any) -> Iterator[dict]:
+        """
+        list_objects_v2 の paginator で1ページずつ返す（取得に失敗した場合はログを出力して例外を送出する）
+        """
+        paginator = self.client.get_paginator('list_objects_v2')
+        try:
+            yield from paginator.paginate(
+                Bucket=bucket_name,
+                Prefix=prefix,
+                PaginationConfig={'PageSize': page_size},
+                **kwargs
+            )
+        except ClientError as e:
+            NaviApiLog.error(f"S3のオブジェクト一覧の取得に失敗しました: bucket={bucket_name} prefix={prefix} error={e}")
+            raise e
+
+    def iter_objects(self, bucket_name: str, prefix: str = '', page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[dict]:
+        """
+        指定されたバケット内のオブジェクト（Key・ETag・Size 等）を1件ずつ返す。
+        ページ毎に取得するため、バケットの件数によらずメモリ使用量は1ページ分となる。
+        """
+        for page in self._paginate(bucket_name, prefix, page_size):
+            yield from page.get('Contents', [])
+
+    def iter_objects_sharded(
+        self,
+        bucket_name: str,
+        prefix: str = '',
+        max_workers: int = DEFAULT_LIST_WORKERS,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        delimiter: str = '/') -> Iterator[dict]:
+        """
+        prefix 直下のプレフィックス（例: 企業ID/）毎に、スレッドで並行に一覧を取得して1件ずつ返す。
+        返す順序はキーの順とは限らない。
+        保持するのはスレッド数分のページのみで、呼び出し側の処理が遅い場合は一覧の取得を待たせる。
+        """
+        shard_prefixes = []
+        for page in self._paginate(bucket_name, prefix, page_size, Delimiter=delimiter):
+            # prefix 直下のオブジェクトはそのまま返す
+            yield from page.get('Contents', [])
+            shard_prefixes.extend(common_prefix['Prefix'] for common_prefix in page.get('CommonPrefixes', []))
+
+        max_workers = min(max_workers, len(shard_prefixes))
+        if max_workers <= 1:
+            for shard_prefix in shard_prefixes:
+                yield from self.iter_objects(bucket_name, shard_prefix, page_size)
+            return
+
+        pages: queue.Queue = queue.Queue(maxsize=max_workers)
+        stop = threading.Event()
+
+        def put(item: Any) -> None:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def list_shard(shard_prefix: str) -> None:
+            error: Optional[BaseException] = None
+            try:
+                for page in self._paginate(bucket_name, shard_prefix, page_size):
+                    if stop.is_set():
+                        return
+                    put(page.get('Contents', []))
+            except BaseException as e:
+                error = e
+            finally:
+                # プレフィックス毎に完了（失敗した場合は例外）を通知する
+                put(_ShardDone(error))
+
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-list")
+        try:
+            for shard_prefix in shard_prefixes:
+                executor.submit(list_shard, shard_prefix)
+            remaining = len(shard_prefixes)
+            while remaining:
+                item = pages.get()
+                if isinstance(item, _ShardDone):
+                    if item.error is not None:
+                        raise item.error
+                    remaining -= 1
+                    continue
+                yield from item
+        finally:
+            # 途中で失敗した・呼び出し側が読むのをやめた場合は残りの取得を止める
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class _ShardDone:
+    def __init__(self, error: Optional[BaseException]) -> None:
+        self.error = error
@@ -1,10 +1,18 @@
+import asyncio
 import boto3
 import json
 import os
+import threading
+import time
 from botocore.exceptions import ClientError
-from typing import Union, Dict, Any
+from typing import Iterable, Union, Dict, Any, Optional
+from app.core.logging import NaviApiLog
 
 class SsmClient:
+    # get_cached_parameter 用のプロセス内キャッシュ {name: (取得時刻, 値)}
+    _cache: Dict[str, tuple[float, Any]] = {}
+    _cache_lock = threading.Lock()
+
     def __init__(self):
         """
         SSM クライアントの初期化
@@ -36,3 +44,53 @@ class SsmClient:
         except ClientError as e:
             raise e
 
+    @classmethod
+    def get_cached_parameter(
+        cls,
+        name: str,
+        default: Optional[Dict[str, Any]] = None,
+        ttl_seconds: float = 300) -> Union[str, Dict[str, Any]]:
+        """
+        パラメータを取得し、ttl_seconds の間プロセス内にキャッシュする。
+        キャッシュ等のリクエスト毎に参照する任意設定向けで、
+        取得に失敗した場合は default を返却する（default もキャッシュされる）。
+        """
+        now = time.monotonic()
+        with cls._cache_lock:
+            cached = cls._cache.get(name)
+            if cached and now - cached[0] < ttl_seconds:
+                return cached[1]
+
+        try:
+            value = cls().get_parameter(name)
+        except Exception as e:
+            NaviApiLog.warning(f"パラメータ'{name}'を取得できませんでした。デフォルト値を使用します: {e}")
+            value = default if default is not None else {}
+
+        with cls._cache_lock:
+            cls._cache[name] = (now, value)
+        return value
+
+    @classmethod
+    async def aprefetch_cached_parameters(cls, names: Iterable[str], ttl_seconds: float = 300) -> None:
+        """
+        キャッシュに無い・期限切れのパラメータを別スレッドで取得する。
+        非同期の処理で get_cached_parameter を呼ぶ前に実行し、boto3 の呼び出しでイベントループを止めない。
+        """
+        now = time.monotonic()
+        with cls._cache_lock:
+            expired = [
+                name for name in names
+                if name not in cls._cache or now - cls._cache[name][0] >= ttl_seconds
+            ]
+        if not expired:
+            return
+        await asyncio.to_thread(
+            lambda: [cls.get_cached_parameter(name, ttl_seconds=ttl_seconds) for name in expired]
+        )
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """get_cached_parameter のキャッシュを破棄する"""
+        with cls._cache_lock:
+            cls._cache.clear()
@@ -0,0 +1,6 @@
+from app.core.cache.semantic_answer_cache import SemanticAnswerCache
+from app.core.cache.exact_answer_cache import ExactAnswerCache
+from app.core.cache.corpus_version_registry import CorpusVersionRegistry
+from app.core.cache.faq_store import FaqStore
+
+__all__ = ["SemanticAnswerCache", "ExactAnswerCache", "CorpusVersionRegistry", "FaqStore"]
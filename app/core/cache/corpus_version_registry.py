@@ -0,0 +1,69 @@
+import threading
+import time
+from typing import Optional
+from app.core.aws.ssm_client import SsmClient
+
+
+DEFAULT_CORPUS_VERSION_TTL_SECONDS = 60
+
+
+class CorpusVersionRegistry:
+    """
+    テナント（company_id, application_id）毎の最新のマニュアル構成バージョンを保持する
+
+    回答キャッシュのキーに含めるバージョンをMySQLに問い合わせずに得るため、
+    マニュアル取得時に算出したバージョンを一定時間（corpus_version_ttl_seconds）再利用する。
+    期限切れ・未登録の場合は None を返し、呼び出し側でマニュアルを再取得する。
+    """
+
+    _lock = threading.Lock()
+    _versions: dict[tuple[int, Optional[int]], tuple[str, float]] = {}
+
+    @classmethod
+    def get_ttl_seconds(cls) -> float:
+        setting = SsmClient.get_cached_parameter("answer_cache_setting", default={})
+        if not isinstance(setting, dict):
+            return DEFAULT_CORPUS_VERSION_TTL_SECONDS
+        return setting.get("corpus_version_ttl_seconds", DEFAULT_CORPUS_VERSION_TTL_SECONDS)
+
+    @classmethod
+    def get(cls, company_id: int, application_id: Optional[int]) -> Optional[str]:
+        """
+        有効期限内のバージョンを返す
+        """
+        with cls._lock:
+            registered = cls._versions.get((company_id, application_id))
+        if not registered:
+            return None
+        version, registered_at = registered
+        if time.monotonic() - registered_at > cls.get_ttl_seconds():
+            return None
+        return version
+
+    @classmethod
+    def update(cls, company_id: int, application_id: Optional[int], corpus_version: str) -> None:
+        """
+        マニュアル取得時に算出したバージョンを登録する
+        """
+        with cls._lock:
+            cls._versions[(company_id, application_id)] = (corpus_version, time.monotonic())
+
+    @classmethod
+    def invalidate(cls, company_id: int, application_id: Optional[int] = None) -> None:
+        """
+        テナントのバージョンを破棄し、次回のリクエストでマニュアルを再取得させる
+        企業配下の全アプリケーションを対象とした問い合わせ（application_id=None）のバージョンも破棄する
+        """
+        with cls._lock:
+            keys = [
+                key for key in cls._versions
+                if key[0] == company_id
+                and (application_id is None or key[1] in (application_id, None))
+            ]
+            for key in keys:
+                cls._versions.pop(key, None)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._versions.clear()
@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from app.core.aws.ssm_client import SsmClient
+from app.core.logging import NaviApiLog
+from app.core.metrics import NaviApiMetrics
+from app.core.utils.text_util import TextUtil
+
+
+# キーの構成やプロンプトの組み立て方を変えた場合に上げ、古いキャッシュを無効化する
+CACHE_SCHEMA_VERSION = 1
+
+DEFAULT_EXACT_CACHE_SETTING = {
+    "enabled": False,
+    "max_entries": 10000,
+    "ttl_seconds": 86400,
+    # 指定した場合はSQLiteファイルを永続層として使用する（ワーカー間・再起動後も共有される）
+    "persistent_path": None,
+}
+
+
+class ExactAnswerCache:
+    """
+    同一テナントへの完全一致の質問に対して回答を再利用するキャッシュ
+
+    キー: (company_id, application_id, 正規化した質問, corpus_version, config_version)
+    - corpus_version: テナントのマニュアル構成のバージョン（変更されると別キーになる）
+    - config_version: プロンプト・LLM設定のバージョン（設定を変えると別キーになる）
+
+    メモリ上のLRUを1次層、任意でSQLiteファイルを2次層として使用する。
+    設定は SSM の answer_cache_setting.exact から取得する。
+    """
+
+    METRIC_PREFIX = "answer_cache.exact"
+
+    _lock = threading.Lock()
+    _entries: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+    _sqlite_lock = threading.Lock()
+    _sqlite_connection: Optional[sqlite3.Connection] = None
+    _sqlite_path: Optional[str] = None
+    _config_version: Optional[tuple[str, str]] = None
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("answer_cache_setting", default={})
+        exact_setting = setting.get("exact", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_EXACT_CACHE_SETTING, **exact_setting}
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return bool(cls.get_setting().get("enabled"))
+
+    @classmethod
+    def get_config_version(cls) -> str:
+        """
+        回答に影響するプロンプト・LLM設定からバージョン文字列を生成する
+        """
+        question_llm_setting = SsmClient.get_cached_parameter("question_llm_setting", default={})
+        llm_setting = SsmClient.get_cached_parameter("llm_setting", default={})
+        if isinstance(llm_setting, dict):
+            llm_setting = {key: value for key, value in llm_setting.items() if key != "api_key"}
+        payload = json.dumps(
+            [CACHE_SCHEMA_VERSION, question_llm_setting, llm_setting],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        # 設定の内容が同じ間はハッシュの再計算を省略する
+        # （id() は解放後に別の設定オブジェクトで再利用されうるため、内容そのものをキーにする）
+        memo = cls._config_version
+        if memo and memo[0] == payload:
+            return memo[1]
+        version = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+        cls._config_version = (payload, version)
+        return version
+
+    @classmethod
+    def build_key(
+        cls,
+        company_id: int,
+        application_id: Optional[int],
+        question: str,
+        corpus_version: str) -> str:
+        payload = json.dumps(
+            [
+                company_id,
+                application_id,
+                TextUtil.normalize_question(question),
+                corpus_version,
+                cls.get_config_version(),
+            ],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def get(
+        cls,
+        company_id: int,
+        application_id: Optional[int],
+        question: str,
+        corpus_version: str) -> Optional[str]:
+        """
+        キャッシュ済みの回答を取得する
+
+        Returns:
+            Optional[str]: ヒットした場合は回答、ヒットしない場合は None
+        """
+        started_at = time.perf_counter()
+        setting = cls.get_setting()
+        key = cls.build_key(company_id, application_id, question, corpus_version)
+        ttl_seconds = setting.get("ttl_seconds")
+        now = time.time()
+
+        tier = None
+        answer = None
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry and now - entry[1] <= ttl_seconds:
+                cls._entries.move_to_end(key)
+                answer = entry[0]
+                tier = "memory"
+            elif entry:
+                cls._entries.pop(key, None)
+
+        if answer is None and setting.get("persistent_path"):
+            persisted = cls._persistent_get(setting.get("persistent_path"), key)
+            if persisted and now - persisted[1] <= ttl_seconds:
+                answer = persisted[0]
+                tier = "persistent"
+                cls._memory_set(key, answer, persisted[1], setting.get("max_entries"))
+
+        NaviApiMetrics.observe(
+            f"{cls.METRIC_PREFIX}.lookup_us",
+            round((time.perf_counter() - started_at) * 1_000_000, 1)
+        )
+        if answer is None:
+            NaviApiMetrics.increment(f"{cls.METRIC_PREFIX}.misses")
+            return None
+
+        NaviApiMetrics.increment(f"{cls.METRIC_PREFIX}.hits", labels={"tier": tier})
+        NaviApiMetrics.increment("llm.calls_saved", labels={"source": "exact_cache"})
+        NaviApiLog.info(
+            f"完全一致キャッシュにヒットしました。"
+            f"company_id={company_id} "
+            f"application_id={application_id} "
+            f"tier={tier}"
+        )
+        return answer
+
+    @classmethod
+    def set(
+        cls,
+        company_id: int,
+        application_id: Optional[int],
+        question: str,
+        corpus_version: str,
+        answer: str) -> None:
+        """
+        回答をキャッシュに登録する
+        """
+        if not answer:
+            return
+        setting = cls.get_setting()
+        key = cls.build_key(company_id, application_id, question, corpus_version)
+        created_at = time.time()
+        cls._memory_set(key, answer, created_at, setting.get("max_entries"))
+        if setting.get("persistent_path"):
+            cls._persistent_set(setting.get("persistent_path"), key, answer, created_at)
+
+    @classmethod
+    def _memory_set(cls, key: str, answer: str, created_at: float, max_entries: int) -> None:
+        with cls._lock:
+            cls._entries[key] = (answer, created_at)
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > max(1, int(max_entries)):
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def _get_sqlite_connection(cls, path: str) -> sqlite3.Connection:
+        """
+        SQLite接続を取得する（_sqlite_lock の取得中に呼び出すこと）
+        """
+        if cls._sqlite_connection is None or cls._sqlite_path != path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            # 複数ワーカーから同時に読み書きできるようWALモードを使用する
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS answer_cache ("
+                "cache_key TEXT PRIMARY KEY, "
+                "answer TEXT NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+            connection.commit()
+            cls._sqlite_connection = connection
+            cls._sqlite_path = path
+        return cls._sqlite_connection
+
+    @classmethod
+    def _persistent_get(cls, path: str, key: str) -> Optional[tuple[str, float]]:
+        try:
+            with cls._sqlite_lock:
+                connection = cls._get_sqlite_connection(path)
+                row = connection.execute(
+                    "SELECT answer, created_at FROM answer_cache WHERE cache_key = ?",
+                    (key,)
+                ).fetchone()
+            return (row[0], row[1]) if row else None
+        except Exception as e:
+            NaviApiLog.warning(f"永続キャッシュの参照に失敗しました: {e}")
+            return None
+
+    @classmethod
+    def _persistent_set(cls, path: str, key: str, answer: str, created_at: float) -> None:
+        try:
+            with cls._sqlite_lock:
+                connection = cls._get_sqlite_connection(path)
+                connection.execute(
+                    "INSERT OR REPLACE INTO answer_cache (cache_key, answer, created_at) VALUES (?, ?, ?)",
+                    (key, answer, created_at)
+                )
+                connection.commit()
+        except Exception as e:
+            NaviApiLog.warning(f"永続キャッシュへの登録に失敗しました: {e}")
+
+    @classmethod
+    def purge_expired(cls) -> int:
+        """
+        永続層から有効期限切れのエントリを削除する
+
+        Returns:
+            int: 削除件数
+        """
+        setting = cls.get_setting()
+        path = setting.get("persistent_path")
+        if not path:
+            return 0
+        threshold = time.time() - setting.get("ttl_seconds")
+        with cls._sqlite_lock:
+            connection = cls._get_sqlite_connection(path)
+            cursor = connection.execute("DELETE FROM answer_cache WHERE created_at < ?", (threshold,))
+            connection.commit()
+            return cursor.rowcount
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        メモリ層を破棄し、永続層の接続を閉じる
+        """
+        with cls._lock:
+            cls._entries.clear()
+            cls._config_version = None
+        with cls._sqlite_lock:
+            if cls._sqlite_connection is not None:
+                cls._sqlite_connection.close()
+            cls._sqlite_connection = None
+            cls._sqlite_path = None
+
+    @classmethod
+    def stats(cls) -> dict[str, Any]:
+        hits = NaviApiMetrics.get_counter(f"{cls.METRIC_PREFIX}.hits", labels={"tier": "memory"}) \
+            + NaviApiMetrics.get_counter(f"{cls.METRIC_PREFIX}.hits", labels={"tier": "persistent"})
+        misses = NaviApiMetrics.get_counter(f"{cls.METRIC_PREFIX}.misses")
+        with cls._lock:
+            entries = len(cls._entries)
+        return {
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "entries": entries,
+        }
@@ -0,0 +1,344 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.aws.ssm_client import SsmClient
+from app.core.logging import NaviApiLog
+from app.core.metrics import NaviApiMetrics
+from app.core.utils.text_util import TextUtil
+from app.repositories.faq_repository import FaqDto, FaqRepository
+
+
+DEFAULT_FAQ_SETTING = {
+    "enabled": True,
+    # よくある質問の変更を確認する間隔（この間は MySQL に問い合わせずメモリ上の内容で照合する）
+    "poll_interval_seconds": 30,
+    # 質問の埋め込みでの照合を行うか（無効の場合は正規化後の完全一致のみ）
+    "semantic_enabled": True,
+    # 質問の埋め込み同士のコサイン類似度がこれ以上の場合に一致とみなす
+    "similarity_threshold": 0.9,
+}
+
+
+@dataclass
+class _TenantFaqs:
+    """
+    テナント（company_id, application_id）単位のよくある質問
+    埋め込みは初回の照合時に計算し、正規化済みの行列として保持する
+    """
+    version: str
+    checked_at: float
+    faqs: list[FaqDto] = field(default_factory=list)
+    keys: dict[str, int] = field(default_factory=dict)
+    vectors: Optional[np.ndarray] = None
+
+
+class FaqStore:
+    """
+    テナント毎のよくある質問（承認済みの回答）をメモリ上に保持し、検索・LLMを使わずに回答する
+
+    - 正規化後の質問が完全一致する場合、または質問の埋め込みの類似度が閾値以上の場合に回答を返す
+    - MySQL の内容は poll_interval_seconds 毎に件数・最終更新日時で変更を確認し、変更があれば読み直す
+    - 読み込みに失敗した場合は照合を行わず、通常の回答生成を継続する
+
+    設定は SSM の answer_cache_setting.faq から取得する。
+    """
+
+    METRIC_PREFIX = "faq"
+
+    _lock = threading.Lock()
+    _tenants: dict[tuple[int, Optional[int]], _TenantFaqs] = {}
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("answer_cache_setting", default={})
+        faq_setting = setting.get("faq", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_FAQ_SETTING, **faq_setting}
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return bool(cls.get_setting().get("enabled"))
+
+    @classmethod
+    def _needs_poll(cls, tenant_key: tuple[int, Optional[int]]) -> bool:
+        with cls._lock:
+            tenant = cls._tenants.get(tenant_key)
+        if tenant is None:
+            return True
+        return time.monotonic() - tenant.checked_at >= cls.get_setting().get("poll_interval_seconds")
+
+    @classmethod
+    def needs_refresh(cls, company_id: int, application_id: Optional[int]) -> bool:
+        """
+        確認間隔が経過しており、refresh で MySQL に問い合わせる必要があるか
+        """
+        return cls._needs_poll((company_id, application_id))
+
+    @classmethod
+    def _current_version(cls, tenant_key: tuple[int, Optional[int]]) -> Optional[str]:
+        with cls._lock:
+            tenant = cls._tenants.get(tenant_key)
+        return tenant.version if tenant else None
+
+    @classmethod
+    def _mark_checked(cls, tenant_key: tuple[int, Optional[int]]) -> None:
+        with cls._lock:
+            tenant = cls._tenants.get(tenant_key)
+            if tenant is None:
+                # 読み込みに失敗した場合も、次の確認までは空として扱い MySQL への問い合わせを繰り返さない
+                cls._tenants[tenant_key] = _TenantFaqs(version="", checked_at=time.monotonic())
+            else:
+                tenant.checked_at = time.monotonic()
+
+    @classmethod
+    def load(
+        cls,
+        company_id: int,
+        application_id: Optional[int],
+        version: str,
+        faqs: list[FaqDto]) -> None:
+        """
+        テナントのよくある質問を登録する（以前の内容と埋め込みは破棄する）
+        """
+        keys = {}
+        for index, faq in enumerate(faqs):
+            key = TextUtil.normalize_question(faq.question)
+            if key:
+                keys.setdefault(key, index)
+        with cls._lock:
+            cls._tenants[(company_id, application_id)] = _TenantFaqs(
+                version=version,
+                checked_at=time.monotonic(),
+                faqs=list(faqs),
+                keys=keys,
+            )
+        NaviApiMetrics.increment(f"{cls.METRIC_PREFIX}.reloads")
+        NaviApiLog.info(
+            f"よくある質問を読み込みました。"
+            f"company_id={company_id} "
+            f"application_id={application_id} "
+            f"件数={len(faqs)}"
+        )
+
+    @classmethod
+    def refresh(cls, session: Session, company_id: int, application_id: Optional[int]) -> None:
+        """
+        確認間隔が経過している場合に変更を確認し、変更があれば読み直す
+        """
+        tenant_key = (company_id, application_id)
+        if not cls._needs_poll(tenant_key):
+            return
+        try:
+            version = FaqRepository.get_version(
+                session=session, company_id=company_id, application_id=application_id
+            )
+            if version != cls._current_version(tenant_key):
+                faqs = FaqRepository.get_by_company_id(
+                    session=session, company_id=company_id, application_id=application_id
+                )
+                cls.load(company_id, application_id, version, faqs)
+                return
+        except Exception as e:
+            NaviApiLog.warning(f"よくある質問の読み込みに失敗しました。company_id={company_id} error={e}")
+        cls._mark_checked(tenant_key)
+
+    @classmethod
+    async def arefresh(cls, session: AsyncSession, company_id: int, application_id: Optional[int]) -> None:
+        """
+        refresh の非同期版
+        """
+        tenant_key = (company_id, application_id)
+        if not cls._needs_poll(tenant_key):
+            return
+        try:
+            version = await FaqRepository.aget_version(
+                session=session, company_id=company_id, application_id=application_id
+            )
+            if version != cls._current_version(tenant_key):
+                faqs = await FaqRepository.aget_by_company_id(
+                    session=session, company_id=company_id, application_id=application_id
+                )
+                cls.load(company_id, application_id, version, faqs)
+                return
+        except Exception as e:
+            NaviApiLog.warning(f"よくある質問の読み込みに失敗しました。company_id={company_id} error={e}")
+        cls._mark_checked(tenant_key)
+
+    @classmethod
+    def _hit(cls, company_id: int, application_id: Optional[int], faq: FaqDto, match: str) -> str:
+        NaviApiMetrics.increment(f"{cls.METRIC_PREFIX}.hits", labels={"match": match})
+        NaviApiMetrics.increment("llm.calls_saved", labels={"source": "faq"})
+        NaviApiLog.info(
+            f"よくある質問に一致しました。"
+            f"company_id={company_id} "
+            f"application_id={application_id} "
+            f"faq_id={faq.faq_id} "
+            f"match={match}"
+        )
+        return faq.answer
+
+    @classmethod
+    def match_exact(cls, company_id: int, application_id: Optional[int], question: str) -> Optional[str]:
+        """
+        正規化後の質問が一致するよくある質問の回答を返す
+        """
+        key = TextUtil.normalize_question(question)
+        with cls._lock:
+            tenant = cls._tenants.get((company_id, application_id))
+            index = tenant.keys.get(key) if tenant and key else None
+            faq = tenant.faqs[index] if index is not None else None
+        if faq is None:
+            return None
+        return cls._hit(company_id, application_id, faq, match="exact")
+
+    @classmethod
+    def should_match_semantic(cls, company_id: int, application_id: Optional[int]) -> bool:
+        """
+        埋め込みでの照合を行うか（有効かつテナントによくある質問がある場合のみ質問を埋め込む）
+        """
+        setting = cls.get_setting()
+        if not setting.get("enabled") or not setting.get("semantic_enabled"):
+            return False
+        with cls._lock:
+            tenant = cls._tenants.get((company_id, application_id))
+            return bool(tenant and tenant.faqs)
+
+    @staticmethod
+    def _normalize_rows(embeddings: list[list[float]]) -> Optional[np.ndarray]:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or not len(vectors):
+            return None
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @classmethod
+    def _pending_questions(cls, tenant_key: tuple[int, Optional[int]]) -> Optional[tuple[str, list[str]]]:
+        """
+        埋め込みが未計算の場合に、バージョンと埋め込む質問を返す
+        """
+        with cls._lock:
+            tenant = cls._tenants.get(tenant_key)
+            if not tenant or not tenant.faqs or tenant.vectors is not None:
+                return None
+            return tenant.version, [faq.question for faq in tenant.faqs]
+
+    @classmethod
+    def _set_vectors(cls, tenant_key: tuple[int, Optional[int]], version: str, embeddings: list[list[float]]) -> None:
+        vectors = cls._normalize_rows(embeddings)
+        with cls._lock:
+            tenant = cls._tenants.get(tenant_key)
+            # 埋め込み中に読み直された場合は古い質問の埋め込みを登録しない
+            if tenant and tenant.version == version and vectors is not None and len(vectors) == len(tenant.faqs):
+                tenant.vectors = vectors
+
+    @classmethod
+    def _match_vector(cls, company_id: int, application_id: Optional[int], embedding: list[float]) -> Optional[str]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if vector.ndim != 1 or norm == 0:
+            return None
+        vector = vector / norm
+        with cls._lock:
+            tenant = cls._tenants.get((company_id, application_id))
+            if not tenant or tenant.vectors is None or tenant.vectors.shape[1] != vector.shape[0]:
+                return None
+            similarities = tenant.vectors @ vector
+            best_index = int(np.argmax(similarities))
+            best_similarity = float(similarities[best_index])
+            faq = tenant.faqs[best_index]
+        if best_similarity < cls.get_setting().get("similarity_threshold"):
+            return None
+        return cls._hit(company_id, application_id, faq, match="semantic")
+
+    @classmethod
+    def match_semantic(
+        cls,
+        company_id: int,
+        application_id: Optional[int],
+        embedding: list[float],
+        embed_texts: Callable[[list[str]], list[list[float]]]) -> Optional[str]:
+        """
+        質問の埋め込みが類似するよくある質問の回答を返す
+
+        Args:
+            company_id: 企業ID
+            application_id: アプリケーションID
+            embedding: 質問の埋め込みベクトル（ベクトル検索にも使用するクエリ埋め込み）
+            embed_texts: よくある質問の埋め込みが未計算の場合に使用する埋め込み関数
+
+        Returns:
+            Optional[str]: 一致した場合は承認済みの回答、一致しない場合は None
+        """
+        tenant_key = (company_id, application_id)
+        pending = cls._pending_questions(tenant_key)
+        if pending is not None:
+            version, questions = pending
+            try:
+                cls._set_vectors(tenant_key, version, embed_texts(questions))
+            except Exception as e:
+                NaviApiLog.warning(f"よくある質問の埋め込みに失敗しました。company_id={company_id} error={e}")
+                return None
+        return cls._match_vector(company_id, application_id, embedding)
+
+    @classmethod
+    async def amatch_semantic(
+        cls,
+        company_id: int,
+        application_id: Optional[int],
+        embedding: list[float],
+        embed_texts: Callable[[list[str]], Awaitable[list[list[float]]]]) -> Optional[str]:
+        """
+        match_semantic の非同期版
+        """
+        tenant_key = (company_id, application_id)
+        pending = cls._pending_questions(tenant_key)
+        if pending is not None:
+            version, questions = pending
+            try:
+                cls._set_vectors(tenant_key, version, await embed_texts(questions))
+            except Exception as e:
+                NaviApiLog.warning(f"よくある質問の埋め込みに失敗しました。company_id={company_id} error={e}")
+                return None
+        return cls._match_vector(company_id, application_id, embedding)
+
+    @classmethod
+    def invalidate(cls, company_id: int, application_id: Optional[int] = None) -> None:
+        """
+        テナントのよくある質問を破棄し、次回のリクエストで読み直させる
+        企業配下の全アプリケーションを対象とした問い合わせ（application_id=None）の内容も破棄する
+        """
+        with cls._lock:
+            keys = [
+                key for key in cls._tenants
+                if key[0] == company_id
+                and (application_id is None or key[1] in (application_id, None))
+            ]
+            for key in keys:
+                cls._tenants.pop(key, None)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._tenants.clear()
+
+    @classmethod
+    def stats(cls) -> dict[str, Any]:
+        """
+        一致件数と保持しているよくある質問の件数を返す
+        """
+        exact = NaviApiMetrics.get_counter(f"{cls.METRIC_PREFIX}.hits", labels={"match": "exact"})
+        semantic = NaviApiMetrics.get_counter(f"{cls.METRIC_PREFIX}.hits", labels={"match": "semantic"})
+        with cls._lock:
+            entries = sum(len(tenant.faqs) for tenant in cls._tenants.values())
+            tenants = len(cls._tenants)
+        return {
+            "exact_hits": int(exact),
+            "semantic_hits": int(semantic),
+            "llm_calls_saved": int(exact + semantic),
+            "tenants": tenants,
+            "entries": entries,
+        }
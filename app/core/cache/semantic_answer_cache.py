@@ -0,0 +1,209 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+import numpy as np
+from app.core.aws.ssm_client import SsmClient
+from app.core.logging import NaviApiLog
+from app.core.metrics import NaviApiMetrics
+
+
+DEFAULT_SEMANTIC_CACHE_SETTING = {
+    "enabled": False,
+    "similarity_threshold": 0.92,
+    "max_entries_per_tenant": 500,
+    "ttl_seconds": 86400,
+}
+
+
+@dataclass
+class _TenantEntries:
+    """
+    テナント（company_id, application_id）単位のキャッシュエントリ
+    埋め込みは正規化済みの行列として保持し、コサイン類似度を内積で一括計算する
+    """
+    corpus_version: str
+    questions: list[str] = field(default_factory=list)
+    answers: list[str] = field(default_factory=list)
+    created_at: list[float] = field(default_factory=list)
+    vectors: Optional[np.ndarray] = None
+
+
+class SemanticAnswerCache:
+    """
+    言い回しの異なる同一趣旨の質問に対して、過去の回答を再利用するためのセマンティックキャッシュ
+
+    - キーはテナント（company_id, application_id）単位で分離する
+    - 質問の埋め込み（検索にも使用するクエリ埋め込み）同士のコサイン類似度が閾値以上なら回答を返す
+    - テナントのマニュアル構成（corpus_version）が変わった場合はテナント単位で破棄する
+
+    設定は SSM の answer_cache_setting.semantic から取得する。
+    """
+
+    METRIC_PREFIX = "answer_cache.semantic"
+
+    _lock = threading.Lock()
+    _tenants: dict[tuple[int, Optional[int]], _TenantEntries] = {}
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("answer_cache_setting", default={})
+        semantic_setting = setting.get("semantic", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_SEMANTIC_CACHE_SETTING, **semantic_setting}
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return bool(cls.get_setting().get("enabled"))
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if vector.ndim != 1 or norm == 0:
+            return None
+        return vector / norm
+
+    @classmethod
+    def lookup(
+        cls,
+        company_id: int,
+        application_id: Optional[int],
+        corpus_version: str,
+        embedding: list[float]) -> Optional[str]:
+        """
+        類似する過去の質問の回答を取得する
+
+        Args:
+            company_id: 企業ID
+            application_id: アプリケーションID
+            corpus_version: 現在のマニュアル構成のバージョン
+            embedding: 質問の埋め込みベクトル
+
+        Returns:
+            Optional[str]: ヒットした場合は回答、ヒットしない場合は None
+        """
+        setting = cls.get_setting()
+        vector = cls._normalize(embedding)
+        if vector is None:
+            return None
+
+        tenant_key = (company_id, application_id)
+        now = time.time()
+        with cls._lock:
+            tenant = cls._tenants.get(tenant_key)
+            if tenant and tenant.corpus_version != corpus_version:
+                NaviApiLog.info(
+                    f"マニュアルが更新されたためセマンティックキャッシュを破棄します。"
+                    f"company_id={company_id} "
+                    f"application_id={application_id}"
+                )
+                cls._tenants.pop(tenant_key, None)
+                NaviApiMetrics.increment(f"{cls.METRIC_PREFIX}.invalidations")
+                tenant = None
+
+            if not tenant or tenant.vectors is None or not tenant.answers:
+                NaviApiMetrics.increment(f"{cls.METRIC_PREFIX}.misses")
+                return None
+
+            similarities = tenant.vectors @ vector
+            best_index = int(np.argmax(similarities))
+            best_similarity = float(similarities[best_index])
+            is_expired = now - tenant.created_at[best_index] > setting.get("ttl_seconds")
+            answer = tenant.answers[best_index]
+            matched_question = tenant.questions[best_index]
+
+        if best_similarity < setting.get("similarity_threshold") or is_expired:
+            NaviApiMetrics.increment(f"{cls.METRIC_PREFIX}.misses")
+            return None
+
+        NaviApiMetrics.increment(f"{cls.METRIC_PREFIX}.hits")
+        NaviApiMetrics.increment("llm.calls_saved", labels={"source": "semantic_cache"})
+        NaviApiLog.info(
+            f"セマンティックキャッシュにヒットしました。"
+            f"company_id={company_id} "
+            f"application_id={application_id} "
+            f"similarity={best_similarity:.4f} "
+            f"matched_question={matched_question}"
+        )
+        return answer
+
+    @classmethod
+    def store(
+        cls,
+        company_id: int,
+        application_id: Optional[int],
+        corpus_version: str,
+        question: str,
+        embedding: list[float],
+        answer: str) -> None:
+        """
+        回答をキャッシュに登録する
+        テナント毎の上限を超えた場合は古いエントリから削除する
+        """
+        setting = cls.get_setting()
+        vector = cls._normalize(embedding)
+        if vector is None or not answer:
+            return
+
+        tenant_key = (company_id, application_id)
+        max_entries = max(1, int(setting.get("max_entries_per_tenant")))
+        with cls._lock:
+            tenant = cls._tenants.get(tenant_key)
+            if not tenant or tenant.corpus_version != corpus_version:
+                tenant = _TenantEntries(corpus_version=corpus_version)
+                cls._tenants[tenant_key] = tenant
+
+            tenant.questions.append(question)
+            tenant.answers.append(answer)
+            tenant.created_at.append(time.time())
+            if tenant.vectors is None:
+                tenant.vectors = vector[np.newaxis, :]
+            else:
+                tenant.vectors = np.vstack([tenant.vectors, vector])
+
+            overflow = len(tenant.answers) - max_entries
+            if overflow > 0:
+                del tenant.questions[:overflow]
+                del tenant.answers[:overflow]
+                del tenant.created_at[:overflow]
+                tenant.vectors = tenant.vectors[overflow:]
+
+    @classmethod
+    def invalidate(cls, company_id: int, application_id: Optional[int] = None) -> None:
+        """
+        テナントのキャッシュを破棄する
+        application_id を省略した場合は企業配下の全アプリケーションを破棄する
+        """
+        with cls._lock:
+            keys = [
+                key for key in cls._tenants
+                if key[0] == company_id and (application_id is None or key[1] == application_id)
+            ]
+            for key in keys:
+                cls._tenants.pop(key, None)
+        if keys:
+            NaviApiMetrics.increment(f"{cls.METRIC_PREFIX}.invalidations", value=len(keys))
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._tenants.clear()
+
+    @classmethod
+    def stats(cls) -> dict[str, Any]:
+        """
+        ヒット率と節約できたLLM呼び出し数を返す
+        """
+        hits = NaviApiMetrics.get_counter(f"{cls.METRIC_PREFIX}.hits")
+        misses = NaviApiMetrics.get_counter(f"{cls.METRIC_PREFIX}.misses")
+        with cls._lock:
+            entries = sum(len(tenant.answers) for tenant in cls._tenants.values())
+            tenants = len(cls._tenants)
+        return {
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "llm_calls_saved": int(hits),
+            "tenants": tenants,
+            "entries": entries,
+        }
@@ -1,8 +1,9 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from contextlib import contextmanager
-from typing import Generator
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncGenerator, Generator
 from app.core.aws.secret_manager import SecretManager
 
 
@@ -13,11 +14,12 @@ class MySQLDatabase:
     def __init__(self):
         self._engine = None
         self._session_local = None
+        self._async_engine = None
+        self._async_session_local = None
 
-    def initialize(self):
-        params = SecretManager().get_secret("mysql_setting")
-
-        SQLALCHEMY_DATABASE_URL = "mysql+pymysql://{0}:{1}@{2}:{3}/{4}?charset=utf8".format(
+    def _build_url(self, params: dict, driver: str) -> str:
+        return "mysql+{0}://{1}:{2}@{3}:{4}/{5}?charset=utf8".format(
+            driver,
             params.get("user"),
             params.get("password"),
             params.get("host"),
@@ -25,6 +27,11 @@ class MySQLDatabase:
             params.get("database")
         )
 
+    def initialize(self):
+        params = SecretManager().get_secret("mysql_setting")
+
+        SQLALCHEMY_DATABASE_URL = self._build_url(params, "pymysql")
+
         self._engine = create_engine(
             SQLALCHEMY_DATABASE_URL,
             pool_size=params.get("pool_size"),
@@ -36,6 +43,28 @@ class MySQLDatabase:
 
         self._session_local = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)
 
+    def initialize_async(self):
+        """
+        非同期エンジン（aiomysql）を初期化する
+        同期エンジンとは別のコネクションプールを持つ
+        """
+        params = SecretManager().get_secret("mysql_setting")
+
+        self._async_engine = create_async_engine(
+            self._build_url(params, "aiomysql"),
+            pool_size=params.get("pool_size"),
+            max_overflow=params.get("max_overflow"),
+            pool_timeout=params.get("pool_timeout"),
+            pool_recycle=params.get("pool_recycle"),
+            pool_pre_ping=params.get("pool_pre_ping"),
+        )
+
+        self._async_session_local = async_sessionmaker(
+            bind=self._async_engine,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+
     @property
     def engine(self):
         if self._engine is None:
@@ -58,3 +87,20 @@ class MySQLDatabase:
             yield db
         finally:
             db.close()
+
+    @property
+    def async_engine(self):
+        if self._async_engine is None:
+            self.initialize_async()
+        return self._async_engine
+
+    @asynccontextmanager
+    async def get_async_session(self) -> AsyncGenerator[AsyncSession, None]:
+        if self._async_session_local is None:
+            self.initialize_async()
+
+        db = self._async_session_local()
+        try:
+            yield db
+        finally:
+            await db.close()
@@ -1,4 +1,6 @@
+from functools import lru_cache
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from contextlib import contextmanager
@@ -19,6 +21,8 @@ class PostgreSQLDatabase:
         self._engine = None
         self._session_local = None
         self._connection_string = None
+        self._engine_options = None
+        self._async_engine = None
 
     def initialize(self):
         """
@@ -55,6 +59,7 @@ class PostgreSQLDatabase:
                 "pool_pre_ping": params.get("pool_pre_ping", True),
             }
             
+            self._engine_options = engine_options
             self._engine = create_engine(self._connection_string, **engine_options)
             self._session_local = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)
             
@@ -94,6 +99,18 @@ class PostgreSQLDatabase:
             self.initialize()
         return self._connection_string
 
+    @property
+    def async_engine(self) -> AsyncEngine:
+        """
+        非同期のSQLAlchemy Engineを取得します。
+        psycopg（v3）は同一の接続文字列で非同期接続に対応しているため、同期Engineと同じ設定で作成します。
+        """
+        if self._async_engine is None:
+            if self._connection_string is None:
+                self.initialize()
+            self._async_engine = create_async_engine(self._connection_string, **self._engine_options)
+        return self._async_engine
+
     @contextmanager
     def get_session(self) -> Generator[Session, None, None]:
         """
@@ -120,3 +137,20 @@ class PostgreSQLDatabase:
         if self._engine:
             self._engine.dispose()
             NaviApiLog.info("PostgreSQL connection pool disposed")
+
+    async def adispose(self):
+        """
+        非同期のデータベース接続プールを破棄します。
+        """
+        if self._async_engine:
+            await self._async_engine.dispose()
+            NaviApiLog.info("PostgreSQL async connection pool disposed")
+
+
+@lru_cache()
+def get_postgresql_database() -> PostgreSQLDatabase:
+    """
+    プロセス内で共有するPostgreSQLDatabaseインスタンスを返す
+    非同期Engine（コネクションプール）をリクエスト間で使い回すために使用する
+    """
+    return PostgreSQLDatabase()
@@ -0,0 +1,132 @@
+import threading
+from collections import deque
+from typing import Any, Optional
+
+
+class NaviApiMetrics:
+    """
+    プロセス内で集計するシンプルなメトリクスクラス
+    NaviApiLog と同様にクラスメソッドとして直接記録可能
+
+    - counter: 単調増加する回数（キャッシュヒット数など）
+    - gauge: 現在値（キューの深さなど）
+    - observation: 計測値の分布（待ち時間など）。直近 OBSERVATION_WINDOW 件からパーセンタイルを算出する
+    """
+
+    OBSERVATION_WINDOW = 1000
+
+    _lock = threading.Lock()
+    _counters: dict[str, float] = {}
+    _gauges: dict[str, float] = {}
+    _observations: dict[str, deque] = {}
+    _observation_totals: dict[str, list[float]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Optional[dict[str, Any]] = None) -> str:
+        if not labels:
+            return name
+        label_str = ",".join(f"{key}={labels[key]}" for key in sorted(labels))
+        return f"{name}{{{label_str}}}"
+
+    @classmethod
+    def increment(cls, name: str, value: float = 1, labels: Optional[dict[str, Any]] = None) -> None:
+        """カウンターを加算する"""
+        key = cls._key(name, labels)
+        with cls._lock:
+            cls._counters[key] = cls._counters.get(key, 0) + value
+
+    @classmethod
+    def set_gauge(cls, name: str, value: float, labels: Optional[dict[str, Any]] = None) -> None:
+        """ゲージに現在値を設定する"""
+        key = cls._key(name, labels)
+        with cls._lock:
+            cls._gauges[key] = value
+
+    @classmethod
+    def add_gauge(cls, name: str, delta: float, labels: Optional[dict[str, Any]] = None) -> None:
+        """ゲージを増減する"""
+        key = cls._key(name, labels)
+        with cls._lock:
+            cls._gauges[key] = cls._gauges.get(key, 0) + delta
+
+    @classmethod
+    def observe(cls, name: str, value: float, labels: Optional[dict[str, Any]] = None) -> None:
+        """計測値を記録する"""
+        key = cls._key(name, labels)
+        with cls._lock:
+            if key not in cls._observations:
+                cls._observations[key] = deque(maxlen=cls.OBSERVATION_WINDOW)
+                cls._observation_totals[key] = [0, 0.0]
+            cls._observations[key].append(value)
+            cls._observation_totals[key][0] += 1
+            cls._observation_totals[key][1] += value
+
+    @classmethod
+    def get_counter(cls, name: str, labels: Optional[dict[str, Any]] = None) -> float:
+        with cls._lock:
+            return cls._counters.get(cls._key(name, labels), 0)
+
+    @classmethod
+    def get_gauge(cls, name: str, labels: Optional[dict[str, Any]] = None) -> float:
+        with cls._lock:
+            return cls._gauges.get(cls._key(name, labels), 0)
+
+    @classmethod
+    def percentile(cls, name: str, percentile: float, labels: Optional[dict[str, Any]] = None) -> Optional[float]:
+        """
+        直近の計測値からパーセンタイル値を算出する
+
+        Args:
+            name: メトリクス名
+            percentile: 0〜100のパーセンタイル
+            labels: ラベル
+
+        Returns:
+            Optional[float]: 計測値が存在しない場合は None
+        """
+        with cls._lock:
+            values = list(cls._observations.get(cls._key(name, labels), []))
+        if not values:
+            return None
+        values.sort()
+        index = min(len(values) - 1, max(0, int(round(percentile / 100 * (len(values) - 1)))))
+        return values[index]
+
+    @classmethod
+    def snapshot(cls) -> dict[str, Any]:
+        """
+        現在のメトリクスを辞書形式で返す（/metrics エンドポイント用）
+        """
+        with cls._lock:
+            counters = dict(cls._counters)
+            gauges = dict(cls._gauges)
+            observations = {key: sorted(values) for key, values in cls._observations.items()}
+            totals = {key: list(value) for key, value in cls._observation_totals.items()}
+
+        summaries = {}
+        for key, values in observations.items():
+            if not values:
+                continue
+            count, total = totals[key]
+            summaries[key] = {
+                "count": int(count),
+                "avg": round(total / count, 3) if count else 0,
+                "p50": values[int(round(0.50 * (len(values) - 1)))],
+                "p95": values[int(round(0.95 * (len(values) - 1)))],
+                "p99": values[int(round(0.99 * (len(values) - 1)))],
+                "max": values[-1],
+            }
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "observations": summaries,
+        }
+
+    @classmethod
+    def reset(cls) -> None:
+        """全メトリクスを初期化する（テスト用）"""
+        with cls._lock:
+            cls._counters.clear()
+            cls._gauges.clear()
+            cls._observations.clear()
+            cls._observation_totals.clear()
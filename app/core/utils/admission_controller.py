@@ -0,0 +1,296 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterator, Optional
+from app.core.logging import NaviApiLog
+from app.core.metrics import NaviApiMetrics
+
+
+DEFAULT_ADMISSION_SETTING = {
+    "enabled": True,
+    # 同時に実行するLLM呼び出しの上限（プロセス単位）
+    "max_in_flight": 8,
+    # 実行待ちで保持するリクエストの上限（超えた場合は即座に拒否する）
+    "max_queue": 32,
+    # 実行待ちの最大秒数（超えた場合は拒否する）
+    "queue_timeout_seconds": 30.0,
+    # 処理時間の実績が無い場合に返す Retry-After の秒数
+    "retry_after_seconds": 5,
+    "max_retry_after_seconds": 60,
+    "queue_full_status_code": 429,
+    "timeout_status_code": 503,
+}
+
+# 処理時間の指数移動平均の重み
+HOLD_TIME_ALPHA = 0.2
+
+
+class AdmissionRejectedError(Exception):
+    """
+    同時実行数の上限と実行待ちの上限を超えたため、リクエストを受け付けなかった場合の例外
+    API では status_code と Retry-After ヘッダーを付けたエラーレスポンスに変換する
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after_seconds: int, reason: str) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.retry_after_seconds = retry_after_seconds
+        self.reason = reason
+
+
+class _Waiter:
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def notify(self) -> None:
+        if self.loop is None:
+            self.event.set()
+            return
+
+        def set_result() -> None:
+            if not self.future.done():
+                self.future.set_result(True)
+
+        self.loop.call_soon_threadsafe(set_result)
+
+
+class AdmissionController:
+    """
+    LLM呼び出しの同時実行数を制限し、上限を超えたリクエストを期限付きの待ち行列で待たせる
+
+    - 同期版（slot）と非同期版（aslot）は同じ上限・待ち行列を共有し、到着順に実行枠を割り当てる
+    - 待ち行列が上限に達している場合は待たずに、期限までに実行枠を得られなかった場合はその時点で
+      AdmissionRejectedError を送出する（Retry-After は処理時間の実績と待ち行列の長さから見積もる）
+    - 実行中の数・待ち行列の長さ・待ち時間をメトリクスに記録する
+
+    設定は SSM の llm_setting.admission から取得する。
+    """
+
+    _lock = threading.Lock()
+    _controllers: dict[str, "AdmissionController"] = {}
+
+    def __init__(self, name: str, setting: Optional[dict[str, Any]] = None) -> None:
+        self.name = name
+        self.setting = {**DEFAULT_ADMISSION_SETTING, **(setting or {})}
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters: deque[_Waiter] = deque()
+        self._hold_seconds: Optional[float] = None
+
+    @classmethod
+    def get(cls, name: str, setting: Optional[dict[str, Any]] = None) -> "AdmissionController":
+        """
+        名前毎に共有の AdmissionController を取得する
+        設定値が変わった場合は実行中・待機中のリクエストを保持したまま反映する
+        """
+        with cls._lock:
+            controller = cls._controllers.get(name)
+            if controller is None:
+                controller = cls(name, setting)
+                cls._controllers[name] = controller
+                return controller
+        controller.configure(setting)
+        return controller
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._controllers.clear()
+
+    @classmethod
+    def stats(cls) -> dict[str, Any]:
+        with cls._lock:
+            controllers = list(cls._controllers.values())
+        return {controller.name: controller.snapshot() for controller in controllers}
+
+    def configure(self, setting: Optional[dict[str, Any]]) -> None:
+        setting = {**DEFAULT_ADMISSION_SETTING, **(setting or {})}
+        if setting == self.setting:
+            return
+        with self._lock:
+            self.setting = setting
+            # 上限が増えた場合は待機中のリクエストに実行枠を割り当てる
+            while self._waiters and self._in_flight < self.setting.get("max_in_flight"):
+                self._in_flight += 1
+                self._grant(self._waiters.popleft())
+        self._record_gauges()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.setting.get("enabled"))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def average_hold_ms(self) -> Optional[float]:
+        """
+        実行枠を保持していた時間（LLM呼び出しの処理時間）の移動平均（実績が無い場合は None）
+        """
+        hold_seconds = self._hold_seconds
+        return None if hold_seconds is None else hold_seconds * 1000
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "max_in_flight": self.setting.get("max_in_flight"),
+                "max_queue": self.setting.get("max_queue"),
+            }
+
+    def _labels(self) -> dict[str, str]:
+        return {"name": self.name}
+
+    def _record_gauges(self) -> None:
+        NaviApiMetrics.set_gauge("llm.admission.in_flight", self._in_flight, labels=self._labels())
+        NaviApiMetrics.set_gauge("llm.admission.queue_depth", len(self._waiters), labels=self._labels())
+
+    def _retry_after_seconds(self) -> int:
+        if self._hold_seconds is None:
+            return int(self.setting.get("retry_after_seconds"))
+        # 待ち行列の全てのリクエストが捌けるまでの見込み時間
+        estimate = self._hold_seconds * (len(self._waiters) + 1) / max(1, self.setting.get("max_in_flight"))
+        return int(min(self.setting.get("max_retry_after_seconds"), max(1, math.ceil(estimate))))
+
+    def _reject(self, reason: str, status_code: int, message: str) -> AdmissionRejectedError:
+        retry_after_seconds = self._retry_after_seconds()
+        NaviApiMetrics.increment("llm.admission.rejected", labels={**self._labels(), "reason": reason})
+        NaviApiLog.warning(
+            f"LLMの同時実行数が上限に達しているため、リクエストを拒否しました。"
+            f"name={self.name} "
+            f"reason={reason} "
+            f"in_flight={self._in_flight} "
+            f"queue_depth={len(self._waiters)} "
+            f"retry_after={retry_after_seconds}"
+        )
+        return AdmissionRejectedError(message, status_code, retry_after_seconds, reason)
+
+    @staticmethod
+    def _grant(waiter: _Waiter) -> None:
+        waiter.granted = True
+        waiter.notify()
+
+    def _enter(self, waiter: _Waiter) -> Optional[_Waiter]:
+        """
+        実行枠を取得する。空きが無い場合は待ち行列に追加した waiter を返す
+        """
+        with self._lock:
+            if self._in_flight < self.setting.get("max_in_flight") and not self._waiters:
+                self._in_flight += 1
+                self._record_gauges()
+                return None
+            if len(self._waiters) >= self.setting.get("max_queue"):
+                raise self._reject(
+                    "queue_full",
+                    self.setting.get("queue_full_status_code"),
+                    "現在リクエストが集中しています。しばらくしてから再度お試しください。",
+                )
+            self._waiters.append(waiter)
+            self._record_gauges()
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """
+        待機をやめて待ち行列から外す
+
+        Returns:
+            bool: 外した場合は True（直前に実行枠が割り当てられていた場合は False）
+        """
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters.remove(waiter)
+            self._record_gauges()
+            return True
+
+    def _timeout(self) -> AdmissionRejectedError:
+        with self._lock:
+            return self._reject(
+                "timeout",
+                self.setting.get("timeout_status_code"),
+                "現在リクエストが集中しているため、回答を生成できませんでした。しばらくしてから再度お試しください。",
+            )
+
+    def _release(self, hold_seconds: Optional[float]) -> None:
+        with self._lock:
+            if hold_seconds is not None:
+                if self._hold_seconds is None:
+                    self._hold_seconds = hold_seconds
+                else:
+                    self._hold_seconds += HOLD_TIME_ALPHA * (hold_seconds - self._hold_seconds)
+            # 実行枠は減らさずに、次に待っているリクエストへ引き継ぐ
+            if self._waiters and self._in_flight <= self.setting.get("max_in_flight"):
+                self._grant(self._waiters.popleft())
+            else:
+                self._in_flight -= 1
+            self._record_gauges()
+
+    def _record_wait(self, started: float) -> None:
+        NaviApiMetrics.observe("llm.admission.wait_ms", (time.perf_counter() - started) * 1000, labels=self._labels())
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        実行枠を取得してから処理を実行する
+
+        Raises:
+            AdmissionRejectedError: 待ち行列が上限に達している、または期限までに実行枠を取得できなかった場合
+        """
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        waiter = self._enter(_Waiter())
+        if waiter is not None:
+            waiter.event.wait(self.setting.get("queue_timeout_seconds"))
+            if self._abandon(waiter):
+                self._record_wait(started)
+                raise self._timeout()
+        self._record_wait(started)
+        acquired = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - acquired)
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        """
+        slot の非同期版（待機中にイベントループをブロックしない）
+        """
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        waiter = self._enter(_Waiter(asyncio.get_running_loop()))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.setting.get("queue_timeout_seconds"))
+            except asyncio.TimeoutError:
+                if self._abandon(waiter):
+                    self._record_wait(started)
+                    raise self._timeout()
+            except asyncio.CancelledError:
+                # 割り当て済みの実行枠は使わずに次のリクエストへ引き継ぐ
+                if not self._abandon(waiter):
+                    self._release(None)
+                raise
+        self._record_wait(started)
+        acquired = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - acquired)
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+from app.core.logging import NaviApiLog
+from app.core.metrics import NaviApiMetrics
+
+try:
+    import fcntl
+except ImportError:  # Windows などでは fcntl が無いため、ワーカー間のロックは無効になる
+    fcntl = None
+
+
+T = TypeVar("T")
+
+LOCK_POLL_INTERVAL_SECONDS = 0.05
+
+
+@dataclass
+class _Call:
+    event: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    同じキーの処理が実行中の場合、後続の呼び出しは先行する処理の完了を待って結果を共有する
+
+    - 同期版（do）はワーカー内のスレッド間、非同期版（ado）はイベントループ内のタスク間で合流する
+    - 待機時間は上限付きで、超えた場合は待機をやめて自身で処理を実行する（フォールバック）
+    - 先行する処理が例外で終了した場合は、待機していた呼び出しはそれぞれ自身で処理を実行し直す
+      （一時的な失敗が合流した全ての呼び出しに波及しないようにする）
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._async_calls: dict[Hashable, asyncio.Future] = {}
+
+    def _record(self, outcome: str) -> None:
+        NaviApiMetrics.increment("single_flight.calls", labels={"name": self.name, "outcome": outcome})
+
+    def _log_fallback(self, wait_timeout_seconds: float) -> None:
+        NaviApiLog.warning(
+            f"先行する処理の待機がタイムアウトしたため、単独で実行します。"
+            f"name={self.name} "
+            f"wait_timeout_seconds={wait_timeout_seconds}"
+        )
+
+    def _log_retry(self, error: BaseException) -> None:
+        NaviApiLog.warning(
+            f"先行する処理が失敗したため、単独で実行し直します。"
+            f"name={self.name} "
+            f"error={error}"
+        )
+
+    def do(self, key: Hashable, fn: Callable[[], T], wait_timeout_seconds: float) -> T:
+        """
+        キー毎に1回だけ fn を実行し、同時に呼び出された他のスレッドと結果を共有する
+
+        Args:
+            key: 合流のキー
+            fn: 実行する処理
+            wait_timeout_seconds: 先行する処理を待つ最大秒数
+
+        Returns:
+            T: fn の結果
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if is_leader:
+            self._record("leader")
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+
+        if not call.event.wait(wait_timeout_seconds):
+            self._record("fallback")
+            self._log_fallback(wait_timeout_seconds)
+            return fn()
+        if call.error is not None:
+            self._record("retry")
+            self._log_retry(call.error)
+            return fn()
+        self._record("shared")
+        return call.result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]], wait_timeout_seconds: float) -> T:
+        """
+        do の非同期版
+        """
+        future = self._async_calls.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            # 待機するタスクが無い場合でも例外が未取得として警告されないようにする
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._async_calls[key] = future
+            self._record("leader")
+            try:
+                result = await fn()
+                future.set_result(result)
+                return result
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                self._async_calls.pop(key, None)
+
+        try:
+            # 待機側のタイムアウト・キャンセルが先行する処理に波及しないよう shield する
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=wait_timeout_seconds)
+        except asyncio.TimeoutError:
+            self._record("fallback")
+            self._log_fallback(wait_timeout_seconds)
+            return await fn()
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # 先行する処理がキャンセルされた場合は自身で実行する
+            self._record("fallback")
+            return await fn()
+        except Exception as e:
+            self._record("retry")
+            self._log_retry(e)
+            return await fn()
+        self._record("shared")
+        return result
+
+
+class FileLock:
+    """
+    同一ホスト上のワーカープロセス間で共有する排他ロック（fcntl.flock）
+
+    ロックファイルはキーのハッシュ値をファイル名として lock_dir に作成する。
+    flock はプロセスの終了時に自動で解放されるため、ワーカーが異常終了してもロックは残らない。
+    """
+
+    def __init__(self, lock_dir: str, key: Hashable) -> None:
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:32]
+        self.path = os.path.join(lock_dir, f"{digest}.lock")
+        self.lock_dir = lock_dir
+        self._fd: Optional[int] = None
+
+    @staticmethod
+    def is_supported() -> bool:
+        return fcntl is not None
+
+    def _try_acquire(self) -> bool:
+        if self._fd is None:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def acquire(self, timeout_seconds: float) -> bool:
+        """
+        ロックを取得する
+
+        Returns:
+            bool: タイムアウトまでに取得できた場合は True
+        """
+        if not self.is_supported():
+            return False
+        deadline = time.monotonic() + timeout_seconds
+        while not self._try_acquire():
+            if time.monotonic() >= deadline:
+                self._close()
+                return False
+            time.sleep(LOCK_POLL_INTERVAL_SECONDS)
+        return True
+
+    async def aacquire(self, timeout_seconds: float) -> bool:
+        """
+        acquire の非同期版（待機中にイベントループをブロックしない）
+        """
+        if not self.is_supported():
+            return False
+        deadline = time.monotonic() + timeout_seconds
+        while not self._try_acquire():
+            if time.monotonic() >= deadline:
+                self._close()
+                return False
+            await asyncio.sleep(LOCK_POLL_INTERVAL_SECONDS)
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._close()
+
+    def _close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
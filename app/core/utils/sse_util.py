@@ -0,0 +1,99 @@
+import json
+import queue
+import threading
+from typing import Any, Iterable, Iterator, Optional
+
+
+class SseUtil:
+    """
+    Server-Sent Events（text/event-stream）形式のレスポンスを組み立てるユーティリティ
+
+    イベント形式:
+        event: <event_name>
+        data: <JSON文字列>
+        (空行)
+    keep-alive はコメント行（": ping"）として送信するため、クライアント側のイベントとしては扱われない。
+    """
+    MEDIA_TYPE = "text/event-stream"
+    HEADERS = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        # nginx 等のリバースプロキシによるバッファリングを無効化する
+        "X-Accel-Buffering": "no",
+    }
+
+    _END = object()
+
+    @staticmethod
+    def format_event(data: Any, event: Optional[str] = None) -> str:
+        """
+        1件のSSEイベントを文字列に変換する
+
+        Args:
+            data: 送信するデータ（JSONにシリアライズされるため改行を含んでも安全）
+            event: イベント名（省略時はクライアント側で "message" として扱われる）
+
+        Returns:
+            str: SSE形式の文字列
+        """
+        lines = []
+        if event:
+            lines.append(f"event: {event}")
+        lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+        return "\n".join(lines) + "\n\n"
+
+    @staticmethod
+    def format_comment(comment: str = "ping") -> str:
+        """
+        SSEのコメント行を生成する（keep-alive用）
+        """
+        return f": {comment}\n\n"
+
+    @staticmethod
+    def with_keepalive(events: Iterable[str], interval_seconds: float) -> Iterator[str]:
+        """
+        イベントの生成が interval_seconds 以上途切れた場合に keep-alive を挟み込む
+
+        LLMの応答待ち（最初のトークンが届くまで）などでプロキシやブラウザが
+        接続をタイムアウトさせないよう、イベントの生成を別スレッドで行い、
+        待機中は定期的にコメント行を送信する。
+
+        Args:
+            events: SSE形式の文字列を返すイテラブル
+            interval_seconds: keep-alive の送信間隔（秒）
+
+        Returns:
+            Iterator[str]: keep-alive を含むSSE文字列のイテレータ
+        """
+        buffer: queue.Queue = queue.Queue()
+        stopped = threading.Event()
+
+        def _produce():
+            try:
+                for event in events:
+                    if stopped.is_set():
+                        break
+                    buffer.put(event)
+            except Exception as e:
+                buffer.put(e)
+            finally:
+                buffer.put(SseUtil._END)
+
+        producer = threading.Thread(target=_produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                try:
+                    item = buffer.get(timeout=interval_seconds)
+                except queue.Empty:
+                    yield SseUtil.format_comment("ping")
+                    continue
+
+                if item is SseUtil._END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # クライアント切断時に生成側へ停止を通知する
+            stopped.set()
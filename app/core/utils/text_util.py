@@ -0,0 +1,26 @@
+import re
+import unicodedata
+
+
+class TextUtil:
+    """
+    テキスト処理のユーティリティ
+    """
+    _WHITESPACE_PATTERN = re.compile(r"\s+")
+    _TRAILING_PUNCTUATION_PATTERN = re.compile(r"[\s?？!！。．.、,，]+$")
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """
+        キャッシュキー等に使用するため質問テキストを正規化する
+
+        - NFKC正規化（全角英数・半角カナ等の表記ゆれを統一）
+        - 大文字小文字の統一
+        - 連続する空白を1つにまとめ、前後の空白を除去
+        - 末尾の句読点・疑問符を除去
+        """
+        if not question:
+            return ""
+        normalized = unicodedata.normalize("NFKC", question).casefold()
+        normalized = TextUtil._WHITESPACE_PATTERN.sub(" ", normalized).strip()
+        return TextUtil._TRAILING_PUNCTUATION_PATTERN.sub("", normalized)
@@ -1,32 +1,232 @@
+import asyncio
+from app.core.aws.ssm_client import SsmClient
+from app.core.logging import NaviApiLog
+from app.models.llm import base_llm_model
+from app.models.llm.embedding_model import EmbeddingModelManager
 from app.models.llm.question_llm_model import QuestionLLMModel, State
-from typing import Optional
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import RunnableConfig
+from typing import Any, Iterator, Optional
+
+NOT_FOUND_MESSAGE = "申し訳ございません。\n回答が見つかりませんでした。"
+
+
+class QueryEmbeddingHelper:
+    """
+    質問の埋め込みのみを行うヘルパー
+
+    回答キャッシュ・よくある質問の照合に使用する。QuestionLLMHelper と異なり
+    PGVector・LLMクライアント・AdmissionController を初期化せず、埋め込みモデルはプロセス内で共有する。
+    """
+
+    def __init__(self) -> None:
+        embedding_setting = SsmClient.get_cached_parameter("embedding_setting", default={})
+        try:
+            self.embeddings = EmbeddingModelManager.get_shared_embedding_model(
+                model_name=embedding_setting.get("model_name"),
+                api_key=embedding_setting.get("api_key"),
+                device=embedding_setting.get("device", "cpu"),
+                use_api=base_llm_model.USE_OPEN_AI)
+        except Exception as e:
+            NaviApiLog.error(f"Embeddingモデルの初期化に失敗しました: {e}")
+            raise RuntimeError("言語モデルの初期化に失敗しました")
+
+    def embed_query(self, question_text: str) -> list[float]:
+        """
+        質問テキストの埋め込みベクトルを取得する
+        """
+        try:
+            return self.embeddings.embed_query(question_text)
+        except Exception as e:
+            NaviApiLog.error(f"クエリの埋め込みに失敗しました: {e}")
+            raise RuntimeError("質問の埋め込み処理に失敗しました")
+
+    async def aembed_query(self, question_text: str) -> list[float]:
+        """
+        embed_query の非同期版
+        """
+        try:
+            return await self.embeddings.aembed_query(question_text)
+        except Exception as e:
+            NaviApiLog.error(f"クエリの埋め込みに失敗しました: {e}")
+            raise RuntimeError("質問の埋め込み処理に失敗しました")
+
+    def embed_queries(self, question_texts: list[str]) -> list[list[float]]:
+        """
+        複数の質問テキストの埋め込みベクトルを1回のバッチで取得する
+        """
+        try:
+            embed_queries = getattr(self.embeddings, "embed_queries", None)
+            if embed_queries is not None:
+                return embed_queries(question_texts)
+            return self.embeddings.embed_documents(question_texts)
+        except Exception as e:
+            NaviApiLog.error(f"クエリの埋め込みに失敗しました: {e}")
+            raise RuntimeError("質問の埋め込み処理に失敗しました")
+
+    async def aembed_queries(self, question_texts: list[str]) -> list[list[float]]:
+        """
+        embed_queries の非同期版
+        """
+        try:
+            embed_queries = getattr(self.embeddings, "embed_queries", None)
+            if embed_queries is not None:
+                # CPUで実行されるエンコードはイベントループを止めないよう別スレッドで行う
+                return await asyncio.to_thread(embed_queries, question_texts)
+            return await self.embeddings.aembed_documents(question_texts)
+        except Exception as e:
+            NaviApiLog.error(f"クエリの埋め込みに失敗しました: {e}")
+            raise RuntimeError("質問の埋め込み処理に失敗しました")
 
 
 class QuestionLLMHelper:
-    def __init__(self, file_paths: Optional[list[str]] = None, collection_name: str = "manuals"):
+    def __init__(
+        self,
+        file_paths: Optional[list[str]] = None,
+        collection_name: str = "manuals",
+        company_id: Optional[int] = None
+    ):
         """
         質問応答ヘルパーを初期化する
         
         Args:
             file_paths: フィルタリングするファイルパスのリスト
             collection_name: 使用するコレクション名
+            company_id: 企業ID（混雑時のモデル選択のテナント毎の上書きに使用する）
         """
         self.file_paths = file_paths
-        self.question_llm_model = QuestionLLMModel(file_paths=file_paths, collection_name=collection_name)
+        self.question_llm_model = QuestionLLMModel(
+            file_paths=file_paths, collection_name=collection_name, company_id=company_id
+        )
+
+    def embed_query(self, question_text: str) -> list[float]:
+        """
+        質問テキストの埋め込みベクトルを取得する
+        
+        Args:
+            question_text: 質問テキスト
+            
+        Returns:
+            list[float]: 埋め込みベクトル
+        """
+        return self.question_llm_model.embed_query(question_text)
+
+    async def aembed_query(self, question_text: str) -> list[float]:
+        """
+        embed_query の非同期版
+        """
+        return await self.question_llm_model.aembed_query(question_text)
+
+    def embed_queries(self, question_texts: list[str]) -> list[list[float]]:
+        """
+        複数の質問テキストの埋め込みベクトルを1回のバッチで取得する
+        """
+        return self.question_llm_model.embed_queries(question_texts)
 
-    def answer_question(self, question_text: str) -> str:
+    async def aembed_queries(self, question_texts: list[str]) -> list[list[float]]:
+        """
+        embed_queries の非同期版
+        """
+        return await self.question_llm_model.aembed_queries(question_texts)
+
+    @staticmethod
+    def _graph_kwargs(conversation_id: Optional[str]) -> dict[str, Any]:
+        """
+        会話モードの場合は会話の thread_id を実行設定として渡す
+        """
+        if conversation_id is None:
+            return {}
+        config: RunnableConfig = {"configurable": {"thread_id": conversation_id}}
+        return {"config": config}
+
+    def answer_question(
+        self,
+        question_text: str,
+        query_embedding: Optional[list[float]] = None,
+        conversation_id: Optional[str] = None
+    ) -> str:
         """
         質問に対する回答を生成する
         
         Args:
             question_text: 質問テキスト
+            query_embedding: 計算済みの質問の埋め込み（指定時はベクトル検索で再利用する）
+            conversation_id: 会話の thread_id（指定時はこれまでのやり取りを踏まえて回答する）
             
         Returns:
             str: 生成された回答テキスト
         """
         if not self.file_paths:
-            return "申し訳ございません。\n回答が見つかりませんでした。"
-        graph = self.question_llm_model.get_graph()
-        user_query = State(query=question_text)
-        first_response = graph.invoke(input=user_query)
+            return NOT_FOUND_MESSAGE
+        graph = self.question_llm_model.get_graph(conversational=conversation_id is not None)
+        # 会話モードでは前のターンの埋め込みが引き継がれないよう、未指定（None）も明示的に渡す
+        user_query = State(query=question_text, query_embedding=query_embedding)
+        first_response = graph.invoke(input=user_query, **self._graph_kwargs(conversation_id))
         return first_response.get("messages")[-1].content
+
+    async def aanswer_question(
+        self,
+        question_text: str,
+        query_embedding: Optional[list[float]] = None,
+        conversation_id: Optional[str] = None
+    ) -> str:
+        """
+        answer_question の非同期版
+        グラフを ainvoke で実行し、LLMの応答待ちの間スレッドを占有しない
+        
+        Args:
+            question_text: 質問テキスト
+            query_embedding: 計算済みの質問の埋め込み（指定時はベクトル検索で再利用する）
+            conversation_id: 会話の thread_id（指定時はこれまでのやり取りを踏まえて回答する）
+            
+        Returns:
+            str: 生成された回答テキスト
+        """
+        if not self.file_paths:
+            return NOT_FOUND_MESSAGE
+        graph = self.question_llm_model.get_graph(conversational=conversation_id is not None)
+        user_query = State(query=question_text, query_embedding=query_embedding)
+        first_response = await graph.ainvoke(input=user_query, **self._graph_kwargs(conversation_id))
+        return first_response.get("messages")[-1].content
+
+    def stream_answer(self, question_text: str, conversation_id: Optional[str] = None) -> Iterator[str]:
+        """
+        質問に対する回答をトークン単位で逐次生成する
+
+        LangGraphの stream API（messagesモード）で llm_response ノード内の
+        ChatOpenAI の出力チャンクを受け取り、届いた順に返却する。
+        チャンクが1件も届かなかった場合（空の質問など）は最終状態の回答をまとめて返却する。
+
+        Args:
+            question_text: 質問テキスト
+            conversation_id: 会話の thread_id（指定時はこれまでのやり取りを踏まえて回答する）
+
+        Returns:
+            Iterator[str]: 回答テキストの断片
+        """
+        if not self.file_paths:
+            yield NOT_FOUND_MESSAGE
+            return
+
+        graph = self.question_llm_model.get_graph(conversational=conversation_id is not None)
+        user_query = State(query=question_text, query_embedding=None)
+
+        streamed = False
+        final_state = None
+        for mode, payload in graph.stream(
+            input=user_query, stream_mode=["messages", "values"], **self._graph_kwargs(conversation_id)
+        ):
+            if mode == "values":
+                final_state = payload
+                continue
+
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") != "llm_response":
+                continue
+            # ノードの戻り値（確定したAIMessage）は除外し、生成途中のチャンクのみを返す
+            if isinstance(chunk, AIMessageChunk) and chunk.content:
+                streamed = True
+                yield chunk.content
+
+        if not streamed and final_state and final_state.get("messages"):
+            yield final_state.get("messages")[-1].content
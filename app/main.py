@@ -1,7 +1,14 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from app.api.endpoints.question import question_router
 from app.api.endpoints.auth_token import token_router
+from app.api.endpoints.metrics import metrics_router
+from app.api.endpoints.ingestion_job import ingestion_job_router
 from app.core.logging import NaviApiLog
+from app.core.utils.admission_controller import AdmissionRejectedError
+from app.services.question_service import QuestionService
 from fastapi.middleware.cors import CORSMiddleware
 
 # ロギング初期設定
@@ -10,7 +17,15 @@ NaviApiLog.setup(
     enable_file_logging=False  # 必要に応じてTrueに変更
 )
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 設定の誤りは最初のリクエストを待たずに起動時に警告する
+    await asyncio.to_thread(QuestionService.check_single_flight_setting)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000", # 例えばローカル開発
@@ -24,5 +39,20 @@ app.add_middleware(
     allow_headers=["*"],          # 許可するHTTPヘッダー; "*" は全てを許可
 )
 
+
+@app.exception_handler(AdmissionRejectedError)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejectedError):
+    """
+    LLMの同時実行数の上限で受け付けなかったリクエストを、Retry-After 付きの 429/503 で返却する
+    """
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.message},
+        headers={"Retry-After": str(exc.retry_after_seconds)},
+    )
+
+
 app.include_router(token_router)
 app.include_router(question_router)
+app.include_router(metrics_router)
+app.include_router(ingestion_job_router)
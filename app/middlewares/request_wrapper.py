@@ -1,3 +1,4 @@
+import inspect
 from functools import wraps
 from app.core.logging import NaviApiLog
 import json
@@ -17,6 +18,34 @@ def _convert_to_dict(obj):
         return obj
 
 
+def _log_request(func, kwargs):
+    """
+    呼び出された関数名とリクエストパラメータをログ出力する
+    """
+    func_name = func.__name__
+    NaviApiLog.info(f"Function: {func_name}")
+    # Pydanticモデルや基本型のパラメータをログ出力
+    log_params = {}
+    for key, value in kwargs.items():
+        # Requestオブジェクトなどの大きなオブジェクトは除外
+        if key not in ['request', 'response', 'db', 'session']:
+            try:
+                log_params[key] = _convert_to_dict(value)
+            except Exception as e:
+                log_params[key] = str(type(value))
+    
+    if log_params:
+        # センシティブな情報をマスキング
+        masked_params = NaviApiLog.mask_sensitive_data(log_params)
+        # JSON形式で出力
+        try:
+            json_str = json.dumps(masked_params, ensure_ascii=False, indent=None)
+            NaviApiLog.info(f"Request parameters: {json_str}")
+        except (TypeError, ValueError) as e:
+            # JSON化できない場合は文字列化
+            NaviApiLog.info(f"Request parameters: {masked_params}")
+
+
 def request_rapper():
     """
     リクエストボディを指定されたPydanticモデルでバリデーションするデコレーター
@@ -24,31 +53,16 @@ def request_rapper():
     このラッパーは主に互換性の維持や追加の同期処理のために使用されます。
     """
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                _log_request(func, kwargs)
+                return await func(*args, **kwargs)
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            func_name = func.__name__
-            NaviApiLog.info(f"Function: {func_name}")
-            # Pydanticモデルや基本型のパラメータをログ出力
-            log_params = {}
-            for key, value in kwargs.items():
-                # Requestオブジェクトなどの大きなオブジェクトは除外
-                if key not in ['request', 'response', 'db', 'session']:
-                    try:
-                        log_params[key] = _convert_to_dict(value)
-                    except Exception as e:
-                        log_params[key] = str(type(value))
-            
-            if log_params:
-                # センシティブな情報をマスキング
-                masked_params = NaviApiLog.mask_sensitive_data(log_params)
-                # JSON形式で出力
-                try:
-                    json_str = json.dumps(masked_params, ensure_ascii=False, indent=None)
-                    NaviApiLog.info(f"Request parameters: {json_str}")
-                except (TypeError, ValueError) as e:
-                    # JSON化できない場合は文字列化
-                    NaviApiLog.info(f"Request parameters: {masked_params}")
-            
+            _log_request(func, kwargs)
             return func(*args, **kwargs)
         return wrapper
     return decorator
@@ -31,3 +31,23 @@ def transaction(func):
                 logger.error(f"Error during transaction: {e}")
                 raise
     return wrapper
+
+
+def async_transaction(func):
+    """
+    transaction の非同期版
+    非同期セッションを開始し、コミットまたはロールバックを自動で行うデコレーター
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        async with get_db().get_async_session() as session:
+            try:
+                kwargs['session'] = session
+                result = await func(*args, **kwargs)
+                await session.commit()
+                return result
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Error during transaction: {e}")
+                raise
+    return wrapper
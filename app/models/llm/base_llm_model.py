@@ -1,20 +1,42 @@
 from abc import abstractmethod
+import asyncio
 import os
+from typing import Any, Iterable, Optional
 from app.core.aws.ssm_client import SsmClient
-from app.core.database.postgresql import PostgreSQLDatabase
-from langchain_openai import ChatOpenAI
-from langchain_community.document_loaders.s3_file import S3FileLoader
+from app.core.database.postgresql import PostgreSQLDatabase, get_postgresql_database
 from langchain_postgres import PGVector
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
 from langgraph.graph.state import CompiledStateGraph
+from app.core.utils.admission_controller import AdmissionController
+from app.models.llm.chunk_dedup import ChunkDeduplicator, expand_sources, source_filter
+from app.models.llm.document_loader import ConcurrentDocumentLoader
 from app.models.llm.embedding_model import EmbeddingModelManager
+from app.models.llm.ingestion_pipeline import IngestionPipeline
+from app.models.llm.parsed_document_cache import ParsedDocumentCache
+from app.models.llm.llm_client import LLMClientManager
+from app.models.llm.model_routing_policy import ModelRoutingPolicy, RoutingSignals
+from app.models.llm.pdf_extractor import PdfTextExtractor
+from app.models.llm.text_splitter import JapaneseTextSplitter
+from app.models.llm.vector_sync import SyncStats, VectorSyncEngine
+from app.models.llm.vector_writer import PgVectorBulkWriter
+from app.repositories.manual_repository import ManualDto
 from sqlalchemy import text
 from app.core.logging import NaviApiLog
 
 
 USE_OPEN_AI = False
 
+# 軽量モデルの設定に primary の設定から引き継がない項目
+_LIGHTWEIGHT_EXCLUDED_KEYS = ("backends", "routing", "admission", "lightweight", "model_routing")
+
 class BaseLLMModel:
-    def __init__(self, file_paths: list[str], collection_name: str = "manuals") -> None:
+    def __init__(
+        self,
+        file_paths: list[str],
+        collection_name: str = "manuals",
+        company_id: Optional[int] = None
+    ) -> None:
         if not file_paths:
             raise ValueError("file_pathsを空にすることはできません")
 
@@ -23,40 +45,48 @@ class BaseLLMModel:
 
         self.collection_name = collection_name  # コレクション名を保存
         self.file_paths = file_paths  # フィルタ用のファイルパスを保存
+        self.company_id = company_id  # テナント毎のモデル選択の上書きに使用する
 
         llm_setting = self.params.get_parameter("llm_setting")
+        self.llm_setting = llm_setting
         embedding_setting = self.params.get_parameter("embedding_setting")
 
         try:
-            embeddings = EmbeddingModelManager.get_embedding_model(
+            self.embeddings = EmbeddingModelManager.get_embedding_model(
                 model_name=embedding_setting.get("model_name"),
                 api_key=embedding_setting.get("api_key"),
                 device=embedding_setting.get("device", "cpu"),
                 use_api=USE_OPEN_AI)
             
-            self.llm = ChatOpenAI(
-                model=llm_setting.get("model_name"),
-                base_url=llm_setting.get("base_url", None),
-                api_key=llm_setting.get("api_key"),
-                temperature=llm_setting.get("temperature"),
+            # (model, base_url) 毎にプロセス内で共有し、コネクションプールを使い回す（backends 指定時は振り分ける）
+            self.llm = LLMClientManager.get_llm(llm_setting)
+            # LLMの同時実行数をモデル毎に制限し、集中時は待ち行列で待たせる（溢れた場合は即座に拒否する）
+            self.admission = AdmissionController.get(
+                name=llm_setting.get("model_name"),
+                setting=llm_setting.get("admission")
             )
+
+            # primary の混雑時に簡単な質問を回す軽量モデル（llm_setting.lightweight 指定時のみ）
+            self.model_routing = ModelRoutingPolicy(llm_setting.get("model_routing"))
+            self.lightweight_llm = None
+            self.lightweight_admission = None
+            if llm_setting.get("lightweight"):
+                lightweight_setting = self._lightweight_llm_setting(llm_setting)
+                self.lightweight_llm = LLMClientManager.get_llm(lightweight_setting)
+                self.lightweight_admission = AdmissionController.get(
+                    name=lightweight_setting.get("model_name"),
+                    setting=llm_setting.get("lightweight").get("admission", llm_setting.get("admission"))
+                )
         except Exception as e:
             NaviApiLog.error(f"LLM/Embeddingモデルの初期化に失敗しました: {e}")
             raise RuntimeError("言語モデルの初期化に失敗しました")
 
-        self.llm = ChatOpenAI(
-            model=llm_setting.get("model_name"),
-            base_url=llm_setting.get("base_url", None),
-            api_key=llm_setting.get("api_key"),
-            temperature=llm_setting.get("temperature"),
-        )
-
         self.region_name = os.getenv("AWS_REGION", "ap-northeast-1")
         self.endpoint_url = os.getenv("S3_ENDPOINT")
 
         try:
             self.vector_store = PGVector(
-                embeddings=embeddings,
+                embeddings=self.embeddings,
                 collection_name=collection_name,
                 connection=self.pg_database.connection_string,
                 use_jsonb=True,
@@ -64,25 +94,220 @@ class BaseLLMModel:
             )
             # 初期化時にデフォルトのretrieverを設定
             self.retriever = self._create_retriever()
+            # 非同期版は初回の非同期呼び出し時に作成する
+            self._async_vector_store = None
 
         except Exception as e:
             NaviApiLog.error(f"Vector Storeの初期化に失敗しました: {e}")
             raise RuntimeError("ベクターストアの初期化に失敗しました")
 
-    def _create_retriever(self):
+    @staticmethod
+    def _lightweight_llm_setting(llm_setting: dict[str, Any]) -> dict[str, Any]:
+        """
+        軽量モデルの設定を返す（model_name 以外の未指定の項目は primary の設定を引き継ぐ）
+        """
+        common_setting = {k: v for k, v in llm_setting.items() if k not in _LIGHTWEIGHT_EXCLUDED_KEYS}
+        lightweight_setting = {k: v for k, v in llm_setting.get("lightweight").items() if k != "admission"}
+        return {**common_setting, **lightweight_setting}
+
+    @property
+    def uses_model_routing(self) -> bool:
+        """
+        混雑時に軽量モデルへ切り替える場合は True（検索結果の類似度を判定に使用する）
+        """
+        return self.lightweight_llm is not None and self.model_routing.enabled
+
+    def select_llm(
+        self,
+        question: str,
+        retrieval_score: Optional[float] = None
+    ) -> tuple[BaseChatModel, AdmissionController]:
+        """
+        primary の混雑状況・質問の長さ・検索結果の類似度から回答に使うLLMを選ぶ
+
+        Args:
+            question: 質問テキスト
+            retrieval_score: 検索結果の最上位の類似度（不明な場合は None）
+
+        Returns:
+            tuple[BaseChatModel, AdmissionController]: 使用するLLMと、その同時実行数を制限する AdmissionController
+        """
+        if not self.uses_model_routing:
+            return self.llm, self.admission
+
+        decision = self.model_routing.decide(
+            RoutingSignals(
+                queue_depth=self.admission.queue_depth,
+                latency_ms=self.admission.average_hold_ms,
+                question_chars=len(question),
+                retrieval_score=retrieval_score,
+            ),
+            company_id=self.company_id
+        )
+        self.model_routing.record(decision)
+        if not decision.downgraded:
+            return self.llm, self.admission
+        NaviApiLog.info(
+            f"軽量モデルで回答を生成します。"
+            f"company_id={self.company_id} "
+            f"reason={decision.reason} "
+            f"queue_depth={self.admission.queue_depth}"
+        )
+        return self.lightweight_llm, self.lightweight_admission
+
+    def _create_retriever(self, vector_store: PGVector | None = None):
         """
         指定されたfile_pathsでフィルタリングされたretrieverを作成する。
         file_pathsがNoneの場合、フィルタなしのretrieverを返す。
         """
         try:
             search_kwargs = {}
-            search_kwargs["filter"] = {"source": {"$in": self.file_paths}}
+            search_kwargs["filter"] = source_filter(self.file_paths)
             
-            return self.vector_store.as_retriever(search_kwargs=search_kwargs)
+            return (vector_store or self.vector_store).as_retriever(search_kwargs=search_kwargs)
         except Exception as e:
             NaviApiLog.error(f"Retrieverの作成に失敗しました: {e}")
             raise RuntimeError("検索機能の作成に失敗しました")
 
+    def expand_sources(self, documents: list[Document]) -> list[Document]:
+        """
+        検索結果の sources（内容が同じチャンクを含むマニュアル）を file_paths の範囲に展開する
+        """
+        return expand_sources(documents or [], self.file_paths)
+
+    @property
+    def async_vector_store(self) -> PGVector:
+        """
+        非同期モードのVector Storeを取得する。
+        PGVectorは同期・非同期のどちらか一方のモードでしか動作しないため、
+        プロセス内で共有する非同期Engineを使用して別インスタンスを作成する。
+        """
+        if self._async_vector_store is None:
+            try:
+                self._async_vector_store = PGVector(
+                    embeddings=self.embeddings,
+                    collection_name=self.collection_name,
+                    connection=get_postgresql_database().async_engine,
+                    use_jsonb=True,
+                    pre_delete_collection=False,
+                    async_mode=True,
+                )
+            except Exception as e:
+                NaviApiLog.error(f"非同期Vector Storeの初期化に失敗しました: {e}")
+                raise RuntimeError("ベクターストアの初期化に失敗しました")
+        return self._async_vector_store
+
+    def create_async_retriever(self):
+        """
+        非同期のVector Storeを使用するretrieverを作成する。
+        """
+        return self._create_retriever(self.async_vector_store)
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+        質問テキストを埋め込みベクトルに変換する。
+        同じベクトルをキャッシュ照合とベクトル検索の両方で使い回すために使用する。
+        """
+        try:
+            return self.embeddings.embed_query(text)
+        except Exception as e:
+            NaviApiLog.error(f"クエリの埋め込みに失敗しました: {e}")
+            raise RuntimeError("質問の埋め込み処理に失敗しました")
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        複数の質問テキストをまとめて埋め込みベクトルに変換する。
+        """
+        try:
+            embed_queries = getattr(self.embeddings, "embed_queries", None)
+            if embed_queries is not None:
+                return embed_queries(texts)
+            return self.embeddings.embed_documents(texts)
+        except Exception as e:
+            NaviApiLog.error(f"クエリの埋め込みに失敗しました: {e}")
+            raise RuntimeError("質問の埋め込み処理に失敗しました")
+
+    def search_by_vector(self, embedding: list[float]) -> list:
+        """
+        埋め込み済みのクエリベクトルでfile_pathsに絞り込んだ類似検索を行う。
+        retrieverと同じフィルタを使用し、クエリの再埋め込みを行わない。
+        """
+        try:
+            return self.vector_store.similarity_search_by_vector(
+                embedding,
+                filter=source_filter(self.file_paths),
+            )
+        except Exception as e:
+            NaviApiLog.error(f"ベクトル検索に失敗しました: {e}")
+            raise RuntimeError("検索処理に失敗しました")
+
+    def search_with_score_by_vector(self, embedding: list[float]) -> list[tuple[Document, float]]:
+        """
+        search_by_vector と同じ条件で検索し、ドキュメントと類似度の組を返す。
+        類似度は PGVector の既定のコサイン距離から 1 - 距離 として算出する。
+        """
+        try:
+            results = self.vector_store.similarity_search_with_score_by_vector(
+                embedding,
+                filter=source_filter(self.file_paths),
+            )
+            return [(document, 1.0 - distance) for document, distance in results]
+        except Exception as e:
+            NaviApiLog.error(f"ベクトル検索に失敗しました: {e}")
+            raise RuntimeError("検索処理に失敗しました")
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """
+        embed_query の非同期版
+        """
+        try:
+            return await self.embeddings.aembed_query(text)
+        except Exception as e:
+            NaviApiLog.error(f"クエリの埋め込みに失敗しました: {e}")
+            raise RuntimeError("質問の埋め込み処理に失敗しました")
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        複数の質問テキストをまとめて埋め込みベクトルに変換する。
+        SentenceTransformerは1回のバッチでエンコードし、APIの場合は1回のリクエストにまとめる。
+        """
+        try:
+            embed_queries = getattr(self.embeddings, "embed_queries", None)
+            if embed_queries is not None:
+                # CPUで実行されるエンコードはイベントループを止めないよう別スレッドで行う
+                return await asyncio.to_thread(embed_queries, texts)
+            return await self.embeddings.aembed_documents(texts)
+        except Exception as e:
+            NaviApiLog.error(f"クエリの埋め込みに失敗しました: {e}")
+            raise RuntimeError("質問の埋め込み処理に失敗しました")
+
+    async def asearch_by_vector(self, embedding: list[float]) -> list:
+        """
+        search_by_vector の非同期版
+        """
+        try:
+            return await self.async_vector_store.asimilarity_search_by_vector(
+                embedding,
+                filter=source_filter(self.file_paths),
+            )
+        except Exception as e:
+            NaviApiLog.error(f"ベクトル検索に失敗しました: {e}")
+            raise RuntimeError("検索処理に失敗しました")
+
+    async def asearch_with_score_by_vector(self, embedding: list[float]) -> list[tuple[Document, float]]:
+        """
+        search_with_score_by_vector の非同期版
+        """
+        try:
+            results = await self.async_vector_store.asimilarity_search_with_score_by_vector(
+                embedding,
+                filter=source_filter(self.file_paths),
+            )
+            return [(document, 1.0 - distance) for document, distance in results]
+        except Exception as e:
+            NaviApiLog.error(f"ベクトル検索に失敗しました: {e}")
+            raise RuntimeError("検索処理に失敗しました")
+
     def get_existing_sources(self) -> set[str]:
         """
         Vector DBに既に登録されているsourceのセットを取得する。
@@ -112,11 +337,15 @@ class BaseLLMModel:
                 
                 collection_id = collection_row[0]
                 
-                # 該当コレクションの全てのsourceを取得
+                # 該当コレクションの全てのsourceを取得（内容が同じチャンクを共有しているマニュアルを含む）
                 source_query = text(
-                    "SELECT DISTINCT cmetadata->>'source' as source "
+                    "SELECT cmetadata->>'source' as source "
+                    "FROM langchain_pg_embedding "
+                    "WHERE collection_id = :collection_id "
+                    "UNION "
+                    "SELECT jsonb_array_elements_text(cmetadata->'sources') as source "
                     "FROM langchain_pg_embedding "
-                    "WHERE collection_id = :collection_id"
+                    "WHERE collection_id = :collection_id AND jsonb_exists(cmetadata, 'sources')"
                 )
                 source_result = conn.execute(source_query, {"collection_id": collection_id})
                 
@@ -146,70 +375,106 @@ class BaseLLMModel:
             raise ValueError("bucket_nameを空にすることはできません")
         
         try:
-            documents = self._load_documents(bucket_name)
-            if documents:
-                NaviApiLog.info(f"{len(documents)} 件のドキュメントをベクターストアに追加します")
-                self.vector_store.add_documents(documents)
-                NaviApiLog.info(f"{len(documents)} 件のドキュメントをベクターストアに正常に追加しました")
-            else:
+            pipeline = self._create_ingestion_pipeline(bucket_name)
+            # 一括取り込みの間は ANN インデックスを削除し、最後に作成し直す（ingestion_setting.writer）
+            with pipeline.writer.deferred_ann_indexes():
+                stats = pipeline.run(self.file_paths)
+            if stats.chunks == 0:
                 NaviApiLog.warning("インジェストするドキュメントがロードされませんでした")
         except Exception as e:
             NaviApiLog.error(f"ドキュメントのインジェストに失敗しました: {e}")
             raise RuntimeError("ドキュメントの追加に失敗しました")
 
-    def _load_documents(self, bucket_name: str) -> list:
+    def _create_loader(self, bucket_name: str) -> ConcurrentDocumentLoader:
         """
-        S3からドキュメントをロード
-        
+        S3のマニュアルを並行にダウンロード・解析するローダーを作成
+        PDFはテキストレイヤーから取り出し、使えないページのみ unstructured で解析する（ingestion_setting.pdf）
+        解析したマニュアルは ETag 毎に保存し、取り込み直す場合は解析を省略する（ingestion_setting.cache）
+        """
+        return ConcurrentDocumentLoader(
+            bucket_name=bucket_name,
+            setting=ConcurrentDocumentLoader.get_setting(),
+            parser=PdfTextExtractor(PdfTextExtractor.get_setting()),
+            cache=ParsedDocumentCache(ParsedDocumentCache.get_setting()),
+        )
+
+    def _create_ingestion_pipeline(self, bucket_name: str) -> IngestionPipeline:
+        """
+        S3からのロード → 分割 → 埋め込み → ベクターストアへの書き込みを行うパイプラインを作成
+        ダウンロードはスレッド、PDFの解析はプロセスで並行に行い（ingestion_setting.loader）、
+        日本語の文の区切りでチャンクに分割して（ingestion_setting.splitter）、
+        埋め込みはバッチ毎にストリーミングで行い（ingestion_setting.pipeline）、
+        書き込みは COPY でまとめて行う（ingestion_setting.writer）
+        アプリケーション内で内容が同じチャンクは1行にまとめる（ingestion_setting.dedup）
+
         Args:
             bucket_name: S3バケット名
-            file_paths: ロードするファイルパスのリスト
-            
+
         Returns:
-            list: ロードされたドキュメントのリスト
+            IngestionPipeline: 取り込みパイプライン
         """
-        documents = []
-        failed_files = []
-        
-        # AWS認証情報の検証
-        endpoint_url = os.getenv("S3_ENDPOINT")
-        access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
-        secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
-        
-        if not access_key_id or not secret_access_key:
-            NaviApiLog.warning("AWS認証情報が環境変数に見つかりません")
-        
-        for file_path in self.file_paths:
-            try:
-                if not file_path:
-                    NaviApiLog.warning("空のファイルパスが検出されました。スキップします")
-                    continue
-                    
-                loader = S3FileLoader(
-                    bucket=bucket_name,
-                    key=file_path,
-                    endpoint_url=endpoint_url,
-                    aws_access_key_id=access_key_id, 
-                    aws_secret_access_key=secret_access_key,
-                )
-                loaded_docs = loader.load()
-                
-                if not loaded_docs:
-                    NaviApiLog.warning(f"S3ファイルからドキュメントがロードされませんでした: {file_path}")
-                    continue
-
-                for doc in loaded_docs:
-                    doc.metadata['source'] = f"{bucket_name}/{file_path}"
-                documents.extend(loaded_docs)
-                NaviApiLog.debug(f"{file_path} から {len(loaded_docs)} 件のドキュメントを正常にロードしました")
-            except Exception as e:
-                NaviApiLog.error(f"S3ファイル({file_path})のロードに失敗しました: {e}")
-                failed_files.append(file_path)
-        
-        if failed_files:
-            NaviApiLog.warning(f"{len(failed_files)} 件のファイルのロードに失敗しました: {failed_files}")
+        return IngestionPipeline(
+            loader=self._create_loader(bucket_name),
+            embeddings=self.embeddings,
+            vector_store=self.vector_store,
+            splitter=JapaneseTextSplitter.from_setting(),
+            setting=IngestionPipeline.get_setting(),
+            writer=self._create_writer(),
+            deduplicator=ChunkDeduplicator(ChunkDeduplicator.get_setting()),
+        )
+
+    def _create_writer(self) -> PgVectorBulkWriter:
+        """
+        ベクターストアに COPY で一括して書き込むライターを作成（ingestion_setting.writer）
+        """
+        return PgVectorBulkWriter(self.vector_store, PgVectorBulkWriter.get_setting())
+
+    def sync_documents(self, bucket_name: str, objects: Iterable[dict], manuals: list[ManualDto]) -> SyncStats:
+        """
+        S3のオブジェクト一覧とMySQLのマニュアルに合わせてVector DBを差分で更新する。
+        変更されたマニュアルのみ埋め込み直し、削除されたマニュアルのベクトルは削除する。
+
+        Args:
+            bucket_name: S3バケット名
+            objects: S3のオブジェクト一覧（Key・ETag・Size）
+            manuals: 削除されていないマニュアルの一覧
+
+        Returns:
+            SyncStats: 同期の結果
+
+        Raises:
+            ValueError: bucket_nameが無効な場合
+            RuntimeError: 同期対象の取得に失敗した場合
+        """
+        if not bucket_name:
+            raise ValueError("bucket_nameを空にすることはできません")
 
-        return documents
+        try:
+            return self.create_sync_engine(bucket_name).sync(objects, manuals)
+        except Exception as e:
+            NaviApiLog.error(f"ベクターストアの同期に失敗しました: {e}")
+            raise RuntimeError("ドキュメントの同期に失敗しました")
+
+    def create_sync_engine(self, bucket_name: str) -> VectorSyncEngine:
+        """
+        マニュアル単位でベクトルとマニフェストを更新する同期エンジンを作成
+        差分同期（sync_documents）と取り込みジョブのワーカーで使用する
+
+        Args:
+            bucket_name: S3バケット名
+
+        Returns:
+            VectorSyncEngine: 同期エンジン
+        """
+        return VectorSyncEngine(
+            bucket_name=bucket_name,
+            vector_store=self.vector_store,
+            embeddings=self.embeddings,
+            loader=self._create_loader(bucket_name),
+            splitter=JapaneseTextSplitter.from_setting(),
+            writer=self._create_writer(),
+            deduplicator=ChunkDeduplicator(ChunkDeduplicator.get_setting()),
+        )
 
     @abstractmethod
     def get_graph(self) -> CompiledStateGraph:
@@ -0,0 +1,179 @@
+import hashlib
+from typing import Any, Iterable, Optional
+from langchain_core.documents import Document
+from sqlalchemy import text
+from app.core.aws.ssm_client import SsmClient
+
+
+DEFAULT_DEDUP_SETTING = {
+    # false の場合はチャンク毎に行を追加する（共有済みの行の削除は設定に関わらず参照を外して行う）
+    "enabled": True,
+}
+
+# 他のマニュアルでも参照されている行は削除せず、参照（sources）から外す
+# 1マニュアルのみが参照している行（sources の無い従来の行を含む）は削除する
+_DELETE_OWNED = text(
+    "DELETE FROM langchain_pg_embedding "
+    "WHERE collection_id = :collection_id "
+    "AND cmetadata->>'source' = :source "
+    "AND (NOT jsonb_exists(cmetadata, 'sources') OR jsonb_array_length(cmetadata->'sources') <= 1)"
+)
+# 代表の source を外す場合は次のマニュアルを代表とし、外したマニュアルのページ番号・チャンク番号を削除する
+_DETACH_SHARED = text(
+    "UPDATE langchain_pg_embedding SET cmetadata = CASE "
+    "WHEN cmetadata->>'source' = :source THEN jsonb_set("
+    "jsonb_set(cmetadata - 'page_number' - 'chunk_index', '{sources}', (cmetadata->'sources') - CAST(:source AS text)), "
+    "'{source}', ((cmetadata->'sources') - CAST(:source AS text))->0) "
+    "ELSE jsonb_set(cmetadata, '{sources}', (cmetadata->'sources') - CAST(:source AS text)) END "
+    "WHERE collection_id = :collection_id "
+    "AND cmetadata @> jsonb_build_object('sources', jsonb_build_array(CAST(:source AS text)))"
+)
+_ATTACH = text(
+    "UPDATE langchain_pg_embedding SET cmetadata = jsonb_set("
+    "cmetadata, '{sources}', "
+    "COALESCE(cmetadata->'sources', jsonb_build_array(cmetadata->>'source')) "
+    "|| jsonb_build_array(CAST(:source AS text))) "
+    "WHERE collection_id = :collection_id "
+    "AND cmetadata->>'chunk_hash' = ANY(:chunk_hashes) "
+    "AND NOT COALESCE(cmetadata->'sources', '[]') @> jsonb_build_array(CAST(:source AS text)) "
+    "RETURNING cmetadata->>'chunk_hash'"
+)
+# 取り込み直すマニュアルのみが参照している行は削除されるため、共有できる行に含めない
+_FIND_SHARED = text(
+    "SELECT DISTINCT cmetadata->>'chunk_hash' FROM langchain_pg_embedding "
+    "WHERE collection_id = :collection_id "
+    "AND cmetadata->>'chunk_hash' = ANY(:chunk_hashes) "
+    "AND COALESCE(cmetadata->'sources', '[]') <> jsonb_build_array(CAST(:source AS text))"
+)
+_CREATE_INDEX = (
+    "CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_chunk_hash "
+    "ON langchain_pg_embedding (collection_id, (cmetadata->>'chunk_hash'))"
+)
+
+
+def dedup_scope(source: str) -> str:
+    """
+    同じ内容のチャンクを共有する範囲（{バケット}/{企業ID}/{アプリケーションID}）
+    検索はアプリケーション単位のマニュアルで絞り込むため、共有した行も同じ条件で検索される
+    """
+    return source.rsplit("/", 1)[0]
+
+
+def chunk_hash(source: str, page_content: str) -> str:
+    """
+    空白の違いを除いたチャンクの内容と共有する範囲の SHA-256
+    """
+    normalized = " ".join(page_content.split())
+    return hashlib.sha256(f"{dedup_scope(source)}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+def source_filter(file_paths: list[str]) -> dict[str, Any]:
+    """
+    検索を file_paths のマニュアルに絞り込む PGVector のフィルタ
+    代表の source が検索対象でない共有した行（代表のマニュアルの論理削除後、同期前等）も、
+    sources に検索対象のマニュアルを含む場合は検索する（jsonpath の比較は sources の要素毎に行われる）
+    """
+    return {"$or": [
+        {"source": {"$in": file_paths}},
+        *({"sources": {"$eq": file_path}} for file_path in file_paths),
+    ]}
+
+
+def expand_sources(documents: list[Document], file_paths: Iterable[str]) -> list[Document]:
+    """
+    検索結果の sources（同じ内容のチャンクを含むマニュアル）を検索対象のマニュアルに絞り込む
+    代表の source が検索対象でない場合（論理削除後の同期前等）は、検索対象の先頭のマニュアルに置き換える
+    """
+    allowed = set(file_paths)
+    for document in documents:
+        sources = document.metadata.get("sources")
+        if not isinstance(sources, list):
+            continue
+        visible = [source for source in sources if source in allowed]
+        document.metadata["sources"] = visible
+        if visible and document.metadata.get("source") not in allowed:
+            document.metadata["source"] = visible[0]
+            # ページ番号・チャンク番号は代表のマニュアルのものであるため外す
+            document.metadata.pop("page_number", None)
+            document.metadata.pop("chunk_index", None)
+    return documents
+
+
+class ChunkDeduplicator:
+    """
+    アプリケーション内で内容が同じチャンクを1行にまとめ、行の sources で参照するマニュアルを持つ
+
+    - チャンクの内容のハッシュ（chunk_hash）をメタデータに保存し、既にある行は埋め込まずに sources に追加する
+    - 検索は source_filter で代表の source または sources で絞り込み、sources は expand_sources で検索結果に展開する
+    - マニュアルの削除・取り込み直しでは、他のマニュアルが参照している行を残して参照のみ外す
+
+    設定は SSM の ingestion_setting.dedup から取得する。
+    """
+
+    def __init__(self, setting: Optional[dict[str, Any]] = None) -> None:
+        self.setting = {**DEFAULT_DEDUP_SETTING, **(setting or {})}
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("ingestion_setting", default={})
+        dedup_setting = setting.get("dedup", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_DEDUP_SETTING, **dedup_setting}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.setting.get("enabled"))
+
+    @staticmethod
+    def unique_chunks(source: str, chunks: list[Document]) -> list[Document]:
+        """
+        chunk_hash・source・sources をメタデータに設定し、同じマニュアル内で重複するチャンクを除く
+        """
+        unique: dict[str, Document] = {}
+        for chunk in chunks:
+            key = chunk_hash(source, chunk.page_content)
+            if key in unique:
+                continue
+            chunk.metadata = {**chunk.metadata, "source": source, "sources": [source], "chunk_hash": key}
+            unique[key] = chunk
+        return list(unique.values())
+
+    @staticmethod
+    def ensure_index(session: Any) -> None:
+        session.connection().exec_driver_sql(_CREATE_INDEX)
+
+    @staticmethod
+    def find_shared(session: Any, collection_id: Any, chunk_hashes: list[str], source: str) -> set[str]:
+        """
+        chunk_hashes のうち、source 以外のマニュアルも参照している行があるもの
+        """
+        if not chunk_hashes:
+            return set()
+        rows = session.execute(_FIND_SHARED, {
+            "collection_id": collection_id,
+            "chunk_hashes": chunk_hashes,
+            "source": source,
+        })
+        return {row[0] for row in rows}
+
+    @staticmethod
+    def attach(session: Any, collection_id: Any, chunk_hashes: list[str], source: str) -> set[str]:
+        """
+        chunk_hashes の行の sources に source を追加し、追加できた chunk_hash を返す（コミットは呼び出し側で行う）
+        """
+        if not chunk_hashes:
+            return set()
+        rows = session.execute(_ATTACH, {
+            "collection_id": collection_id,
+            "chunk_hashes": chunk_hashes,
+            "source": source,
+        })
+        return {row[0] for row in rows}
+
+    @staticmethod
+    def detach(session: Any, collection_id: Any, source: str) -> None:
+        """
+        source のみが参照している行を削除し、他のマニュアルも参照している行からは source を外す
+        """
+        parameters = {"collection_id": collection_id, "source": source}
+        session.execute(_DELETE_OWNED, parameters)
+        session.execute(_DETACH_SHARED, parameters)
@@ -0,0 +1,212 @@
+import os
+import re
+import threading
+from typing import Any, Optional
+from langchain_core.documents import Document
+from app.core.logging import NaviApiLog
+from app.core.metrics import NaviApiMetrics
+
+
+DEFAULT_CONTEXT_SETTING = {
+    # コンテキスト全体のトークン上限
+    "max_tokens": 3000,
+    # tiktokenのエンコーディング名（未指定時はモデル名から推定し、推定できなければ o200k_base）
+    "encoding": None,
+    # 文字n-gramの重複率がこの値以上のチャンクは重複として除外する
+    "dedupe_threshold": 0.8,
+    # 予算の残りがこのトークン数未満の場合は、チャンクを切り詰めて追加しない
+    "min_chunk_tokens": 64,
+}
+
+DEFAULT_ENCODING = "o200k_base"
+SHINGLE_SIZE = 5
+
+
+class TokenCounter:
+    """
+    対象モデルのトークナイザ（tiktoken）でトークン数を数える
+
+    エンコーディングを取得できない場合（tiktoken未インストール・BPEファイルを取得できない環境など）は
+    1文字=1トークンとして数える。日本語ではtiktokenより多めに見積もるため、予算を超えることはない。
+    """
+
+    _lock = threading.Lock()
+    _encodings: dict[str, Any] = {}
+
+    def __init__(self, model_name: Optional[str] = None, encoding_name: Optional[str] = None) -> None:
+        self.encoding = self._get_encoding(model_name, encoding_name)
+
+    @classmethod
+    def _load_encoding(cls, model_name: Optional[str], encoding_name: Optional[str]) -> Any:
+        try:
+            import tiktoken
+        except ImportError:
+            return None
+
+        if not encoding_name and model_name:
+            try:
+                # Ollamaのモデル名（例: gpt-oss:20b）をtiktokenのモデル名（gpt-oss-20b）に合わせる
+                return tiktoken.encoding_for_model(model_name.replace(":", "-"))
+            except KeyError:
+                pass
+        return tiktoken.get_encoding(encoding_name or DEFAULT_ENCODING)
+
+    @classmethod
+    def _get_encoding(cls, model_name: Optional[str], encoding_name: Optional[str]) -> Any:
+        key = f"{model_name}|{encoding_name}"
+        with cls._lock:
+            if key in cls._encodings:
+                return cls._encodings[key]
+            try:
+                encoding = cls._load_encoding(model_name, encoding_name)
+            except Exception as e:
+                NaviApiLog.warning(f"トークナイザの取得に失敗したため文字数で見積もります: {e}")
+                encoding = None
+            # 取得に失敗した場合も記録し、リクエスト毎に再取得を試みない
+            cls._encodings[key] = encoding
+            return encoding
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is None:
+            return len(text)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is None:
+            return text[:max_tokens]
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        # マルチバイト文字の途中で切れた場合に発生する置換文字は取り除く
+        return self.encoding.decode(tokens[:max_tokens]).rstrip("�")
+
+
+class ContextPacker:
+    """
+    検索結果のDocumentをプロンプトに埋め込むコンテキスト文字列に変換する
+
+    1. レイアウト由来のノイズ（連続する空白・改行、ページ番号だけの行など）を除去
+    2. 同一・重なりの大きいチャンクを除外
+    3. page_content と短い出典タグ（[ファイル名 p.ページ]）のみで整形
+    4. 検索順位の高い順にトークン上限まで詰める
+
+    設定は SSM の question_llm_setting.context から取得する。
+    """
+
+    _CONTROL_PATTERN = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+    _SPACES_PATTERN = re.compile(r"[ \t　\xa0]+")
+    _BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+    # 「- 3 -」「Page 3」「Page 3 / 10」「３ページ」のような装飾付きのページ番号のみの行、罫線のみの行
+    # 数字・分数のみの行（表のセル「120」、負の値「-3」、比率「3 / 10」）は本文のため残す
+    _NOISE_LINE_PATTERN = re.compile(
+        r"^\s*(?:[-‐－–—]\s*\d+\s*[-‐－–—]|page\s*\d+(?:\s*/\s*\d+)?|\d+\s*ページ|[-=_*・.…─━]{3,})\s*$",
+        re.IGNORECASE
+    )
+
+    def __init__(self, setting: Optional[dict[str, Any]] = None, model_name: Optional[str] = None) -> None:
+        self.setting = {**DEFAULT_CONTEXT_SETTING, **(setting or {})}
+        self.token_counter = TokenCounter(model_name=model_name, encoding_name=self.setting.get("encoding"))
+
+    @classmethod
+    def clean(cls, text: str) -> str:
+        """
+        レイアウト由来のノイズを除去する
+        """
+        text = cls._CONTROL_PATTERN.sub("", text.replace("\r\n", "\n").replace("\r", "\n"))
+        lines = []
+        for line in text.split("\n"):
+            line = cls._SPACES_PATTERN.sub(" ", line).strip()
+            if cls._NOISE_LINE_PATTERN.match(line):
+                continue
+            lines.append(line)
+        return cls._BLANK_LINES_PATTERN.sub("\n\n", "\n".join(lines)).strip()
+
+    @staticmethod
+    def _shingles(text: str) -> set[str]:
+        compact = re.sub(r"\s+", "", text)
+        if len(compact) <= SHINGLE_SIZE:
+            return {compact}
+        return {compact[i:i + SHINGLE_SIZE] for i in range(len(compact) - SHINGLE_SIZE + 1)}
+
+    def _is_duplicate(self, shingles: set[str], selected: list[set[str]]) -> bool:
+        threshold = self.setting.get("dedupe_threshold")
+        for other in selected:
+            overlap = len(shingles & other)
+            # 短い方のチャンクの大部分が他方に含まれていれば重複とみなす（チャンクのオーバーラップ対策）
+            if overlap / max(1, min(len(shingles), len(other))) >= threshold:
+                return True
+        return False
+
+    @staticmethod
+    def _source_tag(document: Document) -> str:
+        metadata = document.metadata or {}
+        source = os.path.basename(str(metadata.get("source") or "")) or "不明"
+        page = metadata.get("page_number", metadata.get("page"))
+        tag = f"{source} p.{page}" if page is not None else source
+        # 内容が同じチャンクを含む他のマニュアル（取り込み時に1行にまとめたもの）
+        others = [
+            os.path.basename(str(other)) for other in metadata.get("sources") or []
+            if other != metadata.get("source")
+        ]
+        return f"[{tag} 他: {', '.join(others)}]" if others else f"[{tag}]"
+
+    def pack(self, documents: list[Document]) -> str:
+        """
+        Documentのリストをトークン上限内のコンテキスト文字列に変換する
+
+        Args:
+            documents: 検索結果（関連度の高い順）
+
+        Returns:
+            str: プロンプトの {context} に埋め込む文字列
+        """
+        documents = documents or []
+        max_tokens = self.setting.get("max_tokens")
+        min_chunk_tokens = self.setting.get("min_chunk_tokens")
+        separator_tokens = self.token_counter.count("\n\n")
+
+        # 圧縮前はDocumentのリストがそのまま {context} に埋め込まれていたため、その文字列で数える
+        pre_tokens = self.token_counter.count(str(documents)) if documents else 0
+        selected_shingles: list[set[str]] = []
+        blocks: list[str] = []
+        used_tokens = 0
+        duplicates = 0
+        for document in documents:
+            content = self.clean(document.page_content or "")
+            if not content:
+                continue
+            shingles = self._shingles(content)
+            if self._is_duplicate(shingles, selected_shingles):
+                duplicates += 1
+                continue
+
+            block = f"{self._source_tag(document)}\n{content}"
+            separator = separator_tokens if blocks else 0
+            block_tokens = self.token_counter.count(block) + separator
+            remaining = max_tokens - used_tokens
+            if block_tokens > remaining:
+                # 残りの予算が十分にある場合のみ、末尾を切り詰めて追加する
+                if remaining >= min_chunk_tokens:
+                    blocks.append(self.token_counter.truncate(block, remaining - separator))
+                break
+
+            blocks.append(block)
+            selected_shingles.append(shingles)
+            used_tokens += block_tokens
+
+        context = "\n\n".join(blocks)
+        post_tokens = self.token_counter.count(context)
+        NaviApiMetrics.observe("context.tokens", pre_tokens, labels={"stage": "pre"})
+        NaviApiMetrics.observe("context.tokens", post_tokens, labels={"stage": "post"})
+        NaviApiLog.info(
+            f"コンテキストを圧縮しました。"
+            f"chunks={len(documents)}->{len(blocks)} "
+            f"duplicates={duplicates} "
+            f"tokens={pre_tokens}->{post_tokens} "
+            f"max_tokens={max_tokens}"
+        )
+        return context
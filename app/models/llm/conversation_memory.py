@@ -0,0 +1,150 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata
+from langgraph.checkpoint.memory import InMemorySaver
+from app.core.logging import NaviApiLog
+
+
+DEFAULT_CONVERSATION_SETTING = {
+    "enabled": True,
+    # プロセス内で保持する会話の上限（超えた場合は最も長く使われていない会話から破棄する）
+    "max_conversations": 1000,
+    # 要約を除く会話履歴のトークン数がこれを超えた場合、古いやり取りを要約にまとめる
+    "max_history_tokens": 1500,
+    # 要約せずにそのまま残す直近のメッセージ数（質問と回答で2件）
+    "keep_recent_messages": 4,
+    # 指定した場合は SQLite ファイルに会話を保存する（ワーカーの再起動後も会話を継続できる）
+    "sqlite_path": None,
+}
+
+
+class LRUInMemorySaver(InMemorySaver):
+    """
+    会話数に上限を設けた InMemorySaver
+
+    - 会話（thread_id）毎に最新のチェックポイントのみを残し、ターン毎に増える古いチェックポイントを破棄する
+    - 会話数が上限を超えた場合は最も長く使われていない会話を破棄する
+    """
+
+    def __init__(self, max_conversations: int) -> None:
+        super().__init__()
+        self.max_conversations = max_conversations
+        self._lock = threading.Lock()
+        self._threads: OrderedDict[str, None] = OrderedDict()
+
+    def _touch(self, thread_id: str) -> None:
+        with self._lock:
+            self._threads[thread_id] = None
+            self._threads.move_to_end(thread_id)
+            evicted = []
+            while len(self._threads) > self.max_conversations:
+                evicted.append(self._threads.popitem(last=False)[0])
+        for evicted_thread_id in evicted:
+            super().delete_thread(evicted_thread_id)
+        if evicted:
+            NaviApiLog.info(f"保持する会話数の上限を超えたため、古い会話を破棄しました。件数={len(evicted)}")
+
+    def _prune(self, thread_id: str, checkpoint_ns: str, checkpoint: Checkpoint) -> None:
+        """
+        最新のチェックポイントから参照されない古いチェックポイント・書き込み・チャネルの値を破棄する
+        """
+        checkpoint_id = checkpoint["id"]
+        channel_versions = checkpoint.get("channel_versions", {})
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        for old_checkpoint_id in [key for key in checkpoints if key != checkpoint_id]:
+            del checkpoints[old_checkpoint_id]
+        for key in list(self.writes.keys()):
+            if key[0] == thread_id and key[1] == checkpoint_ns and key[2] != checkpoint_id:
+                del self.writes[key]
+        for key in list(self.blobs.keys()):
+            if key[0] == thread_id and key[1] == checkpoint_ns and channel_versions.get(key[2]) != key[3]:
+                del self.blobs[key]
+
+    def get_tuple(self, config: RunnableConfig):
+        checkpoint_tuple = super().get_tuple(config)
+        if checkpoint_tuple is not None:
+            self._touch(config["configurable"]["thread_id"])
+        return checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = next_config["configurable"]["thread_id"]
+        with self._lock:
+            self._prune(thread_id, next_config["configurable"]["checkpoint_ns"], checkpoint)
+        self._touch(thread_id)
+        return next_config
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._threads.pop(thread_id, None)
+        super().delete_thread(thread_id)
+
+
+class ConversationMemory:
+    """
+    会話モードで使用する LangGraph のチェックポインターを管理する
+
+    会話毎の状態（メッセージ・要約）は conversation_id から作成した thread_id をキーに保存する。
+    既定ではプロセス内の LRU に保持し、sqlite_path を指定した場合は SQLite ファイルに保存する。
+
+    設定は SSM の question_llm_setting.conversation から取得する。
+    """
+
+    _lock = threading.Lock()
+    _checkpointer: Optional[BaseCheckpointSaver] = None
+    _key: Optional[tuple] = None
+
+    @classmethod
+    def get_setting(cls, question_llm_setting: Optional[dict[str, Any]]) -> dict[str, Any]:
+        setting = question_llm_setting.get("conversation") if isinstance(question_llm_setting, dict) else None
+        setting = setting or {}
+        return {**DEFAULT_CONVERSATION_SETTING, **setting}
+
+    @staticmethod
+    def thread_id(company_id: int, application_id: Optional[int], conversation_id: str) -> str:
+        """
+        会話の thread_id を作成する（他の企業・アプリの会話を参照しないよう、企業ID・アプリIDを含める）
+        """
+        return f"{company_id}:{application_id}:{conversation_id}"
+
+    @classmethod
+    def get_checkpointer(cls, setting: dict[str, Any]) -> BaseCheckpointSaver:
+        """
+        プロセス内で共有するチェックポインターを取得する
+        保存先・上限の設定値が変わった場合は作り直す
+        """
+        key = (setting.get("sqlite_path"), setting.get("max_conversations"))
+        with cls._lock:
+            if cls._checkpointer is None or cls._key != key:
+                cls._checkpointer = cls._create_checkpointer(setting)
+                cls._key = key
+            return cls._checkpointer
+
+    @classmethod
+    def _create_checkpointer(cls, setting: dict[str, Any]) -> BaseCheckpointSaver:
+        max_conversations = int(setting.get("max_conversations"))
+        sqlite_path = setting.get("sqlite_path")
+        if sqlite_path:
+            try:
+                # langgraph-checkpoint-sqlite は SQLite を使用する場合のみ読み込む
+                from app.models.llm.sqlite_conversation_saver import SqliteConversationSaver
+                checkpointer = SqliteConversationSaver.from_path(sqlite_path, max_conversations=max_conversations)
+                NaviApiLog.info(f"会話履歴をSQLiteに保存します。path={sqlite_path}")
+                return checkpointer
+            except Exception as e:
+                NaviApiLog.warning(f"SQLiteの会話履歴を使用できないため、プロセス内に保持します。error={e}")
+        return LRUInMemorySaver(max_conversations=max_conversations)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._checkpointer = None
+            cls._key = None
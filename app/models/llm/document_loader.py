@@ -0,0 +1,406 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+import boto3
+from langchain_core.documents import Document
+from app.core.aws.ssm_client import SsmClient
+from app.core.logging import NaviApiLog
+from app.models.llm.parsed_document_cache import ParsedDocumentCache, ParsedDocuments, parser_version
+
+
+DEFAULT_LOADER_SETTING = {
+    # S3からのダウンロードを同時に行うスレッド数
+    "download_workers": 8,
+    # PDFの解析を行うプロセス数（None の場合はCPUコア数、0 の場合はダウンロードしたスレッドで解析する）
+    "parse_workers": None,
+    # プロセスで解析する拡張子（それ以外はダウンロードしたスレッドで解析する）
+    "process_extensions": [".pdf"],
+    # 進捗をログに出力する間隔（ファイル数）
+    "progress_interval": 10,
+    # ダウンロード・解析中または結果の受け取り待ちのファイル数の上限
+    # （None の場合は download_workers + parse_workers。呼び出し側の処理が遅い場合は先読みを止める）
+    "max_pending_files": None,
+}
+
+
+def partition_file(local_path: str, unstructured_kwargs: Optional[dict[str, Any]] = None) -> list[Document]:
+    """
+    ダウンロード済みのファイルを unstructured で解析し、ページ毎のドキュメントとして返す
+    （ページ番号が無い形式は S3FileLoader の mode="single" と同じく1ファイル1ドキュメント）
+
+    プロセスプールから呼び出すため、モジュールの関数として定義する。
+    """
+    from unstructured.partition.auto import partition
+
+    elements = partition(filename=local_path, **(unstructured_kwargs or {}))
+    pages: dict[Optional[int], list[str]] = {}
+    for element in elements:
+        page_number = getattr(element.metadata, "page_number", None)
+        pages.setdefault(page_number, []).append(str(element))
+    if not pages:
+        return [Document(page_content="", metadata={})]
+    if list(pages) == [None]:
+        return [Document(page_content="\n\n".join(pages[None]), metadata={})]
+    return [
+        Document(page_content="\n\n".join(texts), metadata={"page_number": page_number})
+        for page_number, texts in pages.items()
+    ]
+
+
+def _gather(futures: list[Future]) -> Future:
+    """
+    ページ範囲毎に解析した結果を、全て完了した時点でページ順に結合する Future を返す
+    """
+    gathered: Future = Future()
+    lock = threading.Lock()
+    remaining = [len(futures)]
+
+    def on_done(_: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                return
+        if gathered.cancelled():
+            return
+        try:
+            gathered.set_result([document for future in futures for document in future.result()])
+        except BaseException as e:
+            gathered.set_exception(e)
+
+    for future in futures:
+        future.add_done_callback(on_done)
+    return gathered
+
+
+@dataclass
+class LoadProgress:
+    total: int
+    completed: int = 0
+    documents: int = 0
+    failed_files: list[str] = field(default_factory=list)
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def failed(self) -> int:
+        return len(self.failed_files)
+
+    @property
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started_at) * 1000, 2)
+
+    @property
+    def pages_per_second(self) -> float:
+        # ロードしたドキュメントはページ毎（ページ番号の無い形式はファイル毎）
+        elapsed_seconds = time.perf_counter() - self.started_at
+        return round(self.documents / elapsed_seconds, 2) if elapsed_seconds > 0 else 0.0
+
+
+@dataclass
+class LoadResult:
+    file_path: str
+    documents: list[Document] = field(default_factory=list)
+    error: Optional[Exception] = None
+    # ダウンロードしたファイルの内容の SHA-256（差分取り込みで変更の有無の判定に使用する）
+    content_hash: Optional[str] = None
+
+
+class ConcurrentDocumentLoader:
+    """
+    S3のマニュアルを並行にダウンロード・解析してドキュメントを返す
+
+    - ダウンロードはスレッドプール（download_workers）で行う
+    - 解析に時間の掛かるPDFはプロセスプール（parse_workers）で解析し、CPUコア数に応じて並列化する
+    - 1ファイルの失敗は他のファイルに影響させず、失敗したファイルとしてログに出力する
+    - progress_interval 件毎に進捗をログに出力し、progress_callback にも通知する
+    - cache を指定した場合は ETag と解析のバージョンが同じファイルのダウンロード・解析を省略する
+
+    設定は SSM の ingestion_setting.loader から取得する。
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        setting: Optional[dict[str, Any]] = None,
+        s3_client: Any = None,
+        parser: Callable[[str, Optional[dict[str, Any]]], list[Document]] = partition_file,
+        progress_callback: Optional[Callable[[LoadProgress], None]] = None,
+        unstructured_kwargs: Optional[dict[str, Any]] = None,
+        cache: Optional[ParsedDocumentCache] = None,
+    ) -> None:
+        self.bucket_name = bucket_name
+        self.setting = {**DEFAULT_LOADER_SETTING, **(setting or {})}
+        self.s3_client = s3_client or self._create_s3_client()
+        self.parser = parser
+        self.progress_callback = progress_callback
+        self.unstructured_kwargs = unstructured_kwargs or {}
+        self._progress_lock = threading.Lock()
+        self._content_hashes: dict[str, str] = {}
+        self.cache = cache if cache is not None and cache.enabled else None
+        self._parser_version = parser_version(parser, self.unstructured_kwargs) if self.cache is not None else None
+        # ファイルパス -> (キャッシュのキー, ETag)（キャッシュに無く、解析後に保存するファイル）
+        self._cache_keys: dict[str, tuple[str, str]] = {}
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("ingestion_setting", default={})
+        loader_setting = setting.get("loader", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_LOADER_SETTING, **loader_setting}
+
+    @staticmethod
+    def _create_s3_client():
+        access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
+        secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
+        if not access_key_id or not secret_access_key:
+            NaviApiLog.warning("AWS認証情報が環境変数に見つかりません")
+        # boto3 のクライアントはスレッドセーフのため、ダウンロードのスレッド間で共有する
+        return boto3.client(
+            "s3",
+            region_name=os.getenv("AWS_REGION", "ap-northeast-1"),
+            endpoint_url=os.getenv("S3_ENDPOINT"),
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+        )
+
+    @property
+    def parse_workers(self) -> int:
+        parse_workers = self.setting.get("parse_workers")
+        if parse_workers is None:
+            return os.cpu_count() or 1
+        return max(0, int(parse_workers))
+
+    @property
+    def max_pending_files(self) -> int:
+        max_pending_files = self.setting.get("max_pending_files")
+        if max_pending_files is None:
+            return max(1, int(self.setting.get("download_workers"))) + self.parse_workers
+        return max(1, int(max_pending_files))
+
+    def _uses_process(self, file_path: str) -> bool:
+        extension = os.path.splitext(file_path)[1].lower()
+        return self.parse_workers > 0 and extension in self.setting.get("process_extensions")
+
+    def _create_process_pool(self) -> Optional[Executor]:
+        try:
+            # ダウンロードのスレッドが動いている状態で fork しないよう spawn を使用する
+            return ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        except Exception as e:
+            NaviApiLog.warning(f"解析用のプロセスプールを作成できないため、スレッドで解析します: {e}")
+            return None
+
+    def _get_cached(self, file_path: str) -> Optional[ParsedDocuments]:
+        """
+        キャッシュにある場合は解析済みのドキュメントを返す（無い場合は解析後に保存するキーを記録する）
+        """
+        if self.cache is None:
+            return None
+        etag = self.s3_client.head_object(Bucket=self.bucket_name, Key=file_path).get("ETag")
+        if not etag:
+            return None
+        key = self.cache.key(etag, self._parser_version)
+        parsed = self.cache.get(key)
+        with self._progress_lock:
+            if parsed is not None:
+                self._content_hashes[file_path] = parsed.content_hash
+            else:
+                self._cache_keys[file_path] = (key, etag)
+        return parsed
+
+    def _download(self, file_path: str, local_path: str) -> str:
+        with self._progress_lock:
+            cache_key = self._cache_keys.get(file_path)
+        if cache_key is not None:
+            # 確認した ETag から変更されていた場合は失敗させ、別の内容を同じキーで保存しない
+            self.s3_client.download_file(
+                self.bucket_name, file_path, local_path, ExtraArgs={"IfMatch": cache_key[1]}
+            )
+        else:
+            self.s3_client.download_file(self.bucket_name, file_path, local_path)
+        content_hash = self._hash_file(local_path)
+        with self._progress_lock:
+            self._content_hashes[file_path] = content_hash
+        return local_path
+
+    @staticmethod
+    def _hash_file(local_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(local_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _download_for_process(self, file_path: str, local_path: str) -> list[tuple[int, int]] | ParsedDocuments:
+        """
+        プロセスで解析するファイルをダウンロードし、並列に解析するページ範囲を返す
+        （parser が page_ranges を持つ場合のみ。分けない場合は空。キャッシュにある場合は解析済みのドキュメント）
+        """
+        cached = self._get_cached(file_path)
+        if cached is not None:
+            return cached
+        self._download(file_path, local_path)
+        page_ranges = getattr(self.parser, "page_ranges", None)
+        return page_ranges(local_path) if page_ranges is not None else []
+
+    def _submit_parse(self, process_pool: Executor, local_path: str, page_ranges: list[tuple[int, int]]) -> Future:
+        if len(page_ranges) > 1:
+            # 大きなPDFはページ範囲毎に分けて解析用のプロセスに渡す
+            parse_future = _gather([
+                process_pool.submit(self.parser.extract_pages, local_path, start, end, self.unstructured_kwargs)
+                for start, end in page_ranges
+            ])
+        else:
+            parse_future = process_pool.submit(self.parser, local_path, self.unstructured_kwargs)
+        parse_future.add_done_callback(lambda _: self._remove(local_path))
+        return parse_future
+
+    def _download_and_parse(self, file_path: str, local_path: str) -> list[Document]:
+        """
+        ダウンロードしたスレッドでそのまま解析する（プロセスで解析しないファイル用）
+        """
+        cached = self._get_cached(file_path)
+        if cached is not None:
+            return cached.documents
+        try:
+            self._download(file_path, local_path)
+            return self.parser(local_path, self.unstructured_kwargs)
+        finally:
+            self._remove(local_path)
+
+    @staticmethod
+    def _remove(local_path: str) -> None:
+        try:
+            os.remove(local_path)
+        except OSError:
+            pass
+
+    def _report(self, progress: LoadProgress, result: LoadResult) -> None:
+        with self._progress_lock:
+            progress.completed += 1
+            if result.error is not None:
+                progress.failed_files.append(result.file_path)
+            progress.documents += len(result.documents)
+            interval = max(1, int(self.setting.get("progress_interval")))
+            should_log = progress.completed % interval == 0 or progress.completed == progress.total
+        if should_log:
+            NaviApiLog.info(
+                f"ドキュメントのロード進捗 {progress.completed}/{progress.total} "
+                f"失敗={progress.failed} "
+                f"ドキュメント数={progress.documents} "
+                f"pages_per_second={progress.pages_per_second} "
+                f"elapsed_ms={progress.elapsed_ms}"
+            )
+        if self.progress_callback is not None:
+            self.progress_callback(progress)
+
+    def _to_result(self, file_path: str, future: Future) -> LoadResult:
+        with self._progress_lock:
+            content_hash = self._content_hashes.pop(file_path, None)
+            cache_key = self._cache_keys.pop(file_path, None)
+        try:
+            documents = future.result()
+        except Exception as e:
+            NaviApiLog.error(f"S3ファイル({file_path})のロードに失敗しました: {e}")
+            return LoadResult(file_path=file_path, error=e, content_hash=content_hash)
+        if cache_key is not None:
+            # source はバケット名により変わるため、設定する前に保存する
+            self.cache.put(cache_key[0], ParsedDocuments(documents=documents, content_hash=content_hash))
+        if not documents:
+            NaviApiLog.warning(f"S3ファイルからドキュメントがロードされませんでした: {file_path}")
+        for document in documents:
+            document.metadata["source"] = f"{self.bucket_name}/{file_path}"
+        return LoadResult(file_path=file_path, documents=documents, content_hash=content_hash)
+
+    def iter_load(self, file_paths: list[str]) -> Iterator[LoadResult]:
+        """
+        ファイル毎の結果を完了した順に返す
+
+        先読みするファイル数を max_pending_files までに抑えるため、
+        呼び出し側が結果を受け取るまで次のファイルのダウンロードを開始しない。
+        """
+        targets = []
+        for file_path in file_paths:
+            if not file_path:
+                NaviApiLog.warning("空のファイルパスが検出されました。スキップします")
+                continue
+            targets.append(file_path)
+        if not targets:
+            return
+
+        progress = LoadProgress(total=len(targets))
+        download_workers = max(1, int(self.setting.get("download_workers")))
+        process_pool = None
+        if any(self._uses_process(file_path) for file_path in targets):
+            process_pool = self._create_process_pool()
+
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="s3-download") as download_pool:
+            # future -> (ファイルパス, ローカルパス, 解析済みか)
+            pending: dict[Future, tuple[str, str, bool]] = {}
+            queued = iter(enumerate(targets))
+
+            def submit_next() -> None:
+                while len(pending) < self.max_pending_files:
+                    try:
+                        index, file_path = next(queued)
+                    except StopIteration:
+                        return
+                    # 同じファイル名でも衝突しないよう、連番のファイル名に拡張子を残して保存する
+                    local_path = os.path.join(temp_dir, f"{index}{os.path.splitext(file_path)[1]}")
+                    if process_pool is not None and self._uses_process(file_path):
+                        future = download_pool.submit(self._download_for_process, file_path, local_path)
+                        pending[future] = (file_path, local_path, False)
+                    else:
+                        future = download_pool.submit(self._download_and_parse, file_path, local_path)
+                        pending[future] = (file_path, local_path, True)
+
+            try:
+                submit_next()
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        file_path, local_path, is_parsed = pending.pop(future)
+                        if not is_parsed and future.exception() is None:
+                            downloaded = future.result()
+                            if isinstance(downloaded, ParsedDocuments):
+                                # キャッシュにあったPDFは解析せずに結果として返す
+                                parse_future = Future()
+                                parse_future.set_result(downloaded.documents)
+                            else:
+                                # ダウンロードが完了したPDFを解析用のプロセスに渡す
+                                parse_future = self._submit_parse(process_pool, local_path, downloaded)
+                            pending[parse_future] = (file_path, local_path, True)
+                            continue
+                        result = self._to_result(file_path, future)
+                        self._report(progress, result)
+                        yield result
+                    submit_next()
+            finally:
+                for future in pending:
+                    future.cancel()
+                if process_pool is not None:
+                    process_pool.shutdown(wait=True, cancel_futures=True)
+
+        if self.cache is not None:
+            NaviApiLog.info(f"解析キャッシュ hit={self.cache.hits} miss={self.cache.misses}")
+        if progress.failed_files:
+            NaviApiLog.warning(f"{progress.failed} 件のファイルのロードに失敗しました: {progress.failed_files}")
+
+    def load(self, file_paths: list[str]) -> list[Document]:
+        """
+        全ファイルのドキュメントを file_paths の順に返す（失敗したファイルは含めない）
+        """
+        results = {result.file_path: result for result in self.iter_load(file_paths)}
+        documents = []
+        for file_path in file_paths:
+            result = results.get(file_path)
+            if result is not None:
+                documents.extend(result.documents)
+        return documents
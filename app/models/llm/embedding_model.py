@@ -1,3 +1,4 @@
+import threading
 from sentence_transformers import SentenceTransformer
 from langchain_core.embeddings import Embeddings
 from app.core.logging import NaviApiLog
@@ -88,8 +89,44 @@ class SentenceTransformerEmbeddingsModel(Embeddings):
             NaviApiLog.error(f"ドキュメントの埋め込みに失敗しました: {e}")
             raise RuntimeError("ドキュメントの埋め込み処理に失敗しました")
 
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        複数のクエリテキストを1回のバッチで埋め込みベクトルに変換する
+        
+        Args:
+            texts: 埋め込むテキストのリスト（空文字列を含めない）
+            
+        Returns:
+            list[list[float]]: textsと同じ順序・件数の埋め込みベクトルのリスト
+        """
+        if not texts:
+            return []
+        
+        try:
+            return [embedding.tolist() for embedding in self.model.encode(texts)]
+        except Exception as e:
+            NaviApiLog.error(f"クエリテキストの埋め込みに失敗しました: {e}")
+            raise RuntimeError("テキストの埋め込み処理に失敗しました")
+
 
 class EmbeddingModelManager:
+    # get_shared_embedding_model 用のプロセス内キャッシュ {(model_name, device, use_api): モデル}
+    _lock = threading.Lock()
+    _shared_models: dict[tuple[str, str, bool], Embeddings] = {}
+
+    @classmethod
+    def get_shared_embedding_model(cls, model_name: str, api_key: str, device: str, use_api: bool):
+        """
+        埋め込みモデルをプロセス内で共有して返す（質問の埋め込みのみを行う場合に、リクエスト毎のロードを省く）
+        """
+        key = (model_name, device, use_api)
+        with cls._lock:
+            model = cls._shared_models.get(key)
+            if model is None:
+                model = cls.get_embedding_model(model_name=model_name, api_key=api_key, device=device, use_api=use_api)
+                cls._shared_models[key] = model
+        return model
+
     @classmethod
     def get_embedding_model(cls, model_name: str, api_key: str, device: str, use_api: bool):
         if use_api:
@@ -0,0 +1,58 @@
+import threading
+import time
+from typing import Any, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from app.core.metrics import NaviApiMetrics
+
+
+class FirstTokenLatencyHandler(BaseCallbackHandler):
+    """
+    LLMの呼び出しから最初のトークンを受け取るまでの時間（TTFT）をメトリクスに記録する
+
+    ストリーミング時は最初の空でないトークン、ストリーミングしない場合は応答全体の受信までの時間を
+    llm.first_token_ms{streaming=...} として記録する。labels でプロンプトの組み立て方などを区別する。
+    """
+
+    METRIC = "llm.first_token_ms"
+
+    # 非同期実行時もイベントループ上で即時に呼び出し、計測に executor の待ち時間を含めない
+    run_inline = True
+
+    def __init__(self, labels: Optional[dict[str, str]] = None) -> None:
+        self.labels = labels or {}
+        self._lock = threading.Lock()
+        self._started: dict[UUID, float] = {}
+
+    def _start(self, run_id: UUID) -> None:
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+
+    def _finish(self, run_id: UUID, streaming: bool) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        NaviApiMetrics.observe(
+            self.METRIC,
+            (time.perf_counter() - started) * 1000,
+            labels={**self.labels, "streaming": str(streaming).lower()}
+        )
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id)
+
+    def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        if token:
+            self._finish(run_id, streaming=True)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        # ストリーミングで記録済みの場合は何もしない
+        self._finish(run_id, streaming=False)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._started.pop(run_id, None)
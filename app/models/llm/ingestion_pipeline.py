@@ -0,0 +1,279 @@
+import queue
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from app.core.aws.ssm_client import SsmClient
+from app.core.logging import NaviApiLog
+from app.models.llm.chunk_dedup import ChunkDeduplicator, chunk_hash
+from app.models.llm.document_loader import ConcurrentDocumentLoader
+from app.models.llm.vector_writer import PgVectorBulkWriter
+
+
+DEFAULT_PIPELINE_SETTING = {
+    # 1回の埋め込み・書き込みで扱うチャンク数
+    "batch_size": 64,
+    # 段の間で保持するバッチ数の上限（後段が詰まった場合は前段を待たせる）
+    "queue_size": 2,
+}
+
+# 各段の終了を後段に伝える番兵
+_DONE = object()
+
+
+def embed_texts(embeddings: Embeddings, texts: list[str]) -> list[list[float]]:
+    """
+    テキストを埋め込む（embed_queries を持つ SentenceTransformer は1回のバッチでエンコードする）
+    """
+    embed_queries = getattr(embeddings, "embed_queries", None)
+    if embed_queries is not None:
+        return embed_queries(texts)
+    return embeddings.embed_documents(texts)
+
+
+@dataclass
+class IngestionStats:
+    files: int = 0
+    failed_files: int = 0
+    documents: int = 0
+    chunks: int = 0
+    batches: int = 0
+    # 内容が同じチャンクがあるため埋め込まず、最初の行の sources に追加したチャンク数
+    shared_chunks: int = 0
+    # 最初のバッチがベクターストアに書き込まれるまでの時間
+    first_write_ms: Optional[float] = None
+    elapsed_ms: float = 0.0
+
+
+class _PipelineStopped(Exception):
+    """他の段の失敗によりパイプラインが停止した"""
+
+
+class IngestionPipeline:
+    """
+    マニュアルを ロード → 分割 → 埋め込み → 書き込み の順にストリーミングで取り込む
+
+    - 段の間は上限付きのキュー（queue_size バッチ）で繋ぎ、後段が遅い場合は前段を待たせる
+      （ロードも ConcurrentDocumentLoader の先読み上限で止まるため、メモリ使用量はコーパスの大きさに依存しない）
+    - 埋め込みと書き込みは batch_size チャンク毎に行い、書き込みはバッチ毎に確定する
+    - いずれかの段で失敗した場合は全ての段を停止し、例外を呼び出し側に返す
+    - deduplicator を指定した場合は、アプリケーション内で内容が同じチャンクを1行だけ書き込み、
+      全ての書き込みが終わった後に他のマニュアルを sources に追加する
+
+    設定は SSM の ingestion_setting.pipeline から取得する。
+    """
+
+    def __init__(
+        self,
+        loader: ConcurrentDocumentLoader,
+        embeddings: Embeddings,
+        vector_store: Any,
+        splitter: Optional[Callable[[list[Document]], list[Document]]] = None,
+        setting: Optional[dict[str, Any]] = None,
+        writer: Optional[PgVectorBulkWriter] = None,
+        deduplicator: Optional[ChunkDeduplicator] = None,
+    ) -> None:
+        self.loader = loader
+        self.embeddings = embeddings
+        self.vector_store = vector_store
+        # 指定した場合は COPY でまとめて書き込む（未指定の場合はバッチ毎に add_embeddings で書き込む）
+        self.writer = writer
+        # 分割しない場合はロードしたドキュメントをそのまま埋め込む
+        self.splitter = splitter or (lambda documents: documents)
+        self.setting = {**DEFAULT_PIPELINE_SETTING, **(setting or {})}
+        self.deduplicator = deduplicator if deduplicator is not None and deduplicator.enabled else None
+        self._stop = threading.Event()
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("ingestion_setting", default={})
+        pipeline_setting = setting.get("pipeline", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_PIPELINE_SETTING, **pipeline_setting}
+
+    @property
+    def batch_size(self) -> int:
+        return max(1, int(self.setting.get("batch_size")))
+
+    def _put(self, target: queue.Queue, item: Any) -> None:
+        """
+        キューに空きができるまで待つ（他の段が停止した場合は待つのをやめる）
+        """
+        while True:
+            if self._stop.is_set():
+                raise _PipelineStopped()
+            try:
+                target.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, source: queue.Queue) -> Any:
+        while True:
+            if self._stop.is_set():
+                raise _PipelineStopped()
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _iter_queue(self, source: queue.Queue) -> Iterator[Any]:
+        while True:
+            item = self._get(source)
+            if item is _DONE:
+                return
+            yield item
+
+    def _run_stage(self, name: str, target: Callable[[], None], errors: list[BaseException]) -> threading.Thread:
+        def run() -> None:
+            try:
+                target()
+            except _PipelineStopped:
+                pass
+            except BaseException as e:
+                NaviApiLog.error(f"取り込みの{name}に失敗しました: {e}")
+                errors.append(e)
+                self._stop.set()
+
+        thread = threading.Thread(target=run, name=f"ingestion-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def _iter_chunks(
+        self,
+        file_paths: list[str],
+        stats: IngestionStats,
+        shared_sources: dict[str, set[str]],
+    ) -> Iterator[Document]:
+        # chunk_hash -> 最初に書き込むチャンクの source
+        written_sources: dict[str, str] = {}
+        with closing(self.loader.iter_load(file_paths)) as results:
+            for result in results:
+                stats.files += 1
+                if result.error is not None:
+                    stats.failed_files += 1
+                    continue
+                stats.documents += len(result.documents)
+                for chunk in self.splitter(result.documents):
+                    # 空のテキストは埋め込みと件数がずれるため除外する
+                    if not (chunk.page_content and chunk.page_content.strip()):
+                        continue
+                    if self.deduplicator is None:
+                        yield chunk
+                        continue
+                    source = chunk.metadata.get("source") or ""
+                    key = chunk_hash(source, chunk.page_content)
+                    first_source = written_sources.get(key)
+                    if first_source is None:
+                        written_sources[key] = source
+                        chunk.metadata = {**chunk.metadata, "sources": [source], "chunk_hash": key}
+                        yield chunk
+                        continue
+                    # 既に書き込む（書き込んだ）チャンクと同じ内容のため、埋め込まずに参照のみ追加する
+                    stats.shared_chunks += 1
+                    if first_source != source:
+                        shared_sources.setdefault(source, set()).add(key)
+
+    def _attach_shared_sources(self, shared_sources: dict[str, set[str]]) -> None:
+        """
+        書き込んだ行の sources に、内容が同じチャンクを持つ他のマニュアルを追加する
+        """
+        if not shared_sources:
+            return
+        with self.vector_store.session_maker() as session:
+            collection = self.vector_store.get_collection(session)
+            for source, chunk_hashes in shared_sources.items():
+                ChunkDeduplicator.attach(session, collection.uuid, sorted(chunk_hashes), source)
+            session.commit()
+
+    @staticmethod
+    def batched(chunks: Iterable[Document], batch_size: int) -> Iterator[list[Document]]:
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _write(self, batch: list[Document], vectors: list[list[float]]) -> int:
+        """
+        バッチを書き込み、確定した行数を返す（writer が行を溜めている間は 0）
+        """
+        texts = [chunk.page_content for chunk in batch]
+        metadatas = [chunk.metadata for chunk in batch]
+        if self.writer is not None:
+            return self.writer.add(texts, vectors, metadatas)
+        self.vector_store.add_embeddings(texts=texts, embeddings=vectors, metadatas=metadatas)
+        return len(batch)
+
+    def _record_write(self, written: int, stats: IngestionStats, started_at: float) -> None:
+        if written and stats.first_write_ms is None:
+            stats.first_write_ms = round((time.perf_counter() - started_at) * 1000, 2)
+            NaviApiLog.info(f"最初のバッチを書き込みました。first_write_ms={stats.first_write_ms}")
+
+    def run(self, file_paths: list[str]) -> IngestionStats:
+        """
+        file_paths のマニュアルを取り込み、件数と所要時間を返す
+        """
+        started_at = time.perf_counter()
+        stats = IngestionStats()
+        queue_size = max(1, int(self.setting.get("queue_size")))
+        embed_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        write_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        errors: list[BaseException] = []
+        shared_sources: dict[str, set[str]] = {}
+        self._stop.clear()
+
+        def load_and_split() -> None:
+            for batch in self.batched(self._iter_chunks(file_paths, stats, shared_sources), self.batch_size):
+                self._put(embed_queue, batch)
+            self._put(embed_queue, _DONE)
+
+        def embed() -> None:
+            for batch in self._iter_queue(embed_queue):
+                vectors = embed_texts(self.embeddings, [chunk.page_content for chunk in batch])
+                self._put(write_queue, (batch, vectors))
+            self._put(write_queue, _DONE)
+
+        threads = [
+            self._run_stage("ロード・分割", load_and_split, errors),
+            self._run_stage("埋め込み", embed, errors),
+        ]
+        try:
+            # 書き込みは呼び出し元のスレッドで行う（PGVector の接続をスレッド間で共有しない）
+            for batch, vectors in self._iter_queue(write_queue):
+                self._record_write(self._write(batch, vectors), stats, started_at)
+                stats.batches += 1
+                stats.chunks += len(batch)
+            if self.writer is not None:
+                self._record_write(self.writer.flush(), stats, started_at)
+        except _PipelineStopped:
+            pass
+        except BaseException as e:
+            NaviApiLog.error(f"取り込みの書き込みに失敗しました: {e}")
+            errors.append(e)
+            self._stop.set()
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+        self._attach_shared_sources(shared_sources)
+        stats.elapsed_ms = round((time.perf_counter() - started_at) * 1000, 2)
+        NaviApiLog.info(
+            f"取り込みが完了しました。"
+            f"ファイル数={stats.files} "
+            f"失敗={stats.failed_files} "
+            f"ドキュメント数={stats.documents} "
+            f"チャンク数={stats.chunks} "
+            f"共有したチャンク数={stats.shared_chunks} "
+            f"バッチ数={stats.batches} "
+            f"elapsed_ms={stats.elapsed_ms}"
+            + (f" rows_per_second={self.writer.rows_per_second}" if self.writer is not None else "")
+        )
+        return stats
@@ -0,0 +1,261 @@
+import os
+import random
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Iterator, Optional
+from app.core.aws.s3_client import S3Client
+from app.core.aws.ssm_client import SsmClient
+from app.core.database.mysql import MySQLDatabase
+from app.core.logging import NaviApiLog
+from app.middlewares.transaction import get_db
+from app.models.llm.vector_sync import VectorSyncEngine, manual_key
+from app.repositories.ingestion_job_repository import ClaimedDocumentDto, IngestionJobRepository
+from app.repositories.manual_repository import ManualDto, ManualRepository
+
+
+DEFAULT_JOB_SETTING = {
+    # ワーカーのプロセス数（local_setting/local_app/ingestion_worker.py）
+    "processes": 2,
+    # 1回に取得するマニュアル数（まとめてダウンロード・解析する）
+    "claim_batch_size": 4,
+    # 取得したマニュアルをこの秒数内に完了しない場合は、他のワーカーが取得し直す
+    # （取り込み中は lease_seconds / 3 毎に延長するため、ワーカーが停止した場合のみ取得し直される）
+    "lease_seconds": 1800,
+    # 失敗した場合の試行回数の上限（超えた場合は failed とする）
+    "max_attempts": 5,
+    # 再試行までの待ち時間（backoff_base_seconds * 2^(試行回数-1) を backoff_max_seconds で打ち切る）
+    "backoff_base_seconds": 30,
+    "backoff_max_seconds": 3600,
+    # 処理するマニュアルが無い場合に次に確認するまでの秒数
+    "poll_interval_seconds": 5,
+}
+
+
+class IngestionWorker:
+    """
+    取り込みジョブのマニュアルを取得し、ベクターストアに取り込むワーカー
+
+    - claim_batch_size 件ずつ SKIP LOCKED で取得し、マニュアル毎に完了・失敗を記録する（チェックポイント）
+    - 失敗したマニュアルは指数バックオフで再試行し、max_attempts 回で failed とする
+    - 取り込み中は処理中の期限を延長し、ワーカーが停止した場合は lease_seconds 後に他のワーカー（再起動後を含む）が取得し直す
+    - 取り込む直前に期限を延長できなかった（他のワーカーが取得し直した）マニュアルは取り込まない
+    - 処理中の期限切れが max_attempts 回に達したマニュアルは取得し直さずに failed とする
+    - 書き込みは VectorSyncEngine でマニュアル毎に1トランザクションで行うため、取り込み直しても重複しない
+    - 営業時間中に実行できるよう、ANN インデックスは削除しない
+
+    設定は SSM の ingestion_setting.jobs から取得する。
+    """
+
+    def __init__(
+        self,
+        engine: VectorSyncEngine,
+        s3_client: Optional[S3Client] = None,
+        setting: Optional[dict[str, Any]] = None,
+        worker_id: Optional[str] = None,
+        db: Optional[MySQLDatabase] = None,
+    ) -> None:
+        self.engine = engine
+        self.s3_client = s3_client or S3Client()
+        self.db = db or get_db()
+        self.setting = {**DEFAULT_JOB_SETTING, **(setting or {})}
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("ingestion_setting", default={})
+        job_setting = setting.get("jobs", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_JOB_SETTING, **job_setting}
+
+    def backoff_seconds(self, attempts: int) -> float:
+        """
+        attempts 回目の失敗後に再試行するまでの秒数（同時に失敗したマニュアルが揃わないよう揺らぎを加える）
+        """
+        base_seconds = float(self.setting.get("backoff_base_seconds"))
+        max_seconds = float(self.setting.get("backoff_max_seconds"))
+        seconds = min(base_seconds * (2 ** max(0, attempts - 1)), max_seconds)
+        return seconds * random.uniform(0.8, 1.0)
+
+    def run(self, stop_event: threading.Event) -> None:
+        """
+        stop_event が設定されるまで、マニュアルの取得と取り込みを繰り返す
+        """
+        NaviApiLog.info(f"取り込みワーカーを開始します。worker_id={self.worker_id}")
+        poll_interval_seconds = float(self.setting.get("poll_interval_seconds"))
+        while not stop_event.is_set():
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                # 取得・記録に失敗した場合も、取得済みのマニュアルは期限後に取得し直されるため継続する
+                NaviApiLog.error(f"取り込みジョブの処理に失敗しました: worker_id={self.worker_id} error={e}")
+                processed = 0
+            if processed == 0:
+                stop_event.wait(poll_interval_seconds)
+        NaviApiLog.info(f"取り込みワーカーを停止しました。worker_id={self.worker_id}")
+
+    def run_once(self) -> int:
+        """
+        マニュアルを取得して取り込み、処理した件数を返す
+        """
+        with self.db.get_session() as session:
+            claimed = IngestionJobRepository.claim_documents(
+                session,
+                worker_id=self.worker_id,
+                limit=max(1, int(self.setting.get("claim_batch_size"))),
+                lease_seconds=float(self.setting.get("lease_seconds")),
+                max_attempts=int(self.setting.get("max_attempts")),
+            )
+            session.commit()
+        if not claimed:
+            return 0
+
+        with self._keep_leases(claimed):
+            self._process(claimed)
+        return len(claimed)
+
+    def _process(self, claimed: list[ClaimedDocumentDto]) -> None:
+        """
+        取得したマニュアルを取り込み、マニュアル毎に完了・失敗を記録する
+        """
+        active_manuals = self._get_active_manuals(claimed)
+        # 同じマニュアルが複数のジョブに含まれる場合は1回だけ取り込み、それぞれの完了を記録する
+        documents_by_key: dict[str, list[ClaimedDocumentDto]] = {}
+        for document in claimed:
+            documents_by_key.setdefault(manual_key(document.manual), []).append(document)
+
+        objects = []
+        for key, documents in list(documents_by_key.items()):
+            try:
+                if key not in active_manuals:
+                    # 登録後に削除されたマニュアルはベクトルを削除して完了とする
+                    self.engine.remove_document(self.engine.source_of(key))
+                    self._complete(documents, 0)
+                    del documents_by_key[key]
+                    continue
+                objects.append(self._head_object(key))
+            except Exception as e:
+                self._fail(documents, e)
+                del documents_by_key[key]
+
+        states = {
+            state.key: state
+            for state in self.engine.build_states(objects, [active_manuals[key] for key in documents_by_key])
+        }
+        for result in self.engine.loader.iter_load(list(states)):
+            documents = documents_by_key[result.file_path]
+            if result.error is not None:
+                self._fail(documents, result.error)
+                continue
+            if self._renew_leases(documents) == 0:
+                # 期限が切れて他のワーカーが取得し直したマニュアルは、ベクトルが重複しないよう取り込まない
+                NaviApiLog.warning(
+                    f"処理中の期限が切れたため、取り込みませんでした。"
+                    f"manual_ids={[document.manual.manual_id for document in documents]}"
+                )
+                continue
+            try:
+                # 分割の設定を変更した場合等に取り込み直すため、内容が同じでも埋め込み直す
+                chunks = self.engine.ingest_document(states[result.file_path], result)
+            except Exception as e:
+                self._fail(documents, e)
+                continue
+            self._complete(documents, chunks)
+
+    def _renew_leases(self, documents: list[ClaimedDocumentDto]) -> int:
+        with self.db.get_session() as session:
+            renewed = IngestionJobRepository.renew_lease(
+                session,
+                job_document_ids=[document.job_document_id for document in documents],
+                worker_id=self.worker_id,
+                lease_seconds=float(self.setting.get("lease_seconds")),
+            )
+            session.commit()
+        return renewed
+
+    @contextmanager
+    def _keep_leases(self, claimed: list[ClaimedDocumentDto]) -> Iterator[None]:
+        """
+        この間は lease_seconds / 3 毎に、取得したマニュアルの処理中の期限を別スレッドで延長する
+        （大きなマニュアルの取り込み中に期限が切れ、他のワーカーが同じマニュアルを取り込まないようにする）
+        """
+        interval_seconds = float(self.setting.get("lease_seconds")) / 3
+        stop_event = threading.Event()
+
+        def keep() -> None:
+            while not stop_event.wait(interval_seconds):
+                try:
+                    self._renew_leases(claimed)
+                except Exception as e:
+                    # 延長に失敗した場合も、次の間隔で再び延長する
+                    NaviApiLog.warning(f"処理中の期限の延長に失敗しました: worker_id={self.worker_id} error={e}")
+
+        thread = threading.Thread(target=keep, name=f"ingestion-lease-{self.worker_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop_event.set()
+            thread.join()
+
+    def _get_active_manuals(self, claimed: list[ClaimedDocumentDto]) -> dict[str, ManualDto]:
+        """
+        取得したマニュアルのうち、削除されていないものを返す（更新日時はマニフェストに保存する）
+        """
+        scopes = {(document.manual.company_id, document.manual.application_id) for document in claimed}
+        with self.db.get_session() as session:
+            manuals = [
+                manual
+                for company_id, application_id in scopes
+                for manual in ManualRepository.get_by_company_id(
+                    session=session,
+                    company_id=company_id,
+                    application_id=application_id
+                )
+            ]
+        return {manual_key(manual): manual for manual in manuals}
+
+    def _head_object(self, key: str) -> dict:
+        response = self.s3_client.client.head_object(Bucket=self.engine.bucket_name, Key=key)
+        return {"Key": key, "ETag": response.get("ETag"), "Size": response.get("ContentLength")}
+
+    def _complete(self, documents: list[ClaimedDocumentDto], chunks: int) -> None:
+        with self.db.get_session() as session:
+            for document in documents:
+                completed = IngestionJobRepository.complete_document(
+                    session,
+                    job_document_id=document.job_document_id,
+                    worker_id=self.worker_id,
+                    chunks=chunks,
+                )
+                if completed:
+                    NaviApiLog.info(
+                        f"マニュアルを取り込みました。"
+                        f"job_id={document.job_id} manual_id={document.manual.manual_id} chunks={chunks}"
+                    )
+                else:
+                    NaviApiLog.warning(
+                        f"処理中の期限が切れたため、完了を記録しませんでした。"
+                        f"job_id={document.job_id} manual_id={document.manual.manual_id}"
+                    )
+            session.commit()
+
+    def _fail(self, documents: list[ClaimedDocumentDto], error: BaseException) -> None:
+        with self.db.get_session() as session:
+            for document in documents:
+                retry_at = None
+                if document.attempts < int(self.setting.get("max_attempts")):
+                    retry_at = datetime.now() + timedelta(seconds=self.backoff_seconds(document.attempts))
+                NaviApiLog.error(
+                    f"マニュアルの取り込みに失敗しました。"
+                    f"job_id={document.job_id} manual_id={document.manual.manual_id} "
+                    f"attempts={document.attempts} retry_at={retry_at} error={error}"
+                )
+                IngestionJobRepository.fail_document(
+                    session,
+                    job_document_id=document.job_document_id,
+                    worker_id=self.worker_id,
+                    error=str(error)[:2000],
+                    retry_at=retry_at,
+                )
+            session.commit()
@@ -0,0 +1,266 @@
+import hashlib
+import importlib.util
+import json
+import threading
+from typing import Any, Optional
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+from app.core.logging import NaviApiLog
+from app.core.metrics import NaviApiMetrics
+from app.models.llm.llm_router import DEFAULT_ROUTING_SETTING, LLMBackend, LLMRouter
+
+
+DEFAULT_HTTP_SETTING = {
+    "connect_timeout": 5.0,
+    "read_timeout": 120.0,
+    "write_timeout": 30.0,
+    "pool_timeout": 10.0,
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 60.0,
+    # h2 パッケージがインストールされている場合のみ有効になる（TLS接続時にALPNでネゴシエートされる）
+    "http2": True,
+}
+
+# リクエスト毎に新規接続したかどうかを記録する extensions のキー
+_NEW_CONNECTION_KEY = "navi_new_connection"
+_CONNECT_EVENT = "connection.connect_tcp.started"
+
+
+def _record_response(response: httpx.Response) -> None:
+    """
+    リクエストの完了時に接続の再利用状況をメトリクスに記録する
+    """
+    new_connection = response.request.extensions.get(_NEW_CONNECTION_KEY, {}).get("value", False)
+    NaviApiMetrics.increment(
+        LLMClientManager.METRIC_REQUESTS,
+        labels={"connection": "new" if new_connection else "reused"}
+    )
+
+
+def _on_request(request: httpx.Request) -> None:
+    state = {"value": False}
+
+    def trace(event_name: str, info: dict) -> None:
+        if event_name == _CONNECT_EVENT:
+            state["value"] = True
+
+    request.extensions[_NEW_CONNECTION_KEY] = state
+    request.extensions["trace"] = trace
+
+
+async def _aon_request(request: httpx.Request) -> None:
+    state = {"value": False}
+
+    async def trace(event_name: str, info: dict) -> None:
+        if event_name == _CONNECT_EVENT:
+            state["value"] = True
+
+    request.extensions[_NEW_CONNECTION_KEY] = state
+    request.extensions["trace"] = trace
+
+
+async def _aon_response(response: httpx.Response) -> None:
+    _record_response(response)
+
+
+class LLMClientManager:
+    """
+    LLM（OpenAI互換API）のクライアントをプロセス内で共有する
+
+    (model, base_url) 毎に1つの ChatOpenAI を保持し、keep-alive のコネクションプールを持つ
+    httpx クライアント（同期・非同期）を使い回すことで、質問毎のTCP/TLS接続のコストを省く。
+    タイムアウトとプールの上限は SSM の llm_setting.http で設定する。
+
+    llm_setting.backends に複数のバックエンドが指定されている場合は、
+    バックエンド毎の ChatOpenAI を束ねた LLMRouter を返す。
+    """
+
+    METRIC_REQUESTS = "llm.http.requests"
+
+    _lock = threading.Lock()
+    _clients: dict[tuple[str, Optional[str]], tuple[str, ChatOpenAI]] = {}
+    _routers: dict[str, tuple[str, LLMRouter]] = {}
+
+    @classmethod
+    def get_http_setting(cls, llm_setting: dict[str, Any]) -> dict[str, Any]:
+        http_setting = llm_setting.get("http") or {}
+        return {**DEFAULT_HTTP_SETTING, **http_setting}
+
+    @classmethod
+    def _build_timeout(cls, http_setting: dict[str, Any]) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=http_setting.get("connect_timeout"),
+            read=http_setting.get("read_timeout"),
+            write=http_setting.get("write_timeout"),
+            pool=http_setting.get("pool_timeout"),
+        )
+
+    @classmethod
+    def _build_limits(cls, http_setting: dict[str, Any]) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=http_setting.get("max_connections"),
+            max_keepalive_connections=http_setting.get("max_keepalive_connections"),
+            keepalive_expiry=http_setting.get("keepalive_expiry"),
+        )
+
+    @classmethod
+    def _use_http2(cls, http_setting: dict[str, Any]) -> bool:
+        if not http_setting.get("http2"):
+            return False
+        if importlib.util.find_spec("h2") is None:
+            NaviApiLog.debug("h2がインストールされていないため、HTTP/1.1で接続します")
+            return False
+        return True
+
+    @classmethod
+    def _fingerprint(cls, llm_setting: dict[str, Any]) -> str:
+        payload = json.dumps(llm_setting, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _create_llm(cls, llm_setting: dict[str, Any]) -> ChatOpenAI:
+        http_setting = cls.get_http_setting(llm_setting)
+        timeout = cls._build_timeout(http_setting)
+        limits = cls._build_limits(http_setting)
+        http2 = cls._use_http2(http_setting)
+
+        http_client = httpx.Client(
+            timeout=timeout,
+            limits=limits,
+            http2=http2,
+            event_hooks={"request": [_on_request], "response": [_record_response]},
+        )
+        http_async_client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=limits,
+            http2=http2,
+            event_hooks={"request": [_aon_request], "response": [_aon_response]},
+        )
+        NaviApiLog.info(
+            f"LLMクライアントを作成しました。"
+            f"model={llm_setting.get('model_name')} "
+            f"base_url={llm_setting.get('base_url')} "
+            f"http2={http2} "
+            f"max_connections={http_setting.get('max_connections')}"
+        )
+        return ChatOpenAI(
+            model=llm_setting.get("model_name"),
+            base_url=llm_setting.get("base_url", None),
+            api_key=llm_setting.get("api_key"),
+            temperature=llm_setting.get("temperature"),
+            # openai クライアントは timeout 未指定だとタイムアウト無しになるため明示する
+            timeout=timeout,
+            # 複数のバックエンドにルーティングする場合の既定は 0（_get_router で設定する）
+            max_retries=llm_setting.get("max_retries", 2),
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+
+    @classmethod
+    def get_llm(cls, llm_setting: dict[str, Any]) -> BaseChatModel:
+        """
+        設定に対応する共有のLLMクライアントを取得する
+        同じ (model, base_url) で設定値が変わった場合は作り直す
+
+        Args:
+            llm_setting: SSM の llm_setting
+
+        Returns:
+            BaseChatModel: 共有の ChatOpenAI（backends 指定時は LLMRouter）
+        """
+        if llm_setting.get("backends"):
+            return cls._get_router(llm_setting)
+        return cls._get_client(llm_setting)
+
+    @classmethod
+    def _get_client(cls, llm_setting: dict[str, Any]) -> ChatOpenAI:
+        key = (llm_setting.get("model_name"), llm_setting.get("base_url"))
+        fingerprint = cls._fingerprint(llm_setting)
+        with cls._lock:
+            cached = cls._clients.get(key)
+            if cached and cached[0] == fingerprint:
+                return cached[1]
+            llm = cls._create_llm(llm_setting)
+            cls._clients[key] = (fingerprint, llm)
+        if cached:
+            # 実行中のリクエストが使用している可能性があるため、古いクライアントは閉じずにGCに任せる
+            NaviApiLog.info(f"LLMの設定が変更されたため、クライアントを作り直しました。model={key[0]} base_url={key[1]}")
+        return llm
+
+    @classmethod
+    def _get_router(cls, llm_setting: dict[str, Any]) -> LLMRouter:
+        """
+        llm_setting.backends のバックエンド毎の ChatOpenAI を束ねた LLMRouter を取得する
+        バックエンドの実行中リクエスト数・レイテンシを引き継ぐため、設定値が変わるまで同じインスタンスを返す
+        """
+        key = llm_setting.get("model_name")
+        fingerprint = cls._fingerprint(llm_setting)
+        with cls._lock:
+            cached = cls._routers.get(key)
+            if cached and cached[0] == fingerprint:
+                return cached[1]
+
+        routing_setting = {**DEFAULT_ROUTING_SETTING, **(llm_setting.get("routing") or {})}
+        # バックエンド毎の設定は共通の設定（model_name・api_key・http など）を上書きする
+        common_setting = {k: v for k, v in llm_setting.items() if k not in ("backends", "routing", "base_url")}
+        if len(llm_setting.get("backends")) > 1:
+            # バックエンド内で再試行するより、ヘッジ・別のバックエンドに送る方が早いため、既定では再試行しない
+            common_setting.setdefault("max_retries", 0)
+        backends = []
+        for backend_setting in llm_setting.get("backends"):
+            setting = {**common_setting, **backend_setting}
+            backends.append(LLMBackend(
+                name=setting.get("base_url"),
+                llm=cls._get_client(setting),
+                weight=setting.get("weight", 1.0),
+                latency_window=routing_setting.get("latency_window"),
+            ))
+        router = LLMRouter(model_name=key, backends=backends, routing_setting=routing_setting)
+
+        with cls._lock:
+            cached = cls._routers.get(key)
+            if cached and cached[0] == fingerprint:
+                # 同時に作成された場合は先に登録された方を使う
+                return cached[1]
+            # 実行中のリクエストが使用している可能性があるため、古いルーターは閉じずにGCに任せる
+            cls._routers[key] = (fingerprint, router)
+        NaviApiLog.info(
+            f"LLMのルーティングを設定しました。"
+            f"model={key} "
+            f"backends={[backend.name for backend in backends]} "
+            f"hedge={router.hedge_setting.get('enabled')}"
+        )
+        return router
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            clients = list(cls._clients.values())
+            routers = list(cls._routers.values())
+            cls._clients.clear()
+            cls._routers.clear()
+        for _, router in routers:
+            router.close()
+        for _, llm in clients:
+            if llm.http_client is not None:
+                llm.http_client.close()
+
+    @classmethod
+    def stats(cls) -> dict[str, Any]:
+        """
+        LLMへのHTTPリクエストのうち、既存の接続を再利用できた割合を返す
+        """
+        reused = NaviApiMetrics.get_counter(cls.METRIC_REQUESTS, labels={"connection": "reused"})
+        new = NaviApiMetrics.get_counter(cls.METRIC_REQUESTS, labels={"connection": "new"})
+        with cls._lock:
+            clients = len(cls._clients)
+            routers = [router for _, router in cls._routers.values()]
+        return {
+            "clients": clients,
+            "routers": [router.stats() for router in routers],
+            "requests": int(reused + new),
+            "connections_opened": int(new),
+            "connection_reuse_rate": round(reused / (reused + new), 4) if reused + new else 0.0,
+        }
@@ -0,0 +1,332 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+from pydantic import PrivateAttr
+from app.core.logging import NaviApiLog
+from app.core.metrics import NaviApiMetrics
+
+
+T = TypeVar("T")
+
+DEFAULT_ROUTING_SETTING = {
+    # バックエンド毎に保持するレイテンシの件数
+    "latency_window": 200,
+    # 同期版でヘッジリクエストを実行するスレッド数
+    "max_workers": 16,
+    "hedge": {
+        "enabled": True,
+        # 最初のバックエンドの応答がこのパーセンタイルのレイテンシを超えたら、別のバックエンドにも送る
+        "percentile": 95,
+        # 固定の待機時間（指定した場合はパーセンタイルより優先する）
+        "delay_ms": None,
+        # レイテンシの件数が min_samples に満たない間の待機時間
+        "initial_delay_ms": 3000,
+        "min_delay_ms": 200,
+        "min_samples": 20,
+    },
+}
+
+
+class LLMBackend:
+    """
+    ルーティング先のバックエンド（OpenAI互換API）と、その実行中リクエスト数・レイテンシ
+    """
+
+    def __init__(self, name: str, llm: ChatOpenAI, weight: float = 1.0, latency_window: int = 200) -> None:
+        self.name = name
+        self.llm = llm
+        self.weight = weight if weight and weight > 0 else 1.0
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.latencies: deque[float] = deque(maxlen=latency_window)
+
+    @property
+    def load(self) -> float:
+        return self.outstanding / self.weight
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        values = sorted(self.latencies)
+        index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+        return values[index]
+
+    def stats(self) -> dict[str, Any]:
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        return {
+            "backend": self.name,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_samples": len(self.latencies),
+            "latency_p50_ms": round(p50, 3) if p50 is not None else None,
+            "latency_p95_ms": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class LLMRouter(BaseChatModel):
+    """
+    複数のOpenAI互換バックエンドにリクエストを振り分けるチャットモデル
+
+    - 実行中リクエスト数（weightで割った値）が最も少ないバックエンドを選択する
+    - バックエンド毎にレイテンシを記録し、応答がそのパーセンタイル（既定はp95）を超えた場合は
+      別のバックエンドにも同じリクエストを送り（ヘッジ）、先に成功した応答を採用する
+    - 非同期版では採用されなかったリクエストをキャンセルする。同期版は実行中のスレッドを中断できないため、
+      結果を破棄する
+    - ストリーミングはトークンの送出後に切り替えられないため、ヘッジせずに1つのバックエンドで実行する
+
+    設定は SSM の llm_setting.backends と llm_setting.routing から取得する。
+    """
+
+    model_name: str
+    backends: list[LLMBackend]
+    routing_setting: dict[str, Any] = {}
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _cursor: int = PrivateAttr(default=0)
+    _executor: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "navi-llm-router"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model_name": self.model_name, "backends": [backend.name for backend in self.backends]}
+
+    @property
+    def hedge_setting(self) -> dict[str, Any]:
+        return {**DEFAULT_ROUTING_SETTING["hedge"], **(self.routing_setting.get("hedge") or {})}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.routing_setting.get("max_workers") or DEFAULT_ROUTING_SETTING["max_workers"],
+                    thread_name_prefix="llm-router",
+                )
+            return self._executor
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _acquire(self, exclude: Optional[LLMBackend] = None) -> Optional[LLMBackend]:
+        """
+        実行中リクエスト数が最も少ないバックエンドを選択し、実行中として数える
+        同数の場合は順番に選択する
+        """
+        with self._lock:
+            candidates = [backend for backend in self.backends if backend is not exclude]
+            if not candidates:
+                return None
+            start = self._cursor % len(candidates)
+            self._cursor += 1
+            backend = min(candidates[start:] + candidates[:start], key=lambda b: b.load)
+            backend.outstanding += 1
+            backend.requests += 1
+            outstanding = backend.outstanding
+        NaviApiMetrics.set_gauge("llm.router.outstanding", outstanding, labels={"backend": backend.name})
+        return backend
+
+    def _release(self, backend: LLMBackend, started: float, outcome: str) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            backend.outstanding -= 1
+            if outcome == "success":
+                backend.latencies.append(elapsed_ms)
+            elif outcome == "error":
+                backend.errors += 1
+            outstanding = backend.outstanding
+        NaviApiMetrics.set_gauge("llm.router.outstanding", outstanding, labels={"backend": backend.name})
+        NaviApiMetrics.increment("llm.router.requests", labels={"backend": backend.name, "outcome": outcome})
+        if outcome == "success":
+            NaviApiMetrics.observe("llm.router.latency_ms", elapsed_ms, labels={"backend": backend.name})
+
+    def _hedge_delay_seconds(self, backend: LLMBackend) -> Optional[float]:
+        """
+        ヘッジリクエストを送るまでの待機秒数を返す（ヘッジしない場合は None）
+        """
+        hedge = self.hedge_setting
+        if not hedge.get("enabled") or len(self.backends) < 2:
+            return None
+        delay_ms = hedge.get("delay_ms")
+        if delay_ms is None:
+            if len(backend.latencies) >= hedge.get("min_samples"):
+                delay_ms = backend.percentile(hedge.get("percentile"))
+            else:
+                delay_ms = hedge.get("initial_delay_ms")
+        return max(delay_ms, hedge.get("min_delay_ms")) / 1000
+
+    def _call(self, backend: LLMBackend, fn: Callable[[ChatOpenAI], T]) -> T:
+        started = time.perf_counter()
+        try:
+            result = fn(backend.llm)
+        except BaseException:
+            self._release(backend, started, "error")
+            raise
+        self._release(backend, started, "success")
+        return result
+
+    async def _acall(self, backend: LLMBackend, fn: Callable[[ChatOpenAI], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        try:
+            result = await fn(backend.llm)
+        except asyncio.CancelledError:
+            self._release(backend, started, "cancelled")
+            raise
+        except BaseException:
+            self._release(backend, started, "error")
+            raise
+        self._release(backend, started, "success")
+        return result
+
+    def _start_hedge(self, primary: LLMBackend, reason: str) -> LLMBackend:
+        backend = self._acquire(exclude=primary)
+        NaviApiMetrics.increment("llm.router.hedges", labels={"reason": reason})
+        NaviApiLog.info(
+            f"LLMの応答を待たずに別のバックエンドにもリクエストを送ります。"
+            f"primary={primary.name} "
+            f"hedge={backend.name} "
+            f"reason={reason}"
+        )
+        return backend
+
+    def _record_winner(self, backend: LLMBackend, hedged: bool) -> None:
+        if hedged:
+            NaviApiMetrics.increment("llm.router.hedge_wins", labels={"backend": backend.name})
+
+    def _route(self, fn: Callable[[ChatOpenAI], T]) -> T:
+        primary = self._acquire()
+        delay = self._hedge_delay_seconds(primary)
+        if delay is None:
+            return self._call(primary, fn)
+
+        executor = self._get_executor()
+        futures: dict[Future, LLMBackend] = {executor.submit(self._call, primary, fn): primary}
+        pending = set(futures)
+        hedged = False
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=None if hedged else delay, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._record_winner(futures[future], hedged)
+                    for loser in pending:
+                        # 実行中のスレッドは中断できないため、結果を破棄する
+                        loser.cancel()
+                    return future.result()
+                error = future.exception()
+            if not hedged:
+                hedged = True
+                backend = self._start_hedge(primary, "error" if done else "slow")
+                future = executor.submit(self._call, backend, fn)
+                futures[future] = backend
+                pending.add(future)
+        raise error
+
+    async def _aroute(self, fn: Callable[[ChatOpenAI], Awaitable[T]]) -> T:
+        primary = self._acquire()
+        delay = self._hedge_delay_seconds(primary)
+        if delay is None:
+            return await self._acall(primary, fn)
+
+        tasks: dict[asyncio.Task, LLMBackend] = {asyncio.ensure_future(self._acall(primary, fn)): primary}
+        pending = set(tasks)
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=None if hedged else delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        self._record_winner(tasks[task], hedged)
+                        return task.result()
+                    error = task.exception()
+                if not hedged:
+                    hedged = True
+                    backend = self._start_hedge(primary, "error" if done else "slow")
+                    task = asyncio.ensure_future(self._acall(backend, fn))
+                    tasks[task] = backend
+                    pending.add(task)
+            raise error
+        finally:
+            # 採用されなかったリクエストはキャンセルし、バックエンドの負荷と接続を解放する
+            for task in pending:
+                task.cancel()
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # コールバックはルーター側の実行で通知されるため、バックエンドには run_manager を渡さない
+        return self._route(lambda llm: llm._generate(messages, stop=stop, **kwargs))
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await self._aroute(lambda llm: llm._agenerate(messages, stop=stop, **kwargs))
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        backend = self._acquire()
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield from backend.llm._stream(messages, stop=stop, **kwargs)
+            outcome = "success"
+        except GeneratorExit:
+            outcome = "cancelled"
+            raise
+        finally:
+            self._release(backend, started, outcome)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        backend = self._acquire()
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async for chunk in backend.llm._astream(messages, stop=stop, **kwargs):
+                yield chunk
+            outcome = "success"
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        finally:
+            self._release(backend, started, outcome)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            backends = [backend.stats() for backend in self.backends]
+        return {"model_name": self.model_name, "backends": backends}
@@ -0,0 +1,105 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+from app.core.metrics import NaviApiMetrics
+
+
+TIER_PRIMARY = "primary"
+TIER_LIGHTWEIGHT = "lightweight"
+
+# テナント毎に指定できるモード
+MODE_AUTO = "auto"
+
+DEFAULT_MODEL_ROUTING_SETTING = {
+    # llm_setting.lightweight が未設定の場合は有効にしても常に primary を使用する
+    "enabled": False,
+    # primary の実行待ちがこの件数以上の場合は混雑とみなす
+    "max_queue_depth": 2,
+    # primary の1回当たりの処理時間（移動平均）がこのミリ秒以上の場合は混雑とみなす
+    "max_latency_ms": 15000,
+    # 混雑時でも、これより長い質問は複雑とみなして primary で回答する
+    "max_question_chars": 120,
+    # 混雑時でも、検索結果の最上位の類似度がこれ未満の場合は primary で回答する
+    "min_retrieval_score": 0.6,
+    # 企業ID毎の上書き（例: {"1": {"mode": "primary"}, "2": {"max_queue_depth": 0}}）
+    # mode は auto（既定）・primary（常に primary）・lightweight（常に軽量モデル）
+    "tenants": {},
+}
+
+
+@dataclass
+class RoutingSignals:
+    # primary の実行待ちの件数
+    queue_depth: int
+    # primary の1回当たりの処理時間（実績が無い場合は None）
+    latency_ms: Optional[float]
+    question_chars: int
+    # 検索結果の最上位の類似度（不明な場合は None）
+    retrieval_score: Optional[float]
+
+
+@dataclass
+class RoutingDecision:
+    tier: str
+    reason: str
+
+    @property
+    def downgraded(self) -> bool:
+        return self.tier == TIER_LIGHTWEIGHT
+
+
+class ModelRoutingPolicy:
+    """
+    回答の生成に primary と軽量モデルのどちらを使うかを決める
+
+    primary が混雑している（実行待ちが多い・処理時間が長い）場合に限り、
+    短い質問かつ検索結果の確度が高い質問を軽量モデルに回す。
+    判定結果は llm.model_routing.requests{tier=...,reason=...} としてメトリクスに記録する。
+
+    設定は SSM の llm_setting.model_routing から取得する。
+    """
+
+    METRIC = "llm.model_routing.requests"
+
+    def __init__(self, setting: Optional[dict[str, Any]] = None) -> None:
+        self.setting = {**DEFAULT_MODEL_ROUTING_SETTING, **(setting or {})}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.setting.get("enabled"))
+
+    def tenant_setting(self, company_id: Optional[int]) -> dict[str, Any]:
+        """
+        企業ID毎の上書きを反映した設定を返す
+        """
+        tenants = self.setting.get("tenants") or {}
+        override = tenants.get(str(company_id)) if company_id is not None else None
+        return {"mode": MODE_AUTO, **self.setting, **(override or {})}
+
+    def decide(self, signals: RoutingSignals, company_id: Optional[int] = None) -> RoutingDecision:
+        if not self.enabled:
+            return RoutingDecision(TIER_PRIMARY, "disabled")
+
+        setting = self.tenant_setting(company_id)
+        mode = setting.get("mode")
+        if mode in (TIER_PRIMARY, TIER_LIGHTWEIGHT):
+            return RoutingDecision(mode, "tenant_override")
+
+        if signals.queue_depth >= setting.get("max_queue_depth"):
+            pressure = "queue_depth"
+        elif signals.latency_ms is not None and signals.latency_ms >= setting.get("max_latency_ms"):
+            pressure = "latency"
+        else:
+            return RoutingDecision(TIER_PRIMARY, "normal")
+
+        if signals.question_chars > setting.get("max_question_chars"):
+            return RoutingDecision(TIER_PRIMARY, "complex_question")
+        min_retrieval_score = setting.get("min_retrieval_score")
+        if min_retrieval_score is not None and (
+            signals.retrieval_score is None or signals.retrieval_score < min_retrieval_score
+        ):
+            return RoutingDecision(TIER_PRIMARY, "low_confidence")
+        return RoutingDecision(TIER_LIGHTWEIGHT, pressure)
+
+    @classmethod
+    def record(cls, decision: RoutingDecision) -> None:
+        NaviApiMetrics.increment(cls.METRIC, labels={"tier": decision.tier, "reason": decision.reason})
@@ -0,0 +1,201 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from importlib import metadata
+from typing import Any, Optional
+from botocore.exceptions import ClientError
+from langchain_core.documents import Document
+from app.core.aws.ssm_client import SsmClient
+from app.core.logging import NaviApiLog
+
+
+DEFAULT_CACHE_SETTING = {
+    # false の場合はキャッシュを使わず、毎回ダウンロード・解析する
+    "enabled": True,
+    # local: ローカルディスク（directory）に保存する / s3: S3（bucket・prefix）に保存する
+    "backend": "local",
+    # None の場合は一時ディレクトリ配下の navi_parsed_documents に保存する
+    "directory": None,
+    "bucket": None,
+    "prefix": "parsed_documents/",
+}
+
+# キャッシュのファイル形式を変更した場合に上げる
+CACHE_FORMAT_VERSION = 1
+
+# 解析結果に影響するパッケージ（更新した場合は解析し直す）
+_PARSER_PACKAGES = ("pypdf", "unstructured")
+
+
+@dataclass
+class ParsedDocuments:
+    documents: list[Document]
+    # ダウンロードしたファイルの内容の SHA-256（差分取り込みで変更の有無の判定に使用する）
+    content_hash: Optional[str] = None
+
+
+def parser_version(parser: Any, unstructured_kwargs: Optional[dict[str, Any]] = None) -> str:
+    """
+    解析の結果を変える要素（パーサーの種類・バージョン・設定、unstructured の引数、ライブラリのバージョン）を表す文字列
+    """
+    packages = {}
+    for package in _PARSER_PACKAGES:
+        try:
+            packages[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            packages[package] = None
+    return json.dumps(
+        {
+            "format": CACHE_FORMAT_VERSION,
+            "parser": getattr(parser, "__qualname__", type(parser).__qualname__),
+            "parser_version": getattr(parser, "cache_version", None),
+            "setting": getattr(parser, "setting", None),
+            "unstructured_kwargs": unstructured_kwargs or {},
+            "packages": packages,
+        },
+        sort_keys=True,
+        default=str,
+    )
+
+
+class ParsedDocumentCache:
+    """
+    解析したマニュアルのページ毎のテキストとメタデータを、S3 の ETag と解析のバージョンをキーに保存する
+
+    - 分割・埋め込みモデルを変更して取り込み直す場合に、ダウンロード・解析を省略する
+    - gzip で圧縮した JSON を local（ディレクトリ）または s3（バケット）に保存する
+    - 内容をキーにしているため古いエントリは参照されないだけで、いつ削除してもよい
+    - 読み書きに失敗した場合は警告のみ出力し、キャッシュが無い場合と同じく解析する
+
+    設定は SSM の ingestion_setting.cache から取得する。
+    """
+
+    def __init__(self, setting: Optional[dict[str, Any]] = None, s3_client: Any = None) -> None:
+        self.setting = {**DEFAULT_CACHE_SETTING, **(setting or {})}
+        self._s3_client = s3_client
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("ingestion_setting", default={})
+        cache_setting = setting.get("cache", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_CACHE_SETTING, **cache_setting}
+
+    @property
+    def enabled(self) -> bool:
+        if not self.setting.get("enabled"):
+            return False
+        if self.uses_s3 and not self.setting.get("bucket"):
+            NaviApiLog.warning("解析キャッシュの bucket が設定されていないため、キャッシュを使用しません")
+            return False
+        return True
+
+    @property
+    def uses_s3(self) -> bool:
+        return self.setting.get("backend") == "s3"
+
+    @property
+    def directory(self) -> str:
+        return self.setting.get("directory") or os.path.join(tempfile.gettempdir(), "navi_parsed_documents")
+
+    @property
+    def s3_client(self) -> Any:
+        if self._s3_client is None:
+            from app.core.aws.s3_client import S3Client
+
+            self._s3_client = S3Client().client
+        return self._s3_client
+
+    @staticmethod
+    def key(etag: str, version: str) -> str:
+        return hashlib.sha256(f"{etag}\n{version}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        # 1ディレクトリのファイル数が増えすぎないよう、キーの先頭2文字で分ける
+        return f"{key[:2]}/{key}.json.gz"
+
+    @staticmethod
+    def _encode(parsed: ParsedDocuments) -> bytes:
+        body = {
+            "content_hash": parsed.content_hash,
+            "pages": [
+                {"text": document.page_content, "metadata": document.metadata}
+                for document in parsed.documents
+            ],
+        }
+        return gzip.compress(json.dumps(body, ensure_ascii=False, default=str).encode("utf-8"))
+
+    @staticmethod
+    def _decode(data: bytes) -> ParsedDocuments:
+        body = json.loads(gzip.decompress(data).decode("utf-8"))
+        return ParsedDocuments(
+            documents=[Document(page_content=page["text"], metadata=page["metadata"]) for page in body["pages"]],
+            content_hash=body.get("content_hash"),
+        )
+
+    def _read(self, path: str) -> Optional[bytes]:
+        if self.uses_s3:
+            try:
+                response = self.s3_client.get_object(
+                    Bucket=self.setting.get("bucket"),
+                    Key=f"{self.setting.get('prefix')}{path}",
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                    return None
+                raise
+            return response["Body"].read()
+        local_path = os.path.join(self.directory, path)
+        if not os.path.exists(local_path):
+            return None
+        with open(local_path, "rb") as f:
+            return f.read()
+
+    def _write(self, path: str, data: bytes) -> None:
+        if self.uses_s3:
+            self.s3_client.put_object(
+                Bucket=self.setting.get("bucket"),
+                Key=f"{self.setting.get('prefix')}{path}",
+                Body=data,
+            )
+            return
+        local_path = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(local_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, local_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def get(self, key: str) -> Optional[ParsedDocuments]:
+        try:
+            data = self._read(self._path(key))
+            parsed = self._decode(data) if data is not None else None
+        except Exception as e:
+            NaviApiLog.warning(f"解析キャッシュの読み込みに失敗しました（解析し直します）: key={key} error={e}")
+            parsed = None
+        with self._lock:
+            if parsed is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return parsed
+
+    def put(self, key: str, parsed: ParsedDocuments) -> None:
+        try:
+            self._write(self._path(key), self._encode(parsed))
+        except Exception as e:
+            NaviApiLog.warning(f"解析キャッシュの書き込みに失敗しました: key={key} error={e}")
@@ -0,0 +1,155 @@
+import os
+import re
+import tempfile
+from typing import Any, Optional
+from langchain_core.documents import Document
+from app.core.aws.ssm_client import SsmClient
+from app.models.llm.document_loader import partition_file
+
+
+DEFAULT_PDF_SETTING = {
+    # false の場合はテキストレイヤーを使わず、全て unstructured で解析する
+    "text_layer_enabled": True,
+    # この文字数未満のページはスキャン画像等とみなし、unstructured（OCR）で解析し直す
+    "min_chars_per_page": 20,
+    # 文字化け（置換文字・制御文字・(cid:n)）の割合がこれを超えるページは unstructured で解析し直す
+    "max_invalid_ratio": 0.05,
+    # このページ数を超えるPDFはページ範囲毎に分けて、解析用のプロセスで並列に解析する
+    "pages_per_task": 20,
+}
+
+_INVALID_PATTERN = re.compile(r"\(cid:\d+\)|[\ufffd\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def is_low_quality(text: str, setting: dict[str, Any]) -> bool:
+    """
+    テキストレイヤーから取り出したページの文字列が使えない（空・文字化け）場合は True
+    """
+    stripped = "".join(text.split())
+    if len(stripped) < int(setting.get("min_chars_per_page")):
+        return True
+    invalid_chars = sum(len(match) for match in _INVALID_PATTERN.findall(stripped))
+    return invalid_chars / len(stripped) > float(setting.get("max_invalid_ratio"))
+
+
+class PdfTextExtractor:
+    """
+    PDFのテキストレイヤーから高速にテキストを取り出し、使えないページのみ unstructured で解析する
+
+    - ページ毎に pypdf でテキストを取り出し、空または文字化けしているページは
+      そのページだけのPDFを作って unstructured（strategy により OCR）で解析し直す
+    - pages_per_task ページを超えるPDFは page_ranges で分けたページ範囲毎に
+      ConcurrentDocumentLoader が解析用のプロセスに渡す
+    - PDF以外・pypdf で開けないPDFは unstructured でファイル全体を解析する
+
+    プロセスプールに渡すため、設定のみを保持する。設定は SSM の ingestion_setting.pdf から取得する。
+    """
+
+    # 取り出し方を変更した場合に上げる（解析キャッシュを使わずに解析し直す）
+    cache_version = 1
+
+    def __init__(self, setting: Optional[dict[str, Any]] = None) -> None:
+        self.setting = {**DEFAULT_PDF_SETTING, **(setting or {})}
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("ingestion_setting", default={})
+        pdf_setting = setting.get("pdf", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_PDF_SETTING, **pdf_setting}
+
+    def _uses_text_layer(self, local_path: str) -> bool:
+        return bool(self.setting.get("text_layer_enabled")) and local_path.lower().endswith(".pdf")
+
+    def page_ranges(self, local_path: str) -> list[tuple[int, int]]:
+        """
+        並列に解析するページ範囲（開始, 終了）のリストを返す（分けない場合は空）
+        ダウンロードしたスレッドから呼び出す。
+        """
+        if not self._uses_text_layer(local_path):
+            return []
+        try:
+            from pypdf import PdfReader
+
+            page_count = len(PdfReader(local_path).pages)
+        except Exception:
+            return []
+        pages_per_task = max(1, int(self.setting.get("pages_per_task")))
+        if page_count <= pages_per_task:
+            return []
+        return [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+
+    def __call__(self, local_path: str, unstructured_kwargs: Optional[dict[str, Any]] = None) -> list[Document]:
+        if not self._uses_text_layer(local_path):
+            return partition_file(local_path, unstructured_kwargs)
+        return self.extract_pages(local_path, 0, None, unstructured_kwargs)
+
+    def extract_pages(
+        self,
+        local_path: str,
+        start: int,
+        end: Optional[int],
+        unstructured_kwargs: Optional[dict[str, Any]] = None,
+    ) -> list[Document]:
+        """
+        start ページから end ページの手前までを解析し、ページ毎のドキュメントを返す（page_number は1始まり）
+        """
+        try:
+            from pypdf import PdfReader
+
+            reader = PdfReader(local_path)
+            pages = reader.pages[start:end]
+            texts = [page.extract_text() or "" for page in pages]
+        except Exception:
+            # pypdf が無い・壊れたPDF等の場合は unstructured で全体を解析する（ページ範囲を分けるのは pypdf で開けた場合のみ）
+            return partition_file(local_path, unstructured_kwargs)
+
+        documents = []
+        fallback_indexes = []
+        for index, text in enumerate(texts):
+            if is_low_quality(text, self.setting):
+                fallback_indexes.append(index)
+                documents.append(None)
+            else:
+                documents.append(Document(
+                    page_content=text,
+                    metadata={"page_number": start + index + 1, "extraction": "text_layer"},
+                ))
+        if fallback_indexes:
+            fallback_documents = self._partition_pages(reader, fallback_indexes, start, unstructured_kwargs)
+            for index, document in zip(fallback_indexes, fallback_documents):
+                documents[index] = document
+        return documents
+
+    @staticmethod
+    def _partition_pages(
+        reader: Any,
+        indexes: list[int],
+        start: int,
+        unstructured_kwargs: Optional[dict[str, Any]],
+    ) -> list[Document]:
+        """
+        指定したページのみのPDFを作成して unstructured で解析する
+        """
+        from pypdf import PdfWriter
+
+        writer = PdfWriter()
+        for index in indexes:
+            writer.add_page(reader.pages[start + index])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            subset_path = os.path.join(temp_dir, "pages.pdf")
+            with open(subset_path, "wb") as f:
+                writer.write(f)
+            partitioned = partition_file(subset_path, unstructured_kwargs)
+
+        # 作成したPDFのページ番号（1始まり）を元のページ番号に戻す
+        texts = {document.metadata.get("page_number"): document.page_content for document in partitioned}
+        if list(texts) == [None]:
+            # ページ番号が取れない場合は先頭のページにまとめる
+            texts = {1: texts[None]}
+        return [
+            Document(
+                page_content=texts.get(position + 1, ""),
+                metadata={"page_number": start + index + 1, "extraction": "unstructured"},
+            )
+            for position, index in enumerate(indexes)
+        ]
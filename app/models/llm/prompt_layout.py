@@ -0,0 +1,88 @@
+import threading
+from typing import Any, Optional
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+
+MODE_INLINE = "inline"
+MODE_PREFIX_STABLE = "prefix_stable"
+
+# 会話モードでこれまでのやり取り（要約を含む）を差し込む変数名
+HISTORY_VARIABLE = "history"
+
+DEFAULT_PROMPT_LAYOUT_SETTING = {
+    # inline: prompt_context をそのまま1つのメッセージとして送る
+    # prefix_stable: 固定部分（system_context・指示・テナントの前置き）を先頭のシステムメッセージにまとめ、
+    #                検索結果と質問を後ろのメッセージに置く
+    "mode": MODE_INLINE,
+    # prefix_stable 時に固定部分へ含める指示（{context}・{question} を含めない）
+    "instructions": "",
+    # prefix_stable 時に固定部分の後ろに置くテンプレート
+    "variable_template": "文脈:\n{context}\n\n質問: {question}",
+}
+
+
+class PromptLayout:
+    """
+    LLMに送るプロンプトの組み立て方を決める
+
+    prefix_stable モードでは、リクエスト毎に変わる検索結果・質問より前に、バイト列が変わらない固定部分を置く。
+    Ollama・vLLM などのバックエンドはリクエスト間で共通する先頭部分のKVキャッシュを再利用できるため、
+    固定部分のプリフィル（最初のトークンが出るまでの処理）を省略できる。
+
+    設定は SSM の question_llm_setting.prompt_layout から取得する（未設定時は従来どおり inline）。
+    """
+
+    _lock = threading.Lock()
+    _prompts: dict[tuple[str, str, str], ChatPromptTemplate] = {}
+
+    def __init__(self, question_llm_setting: dict[str, Any], tenant_preamble: Optional[str] = None) -> None:
+        self.question_llm_setting = question_llm_setting
+        self.setting = {**DEFAULT_PROMPT_LAYOUT_SETTING, **(question_llm_setting.get("prompt_layout") or {})}
+        self.tenant_preamble = tenant_preamble
+        if self.mode not in (MODE_INLINE, MODE_PREFIX_STABLE):
+            raise ValueError(f"prompt_layout.modeが不正です: {self.mode}")
+
+    @property
+    def mode(self) -> str:
+        return self.setting.get("mode")
+
+    @property
+    def static_prefix(self) -> str:
+        """
+        リクエスト間で共通の先頭部分（改行・空白の揺れでキャッシュが外れないよう正規化する）
+        """
+        parts = [
+            self.question_llm_setting.get("system_context"),
+            self.tenant_preamble,
+            self.setting.get("instructions"),
+        ]
+        return "\n\n".join(part.strip() for part in parts if part and part.strip())
+
+    def build_prompt(self) -> ChatPromptTemplate:
+        """
+        {context}・{question}（会話モードでは history も）を受け取るプロンプトを返す
+        同じ設定のプロンプトはプロセス内で使い回す
+        """
+        if self.mode == MODE_PREFIX_STABLE:
+            key = (self.mode, self.static_prefix, self.setting.get("variable_template"))
+        else:
+            key = (self.mode, "", self.question_llm_setting.get("prompt_context"))
+        with self._lock:
+            prompt = self._prompts.get(key)
+            if prompt is None:
+                prompt = self._create_prompt(key[1], key[2])
+                self._prompts[key] = prompt
+            return prompt
+
+    def _create_prompt(self, static_prefix: str, template: str) -> ChatPromptTemplate:
+        # 会話履歴は固定部分の後ろ・今回の質問の前に置く（履歴が無い場合は何も追加しない）
+        history = MessagesPlaceholder(HISTORY_VARIABLE, optional=True)
+        if self.mode == MODE_INLINE:
+            return ChatPromptTemplate.from_messages([history, ("human", template)])
+        # 固定部分はテンプレートとして解釈させず、そのままの文字列で送る（波括弧のエスケープも不要）
+        return ChatPromptTemplate.from_messages([
+            SystemMessage(content=static_prefix),
+            history,
+            ("human", template),
+        ])
@@ -1,35 +1,67 @@
 from pydantic import BaseModel, Field
 from typing import Annotated, Any, Optional
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
-import operator
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage, RemoveMessage
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda, RunnableParallel, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
 from app.models.llm.base_llm_model import BaseLLMModel
+from app.core.utils.admission_controller import AdmissionRejectedError
+from app.models.llm.context_packer import ContextPacker
+from app.models.llm.conversation_memory import ConversationMemory
+from app.models.llm.first_token_callback import FirstTokenLatencyHandler
+from app.models.llm.prompt_layout import PromptLayout
 from langgraph.graph.state import CompiledStateGraph
 from app.core.logging import NaviApiLog
 
 
 class State(BaseModel):
     query: str
-    messages: Annotated[list[BaseMessage], operator.add] = Field(default=[])
+    # 呼び出し側で計算済みのクエリ埋め込み（指定時はベクトル検索で再計算しない）
+    query_embedding: Optional[list[float]] = None
+    # RemoveMessage を返すことで要約済みのメッセージを削除できる
+    messages: Annotated[list[BaseMessage], add_messages] = Field(default=[])
+    # 会話モードで要約済みの古いやり取り
+    # （既定値を None にしておくことで、2ターン目以降の入力が保存済みの要約を上書きしない）
+    summary: Optional[str] = None
+
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "あなたは会話の記録係です。これまでの要約と新しいやり取りを1つの要約にまとめてください。"
+        "後続の質問に回答するために必要な事実・条件・ユーザーの関心事を残し、挨拶や重複は省いてください。"
+        "出力は要約の本文のみとしてください。"
+    ),
+    ("human", "これまでの要約:\n{summary}\n\n新しいやり取り:\n{conversation}"),
+])
 
 
 class QuestionLLMModel(BaseLLMModel):
-    def __init__(self, file_paths: list[str], collection_name: str = "manuals") -> None:
+    def __init__(
+        self,
+        file_paths: list[str],
+        collection_name: str = "manuals",
+        tenant_preamble: Optional[str] = None,
+        company_id: Optional[int] = None
+    ) -> None:
         """
         質問応答用のLLMモデルを初期化する
         
         Args:
             file_paths: フィルタリングするファイルパスのリスト
             collection_name: 使用するコレクション名
+            tenant_preamble: テナント毎に固定の前置き（prefix_stable 時にプロンプトの固定部分へ含める）
+            company_id: 企業ID（混雑時のモデル選択のテナント毎の上書きに使用する）
             
         Raises:
             ValueError: question_llm_settingの設定値が不正な場合
             Exception: 初期化に失敗した場合
         """
-        super().__init__(file_paths=file_paths, collection_name=collection_name)
+        super().__init__(file_paths=file_paths, collection_name=collection_name, company_id=company_id)
         
         try:
             self.question_llm_setting = self.params.get_parameter("question_llm_setting")
@@ -41,6 +73,20 @@ class QuestionLLMModel(BaseLLMModel):
             missing_keys = [key for key in required_keys if not self.question_llm_setting.get(key)]
             if missing_keys:
                 raise KeyError(f"question_llm_settingに必須キーが不足しています: {', '.join(missing_keys)}")
+            
+            # 検索結果をプロンプトに埋め込む前に整形・重複除去し、トークン上限内に収める
+            self.context_packer = ContextPacker(
+                setting=self.question_llm_setting.get("context"),
+                model_name=self.llm.model_name
+            )
+
+            # プロンプトは設定値から1度だけ組み立て、リクエスト毎に作り直さない
+            self.prompt_layout = PromptLayout(self.question_llm_setting, tenant_preamble=tenant_preamble)
+            self.prompt = self.prompt_layout.build_prompt()
+            self.first_token_handler = FirstTokenLatencyHandler(labels={"prompt_layout": self.prompt_layout.mode})
+
+            # 会話モードの履歴の保持・要約の設定
+            self.conversation_setting = ConversationMemory.get_setting(self.question_llm_setting)
                 
             NaviApiLog.info("QuestionLLMModelを正常に初期化しました")
         except Exception as e:
@@ -80,12 +126,118 @@ class QuestionLLMModel(BaseLLMModel):
             NaviApiLog.error(f"メッセージの追加に失敗しました: {e}")
             raise RuntimeError("メッセージの処理に失敗しました")
 
-    def llm_response(self, state: State) -> dict[str, Any]:
+    def _build_chain(self, state: State, async_mode: bool = False) -> Runnable:
+        """
+        コンテキスト検索とLLM呼び出しを行うチェーンを構築する
+        
+        Args:
+            state: 現在の状態
+            async_mode: 非同期のVector Storeで検索する場合は True
+            
+        Returns:
+            Runnable: question/context/answer を出力するチェーン
+        """
+        if not self.question_llm_setting.get("prompt_context"):
+            raise KeyError("prompt_contextが設定されていません")
+        
+        routing: dict[str, Any] = {"retrieval_score": None}
+        if self.uses_model_routing:
+            context_retriever = self._create_scored_retriever(state, routing)
+        elif state.query_embedding:
+            query_embedding = state.query_embedding
+            context_retriever = RunnableLambda(
+                lambda _: self.search_by_vector(query_embedding),
+                afunc=lambda _: self.asearch_by_vector(query_embedding),
+            )
+        elif async_mode:
+            context_retriever = self.create_async_retriever()
+        else:
+            context_retriever = self.retriever
+        history = self._history_messages(state)
+        return RunnableParallel(
+            {
+                "question": RunnablePassthrough(),
+                "context": context_retriever
+                | RunnableLambda(self.expand_sources, name="expand_sources")
+                | RunnableLambda(self.context_packer.pack, name="pack_context"),
+                "history": RunnableLambda(lambda _: history, name="history"),
+            }
+        ).assign(
+            answer=self.prompt
+            | self._create_llm_step(state, routing)
+            | StrOutputParser()
+        )
+
+    def _create_scored_retriever(self, state: State, routing: dict[str, Any]) -> Runnable:
+        """
+        検索結果の最上位の類似度を routing に記録しながら検索する（混雑時のモデル選択に使用する）
+        """
+        def to_documents(results: list[tuple[Document, float]]) -> list[Document]:
+            routing["retrieval_score"] = max((score for _, score in results), default=None)
+            return [document for document, _ in results]
+
+        def search(query: str) -> list[Document]:
+            embedding = state.query_embedding or self.embed_query(query)
+            return to_documents(self.search_with_score_by_vector(embedding))
+
+        async def asearch(query: str) -> list[Document]:
+            embedding = state.query_embedding or await self.aembed_query(query)
+            return to_documents(await self.asearch_with_score_by_vector(embedding))
+
+        return RunnableLambda(search, afunc=asearch, name="retriever")
+
+    def _create_llm_step(self, state: State, routing: dict[str, Any]) -> Runnable:
+        """
+        検索が終わった時点で回答に使うLLMを選び、そのLLMの実行枠を取得してから呼び出す
+        （軽量モデルに回したリクエストは primary の実行枠を消費しない）
+        """
+        def invoke(prompt: PromptValue, config: RunnableConfig) -> BaseMessage:
+            llm, admission = self.select_llm(state.query, routing["retrieval_score"])
+            with admission.slot():
+                return llm.with_config(callbacks=[self.first_token_handler]).invoke(prompt, config=config)
+
+        async def ainvoke(prompt: PromptValue, config: RunnableConfig) -> BaseMessage:
+            llm, admission = self.select_llm(state.query, routing["retrieval_score"])
+            async with admission.aslot():
+                return await llm.with_config(callbacks=[self.first_token_handler]).ainvoke(prompt, config=config)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name="llm")
+
+    @staticmethod
+    def _history_messages(state: State) -> list[BaseMessage]:
+        """
+        今回の質問より前のやり取りをプロンプトに含めるメッセージとして返す
+        システムメッセージはプロンプトの固定部分に含まれるため除き、要約済みの部分は要約として先頭に置く
+        """
+        history: list[BaseMessage] = []
+        if state.summary:
+            history.append(SystemMessage(content=f"これまでの会話の要約:\n{state.summary}"))
+        history.extend(message for message in state.messages[:-1] if not isinstance(message, SystemMessage))
+        return history
+
+    def _to_response(self, output: Any) -> dict[str, Any]:
+        """
+        チェーンの出力を状態に追加するメッセージに変換する
+        """
+        if not isinstance(output, dict):
+            NaviApiLog.error(f"チェーンから予期しない出力タイプを受け取りました: {type(output)}")
+            return {"messages": [AIMessage(content="回答の生成に失敗しました。")]}
+        
+        answer = output.get("answer")
+        if not answer:
+            NaviApiLog.warning("LLMから空の回答を受け取りました")
+            answer = "回答を生成できませんでした。別の質問をお試しください。"
+        
+        NaviApiLog.info("LLM応答を正常に生成しました")
+        return {"messages": [AIMessage(content=answer)]}
+
+    def llm_response(self, state: State, config: Optional[RunnableConfig] = None) -> dict[str, Any]:
         """
         LLMを使用して応答を生成する
         
         Args:
             state: 現在の状態
+            config: LangGraphから渡される実行設定（ストリーミング用のコールバックをチェーンへ伝播する）
             
         Returns:
             dict[str, Any]: 生成された応答を含む辞書
@@ -97,32 +249,36 @@ class QuestionLLMModel(BaseLLMModel):
             if not state.query:
                 NaviApiLog.warning("llm_responseに空のクエリが提供されました")
                 return {"messages": [AIMessage(content="質問が空です。質問を入力してください。")]}
-            prompt_context = self.question_llm_setting.get("prompt_context")
-            if not prompt_context:
-                raise KeyError("prompt_contextが設定されていません")
             
-            prompt = ChatPromptTemplate.from_template(prompt_context)
-            chain = RunnableParallel(
-                {
-                    "question": RunnablePassthrough(),
-                    "context": self.retriever,
-                }
-            ).assign(answer=prompt | self.llm | StrOutputParser())
+            chain = self._build_chain(state)
+            output = chain.invoke(state.query, config=config)
+            return self._to_response(output)
             
-            output = chain.invoke(state.query)
-            
-            if not isinstance(output, dict):
-                NaviApiLog.error(f"チェーンから予期しない出力タイプを受け取りました: {type(output)}")
-                return {"messages": [AIMessage(content="回答の生成に失敗しました。")]}
-            
-            answer = output.get("answer")
-            if not answer:
-                NaviApiLog.warning("LLMから空の回答を受け取りました")
-                answer = "回答を生成できませんでした。別の質問をお試しください。"
+        except AdmissionRejectedError:
+            raise
+        except KeyError as e:
+            NaviApiLog.error(f"LLM応答の設定エラー: {e}")
+            raise KeyError("設定に不備があります")
+        except Exception as e:
+            NaviApiLog.error(f"LLM応答の予期しないエラー: {e}")
+            raise RuntimeError("回答の生成中にエラーが発生しました")
+
+    async def allm_response(self, state: State, config: Optional[RunnableConfig] = None) -> dict[str, Any]:
+        """
+        llm_response の非同期版
+        グラフを ainvoke で実行した場合に呼び出され、検索とLLM呼び出しをイベントループ上で待機する
+        """
+        try:
+            if not state.query:
+                NaviApiLog.warning("llm_responseに空のクエリが提供されました")
+                return {"messages": [AIMessage(content="質問が空です。質問を入力してください。")]}
             
-            NaviApiLog.info("LLM応答を正常に生成しました")
-            return {"messages": [AIMessage(content=answer)]}
+            chain = self._build_chain(state, async_mode=True)
+            output = await chain.ainvoke(state.query, config=config)
+            return self._to_response(output)
             
+        except AdmissionRejectedError:
+            raise
         except KeyError as e:
             NaviApiLog.error(f"LLM応答の設定エラー: {e}")
             raise KeyError("設定に不備があります")
@@ -130,9 +286,73 @@ class QuestionLLMModel(BaseLLMModel):
             NaviApiLog.error(f"LLM応答の予期しないエラー: {e}")
             raise RuntimeError("回答の生成中にエラーが発生しました")
 
-    def get_graph(self) -> CompiledStateGraph:
+    def _messages_to_summarize(self, state: State) -> list[BaseMessage]:
+        """
+        会話履歴のトークン数が上限を超えた場合に、要約にまとめる古いメッセージを返す
+        直近の keep_recent_messages 件は要約せずに残す
+        """
+        messages = [message for message in state.messages if not isinstance(message, SystemMessage)]
+        token_counter = self.context_packer.token_counter
+        history_tokens = sum(token_counter.count(str(message.content)) for message in messages)
+        if history_tokens <= self.conversation_setting.get("max_history_tokens"):
+            return []
+        keep = max(0, int(self.conversation_setting.get("keep_recent_messages")))
+        return messages[:len(messages) - keep] if keep else messages
+
+    def _summary_input(self, state: State, messages: list[BaseMessage]) -> dict[str, str]:
+        lines = []
+        for message in messages:
+            speaker = "ユーザー" if isinstance(message, HumanMessage) else "アシスタント"
+            lines.append(f"{speaker}: {message.content}")
+        return {"summary": state.summary or "なし", "conversation": "\n".join(lines)}
+
+    def _to_summary_update(self, summary: str, messages: list[BaseMessage]) -> dict[str, Any]:
+        NaviApiLog.info(f"会話履歴を要約しました。要約したメッセージ数={len(messages)}")
+        return {
+            "summary": summary.strip(),
+            "messages": [RemoveMessage(id=message.id) for message in messages],
+        }
+
+    def summarize_history(self, state: State) -> dict[str, Any]:
+        """
+        会話履歴が上限を超えた場合に古いやり取りを要約へまとめ、1ターン当たりのプロンプトの大きさを一定に保つ
+
+        要約に失敗した場合は履歴をそのまま残し、次のターンで再度要約する
+        """
+        messages = self._messages_to_summarize(state)
+        if not messages:
+            return {}
+        try:
+            with self.admission.slot():
+                summary = (SUMMARY_PROMPT | self.llm | StrOutputParser()).invoke(self._summary_input(state, messages))
+        except Exception as e:
+            NaviApiLog.warning(f"会話履歴の要約に失敗しました。履歴をそのまま保持します。error={e}")
+            return {}
+        return self._to_summary_update(summary, messages)
+
+    async def asummarize_history(self, state: State) -> dict[str, Any]:
+        """
+        summarize_history の非同期版
+        """
+        messages = self._messages_to_summarize(state)
+        if not messages:
+            return {}
+        try:
+            async with self.admission.aslot():
+                summary = await (SUMMARY_PROMPT | self.llm | StrOutputParser()).ainvoke(
+                    self._summary_input(state, messages)
+                )
+        except Exception as e:
+            NaviApiLog.warning(f"会話履歴の要約に失敗しました。履歴をそのまま保持します。error={e}")
+            return {}
+        return self._to_summary_update(summary, messages)
+
+    def get_graph(self, conversational: bool = False) -> CompiledStateGraph:
         """
         LangGraphの実行グラフを構築して返す
+
+        Args:
+            conversational: 会話モードの場合は True（thread_id 毎に履歴を保存し、上限を超えた履歴を要約する）
         
         Returns:
             CompiledStateGraph: コンパイル済みの状態グラフ
@@ -143,13 +363,28 @@ class QuestionLLMModel(BaseLLMModel):
         try:
             graph = StateGraph(State)
             graph.add_node("add_message", self.add_message)
-            graph.add_node("llm_response", self.llm_response)
+            # invoke/stream では llm_response、ainvoke では allm_response が実行される
+            graph.add_node(
+                "llm_response",
+                RunnableLambda(self.llm_response, afunc=self.allm_response, name="llm_response")
+            )
 
             graph.set_entry_point("add_message")
             graph.add_edge("add_message", "llm_response")
-            graph.add_edge("llm_response", END)
+
+            checkpointer = None
+            if conversational:
+                graph.add_node(
+                    "summarize_history",
+                    RunnableLambda(self.summarize_history, afunc=self.asummarize_history, name="summarize_history")
+                )
+                graph.add_edge("llm_response", "summarize_history")
+                graph.add_edge("summarize_history", END)
+                checkpointer = ConversationMemory.get_checkpointer(self.conversation_setting)
+            else:
+                graph.add_edge("llm_response", END)
             
-            compiled_graph = graph.compile()
+            compiled_graph = graph.compile(checkpointer=checkpointer)
             NaviApiLog.info("LangGraphを正常にコンパイルしました")
             return compiled_graph
         except Exception as e:
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sqlite3
+from typing import Any, AsyncIterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+
+class SqliteConversationSaver(SqliteSaver):
+    """
+    会話数に上限を設けた SqliteSaver
+
+    - 会話（thread_id）毎に最新のチェックポイントのみを残し、古いチェックポイント・書き込みを削除する
+    - 会話数が上限を超えた場合は最終更新が最も古い会話から削除する
+    - 非同期版のメソッドは同期版を別スレッドで実行する（接続はロックで直列化される）
+    """
+
+    def __init__(self, conn: sqlite3.Connection, max_conversations: int) -> None:
+        super().__init__(conn)
+        self.max_conversations = max_conversations
+
+    @classmethod
+    def from_path(cls, path: str, max_conversations: int) -> "SqliteConversationSaver":
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 接続は SqliteSaver のロックで直列化されるため、スレッド間で共有する
+        return cls(sqlite3.connect(path, check_same_thread=False), max_conversations=max_conversations)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        configurable = next_config["configurable"]
+        params = (configurable["thread_id"], configurable["checkpoint_ns"], configurable["checkpoint_id"])
+        with self.cursor() as cur:
+            cur.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id <> ?",
+                params,
+            )
+            cur.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id <> ?",
+                params,
+            )
+            # チェックポイントIDは時刻順に並ぶため、最大値を会話の最終更新として扱う
+            cur.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id "
+                "ORDER BY MAX(checkpoint_id) DESC LIMIT -1 OFFSET ?",
+                (self.max_conversations,),
+            )
+            evicted = [(row[0],) for row in cur.fetchall()]
+            if evicted:
+                cur.executemany("DELETE FROM checkpoints WHERE thread_id = ?", evicted)
+                cur.executemany("DELETE FROM writes WHERE thread_id = ?", evicted)
+        return next_config
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
@@ -0,0 +1,117 @@
+import re
+from typing import Any, Iterator, Optional
+from langchain_core.documents import Document
+from app.core.aws.ssm_client import SsmClient
+from app.models.llm.context_packer import TokenCounter
+
+
+DEFAULT_SPLITTER_SETTING = {
+    # false の場合は分割せず、ロードしたドキュメント（ページ）をそのまま埋め込む
+    "enabled": True,
+    # 1チャンクのトークン数の上限
+    "chunk_size": 400,
+    # 前のチャンクの末尾から引き継ぐトークン数の上限（文単位で引き継ぐ）
+    "chunk_overlap": 50,
+    # tiktokenのエンコーディング名（未指定時は o200k_base）
+    "encoding": None,
+}
+
+# 文末（句点・感嘆符・疑問符と、それに続く閉じ括弧）または改行までを1文とする
+_SENTENCE_PATTERN = re.compile(r"[^。．！？!?\n]*(?:[。．！？!?]+[」』）)】〕”’]*|\n+|$)")
+
+
+class JapaneseTextSplitter:
+    """
+    ドキュメントを日本語の文の区切りでチャンクに分割する
+
+    - 句点（。．）・感嘆符・疑問符・改行で文に区切り、chunk_size トークンまで文を詰める
+    - 1文が chunk_size を超える場合はトークン数で切る
+    - 次のチャンクの先頭に、前のチャンクの末尾の文を chunk_overlap トークンまで重ねる
+    - チャンクのメタデータには元のドキュメントのメタデータに加えて
+      page_number（ページ番号が分かる場合）と chunk_index（ファイル内の連番）を設定する
+
+    設定は SSM の ingestion_setting.splitter から取得する。
+    """
+
+    def __init__(self, setting: Optional[dict[str, Any]] = None) -> None:
+        self.setting = {**DEFAULT_SPLITTER_SETTING, **(setting or {})}
+        self.chunk_size = max(1, int(self.setting.get("chunk_size")))
+        # 重なりがチャンクの大きさ以上だと分割が進まないため、半分までに抑える
+        self.chunk_overlap = min(max(0, int(self.setting.get("chunk_overlap"))), self.chunk_size // 2)
+        self.token_counter = TokenCounter(encoding_name=self.setting.get("encoding"))
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("ingestion_setting", default={})
+        splitter_setting = setting.get("splitter", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_SPLITTER_SETTING, **splitter_setting}
+
+    @classmethod
+    def from_setting(cls) -> Optional["JapaneseTextSplitter"]:
+        """
+        設定が有効な場合は分割器を返す（無効な場合は None）
+        """
+        setting = cls.get_setting()
+        if not setting.get("enabled"):
+            return None
+        return cls(setting)
+
+    @staticmethod
+    def split_sentences(text: str) -> list[str]:
+        return [sentence for sentence in _SENTENCE_PATTERN.findall(text) if sentence.strip()]
+
+    def _split_long_sentence(self, sentence: str) -> Iterator[str]:
+        while sentence:
+            piece = self.token_counter.truncate(sentence, self.chunk_size)
+            if not piece:
+                # 1トークンで chunk_size を超えることは無いが、進まない場合は1文字ずつ切る
+                piece = sentence[:1]
+            yield piece
+            sentence = sentence[len(piece):]
+
+    def _overlap(self, sentences: list[tuple[str, int]]) -> list[tuple[str, int]]:
+        overlap = []
+        tokens = 0
+        for sentence, sentence_tokens in reversed(sentences):
+            if tokens + sentence_tokens > self.chunk_overlap:
+                break
+            overlap.insert(0, (sentence, sentence_tokens))
+            tokens += sentence_tokens
+        return overlap
+
+    def split_text(self, text: str) -> list[str]:
+        chunks = []
+        current: list[tuple[str, int]] = []
+        current_tokens = 0
+        # 直前のチャンクから引き継いだ文の数（引き継いだ文だけのチャンクは作らない）
+        carried = 0
+        for sentence in self.split_sentences(text):
+            sentence_tokens = self.token_counter.count(sentence)
+            pieces = [(sentence, sentence_tokens)]
+            if sentence_tokens > self.chunk_size:
+                pieces = [(piece, self.token_counter.count(piece)) for piece in self._split_long_sentence(sentence)]
+            for piece, piece_tokens in pieces:
+                if current_tokens + piece_tokens > self.chunk_size and len(current) > carried:
+                    chunks.append("".join(sentence for sentence, _ in current).strip())
+                    current = self._overlap(current)
+                    current_tokens = sum(tokens for _, tokens in current)
+                    carried = len(current)
+                    # 重なりを含めると上限を超える場合は重ねない
+                    if current_tokens + piece_tokens > self.chunk_size:
+                        current, current_tokens, carried = [], 0, 0
+                current.append((piece, piece_tokens))
+                current_tokens += piece_tokens
+        if len(current) > carried:
+            chunks.append("".join(sentence for sentence, _ in current).strip())
+        return [chunk for chunk in chunks if chunk]
+
+    def __call__(self, documents: list[Document]) -> list[Document]:
+        """
+        1ファイル分のドキュメント（ページ毎または1件）を分割する
+        """
+        chunks = []
+        for document in documents:
+            for text in self.split_text(document.page_content):
+                metadata = {**document.metadata, "chunk_index": len(chunks)}
+                chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
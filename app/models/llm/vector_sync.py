@@ -0,0 +1,467 @@
+import uuid
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, ContextManager, Iterable, Optional
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import BigInteger, Column, DateTime, Integer, MetaData, String, Table, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from app.core.logging import NaviApiLog
+from app.models.llm.chunk_dedup import ChunkDeduplicator
+from app.models.llm.document_loader import ConcurrentDocumentLoader, LoadResult
+from app.models.llm.ingestion_pipeline import IngestionPipeline, embed_texts
+from app.models.llm.vector_writer import PgVectorBulkWriter
+from app.repositories.manual_repository import ManualDto
+
+
+manifest_metadata = MetaData()
+
+# ベクターストアに取り込んだマニュアルの状態（前回の同期時点）
+# ベクトルと同じトランザクションで更新するため、ベクターストアと同じ PostgreSQL に保存する
+ingestion_manifest = Table(
+    "ingestion_manifest",
+    manifest_metadata,
+    Column("collection_name", String, primary_key=True),
+    Column("source", String, primary_key=True),
+    Column("etag", String, nullable=True),
+    Column("size", BigInteger, nullable=True),
+    Column("content_hash", String(64), nullable=True),
+    Column("manual_updated_at", DateTime, nullable=True),
+    Column("chunks", Integer, nullable=False, default=0),
+    Column("synced_at", DateTime, nullable=False, server_default=func.now()),
+)
+
+
+@dataclass
+class SourceState:
+    """同期対象のマニュアルの現在の状態（S3 のオブジェクトと MySQL のマニュアル）"""
+    source: str
+    key: str
+    etag: Optional[str] = None
+    size: Optional[int] = None
+    manual_updated_at: Optional[datetime] = None
+
+
+@dataclass
+class ManifestEntry:
+    source: str
+    etag: Optional[str] = None
+    size: Optional[int] = None
+    content_hash: Optional[str] = None
+    manual_updated_at: Optional[datetime] = None
+    chunks: int = 0
+
+
+@dataclass
+class SyncPlan:
+    # 新規・変更の可能性があるもの（ダウンロードして内容のハッシュで判定する）
+    added: list[SourceState] = field(default_factory=list)
+    changed: list[SourceState] = field(default_factory=list)
+    unchanged: list[SourceState] = field(default_factory=list)
+    # S3 から削除された、または MySQL で論理削除されたマニュアルの source
+    removed: list[str] = field(default_factory=list)
+
+
+@dataclass
+class SyncStats:
+    added: int = 0
+    updated: int = 0
+    # ETag 等は変わったが内容が同じため、埋め込み直さなかったもの
+    touched: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    failed_files: list[str] = field(default_factory=list)
+    chunks: int = 0
+    # 他のマニュアルと内容が同じため、埋め込まずに既存の行を参照したチャンク数
+    shared_chunks: int = 0
+
+
+def manual_key(manual: ManualDto) -> str:
+    """
+    マニュアルの S3 のキー（{企業ID}/{アプリケーションID}/{マニュアルID}.{拡張子}）
+    """
+    return f"{manual.company_id}/{manual.application_id}/{manual.manual_id}.{manual.file_extension}"
+
+
+def _normalize_etag(etag: Optional[str]) -> Optional[str]:
+    return etag.strip('"') if etag else etag
+
+
+class VectorSyncEngine:
+    """
+    S3 のマニュアルとベクターストアを差分で同期する
+
+    - S3 の ETag・サイズと MySQL のマニュアルの更新日時を前回の同期時点（ingestion_manifest）と比較し、
+      変わっていないマニュアルはダウンロードしない
+    - 変わったマニュアルはダウンロードして内容のハッシュを比較し、内容が変わった場合のみ埋め込み直す
+    - S3 から削除された、または MySQL で論理削除されたマニュアルのベクトルを削除する
+    - 1マニュアル毎に 古いベクトルの削除・新しいベクトルの追加・マニフェストの更新 を1トランザクションで確定する
+      （途中で失敗しても、マニュアル毎に古い状態か新しい状態のどちらかになる）
+    - deduplicator を指定した場合は、アプリケーション内の他のマニュアルと内容が同じチャンクを埋め込まずに既存の行で参照する
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        vector_store: Any,
+        embeddings: Embeddings,
+        loader: Optional[ConcurrentDocumentLoader] = None,
+        splitter: Optional[Callable[[list[Document]], list[Document]]] = None,
+        setting: Optional[dict[str, Any]] = None,
+        writer: Optional[PgVectorBulkWriter] = None,
+        deduplicator: Optional[ChunkDeduplicator] = None,
+    ) -> None:
+        self.bucket_name = bucket_name
+        self.vector_store = vector_store
+        self.embeddings = embeddings
+        self.loader = loader or ConcurrentDocumentLoader(
+            bucket_name=bucket_name,
+            setting=ConcurrentDocumentLoader.get_setting(),
+        )
+        self.splitter = splitter or (lambda documents: documents)
+        self.setting = setting or IngestionPipeline.get_setting()
+        # 指定した場合は COPY で書き込む（未指定の場合は INSERT で書き込む）
+        self.writer = writer
+        self.deduplicator = deduplicator if deduplicator is not None and deduplicator.enabled else None
+        self.shared_chunks = 0
+
+    @property
+    def collection_name(self) -> str:
+        return self.vector_store.collection_name
+
+    def source_of(self, key: str) -> str:
+        return f"{self.bucket_name}/{key}"
+
+    def build_states(self, objects: Iterable[dict], manuals: list[ManualDto]) -> list[SourceState]:
+        """
+        S3 のオブジェクトのうち、MySQL に削除されていないマニュアルとして登録されているものを同期対象とする
+        objects は1度だけ順に読むため、S3Client.iter_objects 等のジェネレーターを渡せる
+        """
+        manuals_by_key = {manual_key(manual): manual for manual in manuals}
+        states = []
+        object_count = 0
+        for obj in objects:
+            object_count += 1
+            key = obj.get("Key")
+            manual = manuals_by_key.get(key)
+            if manual is None:
+                continue
+            states.append(SourceState(
+                source=self.source_of(key),
+                key=key,
+                etag=_normalize_etag(obj.get("ETag")),
+                size=obj.get("Size"),
+                manual_updated_at=manual.updated_at,
+            ))
+        NaviApiLog.info(f"バケット内の{object_count}個のファイルのうち、{len(states)}個が同期対象です。")
+        return states
+
+    @staticmethod
+    def plan(
+        states: list[SourceState],
+        manifest: dict[str, ManifestEntry],
+        vector_sources: set[str],
+    ) -> SyncPlan:
+        """
+        現在の状態とマニフェストを比較して同期の計画を作成する
+
+        マニフェストに無いが既にベクトルがある source（マニフェスト導入前の取り込み分）は
+        変更ありとして埋め込み直し、同期対象でなければ削除する。
+        """
+        plan = SyncPlan()
+        current_sources = set()
+        for state in states:
+            current_sources.add(state.source)
+            entry = manifest.get(state.source)
+            if entry is None:
+                if state.source in vector_sources:
+                    plan.changed.append(state)
+                else:
+                    plan.added.append(state)
+            elif (
+                entry.etag != state.etag
+                or entry.size != state.size
+                or entry.manual_updated_at != state.manual_updated_at
+            ):
+                plan.changed.append(state)
+            else:
+                plan.unchanged.append(state)
+        plan.removed = sorted((set(manifest) | vector_sources) - current_sources)
+        return plan
+
+    def sync(self, objects: Iterable[dict], manuals: list[ManualDto]) -> SyncStats:
+        """
+        S3 のオブジェクト一覧と MySQL のマニュアルに合わせてベクターストアを更新する
+        """
+        self._ensure_manifest_table()
+        manifest = self._load_manifest()
+        plan = self.plan(
+            states=self.build_states(objects, manuals),
+            manifest=manifest,
+            vector_sources=self._load_vector_sources(),
+        )
+        NaviApiLog.info(
+            f"ベクターストアの同期を開始します。"
+            f"collection={self.collection_name} "
+            f"新規={len(plan.added)} "
+            f"変更の可能性あり={len(plan.changed)} "
+            f"変更なし={len(plan.unchanged)} "
+            f"削除={len(plan.removed)}"
+        )
+        stats = SyncStats(unchanged=len(plan.unchanged))
+        self.shared_chunks = 0
+
+        for source in plan.removed:
+            try:
+                self.remove_document(source)
+                stats.removed += 1
+            except Exception as e:
+                NaviApiLog.error(f"ベクトルの削除に失敗しました: source={source} error={e}")
+                stats.failed_files.append(source)
+
+        targets = {state.key: state for state in plan.added + plan.changed}
+        with self._deferred_ann_indexes(len(targets)):
+            self._sync_targets(targets, {state.key for state in plan.added}, manifest, stats)
+        stats.shared_chunks = self.shared_chunks
+
+        NaviApiLog.info(
+            f"ベクターストアの同期が完了しました。"
+            f"追加={stats.added} "
+            f"更新={stats.updated} "
+            f"内容変更なし={stats.touched} "
+            f"変更なし={stats.unchanged} "
+            f"削除={stats.removed} "
+            f"失敗={len(stats.failed_files)} "
+            f"チャンク数={stats.chunks} "
+            f"共有したチャンク数={stats.shared_chunks}"
+            + (f" rows_per_second={self.writer.rows_per_second}" if self.writer is not None else "")
+        )
+        return stats
+
+    def _deferred_ann_indexes(self, target_count: int) -> ContextManager[None]:
+        """
+        埋め込み直すマニュアルが多い場合のみ、ANN インデックスを削除して最後に作成し直す
+        """
+        if self.writer is None:
+            return nullcontext()
+        min_documents = int(self.writer.setting.get("defer_ann_index_min_documents"))
+        return self.writer.deferred_ann_indexes(enabled=target_count >= min_documents)
+
+    def _sync_targets(
+        self,
+        targets: dict[str, SourceState],
+        added_keys: set[str],
+        manifest: dict[str, ManifestEntry],
+        stats: SyncStats,
+    ) -> None:
+        for result in self.loader.iter_load(list(targets)):
+            state = targets[result.file_path]
+            if result.error is not None:
+                stats.failed_files.append(state.source)
+                continue
+            try:
+                chunks = self.ingest_document(state, result, manifest.get(state.source))
+                if chunks is None:
+                    stats.touched += 1
+                    continue
+                stats.chunks += chunks
+                if state.key in added_keys:
+                    stats.added += 1
+                else:
+                    stats.updated += 1
+            except Exception as e:
+                NaviApiLog.error(f"マニュアルの同期に失敗しました: source={state.source} error={e}")
+                stats.failed_files.append(state.source)
+
+    def ingest_document(
+        self,
+        state: SourceState,
+        result: LoadResult,
+        entry: Optional[ManifestEntry] = None,
+    ) -> Optional[int]:
+        """
+        ロードしたマニュアルを埋め込み直してベクトルとマニフェストを更新し、チャンク数を返す
+        entry（前回の同期時点）と内容のハッシュが一致する場合は埋め込み直さずに None を返す
+        """
+        if entry is not None and entry.content_hash == result.content_hash:
+            # 再アップロード等で ETag だけが変わった場合は埋め込み直さない
+            self._touch_document(state, entry)
+            return None
+        chunks = [
+            chunk for chunk in self.splitter(result.documents)
+            if chunk.page_content and chunk.page_content.strip()
+        ]
+        if self.deduplicator is None:
+            embedded = self._embed_chunks(chunks)
+            self._replace_document(state, result.content_hash, embedded)
+            return len(embedded)
+
+        chunks = self.deduplicator.unique_chunks(state.source, chunks)
+        shared = self._find_shared(state.source, chunks)
+        # 他のマニュアルが既に参照している内容のチャンクは埋め込まない
+        embedded = self._embed_chunks([chunk for chunk in chunks if chunk.metadata["chunk_hash"] not in shared])
+        self._replace_document(
+            state,
+            result.content_hash,
+            embedded,
+            [chunk for chunk in chunks if chunk.metadata["chunk_hash"] in shared],
+        )
+        self.shared_chunks += len(chunks) - len(embedded)
+        return len(chunks)
+
+    def _embed_chunks(self, chunks: list[Document]) -> list[tuple[Document, list[float]]]:
+        embedded = []
+        batch_size = max(1, int(self.setting.get("batch_size")))
+        for batch in IngestionPipeline.batched(chunks, batch_size):
+            vectors = embed_texts(self.embeddings, [chunk.page_content for chunk in batch])
+            embedded.extend(zip(batch, vectors))
+        return embedded
+
+    def _find_shared(self, source: str, chunks: list[Document]) -> set[str]:
+        with self.vector_store.session_maker() as session:
+            collection = self.vector_store.get_collection(session)
+            if collection is None:
+                return set()
+            return self.deduplicator.find_shared(
+                session, collection.uuid, [chunk.metadata["chunk_hash"] for chunk in chunks], source
+            )
+
+    def _ensure_manifest_table(self) -> None:
+        with self.vector_store.session_maker() as session:
+            manifest_metadata.create_all(session.get_bind(), tables=[ingestion_manifest])
+            if self.deduplicator is not None:
+                self.deduplicator.ensure_index(session)
+                session.commit()
+
+    def _load_manifest(self) -> dict[str, ManifestEntry]:
+        statement = select(ingestion_manifest).where(
+            ingestion_manifest.c.collection_name == self.collection_name
+        )
+        with self.vector_store.session_maker() as session:
+            rows = session.execute(statement).mappings().all()
+        return {
+            row["source"]: ManifestEntry(
+                source=row["source"],
+                etag=row["etag"],
+                size=row["size"],
+                content_hash=row["content_hash"],
+                manual_updated_at=row["manual_updated_at"],
+                chunks=row["chunks"],
+            )
+            for row in rows
+        }
+
+    def _load_vector_sources(self) -> set[str]:
+        embedding_store = self.vector_store.EmbeddingStore
+        with self.vector_store.session_maker() as session:
+            collection = self.vector_store.get_collection(session)
+            if collection is None:
+                return set()
+            statement = select(embedding_store.cmetadata["source"].astext).where(
+                embedding_store.collection_id == collection.uuid
+            ).distinct()
+            sources = {source for source in session.scalars(statement) if source}
+            # 内容が同じチャンクを共有しているマニュアル（代表の source 以外）
+            shared_statement = select(
+                func.jsonb_array_elements_text(embedding_store.cmetadata["sources"])
+            ).where(
+                embedding_store.collection_id == collection.uuid,
+                func.jsonb_exists(embedding_store.cmetadata, "sources"),
+            ).distinct()
+            sources.update(source for source in session.scalars(shared_statement) if source)
+            return sources
+
+    def _delete_vectors(self, session, source: str) -> None:
+        """
+        source のベクトルを削除する（他のマニュアルと共有している行は参照のみ外す）
+        """
+        collection = self.vector_store.get_collection(session)
+        ChunkDeduplicator.detach(session, collection.uuid, source)
+
+    def _upsert_manifest(self, session, values: dict[str, Any]) -> None:
+        statement = insert(ingestion_manifest).values(
+            collection_name=self.collection_name,
+            synced_at=func.now(),
+            **values,
+        )
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[ingestion_manifest.c.collection_name, ingestion_manifest.c.source],
+            set_={
+                name: statement.excluded[name]
+                for name in ("etag", "size", "content_hash", "manual_updated_at", "chunks", "synced_at")
+            },
+        ))
+
+    def _replace_document(
+        self,
+        state: SourceState,
+        content_hash: Optional[str],
+        chunks: list[tuple[Document, list[float]]],
+        shared_chunks: Optional[list[Document]] = None,
+    ) -> None:
+        """
+        古いベクトルの削除・新しいベクトルの追加・マニフェストの更新を1トランザクションで行う
+        shared_chunks は埋め込まずに、内容が同じ既存の行の sources に追加する
+        """
+        embedding_store = self.vector_store.EmbeddingStore
+        chunk_count = len(chunks) + len(shared_chunks or [])
+        with self.vector_store.session_maker() as session:
+            collection = self.vector_store.get_collection(session)
+            self._delete_vectors(session, state.source)
+            if shared_chunks:
+                attached = ChunkDeduplicator.attach(
+                    session, collection.uuid, [chunk.metadata["chunk_hash"] for chunk in shared_chunks], state.source
+                )
+                # 確認した後に他のマニュアルから削除された行は、このマニュアルの行として埋め込み直す
+                missing = [chunk for chunk in shared_chunks if chunk.metadata["chunk_hash"] not in attached]
+                chunks = chunks + self._embed_chunks(missing)
+            if chunks and self.writer is not None and self.writer.uses_copy:
+                self.writer.copy_rows(session, collection.uuid, [
+                    (chunk.page_content, vector, {**chunk.metadata, "source": state.source})
+                    for chunk, vector in chunks
+                ])
+            elif chunks:
+                session.execute(insert(embedding_store).values([
+                    {
+                        "id": str(uuid.uuid4()),
+                        "collection_id": collection.uuid,
+                        "embedding": vector,
+                        "document": chunk.page_content,
+                        "cmetadata": {**chunk.metadata, "source": state.source},
+                    }
+                    for chunk, vector in chunks
+                ]))
+            self._upsert_manifest(session, {
+                "source": state.source,
+                "etag": state.etag,
+                "size": state.size,
+                "content_hash": content_hash,
+                "manual_updated_at": state.manual_updated_at,
+                "chunks": chunk_count,
+            })
+            session.commit()
+
+    def _touch_document(self, state: SourceState, entry: ManifestEntry) -> None:
+        with self.vector_store.session_maker() as session:
+            self._upsert_manifest(session, {
+                "source": state.source,
+                "etag": state.etag,
+                "size": state.size,
+                "content_hash": entry.content_hash,
+                "manual_updated_at": state.manual_updated_at,
+                "chunks": entry.chunks,
+            })
+            session.commit()
+
+    def remove_document(self, source: str) -> None:
+        """
+        ベクトルとマニフェストを1トランザクションで削除する
+        """
+        with self.vector_store.session_maker() as session:
+            self._delete_vectors(session, source)
+            session.execute(delete(ingestion_manifest).where(
+                ingestion_manifest.c.collection_name == self.collection_name,
+                ingestion_manifest.c.source == source,
+            ))
+            session.commit()
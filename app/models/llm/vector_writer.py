@@ -0,0 +1,215 @@
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+from sqlalchemy import Column, DateTime, MetaData, String, Table, Text, delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from app.core.aws.ssm_client import SsmClient
+from app.core.logging import NaviApiLog
+
+
+DEFAULT_WRITER_SETTING = {
+    # copy: COPY ... FROM STDIN (FORMAT BINARY) で書き込む / insert: PGVector.add_embeddings で書き込む
+    "method": "copy",
+    # 1回の COPY（1トランザクション）で書き込む行数
+    "batch_size": 1000,
+    # 一括取り込みの間は langchain_pg_embedding の ANN インデックス（hnsw・ivfflat）を削除し、最後に作成し直す
+    # 削除している間は全てのテナントの検索が全件走査になるため、検索を受け付けていないオフラインの一括取り込みでのみ有効にする
+    "defer_ann_index": False,
+    # 差分同期で埋め込み直すマニュアルがこの件数以上の場合のみ ANN インデックスを作成し直す
+    "defer_ann_index_min_documents": 100,
+}
+
+_COPY_STATEMENT = (
+    "COPY langchain_pg_embedding (id, collection_id, embedding, document, cmetadata) "
+    "FROM STDIN (FORMAT BINARY)"
+)
+_COPY_TYPES = ["varchar", "uuid", "vector", "varchar", "jsonb"]
+
+_ANN_INDEX_QUERY = text(
+    "SELECT schemaname, indexname, indexdef FROM pg_indexes "
+    "WHERE tablename = 'langchain_pg_embedding' "
+    "AND (indexdef ILIKE '%USING hnsw%' OR indexdef ILIKE '%USING ivfflat%')"
+)
+
+deferred_index_metadata = MetaData()
+
+# 取り込みの間に削除した ANN インデックスの定義
+# 取り込みが異常終了しても次回の取り込みで作成し直せるよう、削除と同じトランザクションでベクターストアと同じ PostgreSQL に保存する
+ingestion_deferred_index = Table(
+    "ingestion_deferred_index",
+    deferred_index_metadata,
+    Column("schema_name", String, primary_key=True),
+    Column("index_name", String, primary_key=True),
+    Column("index_definition", Text, nullable=False),
+    Column("dropped_at", DateTime, nullable=False, server_default=func.now()),
+)
+
+
+class PgVectorBulkWriter:
+    """
+    langchain_pg_embedding にベクトルを COPY（バイナリ形式）で一括して書き込む
+
+    - add で受け取った行を batch_size 行まで溜め、1回の COPY で書き込んでコミットする
+    - copy_rows は呼び出し側のトランザクション内で COPY する（差分同期でマニュアル毎に確定するため）
+    - deferred_ann_indexes の間は ANN インデックスを削除し、最後にまとめて作成し直す
+      （削除している間の検索はインデックスを使わないため遅くなる。オフラインの一括取り込み専用）
+    - 削除した ANN インデックスの定義は ingestion_deferred_index に保存し、
+      異常終了した場合は次回の deferred_ann_indexes の開始時に作成し直す
+    - 書き込んだ行数と rows_per_second をログに出力する
+
+    設定は SSM の ingestion_setting.writer から取得する。
+    """
+
+    def __init__(self, vector_store: Any, setting: Optional[dict[str, Any]] = None) -> None:
+        self.vector_store = vector_store
+        self.setting = {**DEFAULT_WRITER_SETTING, **(setting or {})}
+        self._buffer: list[tuple[str, str, list[float], dict]] = []
+        self._vector_info = None
+        self.rows = 0
+        self.write_seconds = 0.0
+
+    @classmethod
+    def get_setting(cls) -> dict[str, Any]:
+        setting = SsmClient.get_cached_parameter("ingestion_setting", default={})
+        writer_setting = setting.get("writer", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_WRITER_SETTING, **writer_setting}
+
+    @property
+    def uses_copy(self) -> bool:
+        return self.setting.get("method") == "copy"
+
+    @property
+    def batch_size(self) -> int:
+        return max(1, int(self.setting.get("batch_size")))
+
+    @property
+    def rows_per_second(self) -> float:
+        return round(self.rows / self.write_seconds, 2) if self.write_seconds > 0 else 0.0
+
+    def _register_vector(self, dbapi_connection: Any) -> None:
+        """
+        vector 型をバイナリ形式で書き込めるよう接続に登録する（型情報は初回のみ取得する）
+        """
+        from pgvector.psycopg import register_vector_info
+        from psycopg.types import TypeInfo
+
+        if self._vector_info is None:
+            self._vector_info = TypeInfo.fetch(dbapi_connection, "vector")
+        register_vector_info(dbapi_connection, self._vector_info)
+
+    def copy_rows(self, session: Any, collection_id: Any, rows: list[tuple[str, list[float], dict]]) -> int:
+        """
+        (document, embedding, cmetadata) の行を session のトランザクション内で COPY する（コミットは呼び出し側で行う）
+        """
+        if not rows:
+            return 0
+        started_at = time.perf_counter()
+        dbapi_connection = session.connection().connection.dbapi_connection
+        self._register_vector(dbapi_connection)
+        with dbapi_connection.cursor() as cursor:
+            with cursor.copy(_COPY_STATEMENT) as copy:
+                copy.set_types(_COPY_TYPES)
+                for document, embedding, metadata in rows:
+                    copy.write_row((str(uuid.uuid4()), collection_id, embedding, document, metadata))
+        self.rows += len(rows)
+        self.write_seconds += time.perf_counter() - started_at
+        return len(rows)
+
+    def add(self, texts: list[str], embeddings: list[list[float]], metadatas: list[dict]) -> int:
+        """
+        行を溜め、batch_size 行に達した場合に書き込む（書き込んだ行数を返す）
+        """
+        if not self.uses_copy:
+            # COPY を使わない場合は従来どおりバッチ毎に書き込む
+            started_at = time.perf_counter()
+            self.vector_store.add_embeddings(texts=texts, embeddings=embeddings, metadatas=metadatas)
+            self.rows += len(texts)
+            self.write_seconds += time.perf_counter() - started_at
+            return len(texts)
+        self._buffer.extend(zip(texts, embeddings, metadatas))
+        if len(self._buffer) < self.batch_size:
+            return 0
+        return self.flush()
+
+    def flush(self) -> int:
+        """
+        溜めた行を1回の COPY で書き込んでコミットする
+        """
+        if not self._buffer:
+            return 0
+        rows, self._buffer = self._buffer, []
+        with self.vector_store.session_maker() as session:
+            collection = self.vector_store.get_collection(session)
+            if collection is None:
+                raise ValueError("Collection not found")
+            written = self.copy_rows(session, collection.uuid, rows)
+            session.commit()
+        NaviApiLog.info(f"ベクトルを書き込みました。rows={self.rows} rows_per_second={self.rows_per_second}")
+        return written
+
+    def _ensure_deferred_index_table(self, session: Any) -> None:
+        deferred_index_metadata.create_all(session.get_bind(), tables=[ingestion_deferred_index])
+
+    def restore_ann_indexes(self) -> list[str]:
+        """
+        ingestion_deferred_index に保存した ANN インデックスのうち、存在しないものを作成し直す（作成し直したインデックス名を返す）
+        """
+        with self.vector_store.session_maker() as session:
+            self._ensure_deferred_index_table(session)
+            deferred = session.execute(select(
+                ingestion_deferred_index.c.schema_name,
+                ingestion_deferred_index.c.index_name,
+                ingestion_deferred_index.c.index_definition,
+            )).all()
+            if not deferred:
+                return []
+            existing = {(schema_name, index_name) for schema_name, index_name, _ in session.execute(_ANN_INDEX_QUERY).all()}
+            restored = []
+            for schema_name, index_name, index_definition in deferred:
+                if (schema_name, index_name) in existing:
+                    continue
+                # pg_indexes の定義（CREATE INDEX 文）をそのまま実行する
+                session.connection().exec_driver_sql(index_definition)
+                restored.append(index_name)
+            session.execute(delete(ingestion_deferred_index))
+            session.commit()
+        return restored
+
+    @contextmanager
+    def deferred_ann_indexes(self, enabled: bool = True) -> Iterator[None]:
+        """
+        この間は ANN インデックスを削除し、終了時（失敗時も）に作成し直す
+
+        開始時には、前回の取り込みが異常終了して作成し直されていない ANN インデックスを作成し直す
+        （defer_ann_index が無効な場合も行う）。
+        """
+        restored = self.restore_ann_indexes()
+        if restored:
+            NaviApiLog.warning(f"前回の取り込みで削除したままのANNインデックスを作成し直しました: {restored}")
+        if not (enabled and self.setting.get("defer_ann_index")):
+            yield
+            return
+        with self.vector_store.session_maker() as session:
+            indexes = session.execute(_ANN_INDEX_QUERY).all()
+            if indexes:
+                # 削除と同じトランザクションで定義を保存する
+                session.execute(insert(ingestion_deferred_index).values([
+                    {"schema_name": schema_name, "index_name": index_name, "index_definition": index_definition}
+                    for schema_name, index_name, index_definition in indexes
+                ]).on_conflict_do_nothing())
+            for schema_name, index_name, _ in indexes:
+                session.connection().exec_driver_sql(f'DROP INDEX IF EXISTS "{schema_name}"."{index_name}"')
+            session.commit()
+        if indexes:
+            NaviApiLog.info(f"取り込みの間、ANNインデックスを削除します: {[index_name for _, index_name, _ in indexes]}")
+        try:
+            yield
+        finally:
+            if indexes:
+                started_at = time.perf_counter()
+                self.restore_ann_indexes()
+                NaviApiLog.info(
+                    f"ANNインデックスを作成し直しました。"
+                    f"elapsed_ms={round((time.perf_counter() - started_at) * 1000, 2)}"
+                )
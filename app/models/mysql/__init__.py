@@ -4,6 +4,8 @@ from app.models.mysql.company_model import CompanyModel
 from app.models.mysql.user_model import UserModel
 from app.models.mysql.application_model import ApplicationModel
 from app.models.mysql.manual_model import ManualModel
+from app.models.mysql.faq_model import FaqModel
+from app.models.mysql.ingestion_job_model import IngestionJobModel, IngestionJobDocumentModel
 
 __all__ = [
     "RoleModel",
@@ -11,4 +13,7 @@ __all__ = [
     "UserModel",
     "ApplicationModel",
     "ManualModel",
+    "FaqModel",
+    "IngestionJobModel",
+    "IngestionJobDocumentModel",
 ]
\ No newline at end of file
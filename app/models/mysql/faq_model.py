@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy.sql import func
+
+from app.core.database.mysql import Base
+
+
+class FaqModel(Base):
+    __tablename__ = 'faqs'
+
+    faq_id = Column(Integer, primary_key=True, autoincrement=True)
+    application_id = Column(Integer, ForeignKey('applications.application_id', ondelete='CASCADE'), nullable=False, comment='アプリケーションID')
+    question = Column(String(500), nullable=False, comment='質問')
+    answer = Column(Text, nullable=False, comment='回答')
+    is_deleted = Column(Boolean, default=False, nullable=False, comment='削除フラグ')
+    deleted_at = Column(DateTime, nullable=True, comment='削除日時')
+    created_at = Column(DateTime, default=func.now(), nullable=False, comment='作成日時')
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False, comment='更新日時')
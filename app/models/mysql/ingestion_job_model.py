@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy.sql import func
+
+from app.core.database.mysql import Base
+
+
+class IngestionJobModel(Base):
+    __tablename__ = 'ingestion_jobs'
+
+    job_id = Column(Integer, primary_key=True, autoincrement=True)
+    company_id = Column(Integer, ForeignKey('companies.company_id', ondelete='CASCADE'), nullable=False, comment='企業ID')
+    application_id = Column(Integer, nullable=True, comment='アプリケーションID')
+    manual_id = Column(Integer, nullable=True, comment='マニュアルID')
+    created_at = Column(DateTime, default=func.now(), nullable=False, comment='作成日時')
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False, comment='更新日時')
+
+
+class IngestionJobDocumentModel(Base):
+    __tablename__ = 'ingestion_job_documents'
+
+    job_document_id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(Integer, ForeignKey('ingestion_jobs.job_id', ondelete='CASCADE'), nullable=False, comment='ジョブID')
+    company_id = Column(Integer, nullable=False, comment='企業ID')
+    application_id = Column(Integer, nullable=False, comment='アプリケーションID')
+    manual_id = Column(Integer, nullable=False, comment='マニュアルID')
+    file_extension = Column(String(500), nullable=False, comment='ファイル拡張子')
+    status = Column(String(20), default='pending', nullable=False, comment='状態')
+    attempts = Column(Integer, default=0, nullable=False, comment='試行回数')
+    next_attempt_at = Column(DateTime, nullable=False, comment='次回の試行日時')
+    locked_by = Column(String(100), nullable=True, comment='処理中のワーカー')
+    locked_until = Column(DateTime, nullable=True, comment='処理中の期限')
+    chunks = Column(Integer, default=0, nullable=False, comment='チャンク数')
+    last_error = Column(Text, nullable=True, comment='最後のエラー')
+    created_at = Column(DateTime, default=func.now(), nullable=False, comment='作成日時')
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False, comment='更新日時')
@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+
+
+class IngestionJobRequest(BaseModel):
+    application_id: int|None = Field(None, description="アプリID（未指定の場合は企業の全マニュアル）")
+    manual_id: int|None = Field(None, description="マニュアルID（指定した場合はそのマニュアルのみ）")
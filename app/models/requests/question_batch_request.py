@@ -0,0 +1,14 @@
+from pydantic import BaseModel, Field
+
+# 1リクエストで受け付ける質問数の上限
+MAX_BATCH_QUESTIONS = 50
+
+
+class QuestionBatchRequest(BaseModel):
+    application_id: int|None = Field(None, description="アプリID")
+    questions: list[str] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_QUESTIONS,
+        description=f"質問内容のリスト（最大{MAX_BATCH_QUESTIONS}件）"
+    )
@@ -4,3 +4,9 @@ from pydantic import BaseModel, Field
 class QuestionRequest(BaseModel):
     application_id: int|None = Field(None, description="アプリID")
     question: str = Field(..., description="質問内容")
+    conversation_id: str|None = Field(
+        None,
+        min_length=1,
+        max_length=128,
+        description="会話ID（指定時は同じ会話IDのこれまでのやり取りを踏まえて回答する）"
+    )
@@ -0,0 +1,26 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+
+class IngestionJobErrorResponse(BaseModel):
+    manual_id: int = Field(..., description="マニュアルID")
+    status: str = Field(..., description="マニュアルの状態（pending は再試行待ち、failed は試行回数の上限に達した）")
+    attempts: int = Field(..., description="試行回数")
+    error: str|None = Field(None, description="最後のエラー内容")
+
+
+class IngestionJobResponse(BaseModel):
+    job_id: int = Field(..., description="ジョブID")
+    status: str = Field(..., description="ジョブの状態（queued・running・succeeded・failed）")
+    application_id: int|None = Field(None, description="アプリID")
+    manual_id: int|None = Field(None, description="マニュアルID")
+    total: int = Field(..., description="対象のマニュアル数")
+    pending: int = Field(..., description="未処理・再試行待ちのマニュアル数")
+    running: int = Field(..., description="処理中のマニュアル数")
+    succeeded: int = Field(..., description="取り込みが完了したマニュアル数")
+    failed: int = Field(..., description="取り込みに失敗したマニュアル数")
+    chunks: int = Field(..., description="取り込んだチャンク数")
+    progress: float = Field(..., description="完了（成功・失敗）したマニュアルの割合（0〜1）")
+    created_at: datetime = Field(..., description="ジョブの登録日時")
+    updated_at: datetime|None = Field(None, description="最後にマニュアルの状態が更新された日時")
+    errors: list[IngestionJobErrorResponse] = Field(default_factory=list, description="エラーが発生したマニュアル")
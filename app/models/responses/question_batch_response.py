@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+
+
+class QuestionBatchItemResponse(BaseModel):
+    index: int = Field(..., description="リクエストの questions における位置")
+    question: str = Field(..., description="質問内容")
+    answer: str|None = Field(None, description="回答内容（エラー時は null）")
+    error: str|None = Field(None, description="エラー内容（成功時は null）")
+
+
+class QuestionBatchResponse(BaseModel):
+    results: list[QuestionBatchItemResponse] = Field(..., description="質問毎の結果（リクエストと同じ順序）")
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.mysql.company_model import CompanyModel
+from app.models.mysql.application_model import ApplicationModel
+from app.models.mysql.faq_model import FaqModel
+
+
+@dataclass
+class FaqDto:
+    application_id: int
+    faq_id: int
+    question: str
+    answer: str
+    updated_at: datetime | None = None
+
+
+class FaqRepository:
+    @classmethod
+    def _filter(
+        cls,
+        statement: Select,
+        company_id: int,
+        application_id: int|None=None,
+    ) -> Select:
+        statement = statement.join(
+            ApplicationModel, CompanyModel.company_id == ApplicationModel.company_id
+        ).join(
+            FaqModel, ApplicationModel.application_id == FaqModel.application_id
+        ).where(
+            CompanyModel.company_id == company_id,
+            CompanyModel.deleted_at.is_(None),
+            ApplicationModel.deleted_at.is_(None),
+            FaqModel.deleted_at.is_(None)
+        )
+        if application_id:
+            statement = statement.where(
+                ApplicationModel.application_id == application_id
+            )
+        return statement
+
+    @classmethod
+    def _build_statement(
+        cls,
+        company_id: int,
+        application_id: int|None=None,
+    ) -> Select:
+        statement = select(
+            ApplicationModel.application_id,
+            FaqModel.faq_id,
+            FaqModel.question,
+            FaqModel.answer,
+            FaqModel.updated_at
+        ).select_from(CompanyModel)
+        return cls._filter(statement, company_id=company_id, application_id=application_id).order_by(
+            FaqModel.faq_id
+        )
+
+    @classmethod
+    def _build_version_statement(
+        cls,
+        company_id: int,
+        application_id: int|None=None,
+    ) -> Select:
+        statement = select(
+            func.count(FaqModel.faq_id),
+            func.max(FaqModel.updated_at)
+        ).select_from(CompanyModel)
+        return cls._filter(statement, company_id=company_id, application_id=application_id)
+
+    @classmethod
+    def _to_dtos(cls, faqs) -> list[FaqDto]:
+        return [
+            FaqDto(
+                application_id=faq.application_id,
+                faq_id=faq.faq_id,
+                question=faq.question,
+                answer=faq.answer,
+                updated_at=faq.updated_at
+            )
+            for faq in faqs
+        ]
+
+    @staticmethod
+    def _to_version(row) -> str:
+        count, updated_at = row
+        return f"{count}@{updated_at.isoformat() if updated_at else ''}"
+
+    @classmethod
+    def get_by_company_id(
+        cls,
+        session: Session,
+        company_id: int,
+        application_id: int|None=None,
+    ) -> list[FaqDto]:
+        faqs = session.execute(
+            cls._build_statement(company_id=company_id, application_id=application_id)
+        ).all()
+        return cls._to_dtos(faqs)
+
+    @classmethod
+    async def aget_by_company_id(
+        cls,
+        session: AsyncSession,
+        company_id: int,
+        application_id: int|None=None,
+    ) -> list[FaqDto]:
+        """
+        get_by_company_id の非同期版
+        """
+        result = await session.execute(
+            cls._build_statement(company_id=company_id, application_id=application_id)
+        )
+        return cls._to_dtos(result.all())
+
+    @classmethod
+    def get_version(
+        cls,
+        session: Session,
+        company_id: int,
+        application_id: int|None=None,
+    ) -> str:
+        """
+        よくある質問の件数と最終更新日時からバージョン文字列を返す
+        追加・更新・削除（件数の減少）のいずれでも値が変わるため、変更の検知に使用する
+        """
+        row = session.execute(
+            cls._build_version_statement(company_id=company_id, application_id=application_id)
+        ).one()
+        return cls._to_version(row)
+
+    @classmethod
+    async def aget_version(
+        cls,
+        session: AsyncSession,
+        company_id: int,
+        application_id: int|None=None,
+    ) -> str:
+        """
+        get_version の非同期版
+        """
+        result = await session.execute(
+            cls._build_version_statement(company_id=company_id, application_id=application_id)
+        )
+        return cls._to_version(result.one())
@@ -0,0 +1,367 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+from app.models.mysql.company_model import CompanyModel
+from app.models.mysql.ingestion_job_model import IngestionJobDocumentModel, IngestionJobModel
+from app.repositories.manual_repository import ManualDto
+
+
+# マニュアル毎の状態
+DOCUMENT_PENDING = "pending"
+DOCUMENT_RUNNING = "running"
+DOCUMENT_SUCCEEDED = "succeeded"
+DOCUMENT_FAILED = "failed"
+
+# 進捗に含めるエラーの件数の上限
+MAX_PROGRESS_ERRORS = 20
+
+# 処理中の期限切れが試行回数の上限に達したマニュアルのエラー
+LEASE_EXPIRED_ERROR = "処理中の期限切れが上限回数に達しました"
+
+
+@dataclass
+class ClaimedDocumentDto:
+    job_document_id: int
+    job_id: int
+    manual: ManualDto
+    attempts: int
+
+
+@dataclass
+class IngestionJobErrorDto:
+    manual_id: int
+    status: str
+    attempts: int
+    last_error: str | None
+
+
+@dataclass
+class IngestionJobProgressDto:
+    job_id: int
+    company_id: int
+    application_id: int | None
+    manual_id: int | None
+    created_at: datetime
+    total: int = 0
+    pending: int = 0
+    running: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    # 1回以上取得されたマニュアルの数（pending でも再試行待ちのものを含む）
+    started: int = 0
+    chunks: int = 0
+    updated_at: datetime | None = None
+    errors: list[IngestionJobErrorDto] = field(default_factory=list)
+
+
+class IngestionJobRepository:
+    @classmethod
+    def lock_company(
+        cls,
+        session: Session,
+        company_id: int,
+    ) -> bool:
+        """
+        企業の行を SELECT ... FOR UPDATE でロックする（ロックはトランザクションの終了まで保持する）
+        同じ企業のジョブの確認・登録を直列にするため、トランザクション内で最初に呼び出す
+        """
+        locked = session.execute(
+            select(CompanyModel.company_id).where(
+                CompanyModel.company_id == company_id
+            ).with_for_update()
+        ).scalar_one_or_none()
+        return locked is not None
+
+    @classmethod
+    def find_active_job(
+        cls,
+        session: Session,
+        company_id: int,
+        application_id: int|None=None,
+        manual_id: int|None=None,
+    ) -> int | None:
+        """
+        同じ対象で、完了していないマニュアルが残っているジョブのIDを返す
+        """
+        statement = select(
+            IngestionJobModel.job_id
+        ).join(
+            IngestionJobDocumentModel, IngestionJobModel.job_id == IngestionJobDocumentModel.job_id
+        ).where(
+            IngestionJobModel.company_id == company_id,
+            IngestionJobDocumentModel.status.in_([DOCUMENT_PENDING, DOCUMENT_RUNNING])
+        ).order_by(
+            IngestionJobModel.job_id.desc()
+        ).limit(1)
+        statement = statement.where(
+            IngestionJobModel.application_id.is_(None) if application_id is None
+            else IngestionJobModel.application_id == application_id,
+            IngestionJobModel.manual_id.is_(None) if manual_id is None
+            else IngestionJobModel.manual_id == manual_id,
+        )
+        return session.execute(statement).scalar_one_or_none()
+
+    @classmethod
+    def create_job(
+        cls,
+        session: Session,
+        company_id: int,
+        manuals: list[ManualDto],
+        application_id: int|None=None,
+        manual_id: int|None=None,
+        now: datetime|None=None,
+    ) -> int:
+        """
+        ジョブとマニュアル毎の行を登録し、ジョブIDを返す（コミットは呼び出し側で行う）
+        """
+        job = IngestionJobModel(
+            company_id=company_id,
+            application_id=application_id,
+            manual_id=manual_id,
+        )
+        session.add(job)
+        session.flush()
+        if manuals:
+            session.execute(insert(IngestionJobDocumentModel), [
+                {
+                    "job_id": job.job_id,
+                    "company_id": manual.company_id,
+                    "application_id": manual.application_id,
+                    "manual_id": manual.manual_id,
+                    "file_extension": manual.file_extension,
+                    "status": DOCUMENT_PENDING,
+                    "attempts": 0,
+                    "next_attempt_at": now or datetime.now(),
+                    "chunks": 0,
+                }
+                for manual in manuals
+            ])
+        return job.job_id
+
+    @classmethod
+    def claim_documents(
+        cls,
+        session: Session,
+        worker_id: str,
+        limit: int,
+        lease_seconds: float,
+        max_attempts: int|None=None,
+        now: datetime|None=None,
+    ) -> list[ClaimedDocumentDto]:
+        """
+        処理できるマニュアル（再試行の時刻を過ぎた pending、または処理中の期限が切れた running）を
+        limit 件まで取得して running にする（コミットは呼び出し側で行う）。
+        SKIP LOCKED で、他のワーカーが取得中の行は待たずに飛ばす。
+        max_attempts を指定した場合、処理中の期限が切れて試行回数が上限に達したマニュアルは取得せずに failed とする。
+        """
+        now = now or datetime.now()
+        expired = and_(
+            # ワーカーが停止した等で期限までに完了しなかったマニュアルは取得し直す
+            IngestionJobDocumentModel.status == DOCUMENT_RUNNING,
+            IngestionJobDocumentModel.locked_until < now
+        )
+        if max_attempts is not None:
+            # 取り込み中にワーカーが毎回停止するマニュアルを繰り返し取得しないよう、上限に達したものは failed とする
+            session.execute(
+                update(IngestionJobDocumentModel).where(
+                    expired,
+                    IngestionJobDocumentModel.attempts >= max_attempts
+                ).values(
+                    status=DOCUMENT_FAILED,
+                    locked_by=None,
+                    locked_until=None,
+                    last_error=LEASE_EXPIRED_ERROR
+                )
+            )
+            expired = and_(expired, IngestionJobDocumentModel.attempts < max_attempts)
+        documents = session.execute(
+            select(
+                IngestionJobDocumentModel
+            ).where(
+                or_(
+                    and_(
+                        IngestionJobDocumentModel.status == DOCUMENT_PENDING,
+                        IngestionJobDocumentModel.next_attempt_at <= now
+                    ),
+                    expired
+                )
+            ).order_by(
+                IngestionJobDocumentModel.next_attempt_at,
+                IngestionJobDocumentModel.job_document_id
+            ).limit(limit).with_for_update(skip_locked=True)
+        ).scalars().all()
+
+        claimed = []
+        for document in documents:
+            document.status = DOCUMENT_RUNNING
+            document.attempts += 1
+            document.locked_by = worker_id
+            document.locked_until = now + timedelta(seconds=lease_seconds)
+            claimed.append(ClaimedDocumentDto(
+                job_document_id=document.job_document_id,
+                job_id=document.job_id,
+                manual=ManualDto(
+                    company_id=document.company_id,
+                    application_id=document.application_id,
+                    manual_id=document.manual_id,
+                    file_extension=document.file_extension,
+                ),
+                attempts=document.attempts,
+            ))
+        session.flush()
+        return claimed
+
+    @classmethod
+    def renew_lease(
+        cls,
+        session: Session,
+        job_document_ids: list[int],
+        worker_id: str,
+        lease_seconds: float,
+        now: datetime|None=None,
+    ) -> int:
+        """
+        取得中のマニュアルの処理中の期限を延長し、延長した件数を返す（コミットは呼び出し側で行う）。
+        他のワーカーが取得し直したマニュアル、完了・失敗を記録したマニュアルは延長しない。
+        """
+        if not job_document_ids:
+            return 0
+        now = now or datetime.now()
+        result = session.execute(
+            update(IngestionJobDocumentModel).where(
+                IngestionJobDocumentModel.job_document_id.in_(job_document_ids),
+                IngestionJobDocumentModel.locked_by == worker_id,
+                IngestionJobDocumentModel.status == DOCUMENT_RUNNING
+            ).values(
+                locked_until=now + timedelta(seconds=lease_seconds)
+            )
+        )
+        return result.rowcount
+
+    @classmethod
+    def complete_document(
+        cls,
+        session: Session,
+        job_document_id: int,
+        worker_id: str,
+        chunks: int,
+    ) -> bool:
+        """
+        マニュアルの完了を記録する（他のワーカーが取得し直している場合は更新せずに False を返す）
+        """
+        result = session.execute(
+            update(IngestionJobDocumentModel).where(
+                IngestionJobDocumentModel.job_document_id == job_document_id,
+                IngestionJobDocumentModel.locked_by == worker_id,
+                IngestionJobDocumentModel.status == DOCUMENT_RUNNING
+            ).values(
+                status=DOCUMENT_SUCCEEDED,
+                chunks=chunks,
+                locked_by=None,
+                locked_until=None,
+                last_error=None
+            )
+        )
+        return result.rowcount > 0
+
+    @classmethod
+    def fail_document(
+        cls,
+        session: Session,
+        job_document_id: int,
+        worker_id: str,
+        error: str,
+        retry_at: datetime|None,
+    ) -> bool:
+        """
+        マニュアルの失敗を記録する。retry_at を指定した場合はその時刻以降に再試行し、None の場合は failed とする
+        """
+        values = {
+            "status": DOCUMENT_PENDING if retry_at is not None else DOCUMENT_FAILED,
+            "locked_by": None,
+            "locked_until": None,
+            "last_error": error,
+        }
+        if retry_at is not None:
+            values["next_attempt_at"] = retry_at
+        result = session.execute(
+            update(IngestionJobDocumentModel).where(
+                IngestionJobDocumentModel.job_document_id == job_document_id,
+                IngestionJobDocumentModel.locked_by == worker_id,
+                IngestionJobDocumentModel.status == DOCUMENT_RUNNING
+            ).values(**values)
+        )
+        return result.rowcount > 0
+
+    @classmethod
+    def get_progress(
+        cls,
+        session: Session,
+        job_id: int,
+        company_id: int,
+    ) -> IngestionJobProgressDto | None:
+        """
+        ジョブのマニュアル毎の状態を集計して返す（他の企業のジョブは None）
+        """
+        job = session.execute(
+            select(IngestionJobModel).where(
+                IngestionJobModel.job_id == job_id,
+                IngestionJobModel.company_id == company_id
+            )
+        ).scalar_one_or_none()
+        if job is None:
+            return None
+
+        progress = IngestionJobProgressDto(
+            job_id=job.job_id,
+            company_id=job.company_id,
+            application_id=job.application_id,
+            manual_id=job.manual_id,
+            created_at=job.created_at,
+        )
+        rows = session.execute(
+            select(
+                IngestionJobDocumentModel.status,
+                func.count(IngestionJobDocumentModel.job_document_id),
+                func.sum(case((IngestionJobDocumentModel.attempts > 0, 1), else_=0)),
+                func.sum(IngestionJobDocumentModel.chunks),
+                func.max(IngestionJobDocumentModel.updated_at)
+            ).where(
+                IngestionJobDocumentModel.job_id == job_id
+            ).group_by(
+                IngestionJobDocumentModel.status
+            )
+        ).all()
+        for status, count, started, chunks, updated_at in rows:
+            if status in (DOCUMENT_PENDING, DOCUMENT_RUNNING, DOCUMENT_SUCCEEDED, DOCUMENT_FAILED):
+                setattr(progress, status, count)
+            progress.total += count
+            progress.started += int(started or 0)
+            progress.chunks += int(chunks or 0)
+            if updated_at is not None and (progress.updated_at is None or updated_at > progress.updated_at):
+                progress.updated_at = updated_at
+
+        errors = session.execute(
+            select(
+                IngestionJobDocumentModel.manual_id,
+                IngestionJobDocumentModel.status,
+                IngestionJobDocumentModel.attempts,
+                IngestionJobDocumentModel.last_error
+            ).where(
+                IngestionJobDocumentModel.job_id == job_id,
+                IngestionJobDocumentModel.last_error.is_not(None)
+            ).order_by(
+                IngestionJobDocumentModel.manual_id
+            ).limit(MAX_PROGRESS_ERRORS)
+        ).all()
+        progress.errors = [
+            IngestionJobErrorDto(
+                manual_id=error.manual_id,
+                status=error.status,
+                attempts=error.attempts,
+                last_error=error.last_error
+            )
+            for error in errors
+        ]
+        return progress
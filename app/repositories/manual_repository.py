@@ -1,4 +1,8 @@
+import hashlib
 from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.mysql.company_model import CompanyModel
 from app.models.mysql.application_model import ApplicationModel
@@ -11,37 +15,48 @@ class ManualDto:
     application_id: int
     manual_id: int
     file_extension: str
+    updated_at: datetime | None = None
 
 
 class ManualRepository:
     @classmethod
-    def get_by_company_id(
+    def _build_statement(
         cls,
-        session: Session,
-        company_id: int,
+        company_id: int|None,
         application_id: int|None=None,
-    ) -> list[ManualDto]:
-        query = session.query(
+        all_companies: bool=False,
+    ) -> Select:
+        """
+        削除されていないマニュアルを取得するクエリ（all_companies が True の場合のみ全企業を対象とする）
+        """
+        statement = select(
             CompanyModel.company_id,
             ApplicationModel.application_id,
             ManualModel.manual_id,
-            ManualModel.file_extension
+            ManualModel.file_extension,
+            ManualModel.updated_at
         ).join(
             ApplicationModel, CompanyModel.company_id == ApplicationModel.company_id
         ).join(
             ManualModel, ApplicationModel.application_id == ManualModel.application_id
-        ).filter(
-            CompanyModel.company_id == company_id,
+        ).where(
             CompanyModel.deleted_at.is_(None),
             ApplicationModel.deleted_at.is_(None),
             ManualModel.deleted_at.is_(None)
         )
+        if not all_companies:
+            # company_id が None・0 の場合も企業で絞り込む（他の企業のマニュアルは返さない）
+            statement = statement.where(
+                CompanyModel.company_id == company_id
+            )
         if application_id:
-            query = query.filter(
+            statement = statement.where(
                 ApplicationModel.application_id == application_id
             )
-        manuals = query.all()
+        return statement
 
+    @classmethod
+    def _to_dtos(cls, manuals) -> list[ManualDto]:
         manual_dtos = []
         for manual in manuals:
             manual_dtos.append(
@@ -49,8 +64,61 @@ class ManualRepository:
                     company_id=manual.company_id,
                     application_id=manual.application_id,
                     manual_id=manual.manual_id,
-                    file_extension=manual.file_extension
-                    
+                    file_extension=manual.file_extension,
+                    updated_at=manual.updated_at
                 )
             )
         return manual_dtos
+
+    @classmethod
+    def get_by_company_id(
+        cls,
+        session: Session,
+        company_id: int,
+        application_id: int|None=None,
+    ) -> list[ManualDto]:
+        manuals = session.execute(
+            cls._build_statement(company_id=company_id, application_id=application_id)
+        ).all()
+        return cls._to_dtos(manuals)
+
+    @classmethod
+    async def aget_by_company_id(
+        cls,
+        session: AsyncSession,
+        company_id: int,
+        application_id: int|None=None,
+    ) -> list[ManualDto]:
+        """
+        get_by_company_id の非同期版
+        """
+        result = await session.execute(
+            cls._build_statement(company_id=company_id, application_id=application_id)
+        )
+        return cls._to_dtos(result.all())
+
+    @classmethod
+    def get_all_active(
+        cls,
+        session: Session,
+    ) -> list[ManualDto]:
+        """
+        全企業の削除されていないマニュアルを取得する（ベクターストアとの同期用）
+        """
+        manuals = session.execute(
+            cls._build_statement(company_id=None, all_companies=True)
+        ).all()
+        return cls._to_dtos(manuals)
+
+    @classmethod
+    def build_corpus_version(cls, manuals: list[ManualDto]) -> str:
+        """
+        マニュアル構成（追加・削除・更新日時）から回答キャッシュ用のバージョン文字列を生成する。
+        マニュアルが変更されるとバージョンが変わり、古いキャッシュは参照されなくなる。
+        """
+        parts = sorted(
+            f"{manual.application_id}/{manual.manual_id}.{manual.file_extension}"
+            f"@{manual.updated_at.isoformat() if manual.updated_at else ''}"
+            for manual in manuals
+        )
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
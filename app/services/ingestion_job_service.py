@@ -0,0 +1,101 @@
+from sqlalchemy.orm import Session
+from app.core.logging import NaviApiLog
+from app.middlewares.transaction import transaction
+from app.models.requests.ingestion_job_request import IngestionJobRequest
+from app.models.responses.ingestion_job_response import IngestionJobErrorResponse, IngestionJobResponse
+from app.repositories.ingestion_job_repository import IngestionJobProgressDto, IngestionJobRepository
+from app.repositories.manual_repository import ManualRepository
+
+
+class IngestionJobService:
+    @transaction
+    def enqueue(
+        self,
+        session: Session,
+        job_request: IngestionJobRequest,
+        company_id: int) -> IngestionJobResponse | None:
+        """
+        企業・アプリケーション・マニュアル単位の取り込みジョブを登録する（対象のマニュアルが無い場合は None）
+        同じ対象で完了していないジョブがある場合は、新しく登録せずにそのジョブを返す
+        取り込みは取り込みワーカー（local_setting/local_app/ingestion_worker.py）が行う
+        """
+        # 同時に登録された場合に同じ対象のジョブが重複しないよう、確認から登録までを企業単位で直列にする
+        # （REPEATABLE READ では最初の読み取りで参照する時点が決まるため、他の読み取りより先にロックする）
+        IngestionJobRepository.lock_company(session, company_id=company_id)
+        manuals = ManualRepository.get_by_company_id(
+            session=session,
+            company_id=company_id,
+            application_id=job_request.application_id
+        )
+        if job_request.manual_id is not None:
+            manuals = [manual for manual in manuals if manual.manual_id == job_request.manual_id]
+        if not manuals:
+            return None
+
+        job_id = IngestionJobRepository.find_active_job(
+            session,
+            company_id=company_id,
+            application_id=job_request.application_id,
+            manual_id=job_request.manual_id
+        )
+        if job_id is None:
+            job_id = IngestionJobRepository.create_job(
+                session,
+                company_id=company_id,
+                manuals=manuals,
+                application_id=job_request.application_id,
+                manual_id=job_request.manual_id
+            )
+            NaviApiLog.info(f"取り込みジョブを登録しました。job_id={job_id} マニュアル数={len(manuals)}")
+        else:
+            NaviApiLog.info(f"完了していない取り込みジョブがあるため、そのジョブを返します。job_id={job_id}")
+
+        return self._to_response(IngestionJobRepository.get_progress(session, job_id, company_id))
+
+    @transaction
+    def get_progress(
+        self,
+        session: Session,
+        job_id: int,
+        company_id: int) -> IngestionJobResponse | None:
+        """
+        取り込みジョブの進捗を返す（他の企業のジョブ・存在しないジョブは None）
+        """
+        progress = IngestionJobRepository.get_progress(session, job_id, company_id)
+        if progress is None:
+            return None
+        return self._to_response(progress)
+
+    @staticmethod
+    def _status(progress: IngestionJobProgressDto) -> str:
+        if progress.pending + progress.running > 0:
+            return "running" if progress.started > 0 else "queued"
+        return "failed" if progress.failed > 0 else "succeeded"
+
+    @classmethod
+    def _to_response(cls, progress: IngestionJobProgressDto) -> IngestionJobResponse:
+        finished = progress.succeeded + progress.failed
+        return IngestionJobResponse(
+            job_id=progress.job_id,
+            status=cls._status(progress),
+            application_id=progress.application_id,
+            manual_id=progress.manual_id,
+            total=progress.total,
+            pending=progress.pending,
+            running=progress.running,
+            succeeded=progress.succeeded,
+            failed=progress.failed,
+            chunks=progress.chunks,
+            progress=round(finished / progress.total, 4) if progress.total else 1.0,
+            created_at=progress.created_at,
+            updated_at=progress.updated_at,
+            errors=[
+                IngestionJobErrorResponse(
+                    manual_id=error.manual_id,
+                    status=error.status,
+                    attempts=error.attempts,
+                    error=error.last_error
+                )
+                for error in progress.errors
+            ],
+        )
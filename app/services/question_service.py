@@ -1,35 +1,904 @@
-from app.repositories.manual_repository import ManualRepository
-from app.middlewares.transaction import transaction
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Iterator
+from app.repositories.manual_repository import ManualDto, ManualRepository
+from app.middlewares.transaction import get_db, transaction
 from app.models.requests.question_request import QuestionRequest
+from app.models.requests.question_batch_request import QuestionBatchRequest
 from app.models.responses.question_response import QuestionResponse
-from app.helpers.question_llm_helper import QuestionLLMHelper
+from app.models.responses.question_batch_response import QuestionBatchItemResponse, QuestionBatchResponse
+from app.helpers.question_llm_helper import NOT_FOUND_MESSAGE, QueryEmbeddingHelper, QuestionLLMHelper
+from app.core.utils.sse_util import SseUtil
+from app.core.cache.semantic_answer_cache import SemanticAnswerCache
+from app.core.cache.exact_answer_cache import ExactAnswerCache
+from app.core.cache.corpus_version_registry import CorpusVersionRegistry
+from app.core.cache.faq_store import FaqStore
+from app.core.aws.ssm_client import SsmClient
+from app.core.utils.admission_controller import AdmissionRejectedError
+from app.core.utils.single_flight import FileLock, SingleFlight
+from app.core.utils.text_util import TextUtil
+from app.models.llm.conversation_memory import ConversationMemory
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.core.logging import NaviApiLog
 
 COMMON_PATH = "manuals"
 
+DEFAULT_SINGLE_FLIGHT_SETTING = {
+    "enabled": True,
+    # 先行するリクエストを待つ最大秒数（超えた場合は単独で回答を生成する）
+    "wait_timeout_seconds": 60,
+    # 指定した場合はワーカー間でもファイルロックで生成を1回にまとめる
+    # （完全一致キャッシュの persistent_path が無い場合は他のワーカーの回答を再利用できないため、ロックしない）
+    "lock_dir": None,
+}
+
+DEFAULT_BATCH_SETTING = {
+    # 1つのバッチ内で同時に実行する回答生成（ベクトル検索・LLM呼び出し）の上限
+    "max_concurrency": 4,
+}
+
+# 非同期版でリクエスト毎に参照する設定（期限切れの場合はイベントループ外で取得し直す）
+REQUEST_SETTING_NAMES = ("answer_cache_setting", "question_llm_setting", "llm_setting")
+
+ANSWER_SINGLE_FLIGHT = SingleFlight("answer")
+
+
+@dataclass
+class ManualFiles:
+    file_paths: list[str]
+    corpus_version: str
+
 
 class QuestionService:
+    # lock_dir の設定が無効である警告を出力済みか（プロセス毎に1回のみ出力する）
+    _worker_lock_warned = False
+
     @transaction
     def answer(
         self,
         session: Session,
         question_request: QuestionRequest,
         company_id: int) -> QuestionResponse:
+        thread_id = self._conversation_thread_id(question_request, company_id)
+        if thread_id is not None:
+            return self._generate_conversation_answer(
+                session=session,
+                question_request=question_request,
+                company_id=company_id,
+                thread_id=thread_id
+            )
+
+        # 承認済みのよくある質問に一致する場合は、キャッシュ・検索・LLMを使わずに回答する
+        # （読み込み済みの内容で照合し、変更の確認は完全一致キャッシュに無い場合のみ行う）
+        faq_answer = self._match_loaded_faq(question_request, company_id)
+        if faq_answer is not None:
+            return QuestionResponse(
+                answer=faq_answer
+            )
+
+        use_exact_cache = ExactAnswerCache.is_enabled()
+        # 直近に算出したマニュアル構成のバージョンが有効な間は、MySQLに問い合わせずに完全一致キャッシュを参照する
+        known_corpus_version = None
+        if use_exact_cache:
+            known_corpus_version = CorpusVersionRegistry.get(company_id, question_request.application_id)
+        if known_corpus_version:
+            cached_answer = ExactAnswerCache.get(
+                company_id=company_id,
+                application_id=question_request.application_id,
+                question=question_request.question,
+                corpus_version=known_corpus_version,
+            )
+            if cached_answer is not None:
+                return QuestionResponse(
+                    answer=cached_answer
+                )
+
+        faq_answer = self._match_faq(session, question_request, company_id)
+        if faq_answer is not None:
+            return QuestionResponse(
+                answer=faq_answer
+            )
+
+        single_flight_setting = self._get_single_flight_setting()
+        if not single_flight_setting.get("enabled"):
+            return self._generate_answer(
+                session=session,
+                question_request=question_request,
+                company_id=company_id,
+                use_exact_cache=use_exact_cache,
+                known_corpus_version=known_corpus_version
+            )
+
+        # 同じ質問が同時に届いた場合は、先行するリクエストの回答の生成を待って共有する
+        key = self._single_flight_key(question_request, company_id)
+        return ANSWER_SINGLE_FLIGHT.do(
+            key,
+            lambda: self._generate_answer_with_lock(
+                key=key,
+                setting=single_flight_setting,
+                session=session,
+                question_request=question_request,
+                company_id=company_id,
+                use_exact_cache=use_exact_cache,
+                known_corpus_version=known_corpus_version
+            ),
+            wait_timeout_seconds=single_flight_setting.get("wait_timeout_seconds"),
+        )
+
+    def _generate_answer_with_lock(
+        self,
+        key: tuple,
+        setting: dict,
+        session: Session,
+        question_request: QuestionRequest,
+        company_id: int,
+        use_exact_cache: bool,
+        known_corpus_version: str | None) -> QuestionResponse:
+        """
+        lock_dir と完全一致キャッシュの永続層が設定されている場合は、ワーカー間のファイルロックを取得してから回答を生成する
+        """
+        lock_dir = setting.get("lock_dir")
+        if not self._use_worker_lock(setting):
+            return self._generate_answer(
+                session=session,
+                question_request=question_request,
+                company_id=company_id,
+                use_exact_cache=use_exact_cache,
+                known_corpus_version=known_corpus_version
+            )
+
+        lock = FileLock(lock_dir, key)
+        acquired = lock.acquire(setting.get("wait_timeout_seconds"))
+        if not acquired:
+            NaviApiLog.warning(f"ワーカー間ロックの取得がタイムアウトしたため、単独で回答を生成します。company_id={company_id}")
+        try:
+            # 他のワーカーが回答を生成して永続キャッシュに登録済みの可能性があるため、
+            # マニュアル取得後に完全一致キャッシュを必ず再確認させる
+            return self._generate_answer(
+                session=session,
+                question_request=question_request,
+                company_id=company_id,
+                use_exact_cache=use_exact_cache,
+                known_corpus_version=None
+            )
+        finally:
+            if acquired:
+                lock.release()
+
+    def _generate_answer(
+        self,
+        session: Session,
+        question_request: QuestionRequest,
+        company_id: int,
+        use_exact_cache: bool,
+        known_corpus_version: str | None) -> QuestionResponse:
+        manual_files = self._get_manual_files(
+            session=session,
+            company_id=company_id,
+            application_id=question_request.application_id
+        )
+
+        # マニュアルが無い場合は固定メッセージとなるためキャッシュ対象外
+        use_exact_cache = use_exact_cache and bool(manual_files.file_paths)
+        if use_exact_cache and manual_files.corpus_version != known_corpus_version:
+            cached_answer = ExactAnswerCache.get(
+                company_id=company_id,
+                application_id=question_request.application_id,
+                question=question_request.question,
+                corpus_version=manual_files.corpus_version,
+            )
+            if cached_answer is not None:
+                return QuestionResponse(
+                    answer=cached_answer
+                )
+
+        use_semantic_cache = bool(manual_files.file_paths) and SemanticAnswerCache.is_enabled()
+        use_faq = FaqStore.should_match_semantic(company_id, question_request.application_id)
+        query_embedding = None
+        if use_semantic_cache or use_faq:
+            # 照合は埋め込みモデルのみで行い、ヒットした場合はベクターストア・LLMの初期化を省く
+            embedder = QueryEmbeddingHelper()
+            query_embedding = embedder.embed_query(question_request.question)
+        if use_faq:
+            faq_answer = FaqStore.match_semantic(
+                company_id=company_id,
+                application_id=question_request.application_id,
+                embedding=query_embedding,
+                embed_texts=embedder.embed_queries,
+            )
+            if faq_answer is not None:
+                return QuestionResponse(
+                    answer=faq_answer
+                )
+        if use_semantic_cache:
+            cached_answer = SemanticAnswerCache.lookup(
+                company_id=company_id,
+                application_id=question_request.application_id,
+                corpus_version=manual_files.corpus_version,
+                embedding=query_embedding,
+            )
+            if cached_answer is not None:
+                return QuestionResponse(
+                    answer=cached_answer
+                )
+
+        helper = QuestionLLMHelper(
+            file_paths=manual_files.file_paths, collection_name=COMMON_PATH, company_id=company_id
+        )
+        answer = helper.answer_question(
+            question_text=question_request.question,
+            query_embedding=query_embedding
+        )
+
+        self._store_answer(
+            question_request=question_request,
+            company_id=company_id,
+            corpus_version=manual_files.corpus_version,
+            answer=answer,
+            use_exact_cache=use_exact_cache,
+            query_embedding=query_embedding if use_semantic_cache else None,
+        )
+
+        return QuestionResponse(
+            answer=answer
+        )
+
+    async def aanswer(
+        self,
+        question_request: QuestionRequest,
+        company_id: int) -> QuestionResponse:
+        """
+        answer の非同期版
+
+        マニュアル取得（aiomysql）・ベクトル検索（非同期PGVector）・LLM呼び出し（ainvoke）を
+        イベントループ上で待機するため、生成中にスレッドプールのスレッドを占有しない。
+        MySQLのセッションはマニュアル取得・よくある質問の確認の間のみ使用し、
+        ベクトル検索・LLMの応答待ちの間は接続プールに返却しておく。
+        """
+        await SsmClient.aprefetch_cached_parameters(REQUEST_SETTING_NAMES)
+        thread_id = self._conversation_thread_id(question_request, company_id)
+        if thread_id is not None:
+            return await self._agenerate_conversation_answer(
+                question_request=question_request,
+                company_id=company_id,
+                thread_id=thread_id
+            )
+
+        faq_answer = self._match_loaded_faq(question_request, company_id)
+        if faq_answer is not None:
+            return QuestionResponse(
+                answer=faq_answer
+            )
+
+        use_exact_cache = ExactAnswerCache.is_enabled()
+        known_corpus_version = None
+        if use_exact_cache:
+            known_corpus_version = CorpusVersionRegistry.get(company_id, question_request.application_id)
+        if known_corpus_version:
+            cached_answer = ExactAnswerCache.get(
+                company_id=company_id,
+                application_id=question_request.application_id,
+                question=question_request.question,
+                corpus_version=known_corpus_version,
+            )
+            if cached_answer is not None:
+                return QuestionResponse(
+                    answer=cached_answer
+                )
+
+        faq_answer = await self._amatch_faq(question_request, company_id)
+        if faq_answer is not None:
+            return QuestionResponse(
+                answer=faq_answer
+            )
+
+        single_flight_setting = self._get_single_flight_setting()
+        if not single_flight_setting.get("enabled"):
+            return await self._agenerate_answer(
+                question_request=question_request,
+                company_id=company_id,
+                use_exact_cache=use_exact_cache,
+                known_corpus_version=known_corpus_version
+            )
+
+        key = self._single_flight_key(question_request, company_id)
+        return await ANSWER_SINGLE_FLIGHT.ado(
+            key,
+            lambda: self._agenerate_answer_with_lock(
+                key=key,
+                setting=single_flight_setting,
+                question_request=question_request,
+                company_id=company_id,
+                use_exact_cache=use_exact_cache,
+                known_corpus_version=known_corpus_version
+            ),
+            wait_timeout_seconds=single_flight_setting.get("wait_timeout_seconds"),
+        )
+
+    async def _agenerate_answer_with_lock(
+        self,
+        key: tuple,
+        setting: dict,
+        question_request: QuestionRequest,
+        company_id: int,
+        use_exact_cache: bool,
+        known_corpus_version: str | None) -> QuestionResponse:
+        """
+        _generate_answer_with_lock の非同期版
+        """
+        lock_dir = setting.get("lock_dir")
+        if not self._use_worker_lock(setting):
+            return await self._agenerate_answer(
+                question_request=question_request,
+                company_id=company_id,
+                use_exact_cache=use_exact_cache,
+                known_corpus_version=known_corpus_version
+            )
+
+        lock = FileLock(lock_dir, key)
+        acquired = await lock.aacquire(setting.get("wait_timeout_seconds"))
+        if not acquired:
+            NaviApiLog.warning(f"ワーカー間ロックの取得がタイムアウトしたため、単独で回答を生成します。company_id={company_id}")
+        try:
+            return await self._agenerate_answer(
+                question_request=question_request,
+                company_id=company_id,
+                use_exact_cache=use_exact_cache,
+                known_corpus_version=None
+            )
+        finally:
+            if acquired:
+                lock.release()
+
+    async def _agenerate_answer(
+        self,
+        question_request: QuestionRequest,
+        company_id: int,
+        use_exact_cache: bool,
+        known_corpus_version: str | None) -> QuestionResponse:
+        manual_files = await self._aget_manual_files(
+            company_id=company_id,
+            application_id=question_request.application_id
+        )
+
+        use_exact_cache = use_exact_cache and bool(manual_files.file_paths)
+        if use_exact_cache and manual_files.corpus_version != known_corpus_version:
+            cached_answer = ExactAnswerCache.get(
+                company_id=company_id,
+                application_id=question_request.application_id,
+                question=question_request.question,
+                corpus_version=manual_files.corpus_version,
+            )
+            if cached_answer is not None:
+                return QuestionResponse(
+                    answer=cached_answer
+                )
+
+        use_semantic_cache = bool(manual_files.file_paths) and SemanticAnswerCache.is_enabled()
+        use_faq = FaqStore.should_match_semantic(company_id, question_request.application_id)
+        query_embedding = None
+        if use_semantic_cache or use_faq:
+            # 照合は埋め込みモデルのみで行い、ヒットした場合はベクターストア・LLMの初期化を省く
+            embedder = await asyncio.to_thread(QueryEmbeddingHelper)
+            query_embedding = await embedder.aembed_query(question_request.question)
+        if use_faq:
+            faq_answer = await FaqStore.amatch_semantic(
+                company_id=company_id,
+                application_id=question_request.application_id,
+                embedding=query_embedding,
+                embed_texts=embedder.aembed_queries,
+            )
+            if faq_answer is not None:
+                return QuestionResponse(
+                    answer=faq_answer
+                )
+        if use_semantic_cache:
+            cached_answer = SemanticAnswerCache.lookup(
+                company_id=company_id,
+                application_id=question_request.application_id,
+                corpus_version=manual_files.corpus_version,
+                embedding=query_embedding,
+            )
+            if cached_answer is not None:
+                return QuestionResponse(
+                    answer=cached_answer
+                )
+
+        # モデルの初期化（SSM参照・同期PGVectorの初期化）はブロッキングのため別スレッドで行う
+        helper = await asyncio.to_thread(
+            QuestionLLMHelper,
+            file_paths=manual_files.file_paths,
+            collection_name=COMMON_PATH,
+            company_id=company_id
+        )
+        answer = await helper.aanswer_question(
+            question_text=question_request.question,
+            query_embedding=query_embedding
+        )
+
+        self._store_answer(
+            question_request=question_request,
+            company_id=company_id,
+            corpus_version=manual_files.corpus_version,
+            answer=answer,
+            use_exact_cache=use_exact_cache,
+            query_embedding=query_embedding if use_semantic_cache else None,
+        )
+
+        return QuestionResponse(
+            answer=answer
+        )
+
+    def _generate_conversation_answer(
+        self,
+        session: Session,
+        question_request: QuestionRequest,
+        company_id: int,
+        thread_id: str) -> QuestionResponse:
+        """
+        会話モードの回答を生成する
+        回答がこれまでのやり取りに依存するため、回答キャッシュと同一質問の合流は使用しない
+        """
+        manual_files = self._get_manual_files(
+            session=session,
+            company_id=company_id,
+            application_id=question_request.application_id
+        )
+        helper = QuestionLLMHelper(
+            file_paths=manual_files.file_paths, collection_name=COMMON_PATH, company_id=company_id
+        )
+        answer = helper.answer_question(
+            question_text=question_request.question,
+            conversation_id=thread_id
+        )
+        return QuestionResponse(
+            answer=answer
+        )
+
+    async def _agenerate_conversation_answer(
+        self,
+        question_request: QuestionRequest,
+        company_id: int,
+        thread_id: str) -> QuestionResponse:
+        """
+        _generate_conversation_answer の非同期版
+        """
+        manual_files = await self._aget_manual_files(
+            company_id=company_id,
+            application_id=question_request.application_id
+        )
+        helper = await asyncio.to_thread(
+            QuestionLLMHelper,
+            file_paths=manual_files.file_paths,
+            collection_name=COMMON_PATH,
+            company_id=company_id
+        )
+        answer = await helper.aanswer_question(
+            question_text=question_request.question,
+            conversation_id=thread_id
+        )
+        return QuestionResponse(
+            answer=answer
+        )
+
+    async def aanswer_batch(
+        self,
+        batch_request: QuestionBatchRequest,
+        company_id: int) -> QuestionBatchResponse:
+        """
+        同じテナントの複数の質問にまとめて回答する
+
+        マニュアルの取得・モデルの初期化は1回だけ行い、質問の埋め込みは1回のバッチで計算する。
+        キャッシュに無い質問の回答生成（ベクトル検索・LLM呼び出し）は同時実行数の上限付きで並行に行い、
+        1件の失敗がバッチ全体を失敗させないよう、結果とエラーは質問毎に返却する。
+        同じ質問（正規化後）が複数含まれる場合は1回だけ生成する。
+        MySQLのセッションはマニュアル取得・よくある質問の確認の間のみ使用する。
+        """
+        started_at = time.perf_counter()
+        application_id = batch_request.application_id
+        questions = batch_request.questions
+        results: list[QuestionBatchItemResponse | None] = [None] * len(questions)
+
+        await SsmClient.aprefetch_cached_parameters(REQUEST_SETTING_NAMES)
+        use_faq = FaqStore.is_enabled()
+        async with get_db().get_async_session() as session:
+            manual_files = await self._aget_manual_files(
+                company_id=company_id,
+                application_id=application_id,
+                session=session
+            )
+            if use_faq:
+                await FaqStore.arefresh(session=session, company_id=company_id, application_id=application_id)
+        use_exact_cache = ExactAnswerCache.is_enabled() and bool(manual_files.file_paths)
+
+        # 正規化後の質問毎に、回答が必要な位置をまとめる
+        pending: dict[str, list[int]] = {}
+        for index, question in enumerate(questions):
+            if not question or not question.strip():
+                results[index] = QuestionBatchItemResponse(index=index, question=question, error="質問が空です")
+                continue
+            if use_faq:
+                faq_answer = FaqStore.match_exact(company_id, application_id, question)
+                if faq_answer is not None:
+                    results[index] = QuestionBatchItemResponse(index=index, question=question, answer=faq_answer)
+                    continue
+            if use_exact_cache:
+                cached_answer = ExactAnswerCache.get(
+                    company_id=company_id,
+                    application_id=application_id,
+                    question=question,
+                    corpus_version=manual_files.corpus_version,
+                )
+                if cached_answer is not None:
+                    results[index] = QuestionBatchItemResponse(index=index, question=question, answer=cached_answer)
+                    continue
+            pending.setdefault(TextUtil.normalize_question(question), []).append(index)
+
+        if pending:
+            await self._agenerate_batch_answers(
+                questions=questions,
+                pending=list(pending.values()),
+                results=results,
+                application_id=application_id,
+                company_id=company_id,
+                manual_files=manual_files,
+                use_exact_cache=use_exact_cache,
+            )
+
+        error_count = sum(1 for result in results if result.error is not None)
+        NaviApiLog.business("question_batch_completed", {
+            "company_id": company_id,
+            "application_id": application_id,
+            "question_count": len(questions),
+            "generated_count": len(pending),
+            "error_count": error_count,
+            "elapsed_ms": round((time.perf_counter() - started_at) * 1000, 2),
+        })
+        return QuestionBatchResponse(results=results)
+
+    async def _agenerate_batch_answers(
+        self,
+        questions: list[str],
+        pending: list[list[int]],
+        results: list[QuestionBatchItemResponse | None],
+        application_id: int | None,
+        company_id: int,
+        manual_files: ManualFiles,
+        use_exact_cache: bool) -> None:
+        """
+        キャッシュに無い質問の回答を生成し、results の該当位置に設定する
+
+        Args:
+            pending: 同じ質問（正規化後）毎の questions における位置のリスト
+        """
+        texts = [questions[indexes[0]] for indexes in pending]
+
+        use_faq = FaqStore.should_match_semantic(company_id, application_id)
+        embeddings: list[list[float] | None] = [None] * len(texts)
+        if manual_files.file_paths or use_faq:
+            try:
+                embedder = await asyncio.to_thread(QueryEmbeddingHelper)
+                embeddings = await embedder.aembed_queries(texts)
+            except Exception as e:
+                # 埋め込みに失敗した場合は、ベクトル検索で質問毎に埋め込む
+                NaviApiLog.warning(f"質問の一括埋め込みに失敗したため、質問毎に埋め込みます: {e}")
+
+        use_semantic_cache = bool(manual_files.file_paths) and SemanticAnswerCache.is_enabled()
+        semaphore = asyncio.Semaphore(self._get_batch_setting().get("max_concurrency"))
+        helper_task: asyncio.Future | None = None
+
+        def get_helper() -> asyncio.Future:
+            # 回答生成が必要な質問が出た時点で一度だけ構築し、バッチ内で共有する
+            nonlocal helper_task
+            if helper_task is None:
+                helper_task = asyncio.ensure_future(asyncio.to_thread(
+                    QuestionLLMHelper,
+                    file_paths=manual_files.file_paths,
+                    collection_name=COMMON_PATH,
+                    company_id=company_id
+                ))
+            return helper_task
+
+        async def generate(text: str, embedding: list[float] | None) -> str:
+            if use_faq and embedding is not None:
+                faq_answer = await FaqStore.amatch_semantic(
+                    company_id=company_id,
+                    application_id=application_id,
+                    embedding=embedding,
+                    embed_texts=embedder.aembed_queries,
+                )
+                if faq_answer is not None:
+                    return faq_answer
+            if use_semantic_cache and embedding is not None:
+                cached_answer = SemanticAnswerCache.lookup(
+                    company_id=company_id,
+                    application_id=application_id,
+                    corpus_version=manual_files.corpus_version,
+                    embedding=embedding,
+                )
+                if cached_answer is not None:
+                    return cached_answer
+            if not manual_files.file_paths:
+                # マニュアルが無い場合は LLM を使用せず、回答が見つからない旨を返す（キャッシュしない）
+                return NOT_FOUND_MESSAGE
+            helper = await get_helper()
+            async with semaphore:
+                answer = await helper.aanswer_question(question_text=text, query_embedding=embedding)
+            self._store_answer(
+                question_request=QuestionRequest(application_id=application_id, question=text),
+                company_id=company_id,
+                corpus_version=manual_files.corpus_version,
+                answer=answer,
+                use_exact_cache=use_exact_cache,
+                query_embedding=embedding if use_semantic_cache else None,
+            )
+            return answer
+
+        outcomes = await asyncio.gather(
+            *[generate(text, embedding) for text, embedding in zip(texts, embeddings)],
+            return_exceptions=True
+        )
+
+        for indexes, outcome in zip(pending, outcomes):
+            answer = None
+            error = None
+            if isinstance(outcome, AdmissionRejectedError):
+                error = outcome.message
+            elif isinstance(outcome, BaseException):
+                NaviApiLog.error(
+                    f"バッチ内の回答生成に失敗しました。"
+                    f"company_id={company_id} "
+                    f"application_id={application_id} "
+                    f"error={outcome}"
+                )
+                error = "回答の生成中にエラーが発生しました"
+            else:
+                answer = outcome
+            for index in indexes:
+                results[index] = QuestionBatchItemResponse(
+                    index=index, question=questions[index], answer=answer, error=error
+                )
+
+    @staticmethod
+    def _get_batch_setting() -> dict:
+        setting = SsmClient.get_cached_parameter("question_llm_setting", default={})
+        batch_setting = setting.get("batch", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_BATCH_SETTING, **batch_setting}
+
+    @classmethod
+    def check_single_flight_setting(cls) -> None:
+        """
+        起動時に同一質問の合流の設定を確認する（ワーカー間のロックを使用しない設定の場合は警告を出力する）
+        """
+        setting = cls._get_single_flight_setting()
+        if setting.get("enabled"):
+            cls._use_worker_lock(setting)
+
+    @classmethod
+    def _use_worker_lock(cls, setting: dict) -> bool:
+        """
+        ワーカー間のファイルロックを使用するか
+        先行したワーカーの回答は完全一致キャッシュの永続層でのみ共有されるため、永続層が無い場合は使用しない
+        """
+        if not setting.get("lock_dir") or not FileLock.is_supported():
+            return False
+        exact_setting = ExactAnswerCache.get_setting()
+        if exact_setting.get("enabled") and exact_setting.get("persistent_path"):
+            return True
+        if not cls._worker_lock_warned:
+            cls._worker_lock_warned = True
+            NaviApiLog.warning(
+                "single_flight.lock_dir が設定されていますが、完全一致キャッシュの persistent_path が無いため"
+                "ワーカー間のロックは使用しません"
+            )
+        return False
+
+    @staticmethod
+    def _get_single_flight_setting() -> dict:
+        setting = SsmClient.get_cached_parameter("answer_cache_setting", default={})
+        single_flight_setting = setting.get("single_flight", {}) if isinstance(setting, dict) else {}
+        return {**DEFAULT_SINGLE_FLIGHT_SETTING, **single_flight_setting}
+
+    @staticmethod
+    def _match_loaded_faq(question_request: QuestionRequest, company_id: int) -> str | None:
+        """
+        MySQLに問い合わせずに、読み込み済みのよくある質問と照合する
+        完全一致キャッシュにヒットする質問でも、読み込み済みのよくある質問を優先する
+        """
+        if not FaqStore.is_enabled():
+            return None
+        return FaqStore.match_exact(company_id, question_request.application_id, question_request.question)
+
+    @staticmethod
+    def _match_faq(session: Session, question_request: QuestionRequest, company_id: int) -> str | None:
+        """
+        変更を確認したうえで、正規化後の質問が一致するよくある質問の回答を返す
+        """
+        if not FaqStore.is_enabled():
+            return None
+        FaqStore.refresh(session=session, company_id=company_id, application_id=question_request.application_id)
+        return FaqStore.match_exact(company_id, question_request.application_id, question_request.question)
+
+    @staticmethod
+    async def _amatch_faq(question_request: QuestionRequest, company_id: int) -> str | None:
+        """
+        _match_faq の非同期版（変更を確認する場合のみ、短いセッションで MySQL に問い合わせる）
+        """
+        if not FaqStore.is_enabled():
+            return None
+        if FaqStore.needs_refresh(company_id, question_request.application_id):
+            async with get_db().get_async_session() as session:
+                await FaqStore.arefresh(
+                    session=session, company_id=company_id, application_id=question_request.application_id
+                )
+        return FaqStore.match_exact(company_id, question_request.application_id, question_request.question)
+
+    @staticmethod
+    def _conversation_thread_id(question_request: QuestionRequest, company_id: int) -> str | None:
+        """
+        会話IDが指定され、会話モードが有効な場合に会話の thread_id を返す
+        """
+        if not question_request.conversation_id:
+            return None
+        setting = ConversationMemory.get_setting(
+            SsmClient.get_cached_parameter("question_llm_setting", default={})
+        )
+        if not setting.get("enabled"):
+            return None
+        return ConversationMemory.thread_id(
+            company_id=company_id,
+            application_id=question_request.application_id,
+            conversation_id=question_request.conversation_id
+        )
+
+    @staticmethod
+    def _single_flight_key(question_request: QuestionRequest, company_id: int) -> tuple:
+        return (
+            company_id,
+            question_request.application_id,
+            TextUtil.normalize_question(question_request.question),
+        )
+
+    def _store_answer(
+        self,
+        question_request: QuestionRequest,
+        company_id: int,
+        corpus_version: str,
+        answer: str,
+        use_exact_cache: bool,
+        query_embedding: list[float] | None) -> None:
+        """
+        生成した回答を完全一致キャッシュ・セマンティックキャッシュに登録する
+        """
+        if use_exact_cache:
+            ExactAnswerCache.set(
+                company_id=company_id,
+                application_id=question_request.application_id,
+                question=question_request.question,
+                corpus_version=corpus_version,
+                answer=answer,
+            )
+        if query_embedding is not None:
+            SemanticAnswerCache.store(
+                company_id=company_id,
+                application_id=question_request.application_id,
+                corpus_version=corpus_version,
+                question=question_request.question,
+                embedding=query_embedding,
+                answer=answer,
+            )
+
+    def answer_stream(
+        self,
+        question_request: QuestionRequest,
+        company_id: int) -> Iterator[str]:
+        """
+        質問に対する回答をSSEイベントとして逐次返却する
+
+        マニュアル取得とモデルの初期化はレスポンス開始前に行い、
+        失敗した場合は通常のHTTPエラーとして返却する。
+
+        イベント:
+            token: 回答テキストの断片 {"text": "..."}
+            done:  完了通知とメタデータ {"answer_length": .., "token_count": .., "elapsed_ms": ..}
+            error: 生成中のエラー {"message": "..."}
+        """
+        started_at = time.perf_counter()
+        manual_files = self.get_manual_files(
+            company_id=company_id,
+            application_id=question_request.application_id
+        )
+        helper = QuestionLLMHelper(
+            file_paths=manual_files.file_paths, collection_name=COMMON_PATH, company_id=company_id
+        )
+        return self._stream_events(
+            helper=helper,
+            question_request=question_request,
+            company_id=company_id,
+            file_count=len(manual_files.file_paths),
+            started_at=started_at,
+        )
+
+    @transaction
+    def get_manual_files(
+        self,
+        session: Session,
+        company_id: int,
+        application_id: int | None) -> ManualFiles:
+        """
+        トランザクション内でマニュアルのS3ファイルパスを取得する
+        """
+        return self._get_manual_files(
+            session=session,
+            company_id=company_id,
+            application_id=application_id
+        )
+
+    def _get_manual_files(
+        self,
+        session: Session,
+        company_id: int,
+        application_id: int | None) -> ManualFiles:
         NaviApiLog.info(
             f"マニュアルを取得します。"
             f"company_id={company_id} "
-            f"application_id={question_request.application_id}"
+            f"application_id={application_id}"
         )
         manuals = ManualRepository.get_by_company_id(
             session=session,
             company_id=company_id,
-            application_id=question_request.application_id
+            application_id=application_id
+        )
+        return self._build_manual_files(
+            company_id=company_id,
+            application_id=application_id,
+            manuals=manuals
+        )
+
+    async def _aget_manual_files(
+        self,
+        company_id: int,
+        application_id: int | None,
+        session: AsyncSession | None = None) -> ManualFiles:
+        """
+        _get_manual_files の非同期版
+        session を指定しない場合は取得の間のみセッションを使用し、回答の生成中は接続を保持しない
+        """
+        NaviApiLog.info(
+            f"マニュアルを取得します。"
+            f"company_id={company_id} "
+            f"application_id={application_id}"
+        )
+        if session is None:
+            async with get_db().get_async_session() as session:
+                manuals = await ManualRepository.aget_by_company_id(
+                    session=session,
+                    company_id=company_id,
+                    application_id=application_id
+                )
+        else:
+            manuals = await ManualRepository.aget_by_company_id(
+                session=session,
+                company_id=company_id,
+                application_id=application_id
+            )
+        return self._build_manual_files(
+            company_id=company_id,
+            application_id=application_id,
+            manuals=manuals
         )
+
+    def _build_manual_files(
+        self,
+        company_id: int,
+        application_id: int | None,
+        manuals: list[ManualDto]) -> ManualFiles:
         NaviApiLog.info(
             f"マニュアルを取得しました。"
             f"company_id={company_id} "
-            f"application_id={question_request.application_id} "
+            f"application_id={application_id} "
             f"マニュアル数={len(manuals)}"
         )
 
@@ -39,11 +908,57 @@ class QuestionService:
                 f"{COMMON_PATH}/{manual.company_id}/{manual.application_id}/{manual.manual_id}.{manual.file_extension}"
             )
         NaviApiLog.info(f"s3ファイルパスリスト={file_paths}")
+        corpus_version = ManualRepository.build_corpus_version(manuals)
+        CorpusVersionRegistry.update(company_id, application_id, corpus_version)
+        return ManualFiles(
+            file_paths=file_paths,
+            corpus_version=corpus_version
+        )
 
-        answer = QuestionLLMHelper(
-            file_paths=file_paths,collection_name=COMMON_PATH
-        ).answer_question(question_text=question_request.question)
+    def _stream_events(
+        self,
+        helper: QuestionLLMHelper,
+        question_request: QuestionRequest,
+        company_id: int,
+        file_count: int,
+        started_at: float) -> Iterator[str]:
+        token_count = 0
+        answer_length = 0
+        first_token_ms = None
+        thread_id = self._conversation_thread_id(question_request, company_id)
+        stream_kwargs = {} if thread_id is None else {"conversation_id": thread_id}
+        try:
+            for text in helper.stream_answer(question_text=question_request.question, **stream_kwargs):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started_at) * 1000, 2)
+                token_count += 1
+                answer_length += len(text)
+                yield SseUtil.format_event({"text": text}, event="token")
+        except AdmissionRejectedError as e:
+            # レスポンスは開始済みのため、ステータスコードの代わりに再試行までの秒数を通知する
+            yield SseUtil.format_event(
+                {"message": e.message, "retry_after_seconds": e.retry_after_seconds},
+                event="error"
+            )
+            return
+        except Exception as e:
+            NaviApiLog.error(
+                f"回答のストリーミングに失敗しました。"
+                f"company_id={company_id} "
+                f"application_id={question_request.application_id} "
+                f"error={e}"
+            )
+            yield SseUtil.format_event({"message": "回答の生成中にエラーが発生しました"}, event="error")
+            return
 
-        return QuestionResponse(
-            answer=answer
-        )
+        metadata = {
+            "company_id": company_id,
+            "application_id": question_request.application_id,
+            "manual_count": file_count,
+            "token_count": token_count,
+            "answer_length": answer_length,
+            "first_token_ms": first_token_ms,
+            "elapsed_ms": round((time.perf_counter() - started_at) * 1000, 2),
+        }
+        NaviApiLog.business("question_stream_completed", metadata)
+        yield SseUtil.format_event(metadata, event="done")
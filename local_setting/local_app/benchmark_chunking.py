@@ -0,0 +1,82 @@
+import argparse
+import statistics
+import time
+import numpy as np
+from langchain_core.documents import Document
+from app.core.aws.ssm_client import SsmClient
+from app.models.llm.context_packer import TokenCounter
+from app.models.llm.document_loader import partition_file
+from app.models.llm.embedding_model import EmbeddingModelManager
+from app.models.llm.ingestion_pipeline import embed_texts
+from app.models.llm.text_splitter import JapaneseTextSplitter
+
+
+def benchmark_chunking():
+    """
+    チャンクの大きさ毎に、検索結果（上位k件）のトークン数と検索時間を比較するスクリプト。
+    ローカルのマニュアルと質問を指定して実行する。
+    検索時間は質問の埋め込みと全チャンクとのコサイン類似度の計算（メモリ上）の時間で、PGVectorの通信は含まない。
+
+    例: python benchmark_chunking.py --files manual.pdf --questions "駐車場はありますか" --chunk-sizes 0 200 400 800
+        （chunk-size 0 は分割せず、ページ単位で埋め込んだ場合）
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", nargs="+", required=True)
+    parser.add_argument("--questions", nargs="+", required=True)
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[0, 200, 400, 800])
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    embedding_setting = SsmClient().get_parameter("embedding_setting")
+    embeddings = EmbeddingModelManager.get_embedding_model(
+        model_name=embedding_setting.get("model_name"),
+        api_key=embedding_setting.get("api_key"),
+        device=embedding_setting.get("device", "cpu"),
+        use_api=False)
+    token_counter = TokenCounter()
+
+    documents: list[list[Document]] = []
+    for file_path in args.files:
+        pages = partition_file(file_path)
+        for page in pages:
+            page.metadata["source"] = file_path
+        documents.append(pages)
+
+    print("chunk_size\tchunks\tavg_chunk_tokens\tavg_context_tokens\tp50_retrieval_ms\tp95_retrieval_ms")
+    for chunk_size in args.chunk_sizes:
+        splitter = None
+        if chunk_size > 0:
+            splitter = JapaneseTextSplitter({"chunk_size": chunk_size, "chunk_overlap": args.chunk_overlap})
+        chunks = [chunk for pages in documents for chunk in (splitter(pages) if splitter else pages)]
+        chunks = [chunk for chunk in chunks if chunk.page_content.strip()]
+
+        vectors = np.array(embed_texts(embeddings, [chunk.page_content for chunk in chunks]), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+
+        context_tokens = []
+        latencies = []
+        for question in args.questions:
+            for _ in range(args.repeat):
+                started_at = time.perf_counter()
+                query = np.array(embeddings.embed_query(question), dtype=np.float32)
+                scores = vectors @ (query / (np.linalg.norm(query) + 1e-12))
+                top_indexes = np.argsort(-scores)[:args.k]
+                latencies.append((time.perf_counter() - started_at) * 1000)
+            context_tokens.append(sum(token_counter.count(chunks[index].page_content) for index in top_indexes))
+
+        chunk_tokens = [token_counter.count(chunk.page_content) for chunk in chunks]
+        latencies.sort()
+        print(
+            f"{chunk_size or 'page'}\t"
+            f"{len(chunks)}\t"
+            f"{statistics.mean(chunk_tokens):.1f}\t"
+            f"{statistics.mean(context_tokens):.1f}\t"
+            f"{latencies[len(latencies) // 2]:.2f}\t"
+            f"{latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    benchmark_chunking()
@@ -0,0 +1,52 @@
+import argparse
+import multiprocessing
+import signal
+from app.core.logging import NaviApiLog
+from app.models.llm.ingestion_worker import IngestionWorker
+from local_setting.local_app.init_vectors import BaseLLMModel_InitWrapper
+
+
+def run_worker(stop_event) -> None:
+    """
+    1プロセス分の取り込みワーカー（埋め込みモデル・ベクターストアはプロセス毎に作成する）
+    """
+    # 停止は親プロセスが stop_event で伝えるため、Ctrl+C は親プロセスのみで受け取る
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    bucket_name = "manuals"
+    llm_wrapper = BaseLLMModel_InitWrapper([bucket_name], collection_name="manuals")
+    engine = llm_wrapper.create_sync_engine(bucket_name)
+    IngestionWorker(engine, setting=IngestionWorker.get_setting()).run(stop_event)
+
+
+def main() -> None:
+    """
+    取り込みジョブ（POST /ingestion/jobs）のマニュアルをベクターストアに取り込むワーカーを起動するスクリプト。
+    SIGTERM・SIGINT を受け取ると、処理中のマニュアルを終えてから停止する。
+    停止中に取得していたマニュアルは lease_seconds 後に他のワーカー（再起動後を含む）が取り込み直す。
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=None, help="ワーカーのプロセス数（未指定は ingestion_setting.jobs.processes）")
+    args = parser.parse_args()
+    processes = max(1, args.processes or int(IngestionWorker.get_setting().get("processes")))
+
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+
+    def stop(signum, frame) -> None:
+        NaviApiLog.info("停止を受け付けました。処理中のマニュアルを終えてから停止します。")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    NaviApiLog.info(f"取り込みワーカーを{processes}プロセスで起動します。")
+    workers = [context.Process(target=run_worker, args=(stop_event,), daemon=False) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    NaviApiLog.info("全ての取り込みワーカーが停止しました。")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,37 @@
 from app.models.llm.base_llm_model import BaseLLMModel
 from app.core.aws.s3_client import S3Client
 from app.core.logging import NaviApiLog
+from app.middlewares.transaction import get_db
+from app.repositories.manual_repository import ManualRepository
 
 def init_vectors():
     """
-    local_data/minio/manuals 配下のPDFファイルを走査し、
-    一括でVector DBに登録するスクリプト。
+    S3のマニュアルとVector DBを差分で同期するスクリプト。
+    MySQLに登録されている（削除されていない）マニュアルのうち、
+    追加・更新されたものだけを埋め込み、削除されたもののベクトルを削除する。
     """
-    NaviApiLog.info("マニュアルでベクトルデータベースを初期化しています...")
-    
-    # ローカルのMinIOデータフォルダ (docker-composeのvolumes構成に依存)
-    # navi-api-appコンテナからは MinIOは見えないため、単純にS3クライアント経由で取得するのが正しいが、
-    # ここでは「初期化」として、まずバケット内の全ファイルを取得するロジックを組む。
-    
+    NaviApiLog.info("マニュアルでベクトルデータベースを同期しています...")
+
     bucket_name = "manuals"
-    
-    # 既存のS3Clientなどを利用してバケット内のファイル一覧を取得
-    # S3上のファイルを全て登録したい場合:
+
     try:
         s3 = S3Client()
-        # バケット内のオブジェクトをリストアップ（プレフィックスなしで全件）
-        objects = s3.list_objects(bucket_name=bucket_name)
-        
-        file_paths = []
-        if objects:
-            for obj in objects:
-                # S3のキーを取得（例: "/1/1/100.pdf"）
-                key = obj['Key']
-                # PDFファイルのみ対象にする等のフィルタが必要ならここに記述
-                if key.endswith('.pdf'):
-                    # LangChainのS3FileLoaderはbucket引数とkey引数を別々に取るため
-                    # ここではkeyのみをリストに追加する
-                    file_paths.append(key)
-        NaviApiLog.warning(f"ファイル数: {file_paths}")
-        
-        if not file_paths:
-            NaviApiLog.warning(f"バケット'{bucket_name}'にPDFファイルが見つかりませんでした。")
-            return
+        # バケット内のオブジェクトを企業ID毎に並行して取得し、1件ずつ同期対象の判定に渡す（全件をメモリに保持しない）
+        # キーは "{企業ID}/{アプリケーションID}/{マニュアルID}.{拡張子}"、ETag・Size を変更の判定に使用する
+        objects = s3.iter_objects_sharded(bucket_name=bucket_name)
+
+        # 論理削除されたマニュアルは同期対象から外す（ベクトルは削除される）
+        with get_db().get_session() as session:
+            manuals = ManualRepository.get_all_active(session)
+        NaviApiLog.info(f"MySQLに{len(manuals)}件のマニュアルが登録されています。")
+
+        # file_paths は検索時のフィルタにのみ使用するため、同期ではバケット全体を表す値を渡す
+        llm_wrapper = BaseLLMModel_InitWrapper([bucket_name], collection_name="manuals")
+        stats = llm_wrapper.sync_documents(bucket_name, objects, manuals)
 
-        NaviApiLog.info(f"バケット内に{len(file_paths)}個のファイルが見つかりました。")
-        
-        # BaseLLMModelを初期化して、既存のベクトル化済みファイルを取得
-        llm_wrapper = BaseLLMModel_InitWrapper([], collection_name="manuals")
-        existing_sources = llm_wrapper.get_existing_sources()
-        NaviApiLog.info(f"ベクトルストア内に{len(existing_sources)}個の既存ドキュメントが見つかりました。")
-        
-        # 未ベクトル化のファイルのみをフィルタリング
-        new_file_paths = []
-        for file_path in file_paths:
-            source_key = f"{bucket_name}/{file_path}"
-            if source_key not in existing_sources:
-                new_file_paths.append(file_path)
-            else:
-                NaviApiLog.debug(f"既にベクトル化済みのファイルをスキップします: {source_key}")
-        
-        if not new_file_paths:
-            NaviApiLog.info("全てのファイルが既にベクトル化されています。追加するファイルはありません。")
-            return
-        
-        NaviApiLog.info(f"全{len(file_paths)}ファイル中、{len(new_file_paths)}個の新規ファイルを処理します。")
-        
-        # 未ベクトル化のファイルのみを登録
-        llm_wrapper.ingest_documents(bucket_name, new_file_paths)
-        
-        NaviApiLog.info("ベクトルデータベースの初期化が正常に完了しました。")
+        if stats.failed_files:
+            NaviApiLog.warning(f"同期に失敗したファイルがあります（次回の同期で再試行します）: {stats.failed_files}")
+        NaviApiLog.info("ベクトルデータベースの同期が正常に完了しました。")
 
     except Exception as e:
         NaviApiLog.error(f"ベクトルの初期化に失敗しました: {e}")
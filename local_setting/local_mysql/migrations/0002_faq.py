@@ -0,0 +1,33 @@
+# Generated by Django 4.2.27 on 2026-10-18 10:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('local_mysql_models', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Faq',
+            fields=[
+                ('faq_id', models.AutoField(primary_key=True, serialize=False)),
+                ('question', models.CharField(max_length=500, verbose_name='質問')),
+                ('answer', models.TextField(verbose_name='回答')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('is_deleted', models.BooleanField(default=False, verbose_name='削除フラグ')),
+                ('deleted_at', models.DateTimeField(blank=True, null=True, verbose_name='削除日時')),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='faqs', to='local_mysql_models.application')),
+            ],
+            options={
+                'verbose_name': 'よくある質問',
+                'verbose_name_plural': 'よくある質問',
+                'db_table': 'faqs',
+                'indexes': [models.Index(fields=['application'], name='faqs_applica_746a19_idx'), models.Index(fields=['is_deleted'], name='faqs_is_dele_bf9afb_idx')],
+            },
+        ),
+    ]
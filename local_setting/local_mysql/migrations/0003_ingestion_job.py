@@ -0,0 +1,58 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('local_mysql_models', '0002_faq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('job_id', models.AutoField(primary_key=True, serialize=False)),
+                ('application_id', models.IntegerField(blank=True, null=True, verbose_name='アプリケーションID')),
+                ('manual_id', models.IntegerField(blank=True, null=True, verbose_name='マニュアルID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingestion_jobs', to='local_mysql_models.company')),
+            ],
+            options={
+                'verbose_name': 'マニュアル取り込みジョブ',
+                'verbose_name_plural': 'マニュアル取り込みジョブ',
+                'db_table': 'ingestion_jobs',
+                'indexes': [models.Index(fields=['company'], name='ingestion_j_company_5c1f0e_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='IngestionJobDocument',
+            fields=[
+                ('job_document_id', models.AutoField(primary_key=True, serialize=False)),
+                ('company_id', models.IntegerField(verbose_name='企業ID')),
+                ('application_id', models.IntegerField(verbose_name='アプリケーションID')),
+                ('manual_id', models.IntegerField(verbose_name='マニュアルID')),
+                ('file_extension', models.CharField(max_length=500, verbose_name='ファイル拡張子')),
+                ('status', models.CharField(default='pending', max_length=20, verbose_name='状態')),
+                ('attempts', models.IntegerField(default=0, verbose_name='試行回数')),
+                ('next_attempt_at', models.DateTimeField(verbose_name='次回の試行日時')),
+                ('locked_by', models.CharField(blank=True, max_length=100, null=True, verbose_name='処理中のワーカー')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='処理中の期限')),
+                ('chunks', models.IntegerField(default=0, verbose_name='チャンク数')),
+                ('last_error', models.TextField(blank=True, null=True, verbose_name='最後のエラー')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='local_mysql_models.ingestionjob')),
+            ],
+            options={
+                'verbose_name': 'マニュアル取り込みジョブのマニュアル',
+                'verbose_name_plural': 'マニュアル取り込みジョブのマニュアル',
+                'db_table': 'ingestion_job_documents',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='ingestion_j_status_8d2a41_idx')],
+                'constraints': [models.UniqueConstraint(fields=('job', 'manual_id'), name='ingestion_job_documents_job_manual_uniq')],
+            },
+        ),
+    ]
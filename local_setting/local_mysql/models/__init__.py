@@ -2,6 +2,8 @@ from .company_model import Company, SoftDeleteManager
 from .user_model import User, Role
 from .application_model import Application
 from .manual_model import Manual
+from .faq_model import Faq
+from .ingestion_job_model import IngestionJob, IngestionJobDocument
 
 __all__ = [
     'Company',
@@ -10,4 +12,7 @@ __all__ = [
     'Role',
     'Application',
     'Manual',
+    'Faq',
+    'IngestionJob',
+    'IngestionJobDocument',
 ]
@@ -36,12 +36,16 @@ class Application(models.Model):
         return f"{self.application_name} ({self.company.name})"
 
     def delete(self, using=None, keep_parents=False):
-        """論理削除（紐づくマニュアルも削除）"""
+        """論理削除（紐づくマニュアル・よくある質問も削除）"""
         from django.utils import timezone
         
         # 紐づくマニュアルも論理削除
         for manual in self.manuals.filter(is_deleted=False):
             manual.delete()
+
+        # 紐づくよくある質問も論理削除
+        for faq in self.faqs.filter(is_deleted=False):
+            faq.delete()
         
         # アプリケーション自体を論理削除
         self.is_deleted = True
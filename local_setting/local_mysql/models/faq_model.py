@@ -0,0 +1,38 @@
+from django.db import models
+from .application_model import Application
+from .company_model import SoftDeleteManager
+
+
+class Faq(models.Model):
+    """よくある質問モデル（承認済みの回答をLLMを使わずに返却する）"""
+    faq_id = models.AutoField(primary_key=True)
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='faqs')
+    question = models.CharField(max_length=500, verbose_name='質問')
+    answer = models.TextField(verbose_name='回答')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+    is_deleted = models.BooleanField(default=False, verbose_name='削除フラグ')
+    deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='削除日時')
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        app_label = 'local_mysql_models'
+        db_table = 'faqs'
+        indexes = [
+            models.Index(fields=['application']),
+            models.Index(fields=['is_deleted']),
+        ]
+        verbose_name = 'よくある質問'
+        verbose_name_plural = 'よくある質問'
+
+    def __str__(self):
+        return self.question
+
+    def delete(self, using=None, keep_parents=False):
+        """論理削除"""
+        from django.utils import timezone
+        self.is_deleted = True
+        self.deleted_at = timezone.now()
+        self.save()
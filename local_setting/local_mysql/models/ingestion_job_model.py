@@ -0,0 +1,58 @@
+from django.db import models
+from .company_model import Company
+
+
+class IngestionJob(models.Model):
+    """マニュアル取り込みジョブ（企業・アプリケーション・マニュアル単位で登録する）"""
+    job_id = models.AutoField(primary_key=True)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='ingestion_jobs')
+    application_id = models.IntegerField(null=True, blank=True, verbose_name='アプリケーションID')
+    manual_id = models.IntegerField(null=True, blank=True, verbose_name='マニュアルID')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+
+    class Meta:
+        app_label = 'local_mysql_models'
+        db_table = 'ingestion_jobs'
+        indexes = [
+            models.Index(fields=['company']),
+        ]
+        verbose_name = 'マニュアル取り込みジョブ'
+        verbose_name_plural = 'マニュアル取り込みジョブ'
+
+    def __str__(self):
+        return f"{self.job_id}"
+
+
+class IngestionJobDocument(models.Model):
+    """取り込みジョブのマニュアル毎の状態（ワーカーが1件ずつ取得・完了を記録する）"""
+    job_document_id = models.AutoField(primary_key=True)
+    job = models.ForeignKey(IngestionJob, on_delete=models.CASCADE, related_name='documents')
+    company_id = models.IntegerField(verbose_name='企業ID')
+    application_id = models.IntegerField(verbose_name='アプリケーションID')
+    manual_id = models.IntegerField(verbose_name='マニュアルID')
+    file_extension = models.CharField(max_length=500, verbose_name='ファイル拡張子')
+    status = models.CharField(max_length=20, default='pending', verbose_name='状態')
+    attempts = models.IntegerField(default=0, verbose_name='試行回数')
+    next_attempt_at = models.DateTimeField(verbose_name='次回の試行日時')
+    locked_by = models.CharField(max_length=100, null=True, blank=True, verbose_name='処理中のワーカー')
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name='処理中の期限')
+    chunks = models.IntegerField(default=0, verbose_name='チャンク数')
+    last_error = models.TextField(null=True, blank=True, verbose_name='最後のエラー')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+
+    class Meta:
+        app_label = 'local_mysql_models'
+        db_table = 'ingestion_job_documents'
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'manual_id'], name='ingestion_job_documents_job_manual_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+        verbose_name = 'マニュアル取り込みジョブのマニュアル'
+        verbose_name_plural = 'マニュアル取り込みジョブのマニュアル'
+
+    def __str__(self):
+        return f"{self.job_id}/{self.manual_id}"
@@ -81,7 +81,7 @@ def run_migrations():
 
 def insert_initial_data():
     """初期データの投入"""
-    from local_setting.local_mysql.models import Role, Company, User, Application, Manual
+    from local_setting.local_mysql.models import Role, Company, User, Application, Manual, Faq
 
     # ロールの初期データ
     roles = [
@@ -129,6 +129,16 @@ def insert_initial_data():
             "application_id": 1
         }
     ]
+
+    faqs = [
+        {
+            "faq_id": 1,
+            "question": "ゴミ出しの曜日を教えてください",
+            "answer": "燃えるゴミは月曜日と木曜日、資源ゴミは水曜日に出してください。",
+            "is_deleted": 0,
+            "application_id": 1
+        }
+    ]
     
     for role_data in roles:
         Role.objects.update_or_create(
@@ -195,6 +205,18 @@ def insert_initial_data():
             }
         )
         print(f"Manual created/updated: {manual_data['manual_name']}")
+
+    for faq_data in faqs:
+        Faq.objects.update_or_create(
+            faq_id=faq_data['faq_id'],
+            defaults={
+                'question': faq_data['question'],
+                'answer': faq_data['answer'],
+                'is_deleted': faq_data['is_deleted'],
+                'application_id': faq_data['application_id']
+            }
+        )
+        print(f"Faq created/updated: {faq_data['question']}")
     
     print("Initial data insertion completed!")
 
@@ -20,6 +20,7 @@ from sqlalchemy import create_engine, text
 from app.models.mysql.company_model import CompanyModel
 from app.models.mysql.application_model import ApplicationModel
 from app.models.mysql.manual_model import ManualModel
+from app.models.mysql.faq_model import FaqModel
 from app.models.mysql.user_model import UserModel
 from app.models.mysql.role_model import RoleModel
 
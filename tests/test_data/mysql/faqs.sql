@@ -0,0 +1,2 @@
+INSERT INTO faqs (faq_id, application_id, question, answer, is_deleted, deleted_at, created_at, updated_at) VALUES (101, 101, '営業時間を教えてください', '平日9時から18時までです。', 0, NULL, NOW(), NOW());
+INSERT INTO faqs (faq_id, application_id, question, answer, is_deleted, deleted_at, created_at, updated_at) VALUES (102, 101, '削除された質問', '削除された回答', 1, '2023-01-01 00:00:00', NOW(), NOW());
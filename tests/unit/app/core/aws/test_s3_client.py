@@ -1,3 +1,5 @@
+import pytest
+from botocore.exceptions import ClientError
 from app.core.aws.s3_client import S3Client
 
 
@@ -22,3 +24,113 @@ class TestS3Client:
             assert len(results) == 2
             assert results[0] == b"file_content_1"
             assert results[1] == b"file_content_2"
+
+    def test_iter_objects(self, managed_s3_bucket):
+        """ページを跨いで全てのオブジェクトを返すテスト"""
+        bucket_name = "test-bucket"
+        files = {f"1/1/{index}.pdf": f"content_{index}" for index in range(5)}
+
+        with managed_s3_bucket(bucket_name, files):
+            s3_client = S3Client()
+            keys = [obj["Key"] for obj in s3_client.iter_objects(bucket_name, prefix="1/", page_size=2)]
+
+            assert keys == sorted(files)
+            assert [obj["Key"] for obj in s3_client.list_objects(bucket_name, prefix="1/")] == sorted(files)
+
+    def test_iter_objects_sharded(self, managed_s3_bucket):
+        """プレフィックス毎に並行して取得し、直下のオブジェクトも含めて全件を返すテスト"""
+        bucket_name = "test-bucket"
+        files = {
+            "readme.txt": "readme",
+            **{f"{company_id}/1/{index}.pdf": "content" for company_id in range(1, 4) for index in range(3)},
+        }
+
+        with managed_s3_bucket(bucket_name, files):
+            s3_client = S3Client()
+            keys = [
+                obj["Key"]
+                for obj in s3_client.iter_objects_sharded(bucket_name, max_workers=2, page_size=2)
+            ]
+
+            assert sorted(keys) == sorted(files)
+            assert len(keys) == len(files)
+
+    def test_iter_objects_sharded_stops_early(self, managed_s3_bucket):
+        """途中で読むのをやめた場合に一覧の取得を止めるテスト"""
+        bucket_name = "test-bucket"
+        files = {f"{company_id}/1/{index}.pdf": "content" for company_id in range(1, 5) for index in range(5)}
+
+        with managed_s3_bucket(bucket_name, files):
+            objects = S3Client().iter_objects_sharded(bucket_name, max_workers=2, page_size=1)
+            first = next(objects)
+            objects.close()
+
+            assert first["Key"] in files
+
+    def test_iter_objects_error(self):
+        """一覧の取得に失敗した場合は例外を送出するテスト"""
+        with pytest.raises(ClientError):
+            list(S3Client().iter_objects("not-exist-bucket"))
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "メモリ上のbytesで受け取る",
+            "mode": "bytes",
+        },
+        {
+            "description": "ファイルで受け取る",
+            "mode": "file",
+        },
+        {
+            "description": "メモリマップで受け取る",
+            "mode": "mmap",
+        },
+    ], ids=lambda x: x["description"])
+    def test_fetch_objects(self, test_case, managed_s3_bucket, tmp_path):
+        """並行に取得し、失敗したオブジェクトはエラーとして返すテスト"""
+        bucket_name = "test-bucket"
+        files = {f"1/1/{index}.pdf": f"content_{index}" for index in range(4)}
+
+        with managed_s3_bucket(bucket_name, files):
+            results = list(S3Client().fetch_objects(
+                bucket_name,
+                [*files, "1/1/missing.pdf"],
+                mode=test_case["mode"],
+                directory=str(tmp_path),
+                max_workers=2,
+            ))
+
+            contents = {}
+            for result in results:
+                if result.error is not None:
+                    continue
+                if result.path is not None:
+                    with open(result.path, "rb") as f:
+                        contents[result.key] = f.read()
+                else:
+                    contents[result.key] = bytes(result.body[:])
+                    result.close()
+            assert contents == {key: content.encode() for key, content in files.items()}
+            assert [result.key for result in results if result.error is not None] == ["1/1/missing.pdf"]
+            assert all(result.size == len(files[result.key]) for result in results if result.error is None)
+
+    def test_fetch_objects_multipart(self, managed_s3_bucket):
+        """閾値以上のオブジェクトを Range 指定で分けて取得しても内容が一致するテスト"""
+        bucket_name = "test-bucket"
+        content = bytes(range(256)) * 40
+
+        with managed_s3_bucket(bucket_name, {"1/1/large.pdf": content}):
+            results = list(S3Client().fetch_objects(
+                bucket_name,
+                ["1/1/large.pdf"],
+                multipart_threshold=1024,
+                part_size=1024,
+            ))
+
+            assert results[0].error is None
+            assert results[0].body == content
+
+    def test_fetch_objects_invalid_mode(self):
+        """受け取り方が不正な場合のテスト"""
+        with pytest.raises(ValueError):
+            list(S3Client().fetch_objects("test-bucket", ["1/1/1.pdf"], mode="stream"))
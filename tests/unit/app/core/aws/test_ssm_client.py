@@ -1,5 +1,7 @@
+import asyncio
 import json
 import pytest
+from unittest.mock import patch
 from botocore.exceptions import ClientError
 from app.core.aws.ssm_client import SsmClient
 
@@ -22,3 +24,17 @@ class TestSsmClient:
             client.get_parameter("non-existent-param-999")
 
         assert excinfo.value.response["Error"]["Code"] == "ParameterNotFound"
+
+    def test_aprefetch_cached_parameters(self):
+        """キャッシュに無いパラメータのみを取得し、以降は get_cached_parameter がキャッシュから返すテスト"""
+        SsmClient.clear_cache()
+        try:
+            with patch.object(SsmClient, "__init__", return_value=None), \
+                    patch.object(SsmClient, "get_parameter", side_effect=lambda name: {"name": name}) as mock_get:
+                asyncio.run(SsmClient.aprefetch_cached_parameters(["a", "b"]))
+                asyncio.run(SsmClient.aprefetch_cached_parameters(["a", "b"]))
+
+                assert SsmClient.get_cached_parameter("a") == {"name": "a"}
+                assert mock_get.call_count == 2
+        finally:
+            SsmClient.clear_cache()
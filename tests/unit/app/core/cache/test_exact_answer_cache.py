@@ -0,0 +1,170 @@
+import pytest
+from unittest.mock import patch
+from app.core.cache.exact_answer_cache import ExactAnswerCache
+from app.core.cache.corpus_version_registry import CorpusVersionRegistry
+from app.core.metrics import NaviApiMetrics
+
+
+class TestExactAnswerCache:
+    """ExactAnswerCacheのテストクラス"""
+
+    @pytest.fixture
+    def parameters(self):
+        return {
+            "answer_cache_setting": {
+                "exact": {
+                    "enabled": True,
+                    "max_entries": 2,
+                    "ttl_seconds": 3600,
+                    "persistent_path": None,
+                }
+            },
+            "question_llm_setting": {"system_context": "システム", "prompt_context": "{context}{question}"},
+            "llm_setting": {"model_name": "gpt-oss:20b", "temperature": 0.7, "api_key": "secret"},
+        }
+
+    @pytest.fixture(autouse=True)
+    def setup_cache(self, parameters):
+        ExactAnswerCache.clear()
+        CorpusVersionRegistry.clear()
+        NaviApiMetrics.reset()
+        with patch(
+            'app.core.cache.exact_answer_cache.SsmClient.get_cached_parameter',
+            side_effect=lambda name, default=None, **kwargs: parameters.get(name, default)
+        ):
+            yield
+        ExactAnswerCache.clear()
+        CorpusVersionRegistry.clear()
+        NaviApiMetrics.reset()
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "同一の質問はヒット",
+            "question": "返品の方法を教えてください",
+            "expected_answer": "回答"
+        },
+        {
+            "description": "前後の空白・末尾の疑問符は正規化されてヒット",
+            "question": "  返品の方法を教えてください？ ",
+            "expected_answer": "回答"
+        },
+        {
+            "description": "全角英数字・大文字は正規化されてヒット",
+            "question": "ＡＢＣの返品の方法を教えてください",
+            "expected_answer": "ABCの回答"
+        },
+        {
+            "description": "異なる質問はミス",
+            "question": "配送について教えてください",
+            "expected_answer": None
+        }
+    ], ids=lambda x: x["description"])
+    def test_get(self, test_case):
+        """getのヒット/ミス判定テスト"""
+        ExactAnswerCache.set(1, 10, "返品の方法を教えてください", "v1", "回答")
+        ExactAnswerCache.set(1, 10, "abcの返品の方法を教えてください", "v1", "ABCの回答")
+
+        result = ExactAnswerCache.get(1, 10, test_case["question"], "v1")
+
+        assert result == test_case["expected_answer"]
+
+    def test_key_contains_tenant_and_versions(self, parameters):
+        """テナント・マニュアル構成・設定のいずれかが異なればミスするテスト"""
+        ExactAnswerCache.set(1, 10, "質問", "v1", "回答")
+
+        assert ExactAnswerCache.get(2, 10, "質問", "v1") is None
+        assert ExactAnswerCache.get(1, 20, "質問", "v1") is None
+        assert ExactAnswerCache.get(1, 10, "質問", "v2") is None
+        assert ExactAnswerCache.get(1, 10, "質問", "v1") == "回答"
+
+        # プロンプト設定が変わると別キーになる
+        parameters["question_llm_setting"] = {"system_context": "変更後", "prompt_context": "{context}{question}"}
+        assert ExactAnswerCache.get(1, 10, "質問", "v1") is None
+
+    def test_config_version_follows_setting_content(self, parameters):
+        """設定のオブジェクトではなく内容が変わった場合に設定のバージョンが変わるテスト"""
+        version = ExactAnswerCache.get_config_version()
+
+        # 同じ内容の別オブジェクトは同じバージョン
+        parameters["llm_setting"] = dict(parameters["llm_setting"])
+        assert ExactAnswerCache.get_config_version() == version
+
+        # 同じオブジェクトでも内容が変わればバージョンが変わる
+        parameters["llm_setting"]["temperature"] = 0.1
+        assert ExactAnswerCache.get_config_version() != version
+
+    def test_lru_eviction(self):
+        """上限を超えた場合は最も参照されていないエントリが削除されるテスト"""
+        ExactAnswerCache.set(1, 10, "質問1", "v1", "回答1")
+        ExactAnswerCache.set(1, 10, "質問2", "v1", "回答2")
+        # 質問1を参照して最新にする
+        assert ExactAnswerCache.get(1, 10, "質問1", "v1") == "回答1"
+        ExactAnswerCache.set(1, 10, "質問3", "v1", "回答3")
+
+        assert ExactAnswerCache.get(1, 10, "質問2", "v1") is None
+        assert ExactAnswerCache.get(1, 10, "質問1", "v1") == "回答1"
+        assert ExactAnswerCache.get(1, 10, "質問3", "v1") == "回答3"
+
+    def test_persistent_tier(self, parameters, tmp_path):
+        """メモリ層から消えても永続層（SQLite）からヒットするテスト"""
+        parameters["answer_cache_setting"]["exact"]["persistent_path"] = str(tmp_path / "answer_cache.sqlite3")
+        ExactAnswerCache.set(1, 10, "質問", "v1", "永続化された回答")
+
+        # プロセス再起動相当としてメモリ層を破棄
+        ExactAnswerCache.clear()
+
+        assert ExactAnswerCache.get(1, 10, "質問", "v1") == "永続化された回答"
+        assert NaviApiMetrics.get_counter("answer_cache.exact.hits", labels={"tier": "persistent"}) == 1
+        # 永続層からの取得後はメモリ層に昇格している
+        assert ExactAnswerCache.get(1, 10, "質問", "v1") == "永続化された回答"
+        assert NaviApiMetrics.get_counter("answer_cache.exact.hits", labels={"tier": "memory"}) == 1
+
+    def test_stats(self):
+        """ヒット率が集計されるテスト"""
+        ExactAnswerCache.set(1, 10, "質問", "v1", "回答")
+        ExactAnswerCache.get(1, 10, "質問", "v1")
+        ExactAnswerCache.get(1, 10, "別の質問", "v1")
+
+        stats = ExactAnswerCache.stats()
+
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert NaviApiMetrics.get_counter("llm.calls_saved", labels={"source": "exact_cache"}) == 1
+
+
+class TestCorpusVersionRegistry:
+    """CorpusVersionRegistryのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def setup_registry(self):
+        CorpusVersionRegistry.clear()
+        with patch(
+            'app.core.cache.corpus_version_registry.SsmClient.get_cached_parameter',
+            return_value={"corpus_version_ttl_seconds": 60}
+        ):
+            yield
+        CorpusVersionRegistry.clear()
+
+    def test_get_and_update(self):
+        assert CorpusVersionRegistry.get(1, 10) is None
+        CorpusVersionRegistry.update(1, 10, "v1")
+        assert CorpusVersionRegistry.get(1, 10) == "v1"
+
+    def test_expired_version_is_not_returned(self):
+        with patch('app.core.cache.corpus_version_registry.time.monotonic', side_effect=[0, 61]):
+            CorpusVersionRegistry.update(1, 10, "v1")
+            assert CorpusVersionRegistry.get(1, 10) is None
+
+    def test_invalidate(self):
+        CorpusVersionRegistry.update(1, 10, "v1")
+        CorpusVersionRegistry.update(1, None, "v-all")
+        CorpusVersionRegistry.update(1, 20, "v2")
+        CorpusVersionRegistry.update(2, 10, "v3")
+
+        CorpusVersionRegistry.invalidate(company_id=1, application_id=10)
+
+        assert CorpusVersionRegistry.get(1, 10) is None
+        assert CorpusVersionRegistry.get(1, None) is None
+        assert CorpusVersionRegistry.get(1, 20) == "v2"
+        assert CorpusVersionRegistry.get(2, 10) == "v3"
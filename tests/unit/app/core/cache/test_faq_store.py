@@ -0,0 +1,194 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from app.core.cache.faq_store import FaqStore
+from app.core.metrics import NaviApiMetrics
+from app.repositories.faq_repository import FaqDto
+
+
+FAQS = [
+    FaqDto(application_id=10, faq_id=1, question="営業時間を教えてください", answer="平日9時から18時までです。"),
+    FaqDto(application_id=10, faq_id=2, question="駐車場はありますか？", answer="10台分の駐車場があります。"),
+]
+
+
+class TestFaqStore:
+    """FaqStoreのテストクラス"""
+
+    SETTING = {
+        "faq": {
+            "enabled": True,
+            "poll_interval_seconds": 30,
+            "semantic_enabled": True,
+            "similarity_threshold": 0.9,
+        }
+    }
+
+    @pytest.fixture(autouse=True)
+    def setup_store(self):
+        FaqStore.clear()
+        NaviApiMetrics.reset()
+        with patch(
+            'app.core.cache.faq_store.SsmClient.get_cached_parameter',
+            return_value=self.SETTING
+        ):
+            yield
+        FaqStore.clear()
+        NaviApiMetrics.reset()
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "同じ質問は一致",
+            "question": "営業時間を教えてください",
+            "expected_answer": "平日9時から18時までです。"
+        },
+        {
+            "description": "末尾の疑問符・前後の空白の違いは一致",
+            "question": " 駐車場はありますか ",
+            "expected_answer": "10台分の駐車場があります。"
+        },
+        {
+            "description": "異なる質問は不一致",
+            "question": "営業時間は何時までですか",
+            "expected_answer": None
+        },
+    ], ids=lambda x: x["description"])
+    def test_match_exact(self, test_case):
+        """正規化後の質問での照合テスト"""
+        FaqStore.load(company_id=1, application_id=10, version="2@", faqs=FAQS)
+
+        result = FaqStore.match_exact(1, 10, test_case["question"])
+
+        assert result == test_case["expected_answer"]
+        assert NaviApiMetrics.get_counter("faq.hits", labels={"match": "exact"}) == (
+            1 if test_case["expected_answer"] else 0
+        )
+
+    def test_match_exact_is_isolated_by_tenant(self):
+        """他のテナントのよくある質問は参照されないテスト"""
+        FaqStore.load(company_id=1, application_id=10, version="2@", faqs=FAQS)
+
+        assert FaqStore.match_exact(2, 10, "営業時間を教えてください") is None
+        assert FaqStore.match_exact(1, 20, "営業時間を教えてください") is None
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "類似度が閾値以上なら一致",
+            "embedding": [0.05, 0.99],
+            "expected_answer": "10台分の駐車場があります。"
+        },
+        {
+            "description": "類似度が閾値未満なら不一致",
+            "embedding": [0.7, 0.7],
+            "expected_answer": None
+        },
+        {
+            "description": "ゼロベクトルは不一致",
+            "embedding": [0.0, 0.0],
+            "expected_answer": None
+        },
+    ], ids=lambda x: x["description"])
+    def test_match_semantic(self, test_case):
+        """質問の埋め込みでの照合テスト"""
+        FaqStore.load(company_id=1, application_id=10, version="2@", faqs=FAQS)
+        embed_texts = Mock(return_value=[[1.0, 0.0], [0.0, 1.0]])
+
+        result = FaqStore.match_semantic(1, 10, test_case["embedding"], embed_texts=embed_texts)
+
+        assert result == test_case["expected_answer"]
+        embed_texts.assert_called_once_with(["営業時間を教えてください", "駐車場はありますか？"])
+
+    def test_match_semantic_embeds_faqs_once(self):
+        """よくある質問の埋め込みは読み込み毎に1回だけ計算されるテスト"""
+        FaqStore.load(company_id=1, application_id=10, version="2@", faqs=FAQS)
+        embed_texts = AsyncMock(return_value=[[1.0, 0.0], [0.0, 1.0]])
+
+        for _ in range(3):
+            result = asyncio.run(FaqStore.amatch_semantic(1, 10, [1.0, 0.0], embed_texts=embed_texts))
+
+        assert result == "平日9時から18時までです。"
+        assert embed_texts.await_count == 1
+        assert NaviApiMetrics.get_counter("faq.hits", labels={"match": "semantic"}) == 3
+
+    def test_match_semantic_embedding_failure(self):
+        """よくある質問の埋め込みに失敗した場合は不一致として扱うテスト"""
+        FaqStore.load(company_id=1, application_id=10, version="2@", faqs=FAQS)
+
+        result = FaqStore.match_semantic(1, 10, [1.0, 0.0], embed_texts=Mock(side_effect=RuntimeError("失敗")))
+
+        assert result is None
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "確認間隔内は MySQL に問い合わせない",
+            "elapsed_seconds": 10,
+            "version": "3@",
+            "expected_version_calls": 0,
+            "expected_load_calls": 0,
+            "expected_answer": "平日9時から18時までです。",
+        },
+        {
+            "description": "確認間隔の経過後、変更が無ければ読み直さない",
+            "elapsed_seconds": 31,
+            "version": "2@",
+            "expected_version_calls": 1,
+            "expected_load_calls": 0,
+            "expected_answer": "平日9時から18時までです。",
+        },
+        {
+            "description": "確認間隔の経過後、変更があれば読み直す",
+            "elapsed_seconds": 31,
+            "version": "3@",
+            "expected_version_calls": 1,
+            "expected_load_calls": 1,
+            "expected_answer": "平日10時から17時までです。",
+        },
+    ], ids=lambda x: x["description"])
+    def test_refresh(self, test_case):
+        """変更の確認と読み直しのテスト"""
+        updated = [FaqDto(application_id=10, faq_id=1, question="営業時間を教えてください", answer="平日10時から17時までです。")]
+        with patch('app.core.cache.faq_store.time.monotonic', return_value=1000.0):
+            FaqStore.load(company_id=1, application_id=10, version="2@", faqs=FAQS)
+
+        with patch('app.core.cache.faq_store.time.monotonic', return_value=1000.0 + test_case["elapsed_seconds"]), \
+                patch('app.core.cache.faq_store.FaqRepository') as mock_repository:
+            mock_repository.get_version.return_value = test_case["version"]
+            mock_repository.get_by_company_id.return_value = updated
+            FaqStore.refresh(session=Mock(), company_id=1, application_id=10)
+
+        assert mock_repository.get_version.call_count == test_case["expected_version_calls"]
+        assert mock_repository.get_by_company_id.call_count == test_case["expected_load_calls"]
+        assert FaqStore.match_exact(1, 10, "営業時間を教えてください") == test_case["expected_answer"]
+
+    def test_arefresh_loads_on_first_request(self):
+        """初回のリクエストで読み込まれるテスト"""
+        with patch('app.core.cache.faq_store.FaqRepository') as mock_repository:
+            mock_repository.aget_version = AsyncMock(return_value="2@")
+            mock_repository.aget_by_company_id = AsyncMock(return_value=FAQS)
+            asyncio.run(FaqStore.arefresh(session=Mock(), company_id=1, application_id=10))
+
+        assert FaqStore.match_exact(1, 10, "営業時間を教えてください") == "平日9時から18時までです。"
+        assert FaqStore.stats()["entries"] == 2
+
+    def test_refresh_failure_is_isolated(self):
+        """読み込みに失敗した場合は一致なしとして扱い、確認間隔内は再度問い合わせないテスト"""
+        with patch('app.core.cache.faq_store.FaqRepository') as mock_repository:
+            mock_repository.get_version.side_effect = Exception("Table 'faqs' doesn't exist")
+            FaqStore.refresh(session=Mock(), company_id=1, application_id=10)
+            FaqStore.refresh(session=Mock(), company_id=1, application_id=10)
+
+        assert mock_repository.get_version.call_count == 1
+        assert FaqStore.match_exact(1, 10, "営業時間を教えてください") is None
+        assert FaqStore.should_match_semantic(1, 10) is False
+
+    def test_reload_discards_embeddings(self):
+        """読み直した場合はよくある質問の埋め込みを計算し直すテスト"""
+        FaqStore.load(company_id=1, application_id=10, version="2@", faqs=FAQS)
+        FaqStore.match_semantic(1, 10, [1.0, 0.0], embed_texts=Mock(return_value=[[1.0, 0.0], [0.0, 1.0]]))
+
+        FaqStore.load(company_id=1, application_id=10, version="3@", faqs=FAQS[1:])
+        embed_texts = Mock(return_value=[[1.0, 0.0]])
+        result = FaqStore.match_semantic(1, 10, [1.0, 0.0], embed_texts=embed_texts)
+
+        assert result == "10台分の駐車場があります。"
+        embed_texts.assert_called_once_with(["駐車場はありますか？"])
@@ -0,0 +1,120 @@
+import pytest
+from unittest.mock import patch
+from app.core.cache.semantic_answer_cache import SemanticAnswerCache
+from app.core.metrics import NaviApiMetrics
+
+
+class TestSemanticAnswerCache:
+    """SemanticAnswerCacheのテストクラス"""
+
+    SETTING = {
+        "semantic": {
+            "enabled": True,
+            "similarity_threshold": 0.9,
+            "max_entries_per_tenant": 2,
+            "ttl_seconds": 3600,
+        }
+    }
+
+    @pytest.fixture(autouse=True)
+    def setup_cache(self):
+        SemanticAnswerCache.clear()
+        NaviApiMetrics.reset()
+        with patch(
+            'app.core.cache.semantic_answer_cache.SsmClient.get_cached_parameter',
+            return_value=self.SETTING
+        ):
+            yield
+        SemanticAnswerCache.clear()
+        NaviApiMetrics.reset()
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "類似度が閾値以上ならヒット",
+            "query_embedding": [0.99, 0.05, 0.0],
+            "expected_answer": "回答A"
+        },
+        {
+            "description": "類似度が閾値未満ならミス",
+            "query_embedding": [0.0, 1.0, 0.0],
+            "expected_answer": None
+        },
+        {
+            "description": "ゼロベクトルはミス",
+            "query_embedding": [0.0, 0.0, 0.0],
+            "expected_answer": None
+        }
+    ], ids=lambda x: x["description"])
+    def test_lookup(self, test_case):
+        """lookupのヒット/ミス判定テスト"""
+        SemanticAnswerCache.store(
+            company_id=1,
+            application_id=10,
+            corpus_version="v1",
+            question="使い方を教えて",
+            embedding=[1.0, 0.0, 0.0],
+            answer="回答A",
+        )
+
+        result = SemanticAnswerCache.lookup(
+            company_id=1,
+            application_id=10,
+            corpus_version="v1",
+            embedding=test_case["query_embedding"],
+        )
+
+        assert result == test_case["expected_answer"]
+
+    def test_lookup_is_isolated_per_tenant(self):
+        """他テナントの回答は返さないテスト"""
+        SemanticAnswerCache.store(1, 10, "v1", "質問", [1.0, 0.0], "企業1の回答")
+
+        assert SemanticAnswerCache.lookup(2, 10, "v1", [1.0, 0.0]) is None
+        assert SemanticAnswerCache.lookup(1, 20, "v1", [1.0, 0.0]) is None
+        assert SemanticAnswerCache.lookup(1, 10, "v1", [1.0, 0.0]) == "企業1の回答"
+
+    def test_corpus_version_change_invalidates_tenant(self):
+        """マニュアル構成が変わった場合はテナントのキャッシュが破棄されるテスト"""
+        SemanticAnswerCache.store(1, 10, "v1", "質問", [1.0, 0.0], "古い回答")
+
+        assert SemanticAnswerCache.lookup(1, 10, "v2", [1.0, 0.0]) is None
+        # 破棄済みのため元のバージョンでもヒットしない
+        assert SemanticAnswerCache.lookup(1, 10, "v1", [1.0, 0.0]) is None
+
+    def test_invalidate(self):
+        """invalidateでテナント配下のキャッシュが破棄されるテスト"""
+        SemanticAnswerCache.store(1, 10, "v1", "質問", [1.0, 0.0], "回答1")
+        SemanticAnswerCache.store(1, 20, "v1", "質問", [1.0, 0.0], "回答2")
+        SemanticAnswerCache.store(2, 10, "v1", "質問", [1.0, 0.0], "回答3")
+
+        SemanticAnswerCache.invalidate(company_id=1)
+
+        assert SemanticAnswerCache.lookup(1, 10, "v1", [1.0, 0.0]) is None
+        assert SemanticAnswerCache.lookup(1, 20, "v1", [1.0, 0.0]) is None
+        assert SemanticAnswerCache.lookup(2, 10, "v1", [1.0, 0.0]) == "回答3"
+
+    def test_store_evicts_oldest_entries(self):
+        """テナント毎の上限を超えた場合は古いエントリから削除されるテスト"""
+        SemanticAnswerCache.store(1, 10, "v1", "質問1", [1.0, 0.0, 0.0], "回答1")
+        SemanticAnswerCache.store(1, 10, "v1", "質問2", [0.0, 1.0, 0.0], "回答2")
+        SemanticAnswerCache.store(1, 10, "v1", "質問3", [0.0, 0.0, 1.0], "回答3")
+
+        assert SemanticAnswerCache.lookup(1, 10, "v1", [1.0, 0.0, 0.0]) is None
+        assert SemanticAnswerCache.lookup(1, 10, "v1", [0.0, 1.0, 0.0]) == "回答2"
+        assert SemanticAnswerCache.lookup(1, 10, "v1", [0.0, 0.0, 1.0]) == "回答3"
+
+    def test_stats(self):
+        """ヒット率と節約したLLM呼び出し数が集計されるテスト"""
+        SemanticAnswerCache.store(1, 10, "v1", "質問", [1.0, 0.0], "回答")
+        SemanticAnswerCache.lookup(1, 10, "v1", [1.0, 0.0])
+        SemanticAnswerCache.lookup(1, 10, "v1", [1.0, 0.0])
+        SemanticAnswerCache.lookup(1, 10, "v1", [0.0, 1.0])
+        SemanticAnswerCache.lookup(1, 10, "v1", [0.0, 1.0])
+
+        stats = SemanticAnswerCache.stats()
+
+        assert stats["hits"] == 2
+        assert stats["misses"] == 2
+        assert stats["hit_rate"] == 0.5
+        assert stats["llm_calls_saved"] == 2
+        assert stats["entries"] == 1
@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.core.utils.admission_controller import AdmissionController, AdmissionRejectedError
+from app.core.metrics import NaviApiMetrics
+
+
+class TestAdmissionController:
+    """AdmissionControllerのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def setup_metrics(self):
+        AdmissionController.clear()
+        NaviApiMetrics.reset()
+        yield
+        AdmissionController.clear()
+        NaviApiMetrics.reset()
+
+    def _hold(self, controller, release, entered):
+        """実行枠を取得したまま release が設定されるまで待機するスレッドを開始する"""
+        def run():
+            with controller.slot():
+                entered.release()
+                release.wait(5)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def _wait_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    def test_slot_limits_in_flight_and_queues(self):
+        """上限を超えたリクエストは待ち行列で待機し、実行枠が空いた順に実行されるテスト"""
+        controller = AdmissionController("test", {"max_in_flight": 1, "max_queue": 5, "queue_timeout_seconds": 5})
+        release = threading.Event()
+        entered = threading.Semaphore(0)
+        order = []
+
+        holder = self._hold(controller, release, entered)
+        assert entered.acquire(timeout=5)
+
+        def wait_and_run(index):
+            with controller.slot():
+                order.append(index)
+
+        waiters = []
+        for index in range(3):
+            thread = threading.Thread(target=wait_and_run, args=(index,))
+            thread.start()
+            waiters.append(thread)
+            self._wait_until(lambda: controller.queue_depth == index + 1)
+
+        assert controller.in_flight == 1
+        assert NaviApiMetrics.snapshot()["gauges"]["llm.admission.queue_depth{name=test}"] == 3
+
+        release.set()
+        for thread in [holder, *waiters]:
+            thread.join(5)
+
+        assert order == [0, 1, 2]
+        assert controller.in_flight == 0
+        assert controller.queue_depth == 0
+        assert NaviApiMetrics.snapshot()["observations"]["llm.admission.wait_ms{name=test}"]["count"] == 4
+
+    def test_slot_rejects_when_queue_is_full(self):
+        """待ち行列が上限に達している場合は待たずに拒否されるテスト"""
+        controller = AdmissionController("test", {
+            "max_in_flight": 1, "max_queue": 0, "retry_after_seconds": 3, "queue_full_status_code": 429
+        })
+        release = threading.Event()
+        entered = threading.Semaphore(0)
+        holder = self._hold(controller, release, entered)
+        assert entered.acquire(timeout=5)
+
+        started = time.perf_counter()
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            with controller.slot():
+                pass
+        elapsed = time.perf_counter() - started
+        release.set()
+        holder.join(5)
+
+        assert elapsed < 0.5
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.retry_after_seconds == 3
+        assert exc_info.value.reason == "queue_full"
+        assert NaviApiMetrics.get_counter("llm.admission.rejected", labels={"name": "test", "reason": "queue_full"}) == 1
+
+    def test_slot_rejects_after_queue_timeout(self):
+        """期限までに実行枠を取得できない場合は拒否され、待ち行列から外れるテスト"""
+        controller = AdmissionController("test", {
+            "max_in_flight": 1, "max_queue": 5, "queue_timeout_seconds": 0.1, "timeout_status_code": 503
+        })
+        release = threading.Event()
+        entered = threading.Semaphore(0)
+        holder = self._hold(controller, release, entered)
+        assert entered.acquire(timeout=5)
+
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            with controller.slot():
+                pass
+        release.set()
+        holder.join(5)
+
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.reason == "timeout"
+        assert controller.queue_depth == 0
+        assert controller.in_flight == 0
+
+    def test_retry_after_is_estimated_from_hold_time(self):
+        """処理時間の実績がある場合は Retry-After を待ち行列の長さから見積もるテスト"""
+        controller = AdmissionController("test", {"max_in_flight": 2, "max_queue": 4, "max_retry_after_seconds": 60})
+        controller._hold_seconds = 4.0
+        controller._waiters.extend([object()] * 3)
+
+        # (3 + 1) * 4.0 / 2 = 8秒
+        assert controller._retry_after_seconds() == 8
+
+    def test_aslot_shares_limit_with_tasks(self):
+        """非同期版でも同時実行数が上限を超えないテスト"""
+        controller = AdmissionController("test", {"max_in_flight": 2, "max_queue": 10, "queue_timeout_seconds": 5})
+        running = 0
+        peak = 0
+
+        async def run():
+            nonlocal running, peak
+            async with controller.aslot():
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.02)
+                running -= 1
+
+        async def main():
+            await asyncio.gather(*[run() for _ in range(6)])
+
+        asyncio.run(main())
+
+        assert peak == 2
+        assert controller.in_flight == 0
+
+    def test_aslot_rejects_after_queue_timeout(self):
+        """非同期版でも期限までに実行枠を取得できない場合は拒否されるテスト"""
+        controller = AdmissionController("test", {"max_in_flight": 1, "max_queue": 5, "queue_timeout_seconds": 0.05})
+
+        async def main():
+            release = asyncio.Event()
+
+            async def hold():
+                async with controller.aslot():
+                    await release.wait()
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            try:
+                async with controller.aslot():
+                    pass
+            finally:
+                release.set()
+                await holder
+
+        with pytest.raises(AdmissionRejectedError):
+            asyncio.run(main())
+        assert controller.in_flight == 0
+        assert controller.queue_depth == 0
+
+    def test_disabled(self):
+        """無効の場合は上限を適用しないテスト"""
+        controller = AdmissionController("test", {"enabled": False, "max_in_flight": 0, "max_queue": 0})
+
+        with controller.slot():
+            pass
+
+        assert controller.in_flight == 0
+
+    def test_get_reconfigures_shared_controller(self):
+        """同じ名前には同じインスタンスを返し、設定値の変更を反映するテスト"""
+        controller = AdmissionController.get("test", {"max_in_flight": 1})
+
+        assert AdmissionController.get("test", {"max_in_flight": 3}) is controller
+        assert controller.setting["max_in_flight"] == 3
+        assert AdmissionController.stats()["test"]["max_in_flight"] == 3
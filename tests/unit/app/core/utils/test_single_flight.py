@@ -0,0 +1,251 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.core.utils.single_flight import FileLock, SingleFlight
+from app.core.metrics import NaviApiMetrics
+
+
+class _CountingEvent(threading.Event):
+    """待機しているスレッド数を数えるEvent"""
+
+    def __init__(self):
+        super().__init__()
+        self._count_lock = threading.Lock()
+        self.waiters = 0
+
+    def wait(self, timeout=None):
+        with self._count_lock:
+            self.waiters += 1
+        return super().wait(timeout)
+
+
+class TestSingleFlight:
+    """SingleFlightのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def setup_metrics(self):
+        NaviApiMetrics.reset()
+        yield
+        NaviApiMetrics.reset()
+
+    def _start_leader(self, flight, key, fn, results, wait_timeout_seconds=5):
+        started = threading.Event()
+
+        def leader_fn():
+            started.set()
+            return fn()
+
+        thread = threading.Thread(
+            target=lambda: results.append(flight.do(key, leader_fn, wait_timeout_seconds))
+        )
+        thread.start()
+        assert started.wait(5)
+        # 後続のスレッドが待機を開始したことを検知できるようにする
+        event = _CountingEvent()
+        flight._calls[key].event = event
+        return thread, event
+
+    def _wait_for_waiters(self, event, count):
+        deadline = time.monotonic() + 5
+        while event.waiters < count:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    def test_do_shares_result_between_threads(self):
+        """同じキーの同時呼び出しは1回だけ実行されて結果を共有するテスト"""
+        flight = SingleFlight("test")
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return "回答"
+
+        leader, event = self._start_leader(flight, "key", fn, results)
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do("key", fn, 5)))
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        self._wait_for_waiters(event, 3)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert results == ["回答"] * 4
+        assert NaviApiMetrics.get_counter("single_flight.calls", labels={"name": "test", "outcome": "leader"}) == 1
+        assert NaviApiMetrics.get_counter("single_flight.calls", labels={"name": "test", "outcome": "shared"}) == 3
+        assert flight._calls == {}
+
+    def test_do_falls_back_when_wait_times_out(self):
+        """待機がタイムアウトした場合は自身で実行するテスト"""
+        flight = SingleFlight("test")
+        release = threading.Event()
+        results = []
+
+        leader, _ = self._start_leader(flight, "key", lambda: release.wait(5) and "先行の回答", results)
+
+        result = flight.do("key", lambda: "単独の回答", wait_timeout_seconds=0.05)
+        release.set()
+        leader.join(5)
+
+        assert result == "単独の回答"
+        assert results == ["先行の回答"]
+        assert NaviApiMetrics.get_counter("single_flight.calls", labels={"name": "test", "outcome": "fallback"}) == 1
+
+    def test_do_retries_when_leader_fails(self):
+        """先行する処理が失敗した場合、待機していたスレッドは例外を共有せずに自身で実行し直すテスト"""
+        flight = SingleFlight("test")
+        release = threading.Event()
+        errors = []
+        results = []
+
+        def failing():
+            release.wait(5)
+            raise RuntimeError("回答の生成中にエラーが発生しました")
+
+        def run_leader():
+            try:
+                flight.do("key", failing, 5)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        leader = threading.Thread(target=run_leader)
+        leader.start()
+        deadline = time.monotonic() + 5
+        while "key" not in flight._calls:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        event = _CountingEvent()
+        flight._calls["key"].event = event
+        follower = threading.Thread(target=lambda: results.append(flight.do("key", lambda: "再実行の回答", 5)))
+        follower.start()
+        self._wait_for_waiters(event, 1)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        assert errors == ["回答の生成中にエラーが発生しました"]
+        assert results == ["再実行の回答"]
+        assert NaviApiMetrics.get_counter("single_flight.calls", labels={"name": "test", "outcome": "retry"}) == 1
+
+    def test_do_does_not_share_between_keys(self):
+        """キーが異なる場合はそれぞれ実行されるテスト"""
+        flight = SingleFlight("test")
+
+        assert flight.do("key1", lambda: "回答1", 5) == "回答1"
+        assert flight.do("key2", lambda: "回答2", 5) == "回答2"
+
+    def test_ado_shares_result_between_tasks(self):
+        """非同期版でも同じキーの同時呼び出しは1回だけ実行されるテスト"""
+        flight = SingleFlight("test")
+        calls = []
+
+        async def run():
+            release = asyncio.Event()
+
+            async def fn():
+                calls.append(1)
+                await release.wait()
+                return "回答"
+
+            tasks = [asyncio.create_task(flight.ado("key", fn, 5)) for _ in range(5)]
+            # 全てのタスクが待機を開始してから先行する処理を完了させる
+            await asyncio.sleep(0)
+            release.set()
+            return await asyncio.gather(*tasks)
+
+        results = asyncio.run(run())
+
+        assert results == ["回答"] * 5
+        assert len(calls) == 1
+        assert NaviApiMetrics.get_counter("single_flight.calls", labels={"name": "test", "outcome": "shared"}) == 4
+
+    def test_ado_falls_back_when_wait_times_out(self):
+        """非同期版で待機がタイムアウトした場合は自身で実行するテスト"""
+        flight = SingleFlight("test")
+
+        async def run():
+            release = asyncio.Event()
+
+            async def slow():
+                await release.wait()
+                return "先行の回答"
+
+            async def fast():
+                return "単独の回答"
+
+            leader = asyncio.create_task(flight.ado("key", slow, 5))
+            await asyncio.sleep(0)
+            result = await flight.ado("key", fast, wait_timeout_seconds=0.05)
+            release.set()
+            return result, await leader
+
+        assert asyncio.run(run()) == ("単独の回答", "先行の回答")
+
+
+    def test_ado_retries_when_leader_fails(self):
+        """非同期版でも先行する処理が失敗した場合は、待機していたタスクが自身で実行し直すテスト"""
+        flight = SingleFlight("test")
+
+        async def run():
+            release = asyncio.Event()
+
+            async def failing():
+                await release.wait()
+                raise RuntimeError("回答の生成中にエラーが発生しました")
+
+            async def succeeding():
+                return "再実行の回答"
+
+            leader = asyncio.create_task(flight.ado("key", failing, 5))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flight.ado("key", succeeding, 5))
+            await asyncio.sleep(0)
+            release.set()
+            return await asyncio.gather(leader, follower, return_exceptions=True)
+
+        leader_result, follower_result = asyncio.run(run())
+
+        assert isinstance(leader_result, RuntimeError)
+        assert follower_result == "再実行の回答"
+
+class TestFileLock:
+    """FileLockのテストクラス"""
+
+    @pytest.mark.skipif(not FileLock.is_supported(), reason="fcntlが利用できない環境")
+    def test_lock_is_exclusive(self, tmp_path):
+        """同じキーのロックは同時に1つしか取得できないテスト"""
+        lock1 = FileLock(str(tmp_path), ("1", "10", "質問"))
+        lock2 = FileLock(str(tmp_path), ("1", "10", "質問"))
+        other = FileLock(str(tmp_path), ("1", "10", "別の質問"))
+
+        assert lock1.acquire(timeout_seconds=1)
+        assert not lock2.acquire(timeout_seconds=0.1)
+        assert other.acquire(timeout_seconds=1)
+
+        lock1.release()
+        assert lock2.acquire(timeout_seconds=1)
+        lock2.release()
+        other.release()
+
+    @pytest.mark.skipif(not FileLock.is_supported(), reason="fcntlが利用できない環境")
+    def test_aacquire(self, tmp_path):
+        """非同期版のロック取得テスト"""
+        lock1 = FileLock(str(tmp_path), "key")
+        lock2 = FileLock(str(tmp_path), "key")
+
+        async def run():
+            assert await lock1.aacquire(timeout_seconds=1)
+            acquired_while_locked = await lock2.aacquire(timeout_seconds=0.1)
+            lock1.release()
+            acquired_after_release = await lock2.aacquire(timeout_seconds=1)
+            lock2.release()
+            return acquired_while_locked, acquired_after_release
+
+        assert asyncio.run(run()) == (False, True)
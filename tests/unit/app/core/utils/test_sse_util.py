@@ -0,0 +1,69 @@
+import json
+import time
+import pytest
+from app.core.utils.sse_util import SseUtil
+
+
+class TestSseUtil:
+    """SseUtilのテストクラス"""
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "イベント名あり",
+            "data": {"text": "回答"},
+            "event": "token",
+            "expected": 'event: token\ndata: {"text": "回答"}\n\n'
+        },
+        {
+            "description": "イベント名なし",
+            "data": {"text": "回答"},
+            "event": None,
+            "expected": 'data: {"text": "回答"}\n\n'
+        },
+        {
+            "description": "改行を含むデータはJSONでエスケープされる",
+            "data": {"text": "1行目\n2行目"},
+            "event": "token",
+            "expected": 'event: token\ndata: {"text": "1行目\\n2行目"}\n\n'
+        }
+    ], ids=lambda x: x["description"])
+    def test_format_event(self, test_case):
+        """format_eventのテスト"""
+        result = SseUtil.format_event(test_case["data"], event=test_case["event"])
+        assert result == test_case["expected"]
+
+        data_line = [line for line in result.split("\n") if line.startswith("data: ")][0]
+        assert json.loads(data_line.removeprefix("data: ")) == test_case["data"]
+
+    def test_with_keepalive_inserts_ping_while_waiting(self):
+        """イベントが途切れている間はkeep-aliveが送信されるテスト"""
+        def _slow_events():
+            time.sleep(0.35)
+            yield SseUtil.format_event({"text": "回答"}, event="token")
+
+        result = list(SseUtil.with_keepalive(_slow_events(), interval_seconds=0.1))
+
+        assert result[-1] == SseUtil.format_event({"text": "回答"}, event="token")
+        assert result.count(SseUtil.format_comment("ping")) >= 2
+
+    def test_with_keepalive_passes_through_events(self):
+        """すぐに生成されるイベントはそのまま返されるテスト"""
+        events = [
+            SseUtil.format_event({"text": "a"}, event="token"),
+            SseUtil.format_event({"done": True}, event="done"),
+        ]
+
+        result = list(SseUtil.with_keepalive(iter(events), interval_seconds=5))
+
+        assert result == events
+
+    def test_with_keepalive_propagates_exception(self):
+        """生成側の例外が呼び出し側に伝播するテスト"""
+        def _failing_events():
+            yield SseUtil.format_event({"text": "a"}, event="token")
+            raise RuntimeError("生成エラー")
+
+        iterator = SseUtil.with_keepalive(_failing_events(), interval_seconds=5)
+        assert next(iterator) == SseUtil.format_event({"text": "a"}, event="token")
+        with pytest.raises(RuntimeError, match="生成エラー"):
+            next(iterator)
@@ -1,8 +1,9 @@
+import asyncio
 import pytest
-from unittest.mock import patch, MagicMock
-from app.helpers.question_llm_helper import QuestionLLMHelper
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.helpers.question_llm_helper import QueryEmbeddingHelper, QuestionLLMHelper
 from app.models.llm.question_llm_model import State
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, AIMessageChunk
 
 
 class TestQuestionLLMHelper:
@@ -41,7 +42,8 @@ class TestQuestionLLMHelper:
                 # デフォルト値"manuals"で呼ばれることを確認
                 mock_model_class.assert_called_once_with(
                     file_paths=file_paths,
-                    collection_name="manuals"
+                    collection_name="manuals",
+                    company_id=None
                 )
             else:
                 helper = QuestionLLMHelper(
@@ -51,7 +53,8 @@ class TestQuestionLLMHelper:
                 # 指定した値で呼ばれることを確認
                 mock_model_class.assert_called_once_with(
                     file_paths=file_paths,
-                    collection_name=collection_name
+                    collection_name=collection_name,
+                    company_id=None
                 )
             
             # 検証
@@ -198,7 +201,8 @@ class TestQuestionLLMHelper:
             assert result == "マニュアルの内容についての回答"
             mock_model_class.assert_called_once_with(
                 file_paths=file_paths,
-                collection_name="test_collection"
+                collection_name="test_collection",
+                company_id=None
             )
 
     def test_answer_question_model_exception(self):
@@ -297,3 +301,111 @@ class TestQuestionLLMHelper:
 
             assert result == self.DEFAULT_NOT_FOUND_MESSAGE
             mock_model_instance.get_graph.assert_not_called()
+
+    def test_stream_answer_yields_llm_chunks(self):
+        """stream_answerがllm_responseノードのチャンクのみを順に返すテスト"""
+        with patch('app.helpers.question_llm_helper.QuestionLLMModel') as mock_model_class:
+            mock_model_instance = MagicMock()
+            mock_model_class.return_value = mock_model_instance
+
+            mock_graph = MagicMock()
+            mock_model_instance.get_graph.return_value = mock_graph
+            mock_graph.stream.return_value = iter([
+                ("messages", (AIMessageChunk(content="別ノード"), {"langgraph_node": "add_message"})),
+                ("messages", (AIMessageChunk(content="回答"), {"langgraph_node": "llm_response"})),
+                ("messages", (AIMessageChunk(content=""), {"langgraph_node": "llm_response"})),
+                ("messages", (AIMessageChunk(content="です"), {"langgraph_node": "llm_response"})),
+                # ノード完了時の確定メッセージは重複して返さない
+                ("messages", (AIMessage(content="回答です"), {"langgraph_node": "llm_response"})),
+                ("values", {"messages": [AIMessage(content="回答です")]}),
+            ])
+
+            helper = QuestionLLMHelper(file_paths=["manual.pdf"])
+            result = list(helper.stream_answer("テスト質問"))
+
+            assert result == ["回答", "です"]
+            call_args = mock_graph.stream.call_args
+            assert call_args.kwargs.get("input").query == "テスト質問"
+            assert call_args.kwargs.get("stream_mode") == ["messages", "values"]
+
+    def test_stream_answer_falls_back_to_final_state(self):
+        """チャンクが届かない場合は最終状態の回答を返すテスト"""
+        with patch('app.helpers.question_llm_helper.QuestionLLMModel') as mock_model_class:
+            mock_model_instance = MagicMock()
+            mock_model_class.return_value = mock_model_instance
+
+            mock_graph = MagicMock()
+            mock_model_instance.get_graph.return_value = mock_graph
+            mock_graph.stream.return_value = iter([
+                ("values", {"messages": [AIMessage(content="質問が空です。質問を入力してください。")]}),
+            ])
+
+            helper = QuestionLLMHelper(file_paths=["manual.pdf"])
+            result = list(helper.stream_answer(""))
+
+            assert result == ["質問が空です。質問を入力してください。"]
+
+    def test_stream_answer_without_file_paths_returns_default_message(self):
+        """file_paths未指定の場合はストリーミングでも固定メッセージを返すテスト"""
+        with patch('app.helpers.question_llm_helper.QuestionLLMModel') as mock_model_class:
+            mock_model_instance = MagicMock()
+            mock_model_class.return_value = mock_model_instance
+
+            helper = QuestionLLMHelper(file_paths=[])
+            result = list(helper.stream_answer("テスト質問"))
+
+            assert result == [self.DEFAULT_NOT_FOUND_MESSAGE]
+            mock_model_instance.get_graph.assert_not_called()
+
+    def test_aanswer_question_uses_ainvoke(self):
+        """aanswer_questionがグラフを ainvoke で実行するテスト"""
+        with patch('app.helpers.question_llm_helper.QuestionLLMModel') as mock_model_class:
+            mock_model_instance = MagicMock()
+            mock_model_class.return_value = mock_model_instance
+
+            mock_graph = MagicMock()
+            mock_model_instance.get_graph.return_value = mock_graph
+            mock_graph.ainvoke = AsyncMock(return_value={"messages": [AIMessage(content="非同期の回答")]})
+
+            helper = QuestionLLMHelper(file_paths=["manual.pdf"])
+            result = asyncio.run(helper.aanswer_question("テスト質問", query_embedding=[0.1, 0.2]))
+
+            assert result == "非同期の回答"
+            mock_graph.invoke.assert_not_called()
+            user_query = mock_graph.ainvoke.call_args.kwargs.get("input")
+            assert user_query.query == "テスト質問"
+            assert user_query.query_embedding == [0.1, 0.2]
+
+    def test_aanswer_question_without_file_paths_returns_default_message(self):
+        """file_paths未指定の場合は非同期版でも固定メッセージを返すテスト"""
+        with patch('app.helpers.question_llm_helper.QuestionLLMModel') as mock_model_class:
+            mock_model_instance = MagicMock()
+            mock_model_class.return_value = mock_model_instance
+
+            helper = QuestionLLMHelper(file_paths=[])
+            result = asyncio.run(helper.aanswer_question("テスト質問"))
+
+            assert result == self.DEFAULT_NOT_FOUND_MESSAGE
+            mock_model_instance.get_graph.assert_not_called()
+
+
+class TestQueryEmbeddingHelper:
+    """QueryEmbeddingHelperのテストクラス"""
+
+    def test_embed_without_vector_store_and_llm(self):
+        """共有の埋め込みモデルのみを使用し、ベクターストア・LLMを初期化しないテスト"""
+        embeddings = MagicMock()
+        embeddings.embed_query.return_value = [0.1, 0.2]
+        embeddings.embed_queries.return_value = [[0.1], [0.2]]
+        setting = {"model_name": "test-model", "device": "cpu"}
+        with patch('app.helpers.question_llm_helper.SsmClient.get_cached_parameter', return_value=setting), \
+                patch('app.helpers.question_llm_helper.EmbeddingModelManager.get_shared_embedding_model',
+                      return_value=embeddings) as mock_get_model, \
+                patch('app.helpers.question_llm_helper.QuestionLLMModel') as mock_model_class:
+            embedder = QueryEmbeddingHelper()
+
+            assert embedder.embed_query("質問") == [0.1, 0.2]
+            assert asyncio.run(embedder.aembed_queries(["質問1", "質問2"])) == [[0.1], [0.2]]
+
+        mock_get_model.assert_called_once_with(model_name="test-model", api_key=None, device="cpu", use_api=False)
+        mock_model_class.assert_not_called()
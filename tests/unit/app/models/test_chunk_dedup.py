@@ -0,0 +1,124 @@
+import pytest
+from unittest.mock import MagicMock
+from langchain_core.documents import Document
+from langchain_postgres import PGVector
+from langchain_postgres.vectorstores import _get_embedding_collection_store
+from sqlalchemy.dialects import postgresql
+from app.models.llm.chunk_dedup import ChunkDeduplicator, chunk_hash, expand_sources, source_filter
+
+
+class TestChunkDedup:
+    """ChunkDeduplicatorのテストクラス"""
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "同じアプリケーションで空白のみ異なる場合は同じ",
+            "other": ("manuals/1/1/2.pdf", "ゴミの収集日は\n毎週火曜日です。"),
+            "expected_equal": True,
+        },
+        {
+            "description": "別のアプリケーションの場合は異なる",
+            "other": ("manuals/1/2/2.pdf", "ゴミの収集日は 毎週火曜日です。"),
+            "expected_equal": False,
+        },
+        {
+            "description": "内容が異なる場合は異なる",
+            "other": ("manuals/1/1/2.pdf", "ゴミの収集日は毎週水曜日です。"),
+            "expected_equal": False,
+        },
+    ], ids=lambda x: x["description"])
+    def test_chunk_hash(self, test_case):
+        """チャンクの内容のハッシュのテスト（共有する範囲はアプリケーション）"""
+        source, page_content = test_case["other"]
+
+        equal = chunk_hash("manuals/1/1/1.pdf", "ゴミの収集日は 毎週火曜日です。") == chunk_hash(source, page_content)
+
+        assert equal == test_case["expected_equal"]
+
+    def test_unique_chunks(self):
+        """マニュアル内で重複するチャンクを除き、参照のメタデータを設定するテスト"""
+        chunks = [
+            Document(page_content="本文A", metadata={"page_number": 1}),
+            Document(page_content="本文B", metadata={"page_number": 1}),
+            Document(page_content="本文A", metadata={"page_number": 2}),
+        ]
+
+        unique = ChunkDeduplicator.unique_chunks("manuals/1/1/1.pdf", chunks)
+
+        assert [(chunk.page_content, chunk.metadata["page_number"]) for chunk in unique] == [("本文A", 1), ("本文B", 1)]
+        assert unique[0].metadata["sources"] == ["manuals/1/1/1.pdf"]
+        assert unique[0].metadata["chunk_hash"] == chunk_hash("manuals/1/1/1.pdf", "本文A")
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "検索対象のマニュアルのみに絞り込む",
+            "metadata": {"source": "manuals/1/1/1.pdf", "page_number": 3, "sources": ["manuals/1/1/1.pdf", "manuals/1/1/9.pdf", "manuals/1/1/2.pdf"]},
+            "expected": {"source": "manuals/1/1/1.pdf", "page_number": 3, "sources": ["manuals/1/1/1.pdf", "manuals/1/1/2.pdf"]},
+        },
+        {
+            "description": "代表のマニュアルが検索対象でない場合は置き換えてページ番号を外す",
+            "metadata": {"source": "manuals/1/1/9.pdf", "page_number": 3, "chunk_index": 5, "sources": ["manuals/1/1/9.pdf", "manuals/1/1/2.pdf"]},
+            "expected": {"source": "manuals/1/1/2.pdf", "sources": ["manuals/1/1/2.pdf"]},
+        },
+        {
+            "description": "sources の無い従来の行はそのまま",
+            "metadata": {"source": "manuals/1/1/1.pdf", "page_number": 3},
+            "expected": {"source": "manuals/1/1/1.pdf", "page_number": 3},
+        },
+    ], ids=lambda x: x["description"])
+    def test_expand_sources(self, test_case):
+        """検索結果の sources を展開するテスト"""
+        documents = [Document(page_content="本文", metadata=test_case["metadata"])]
+
+        expanded = expand_sources(documents, ["manuals/1/1/1.pdf", "manuals/1/1/2.pdf"])
+
+        assert expanded[0].metadata == test_case["expected"]
+
+    def test_source_filter(self):
+        """代表の source が検索対象でない共有した行も、sources に検索対象のマニュアルを含む場合は検索されるテスト"""
+        file_paths = ["manuals/1/1/2.pdf"]
+        embedding_store, _ = _get_embedding_collection_store()
+        vector_store = PGVector.__new__(PGVector)
+        vector_store.EmbeddingStore = embedding_store
+
+        compiled = vector_store._create_filter_clause(source_filter(file_paths)).compile(dialect=postgresql.dialect())
+
+        # 代表の source での絞り込みと、sources の要素毎の比較（jsonpath）の OR
+        assert " OR jsonb_path_match(" in str(compiled)
+        assert list(compiled.params.values()) == [
+            "source", file_paths, "$.sources == $value", {"value": "manuals/1/1/2.pdf"}
+        ]
+        # 代表のマニュアル（1.pdf）が論理削除された後も、検索結果は 2.pdf のチャンクとして展開される
+        documents = [Document(page_content="本文", metadata={
+            "source": "manuals/1/1/1.pdf", "page_number": 3, "sources": ["manuals/1/1/1.pdf", "manuals/1/1/2.pdf"]
+        })]
+        assert expand_sources(documents, file_paths)[0].metadata == {
+            "source": "manuals/1/1/2.pdf", "sources": ["manuals/1/1/2.pdf"]
+        }
+
+    def test_attach(self):
+        """参照を追加できた chunk_hash を返し、空の場合は実行しないテスト"""
+        session = MagicMock()
+        session.execute.return_value = [("h1",)]
+
+        assert ChunkDeduplicator.attach(session, "collection-uuid", ["h1", "h2"], "manuals/1/1/2.pdf") == {"h1"}
+        assert session.execute.call_args.args[1] == {
+            "collection_id": "collection-uuid",
+            "chunk_hashes": ["h1", "h2"],
+            "source": "manuals/1/1/2.pdf",
+        }
+        assert ChunkDeduplicator.attach(session, "collection-uuid", [], "manuals/1/1/2.pdf") == set()
+        assert session.execute.call_count == 1
+
+    def test_detach(self):
+        """1マニュアルのみが参照する行の削除と、共有している行からの参照の削除を行うテスト"""
+        session = MagicMock()
+
+        ChunkDeduplicator.detach(session, "collection-uuid", "manuals/1/1/1.pdf")
+
+        statements = [str(call.args[0]) for call in session.execute.call_args_list]
+        assert statements[0].startswith("DELETE FROM langchain_pg_embedding")
+        assert statements[1].startswith("UPDATE langchain_pg_embedding")
+        # 代表の source を置き換える場合は、外したマニュアルのページ番号・チャンク番号を残さない
+        assert "THEN jsonb_set(jsonb_set(cmetadata - 'page_number' - 'chunk_index'" in statements[1]
+        assert statements[1].count("- 'page_number'") == 1
@@ -0,0 +1,139 @@
+import pytest
+from unittest.mock import patch
+from langchain_core.documents import Document
+from app.models.llm.context_packer import ContextPacker, TokenCounter
+from app.core.metrics import NaviApiMetrics
+
+
+class TestContextPacker:
+    """ContextPackerのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def setup_tokenizer(self):
+        # BPEファイルを取得しないよう、文字数でトークン数を数えるフォールバックを使用する
+        TokenCounter._encodings.clear()
+        NaviApiMetrics.reset()
+        with patch.object(TokenCounter, '_load_encoding', return_value=None):
+            yield
+        TokenCounter._encodings.clear()
+        NaviApiMetrics.reset()
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "連続する空白と空行をまとめる",
+            "text": "返品は  30日以内\t\tに\n\n\n\n受け付けます",
+            "expected": "返品は 30日以内 に\n\n受け付けます"
+        },
+        {
+            "description": "ページ番号だけの行と罫線を除去する",
+            "text": "配送について\n- 3 -\nPage 4\nPage 12 / 40\n5ページ\n──────\n翌日に発送します",
+            "expected": "配送について\n翌日に発送します"
+        },
+        {
+            "description": "数字のみの表の行は残す",
+            "text": "料金表\nサイズ\n120\n-3\n3 / 10\n- 4 -",
+            "expected": "料金表\nサイズ\n120\n-3\n3 / 10"
+        },
+        {
+            "description": "制御文字を除去する",
+            "text": "操作\x0c手順\r\nです",
+            "expected": "操作手順\nです"
+        }
+    ], ids=lambda x: x["description"])
+    def test_clean(self, test_case):
+        """レイアウト由来のノイズ除去テスト"""
+        assert ContextPacker.clean(test_case["text"]) == test_case["expected"]
+
+    def test_pack_formats_content_with_source_tag(self):
+        """page_content と出典タグのみで整形されるテスト"""
+        documents = [
+            Document(
+                page_content="返品は30日以内に受け付けます。",
+                metadata={"source": "bucket/manuals/1/10/100.pdf", "page_number": 3, "filetype": "application/pdf"}
+            ),
+            Document(page_content="送料は無料です。", metadata={"source": "bucket/manuals/1/10/101.txt"}),
+        ]
+
+        context = ContextPacker().pack(documents)
+
+        assert context == "[100.pdf p.3]\n返品は30日以内に受け付けます。\n\n[101.txt]\n送料は無料です。"
+        assert "filetype" not in context
+        assert "Document(" not in context
+
+    def test_pack_formats_source_tag_with_shared_sources(self):
+        """内容が同じチャンクを持つ他のマニュアルを出典タグに含めるテスト"""
+        documents = [
+            Document(
+                page_content="電源を切ってから作業してください。",
+                metadata={
+                    "source": "bucket/manuals/1/10/100.pdf",
+                    "page_number": 2,
+                    "sources": ["bucket/manuals/1/10/100.pdf", "bucket/manuals/1/10/102.pdf"],
+                }
+            ),
+        ]
+
+        context = ContextPacker().pack(documents)
+
+        assert context == "[100.pdf p.2 他: 102.pdf]\n電源を切ってから作業してください。"
+
+    def test_pack_removes_duplicated_and_overlapping_chunks(self):
+        """同一・重なりの大きいチャンクが除外されるテスト"""
+        base = "商品の返品は到着後30日以内に限り受け付けます。未開封の商品に限ります。"
+        documents = [
+            Document(page_content=base, metadata={"source": "a.pdf"}),
+            Document(page_content=base, metadata={"source": "a.pdf"}),
+            # チャンク分割のオーバーラップで前のチャンクにほぼ含まれる
+            Document(page_content="到着後30日以内に限り受け付けます。未開封の商品", metadata={"source": "a.pdf"}),
+            Document(page_content="配送は通常3営業日以内に行います。", metadata={"source": "b.pdf"}),
+        ]
+
+        context = ContextPacker().pack(documents)
+
+        assert context.count("[a.pdf]") == 1
+        assert "[b.pdf]" in context
+
+    def test_pack_respects_token_budget(self):
+        """トークン上限を超える場合は関連度の低いチャンクから除外・切り詰めるテスト"""
+        documents = [
+            Document(page_content="あ" * 50, metadata={"source": "a.pdf"}),
+            Document(page_content="い" * 50, metadata={"source": "b.pdf"}),
+            Document(page_content="う" * 50, metadata={"source": "c.pdf"}),
+        ]
+        packer = ContextPacker(setting={"max_tokens": 100, "min_chunk_tokens": 20})
+
+        context = packer.pack(documents)
+
+        assert packer.token_counter.count(context) <= 100
+        assert context.startswith("[a.pdf]\n" + "あ" * 50)
+        # 2件目は残りの予算まで切り詰めて追加され、3件目は含まれない
+        assert "[b.pdf]" in context
+        assert "う" not in context
+
+    def test_pack_skips_truncation_when_remaining_budget_is_small(self):
+        """残りの予算が min_chunk_tokens 未満の場合は切り詰めたチャンクを追加しないテスト"""
+        documents = [
+            Document(page_content="あ" * 80, metadata={"source": "a.pdf"}),
+            Document(page_content="い" * 50, metadata={"source": "b.pdf"}),
+        ]
+        packer = ContextPacker(setting={"max_tokens": 100, "min_chunk_tokens": 64})
+
+        context = packer.pack(documents)
+
+        assert "[b.pdf]" not in context
+
+    def test_pack_records_token_metrics(self):
+        """圧縮前後のトークン数がメトリクスに記録されるテスト"""
+        documents = [
+            Document(page_content="説明    文\n\n\n\n- 1 -\n", metadata={"source": "a.pdf"}),
+        ]
+
+        context = ContextPacker().pack(documents)
+
+        snapshot = NaviApiMetrics.snapshot()
+        assert snapshot["observations"]["context.tokens{stage=pre}"]["max"] == len(str(documents))
+        assert snapshot["observations"]["context.tokens{stage=post}"]["max"] == len(context)
+
+    def test_pack_empty_documents(self):
+        """検索結果が無い場合は空文字列を返すテスト"""
+        assert ContextPacker().pack([]) == ""
@@ -0,0 +1,229 @@
+import asyncio
+import pytest
+from typing import Any, Optional
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from app.core.utils.admission_controller import AdmissionController
+from app.models.llm.context_packer import ContextPacker, TokenCounter
+from app.models.llm.conversation_memory import ConversationMemory, LRUInMemorySaver
+from app.models.llm.first_token_callback import FirstTokenLatencyHandler
+from app.models.llm.model_routing_policy import ModelRoutingPolicy
+from app.models.llm.prompt_layout import PromptLayout
+from app.models.llm.question_llm_model import QuestionLLMModel, State
+
+
+class RecordingChatModel(BaseChatModel):
+    """受け取ったメッセージを記録し、要約の依頼には要約を、それ以外には連番の回答を返すチャットモデル"""
+
+    calls: list[list[BaseMessage]] = []
+    fail_summary: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        self.calls.append(messages)
+        if "記録係" in str(messages[0].content):
+            if self.fail_summary:
+                raise RuntimeError("要約に失敗")
+            content = f"要約{len(self.calls)}"
+        else:
+            content = f"回答{len(self.calls)}"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+@pytest.fixture(autouse=True)
+def setup():
+    ConversationMemory.clear()
+    PromptLayout._prompts.clear()
+    # tiktoken を読み込まず、1文字1トークンとして数える
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(TokenCounter, "_load_encoding", classmethod(lambda cls, *args: None))
+        yield
+    ConversationMemory.clear()
+    PromptLayout._prompts.clear()
+
+
+class TestLRUInMemorySaver:
+    """LRUInMemorySaverのテストクラス"""
+
+    def _run(self, saver, thread_id, turns=1):
+        model = _build_model(conversation={"max_history_tokens": 100000})
+        graph = model.get_graph(conversational=True)
+        graph.checkpointer = saver
+        for index in range(turns):
+            graph.invoke(State(query=f"質問{index}"), config={"configurable": {"thread_id": thread_id}})
+        return graph
+
+    def test_keeps_only_latest_checkpoint(self):
+        """会話毎に最新のチェックポイントだけが残り、ターン数に比例して増えないテスト"""
+        saver = LRUInMemorySaver(max_conversations=10)
+
+        graph = self._run(saver, "t1", turns=3)
+
+        assert len(saver.storage["t1"][""]) == 1
+        assert all(key[2] in saver.storage["t1"][""] for key in saver.writes)
+        state = graph.get_state({"configurable": {"thread_id": "t1"}})
+        assert [message.content for message in state.values["messages"][1:]] == [
+            "質問0", "回答1", "質問1", "回答2", "質問2", "回答3"
+        ]
+
+    def test_evicts_least_recently_used_conversation(self):
+        """会話数が上限を超えた場合は最も長く使われていない会話が破棄されるテスト"""
+        saver = LRUInMemorySaver(max_conversations=2)
+        self._run(saver, "t1")
+        self._run(saver, "t2")
+        # t1 を使うことで t2 が最も古くなる
+        self._run(saver, "t1")
+
+        self._run(saver, "t3")
+
+        assert set(saver.storage) == {"t1", "t3"}
+        assert not any(key[0] == "t2" for key in saver.blobs)
+
+
+class TestSqliteConversationSaver:
+    """SqliteConversationSaverのテストクラス"""
+
+    def test_prunes_and_evicts(self, tmp_path):
+        """SQLiteでも最新のチェックポイントのみを残し、上限を超えた会話を削除するテスト"""
+        pytest.importorskip("langgraph.checkpoint.sqlite")
+        path = str(tmp_path / "conversation" / "memory.sqlite")
+        model = _build_model(conversation={"sqlite_path": path, "max_conversations": 2, "max_history_tokens": 100000})
+        graph = model.get_graph(conversational=True)
+        checkpointer = graph.checkpointer
+        assert type(checkpointer).__name__ == "SqliteConversationSaver"
+
+        for thread_id in ["t1", "t2", "t3"]:
+            for index in range(2):
+                asyncio.run(graph.ainvoke(State(query=f"質問{index}"), config={"configurable": {"thread_id": thread_id}}))
+
+        with checkpointer.cursor() as cur:
+            rows = cur.execute("SELECT thread_id, COUNT(*) FROM checkpoints GROUP BY thread_id").fetchall()
+        assert sorted(rows) == [("t2", 1), ("t3", 1)]
+        state = graph.get_state({"configurable": {"thread_id": "t3"}})
+        assert len(state.values["messages"]) == 5
+
+
+def _build_model(conversation: Optional[dict] = None, **llm_kwargs) -> QuestionLLMModel:
+    """SSM・Vector Store を使わずに QuestionLLMModel を組み立てる"""
+    question_llm_setting = {
+        "system_context": "あなたはサポート担当です",
+        "prompt_context": "文脈: {context}\n質問: {question}",
+        "prompt_layout": {"mode": "prefix_stable"},
+        "conversation": conversation or {},
+    }
+    model = QuestionLLMModel.__new__(QuestionLLMModel)
+    model.file_paths = ["m.pdf"]
+    model.question_llm_setting = question_llm_setting
+    model.llm = RecordingChatModel(calls=[], **llm_kwargs)
+    model.retriever = RunnableLambda(lambda _: [Document(page_content="返品は30日以内です", metadata={"source": "m.pdf"})])
+    model.create_async_retriever = lambda: model.retriever
+    model.context_packer = ContextPacker(model_name="test")
+    model.prompt_layout = PromptLayout(question_llm_setting)
+    model.prompt = model.prompt_layout.build_prompt()
+    model.first_token_handler = FirstTokenLatencyHandler()
+    model.admission = AdmissionController("test", {"enabled": False})
+    model.conversation_setting = ConversationMemory.get_setting(question_llm_setting)
+    model.company_id = None
+    model.model_routing = ModelRoutingPolicy()
+    model.lightweight_llm = None
+    return model
+
+
+class TestConversationMode:
+    """QuestionLLMModelの会話モードのテストクラス"""
+
+    def _ask(self, graph, question, thread_id="1:10:c1"):
+        return graph.invoke(State(query=question, query_embedding=None), config={"configurable": {"thread_id": thread_id}})
+
+    def test_previous_turns_are_sent_as_history(self):
+        """2ターン目以降は前のやり取りが固定部分と今回の質問の間に入るテスト"""
+        model = _build_model()
+        graph = model.get_graph(conversational=True)
+
+        self._ask(graph, "返品できますか")
+        self._ask(graph, "送料は？")
+
+        messages = model.llm.calls[-1]
+        assert isinstance(messages[0], SystemMessage)
+        assert [type(message) for message in messages[1:]] == [HumanMessage, AIMessage, HumanMessage]
+        assert messages[1].content == "返品できますか"
+        assert messages[2].content == "回答1"
+        assert "送料は？" in messages[3].content
+
+    def test_conversations_are_isolated_by_thread(self):
+        """thread_id が異なる会話の履歴は参照されないテスト"""
+        model = _build_model()
+        graph = model.get_graph(conversational=True)
+
+        self._ask(graph, "返品できますか", thread_id="1:10:c1")
+        self._ask(graph, "送料は？", thread_id="2:10:c1")
+
+        assert len(model.llm.calls[-1]) == 2
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "同期実行",
+            "async_mode": False,
+        },
+        {
+            "description": "非同期実行",
+            "async_mode": True,
+        },
+    ], ids=lambda x: x["description"])
+    def test_old_turns_are_summarized(self, test_case):
+        """履歴が上限を超えた場合は直近のやり取りを残して要約され、プロンプトの大きさが一定に保たれるテスト"""
+        model = _build_model(conversation={"max_history_tokens": 30, "keep_recent_messages": 2})
+        graph = model.get_graph(conversational=True)
+        config = {"configurable": {"thread_id": "1:10:c1"}}
+
+        prompt_sizes = []
+        for index in range(6):
+            state = State(query=f"{index}番目の質問です。よろしくお願いします", query_embedding=None)
+            if test_case["async_mode"]:
+                asyncio.run(graph.ainvoke(state, config=config))
+            else:
+                graph.invoke(state, config=config)
+            answer_calls = [call for call in model.llm.calls if "記録係" not in str(call[0].content)]
+            prompt_sizes.append(len(answer_calls[-1]))
+
+        values = graph.get_state(config).values
+        assert values["summary"].startswith("要約")
+        # システムメッセージ + 直近の1往復のみが残る
+        assert [type(message) for message in values["messages"]] == [SystemMessage, HumanMessage, AIMessage]
+        assert values["messages"][1].content == "5番目の質問です。よろしくお願いします"
+        # 要約が始まった後はプロンプトのメッセージ数が増えない
+        assert prompt_sizes[2:] == [prompt_sizes[2]] * 4
+        assert "これまでの会話の要約" in answer_calls[-1][1].content
+
+    def test_summary_failure_keeps_history(self):
+        """要約に失敗した場合は回答を返し、履歴をそのまま保持するテスト"""
+        model = _build_model(conversation={"max_history_tokens": 10, "keep_recent_messages": 2}, fail_summary=True)
+        graph = model.get_graph(conversational=True)
+
+        self._ask(graph, "返品できますか。よろしくお願いします")
+        result = self._ask(graph, "送料はいくらですか。よろしくお願いします")
+
+        assert result["messages"][-1].content.startswith("回答")
+        assert result.get("summary") is None
+        assert len(result["messages"]) == 5
+
+    def test_stateless_graph_has_no_checkpointer(self):
+        """会話IDを指定しない場合は従来どおり履歴を保存しないテスト"""
+        model = _build_model()
+
+        graph = model.get_graph()
+
+        assert graph.checkpointer is None
+        assert "summarize_history" not in graph.nodes
@@ -0,0 +1,278 @@
+import hashlib
+import os
+import threading
+import time
+import pytest
+from langchain_core.documents import Document
+from app.models.llm.document_loader import ConcurrentDocumentLoader
+from app.models.llm.parsed_document_cache import ParsedDocumentCache
+
+
+def read_text(local_path: str, unstructured_kwargs=None) -> list[Document]:
+    """unstructured を使わずにファイルの内容をそのままドキュメントにする（プロセスから呼び出すためモジュールの関数とする）"""
+    with open(local_path, encoding="utf-8") as f:
+        text = f.read()
+    if text == "解析エラー":
+        raise ValueError("解析に失敗しました")
+    return [Document(page_content=text, metadata={"pid": os.getpid()})]
+
+
+class PagedTextParser:
+    """1行を1ページとし、3ページ以上のファイルは2ページ毎に分けて解析するパーサー"""
+
+    def page_ranges(self, local_path: str) -> list[tuple[int, int]]:
+        with open(local_path, encoding="utf-8") as f:
+            page_count = len(f.read().splitlines())
+        if page_count <= 2:
+            return []
+        return [(start, min(start + 2, page_count)) for start in range(0, page_count, 2)]
+
+    def extract_pages(self, local_path: str, start: int, end=None, unstructured_kwargs=None) -> list[Document]:
+        with open(local_path, encoding="utf-8") as f:
+            lines = f.read().splitlines()[start:end]
+        return [
+            Document(page_content=line, metadata={"page_number": start + index + 1, "pid": os.getpid()})
+            for index, line in enumerate(lines)
+        ]
+
+    def __call__(self, local_path: str, unstructured_kwargs=None) -> list[Document]:
+        return self.extract_pages(local_path, 0)
+
+
+class FakeS3Client:
+    """指定した内容をローカルファイルに書き出す S3 クライアント"""
+
+    def __init__(self, objects: dict[str, str], delay_seconds: float = 0.0):
+        self.objects = objects
+        self.delay_seconds = delay_seconds
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        if Key not in self.objects:
+            raise FileNotFoundError(f"{Bucket}/{Key}")
+        return {"ETag": '"' + hashlib.md5(self.objects[Key].encode("utf-8")).hexdigest() + '"'}
+
+    def download_file(self, bucket: str, key: str, filename: str, ExtraArgs=None) -> None:
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay_seconds)
+            if key not in self.objects:
+                raise FileNotFoundError(f"{bucket}/{key}")
+            if ExtraArgs and ExtraArgs.get("IfMatch") != self.head_object(bucket, key)["ETag"]:
+                raise ValueError("PreconditionFailed")
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write(self.objects[key])
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class TestConcurrentDocumentLoader:
+    """ConcurrentDocumentLoaderのテストクラス"""
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "スレッドで解析する",
+            "setting": {"download_workers": 4, "parse_workers": 0},
+        },
+        {
+            "description": "PDFはプロセスで解析する",
+            "setting": {"download_workers": 4, "parse_workers": 2},
+        },
+    ], ids=lambda x: x["description"])
+    def test_load(self, test_case):
+        """全ファイルのドキュメントが file_paths の順に返り、source が設定されるテスト"""
+        objects = {f"1/1/{index}.pdf": f"マニュアル{index}" for index in range(6)}
+        objects["1/1/memo.txt"] = "メモ"
+        loader = ConcurrentDocumentLoader(
+            bucket_name="manuals",
+            setting=test_case["setting"],
+            s3_client=FakeS3Client(objects),
+            parser=read_text,
+        )
+
+        documents = loader.load(list(objects))
+
+        assert [document.page_content for document in documents] == list(objects.values())
+        assert [document.metadata["source"] for document in documents] == [f"manuals/{key}" for key in objects]
+        pdf_pids = {document.metadata["pid"] for document in documents[:-1]}
+        if test_case["setting"]["parse_workers"]:
+            assert os.getpid() not in pdf_pids
+        else:
+            assert pdf_pids == {os.getpid()}
+        # PDF以外はプロセスに渡さない
+        assert documents[-1].metadata["pid"] == os.getpid()
+
+    def test_downloads_in_parallel(self):
+        """ダウンロードが download_workers まで並行に行われるテスト"""
+        objects = {f"1/1/{index}.txt": "本文" for index in range(8)}
+        s3_client = FakeS3Client(objects, delay_seconds=0.05)
+        loader = ConcurrentDocumentLoader(
+            bucket_name="manuals",
+            setting={"download_workers": 4, "parse_workers": 0},
+            s3_client=s3_client,
+            parser=read_text,
+        )
+
+        documents = loader.load(list(objects))
+
+        assert len(documents) == 8
+        assert s3_client.max_in_flight == 4
+
+    def test_failures_are_isolated(self):
+        """ダウンロード・解析に失敗したファイルを除いて返し、進捗に失敗件数を含めるテスト"""
+        objects = {
+            "1/1/ok.pdf": "正常",
+            "1/1/broken.pdf": "解析エラー",
+            "1/1/ok.txt": "正常なテキスト",
+        }
+        progresses = []
+        loader = ConcurrentDocumentLoader(
+            bucket_name="manuals",
+            setting={"download_workers": 2, "parse_workers": 1, "progress_interval": 1},
+            s3_client=FakeS3Client(objects),
+            parser=read_text,
+            progress_callback=lambda progress: progresses.append((progress.completed, progress.failed)),
+        )
+
+        documents = loader.load(["1/1/ok.pdf", "1/1/missing.pdf", "1/1/broken.pdf", "", "1/1/ok.txt"])
+
+        assert [document.page_content for document in documents] == ["正常", "正常なテキスト"]
+        # 空のファイルパスは対象外
+        assert [completed for completed, _ in progresses] == [1, 2, 3, 4]
+        assert progresses[-1] == (4, 2)
+
+    def test_iter_load_yields_each_file(self):
+        """iter_load がファイル毎の結果を返すテスト"""
+        objects = {"1/1/a.txt": "A", "1/1/b.txt": "B"}
+        loader = ConcurrentDocumentLoader(
+            bucket_name="manuals",
+            setting={"parse_workers": 0},
+            s3_client=FakeS3Client(objects),
+            parser=read_text,
+        )
+
+        results = {result.file_path: result for result in loader.iter_load(["1/1/a.txt", "1/1/missing.txt", "1/1/b.txt"])}
+
+        assert results["1/1/a.txt"].documents[0].page_content == "A"
+        assert results["1/1/b.txt"].error is None
+        assert isinstance(results["1/1/missing.txt"].error, FileNotFoundError)
+
+    def test_iter_load_bounds_prefetch(self):
+        """呼び出し側が結果を受け取るまで max_pending_files を超えてダウンロードしないテスト"""
+        objects = {f"1/1/{index}.txt": "本文" for index in range(10)}
+        s3_client = FakeS3Client(objects)
+        downloaded = []
+        s3_client_download_file = s3_client.download_file
+        s3_client.download_file = lambda bucket, key, filename: (
+            downloaded.append(key), s3_client_download_file(bucket, key, filename)
+        )
+        loader = ConcurrentDocumentLoader(
+            bucket_name="manuals",
+            setting={"download_workers": 4, "parse_workers": 0, "max_pending_files": 3},
+            s3_client=s3_client,
+            parser=read_text,
+        )
+
+        results = loader.iter_load(list(objects))
+        next(results)
+        time.sleep(0.1)
+        # 呼び出し側が処理している間は補充しない
+        assert len(downloaded) == 3
+
+        remaining = list(results)
+
+        assert len(remaining) == 9
+        assert len(downloaded) == 10
+
+    def test_iter_load_content_hash(self):
+        """ダウンロードしたファイルの内容のハッシュを返すテスト"""
+        objects = {"1/1/a.pdf": "A", "1/1/b.pdf": "A", "1/1/c.txt": "C"}
+        loader = ConcurrentDocumentLoader(
+            bucket_name="manuals",
+            setting={"parse_workers": 1},
+            s3_client=FakeS3Client(objects),
+            parser=read_text,
+        )
+
+        results = {result.file_path: result for result in loader.iter_load(list(objects))}
+
+        assert results["1/1/a.pdf"].content_hash == hashlib.sha256("A".encode("utf-8")).hexdigest()
+        assert results["1/1/b.pdf"].content_hash == results["1/1/a.pdf"].content_hash
+        assert results["1/1/c.txt"].content_hash != results["1/1/a.pdf"].content_hash
+
+    def test_load_splits_pages(self):
+        """大きなPDFはページ範囲毎に解析用のプロセスで解析し、ページ順に結合するテスト"""
+        objects = {
+            "1/1/large.pdf": "\n".join(f"ページ{index}" for index in range(1, 6)),
+            "1/1/small.pdf": "ページ1\nページ2",
+        }
+        progresses = []
+        loader = ConcurrentDocumentLoader(
+            bucket_name="manuals",
+            setting={"download_workers": 2, "parse_workers": 2, "progress_interval": 1},
+            s3_client=FakeS3Client(objects),
+            parser=PagedTextParser(),
+            progress_callback=lambda progress: progresses.append(progress.pages_per_second),
+        )
+
+        documents = loader.load(list(objects))
+
+        assert [document.page_content for document in documents] == [
+            "ページ1", "ページ2", "ページ3", "ページ4", "ページ5", "ページ1", "ページ2",
+        ]
+        assert [document.metadata["page_number"] for document in documents[:5]] == [1, 2, 3, 4, 5]
+        assert os.getpid() not in {document.metadata["pid"] for document in documents}
+        assert all(document.metadata["source"] == "manuals/1/1/large.pdf" for document in documents[:5])
+        assert progresses[-1] > 0
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "スレッドで解析する",
+            "setting": {"parse_workers": 0},
+        },
+        {
+            "description": "PDFはプロセスで解析する",
+            "setting": {"parse_workers": 1},
+        },
+    ], ids=lambda x: x["description"])
+    def test_iter_load_uses_cache(self, test_case, tmp_path):
+        """2回目以降はキャッシュから返し、ダウンロード・解析しないテスト"""
+        objects = {"1/1/a.pdf": "A", "1/1/b.txt": "B"}
+        s3_client = FakeS3Client(objects)
+        downloaded = []
+        s3_client_download_file = s3_client.download_file
+        s3_client.download_file = lambda bucket, key, filename, ExtraArgs=None: (
+            downloaded.append(key), s3_client_download_file(bucket, key, filename, ExtraArgs)
+        )
+
+        def load() -> dict:
+            loader = ConcurrentDocumentLoader(
+                bucket_name="manuals",
+                setting=test_case["setting"],
+                s3_client=s3_client,
+                parser=read_text,
+                cache=ParsedDocumentCache({"directory": str(tmp_path)}),
+            )
+            return {result.file_path: result for result in loader.iter_load(list(objects))}
+
+        first = load()
+        second = load()
+
+        assert sorted(downloaded) == ["1/1/a.pdf", "1/1/b.txt"]
+        for file_path, text in objects.items():
+            assert second[file_path].documents[0].page_content == text
+            assert second[file_path].documents[0].metadata["source"] == f"manuals/{file_path}"
+            assert second[file_path].content_hash == first[file_path].content_hash
+
+        # 内容が変わった場合（ETag が変わった場合）は解析し直す
+        objects["1/1/a.pdf"] = "A2"
+        third = load()
+
+        assert downloaded[-1] == "1/1/a.pdf"
+        assert third["1/1/a.pdf"].documents[0].page_content == "A2"
+        assert third["1/1/a.pdf"].content_hash == hashlib.sha256("A2".encode("utf-8")).hexdigest()
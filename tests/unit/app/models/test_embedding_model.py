@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import Mock, patch
 import numpy as np
-from app.models.llm.embedding_model import SentenceTransformerEmbeddingsModel
+from app.models.llm.embedding_model import EmbeddingModelManager, SentenceTransformerEmbeddingsModel
 
 
 class TestSentenceTransformerEmbeddingsModel:
@@ -308,6 +308,26 @@ class TestSentenceTransformerEmbeddingsModel:
         assert result == embedding_vectors
         assert mock_model_instance.encode.call_count == len(valid_texts)
     
+    @patch('app.models.llm.embedding_model.SentenceTransformer')
+    def test_embed_queries_encodes_in_single_batch(self, mock_sentence_transformer):
+        """embed_queriesが1回のencodeで全てのテキストを埋め込むテスト"""
+        texts = ["質問1", "質問2", "質問3"]
+        embedding_vectors = [[0.1, 0.2], [0.3, 0.4], [0.5, 0.6]]
+
+        mock_model_instance = Mock()
+        mock_model_instance.encode.return_value = np.array(embedding_vectors)
+        mock_sentence_transformer.return_value = mock_model_instance
+
+        embedding_model = SentenceTransformerEmbeddingsModel(
+            model_name="test-model",
+            device="cpu"
+        )
+        result = embedding_model.embed_queries(texts)
+
+        assert result == embedding_vectors
+        mock_model_instance.encode.assert_called_once_with(texts)
+        assert embedding_model.embed_queries([]) == []
+
     @pytest.mark.parametrize("test_case", [
         {
             "description": "埋め込み処理に失敗した場合、Exceptionを発生させる",
@@ -337,3 +357,22 @@ class TestSentenceTransformerEmbeddingsModel:
         # 検証
         with pytest.raises(exception_type, match=exception_message):
             embedding_model.embed_documents(texts)
+
+
+class TestEmbeddingModelManager:
+    """EmbeddingModelManagerのユニットテストクラス"""
+
+    @patch('app.models.llm.embedding_model.SentenceTransformer')
+    def test_get_shared_embedding_model(self, mock_sentence_transformer):
+        """同じモデル・デバイスの埋め込みモデルはプロセス内で1回だけロードするテスト"""
+        EmbeddingModelManager._shared_models.clear()
+        try:
+            first = EmbeddingModelManager.get_shared_embedding_model("test-model", None, "cpu", False)
+            second = EmbeddingModelManager.get_shared_embedding_model("test-model", None, "cpu", False)
+            other = EmbeddingModelManager.get_shared_embedding_model("test-model", None, "cuda", False)
+        finally:
+            EmbeddingModelManager._shared_models.clear()
+
+        assert first is second
+        assert other is not first
+        assert mock_sentence_transformer.call_count == 2
@@ -0,0 +1,272 @@
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+from langchain_core.documents import Document
+from app.models.llm.chunk_dedup import ChunkDeduplicator, chunk_hash
+from app.models.llm.document_loader import LoadResult
+from app.models.llm.ingestion_pipeline import IngestionPipeline
+
+
+class FakeLoader:
+    """指定した内容をファイル毎の結果として返すローダー"""
+
+    def __init__(self, contents: dict[str, str], errors: tuple[str, ...] = ()):
+        self.contents = contents
+        self.errors = errors
+        self.produced = 0
+        self.closed = False
+
+    def iter_load(self, file_paths):
+        try:
+            for file_path in file_paths:
+                self.produced += 1
+                if file_path in self.errors:
+                    yield LoadResult(file_path=file_path, error=FileNotFoundError(file_path))
+                    continue
+                document = Document(page_content=self.contents[file_path], metadata={"source": f"manuals/{file_path}"})
+                yield LoadResult(file_path=file_path, documents=[document])
+        finally:
+            self.closed = True
+
+
+class FakeEmbeddings:
+    """テキストの長さを埋め込みとして返す"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text))] for text in texts]
+
+
+class FakeBatchEmbeddings(FakeEmbeddings):
+    """SentenceTransformerEmbeddingsModel と同様に embed_queries を持つ"""
+
+    def embed_queries(self, texts):
+        return [[-float(len(text))] for text in texts]
+
+
+class FakeVectorStore:
+    def __init__(self, loader: FakeLoader = None, delay_seconds: float = 0.0):
+        self.loader = loader
+        self.delay_seconds = delay_seconds
+        self.writes = []
+        self.max_ahead = 0
+        self.thread_names = set()
+
+    def add_embeddings(self, texts, embeddings, metadatas):
+        time.sleep(self.delay_seconds)
+        self.writes.append((texts, embeddings, metadatas))
+        self.thread_names.add(threading.current_thread().name)
+        if self.loader is not None:
+            written = sum(len(texts) for texts, _, _ in self.writes)
+            self.max_ahead = max(self.max_ahead, self.loader.produced - written)
+
+
+class FakeWriter:
+    """batch_size 行毎に書き込んだことにするライター"""
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.buffer = []
+        self.flushed = []
+        self.rows_per_second = 100.0
+
+    def add(self, texts, embeddings, metadatas):
+        self.buffer.extend(texts)
+        if len(self.buffer) < self.batch_size:
+            return 0
+        return self.flush()
+
+    def flush(self):
+        rows, self.buffer = self.buffer, []
+        if rows:
+            self.flushed.append(rows)
+        return len(rows)
+
+
+class TestIngestionPipeline:
+    """IngestionPipelineのテストクラス"""
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "バッチに満たない端数も書き込む",
+            "batch_size": 2,
+            "expected_batches": [["A", "AA"], ["AAA", "AAAA"], ["AAAAA"]],
+        },
+        {
+            "description": "バッチサイズが件数以上なら1回で書き込む",
+            "batch_size": 10,
+            "expected_batches": [["A", "AA", "AAA", "AAAA", "AAAAA"]],
+        },
+    ], ids=lambda x: x["description"])
+    def test_run(self, test_case):
+        """チャンクがバッチ毎に埋め込まれ、メタデータと共に書き込まれるテスト"""
+        contents = {f"1/1/{index}.pdf": "A" * (index + 1) for index in range(5)}
+        embeddings = FakeEmbeddings()
+        vector_store = FakeVectorStore()
+        pipeline = IngestionPipeline(
+            loader=FakeLoader(contents),
+            embeddings=embeddings,
+            vector_store=vector_store,
+            setting={"batch_size": test_case["batch_size"], "queue_size": 1},
+        )
+
+        stats = pipeline.run(list(contents))
+
+        expected_batches = test_case["expected_batches"]
+        assert [texts for texts, _, _ in vector_store.writes] == expected_batches
+        assert [vectors for _, vectors, _ in vector_store.writes] == [
+            [[float(len(text))] for text in batch] for batch in expected_batches
+        ]
+        assert vector_store.writes[0][2][0] == {"source": "manuals/1/1/0.pdf"}
+        assert embeddings.calls == [texts for texts, _, _ in vector_store.writes]
+        # 書き込みは呼び出し元のスレッドで行う
+        assert vector_store.thread_names == {threading.current_thread().name}
+        assert stats.files == 5
+        assert stats.documents == 5
+        assert stats.chunks == 5
+        assert stats.batches == len(expected_batches)
+        assert stats.first_write_ms is not None
+        assert stats.first_write_ms <= stats.elapsed_ms
+
+    def test_run_splits_and_skips_failures(self):
+        """分割したチャンクを書き込み、ロードに失敗したファイルと空のチャンクは除外するテスト"""
+        contents = {"1/1/a.pdf": "一。二。", "1/1/b.pdf": "三。", "1/1/c.pdf": ""}
+        vector_store = FakeVectorStore()
+        pipeline = IngestionPipeline(
+            loader=FakeLoader(contents, errors=("1/1/missing.pdf",)),
+            embeddings=FakeEmbeddings(),
+            vector_store=vector_store,
+            splitter=lambda documents: [
+                Document(page_content=f"{sentence}。", metadata={**document.metadata, "chunk_index": index})
+                for document in documents
+                for index, sentence in enumerate(document.page_content.split("。")[:-1])
+            ] + [Document(page_content=" ", metadata={})],
+            setting={"batch_size": 10},
+        )
+
+        stats = pipeline.run(["1/1/a.pdf", "1/1/missing.pdf", "1/1/b.pdf", "1/1/c.pdf"])
+
+        assert vector_store.writes[0][0] == ["一。", "二。", "三。"]
+        assert [metadata["chunk_index"] for metadata in vector_store.writes[0][2]] == [0, 1, 0]
+        assert stats.files == 4
+        assert stats.failed_files == 1
+        assert stats.chunks == 3
+
+    def test_run_with_writer(self):
+        """ライターを指定した場合はライターに渡し、最後に残りを書き込むテスト"""
+        contents = {f"1/1/{index}.pdf": "本文" for index in range(5)}
+        vector_store = FakeVectorStore()
+        writer = FakeWriter(batch_size=3)
+        pipeline = IngestionPipeline(
+            loader=FakeLoader(contents),
+            embeddings=FakeEmbeddings(),
+            vector_store=vector_store,
+            setting={"batch_size": 2},
+            writer=writer,
+        )
+
+        stats = pipeline.run(list(contents))
+
+        assert [len(rows) for rows in writer.flushed] == [4, 1]
+        assert vector_store.writes == []
+        assert stats.chunks == 5
+        assert stats.first_write_ms is not None
+
+    def test_run_with_dedup(self):
+        """アプリケーション内で内容が同じチャンクは1回だけ埋め込み、他のマニュアルを sources に追加するテスト"""
+        contents = {"1/1/a.pdf": "共通の注意事項", "1/1/b.pdf": "共通の注意事項", "1/2/c.pdf": "共通の注意事項"}
+        embeddings = FakeEmbeddings()
+        vector_store = FakeVectorStore()
+        pipeline = IngestionPipeline(
+            loader=FakeLoader(contents),
+            embeddings=embeddings,
+            vector_store=vector_store,
+            setting={"batch_size": 10},
+            deduplicator=ChunkDeduplicator(),
+        )
+
+        with patch.object(IngestionPipeline, "_attach_shared_sources") as mock_attach:
+            stats = pipeline.run(list(contents))
+
+        # 別のアプリケーション（1/2）のマニュアルとは共有しない
+        assert embeddings.calls == [["共通の注意事項", "共通の注意事項"]]
+        metadata = vector_store.writes[0][2][0]
+        assert metadata["sources"] == ["manuals/1/1/a.pdf"]
+        assert metadata["chunk_hash"] == chunk_hash("manuals/1/1/a.pdf", "共通の注意事項")
+        mock_attach.assert_called_once_with({"manuals/1/1/b.pdf": {metadata["chunk_hash"]}})
+        assert stats.chunks == 2
+        assert stats.shared_chunks == 1
+
+    def test_run_uses_batch_embedding(self):
+        """embed_queries を持つ埋め込みモデルではバッチでエンコードするテスト"""
+        embeddings = FakeBatchEmbeddings()
+        vector_store = FakeVectorStore()
+        pipeline = IngestionPipeline(
+            loader=FakeLoader({"1/1/a.pdf": "本文"}),
+            embeddings=embeddings,
+            vector_store=vector_store,
+        )
+
+        pipeline.run(["1/1/a.pdf"])
+
+        assert vector_store.writes[0][1] == [[-2.0]]
+        assert embeddings.calls == []
+
+    def test_run_applies_backpressure(self):
+        """書き込みが遅い場合にロードが先行し過ぎないテスト"""
+        contents = {f"1/1/{index}.pdf": "本文" for index in range(30)}
+        loader = FakeLoader(contents)
+        vector_store = FakeVectorStore(loader=loader, delay_seconds=0.01)
+        pipeline = IngestionPipeline(
+            loader=loader,
+            embeddings=FakeEmbeddings(),
+            vector_store=vector_store,
+            setting={"batch_size": 1, "queue_size": 1},
+        )
+
+        stats = pipeline.run(list(contents))
+
+        assert stats.chunks == 30
+        # ロード・分割、埋め込み、書き込みの各段とキューで保持する分（各1バッチ）を超えて先読みしない
+        assert vector_store.max_ahead <= 6
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "埋め込みの失敗",
+            "embeddings_error": RuntimeError("埋め込みに失敗しました"),
+            "vector_store_error": None,
+        },
+        {
+            "description": "書き込みの失敗",
+            "embeddings_error": None,
+            "vector_store_error": RuntimeError("書き込みに失敗しました"),
+        },
+    ], ids=lambda x: x["description"])
+    def test_run_failure(self, test_case):
+        """いずれかの段で失敗した場合は全ての段を停止して例外を返すテスト"""
+        contents = {f"1/1/{index}.pdf": "本文" for index in range(100)}
+        loader = FakeLoader(contents)
+        vector_store = FakeVectorStore()
+        if test_case["vector_store_error"] is not None:
+            vector_store.add_embeddings = Mock(side_effect=test_case["vector_store_error"])
+        pipeline = IngestionPipeline(
+            loader=loader,
+            embeddings=FakeEmbeddings(error=test_case["embeddings_error"]),
+            vector_store=vector_store,
+            setting={"batch_size": 1, "queue_size": 1},
+        )
+
+        with pytest.raises(RuntimeError, match="に失敗しました"):
+            pipeline.run(list(contents))
+
+        # ロードも途中で止まり、ローダーは閉じられる
+        assert loader.closed is True
+        assert loader.produced < 100
+        assert [thread.name for thread in threading.enumerate() if thread.name.startswith("ingestion-")] == []
@@ -0,0 +1,217 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import pytest
+from unittest.mock import Mock, patch
+from langchain_core.documents import Document
+from app.models.llm.document_loader import LoadResult
+from app.models.llm.ingestion_worker import DEFAULT_JOB_SETTING, IngestionWorker
+from app.models.llm.vector_sync import SourceState
+from app.repositories.ingestion_job_repository import ClaimedDocumentDto
+from app.repositories.manual_repository import ManualDto
+
+
+MANUAL = ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")
+KEY = "1/10/100.pdf"
+
+
+class FakeDatabase:
+    """get_session でモックセッションを返すデータベース"""
+
+    def __init__(self):
+        self.session = Mock()
+
+    @contextmanager
+    def get_session(self):
+        yield self.session
+
+
+class FakeLoader:
+    """指定したエラーまたは1ページのドキュメントを返すローダー"""
+
+    def __init__(self, error: Exception | None = None):
+        self.error = error
+
+    def iter_load(self, file_paths):
+        for file_path in file_paths:
+            if self.error is not None:
+                yield LoadResult(file_path=file_path, error=self.error)
+            else:
+                yield LoadResult(file_path=file_path, documents=[Document(page_content="text")], content_hash="h1")
+
+
+def claimed(attempts: int = 1, job_id: int = 1) -> ClaimedDocumentDto:
+    return ClaimedDocumentDto(job_document_id=job_id * 10, job_id=job_id, manual=MANUAL, attempts=attempts)
+
+
+def build_engine(loader: FakeLoader) -> Mock:
+    engine = Mock()
+    engine.bucket_name = "manuals"
+    engine.loader = loader
+    engine.source_of.side_effect = lambda key: f"manuals/{key}"
+    engine.build_states.side_effect = lambda objects, manuals: [
+        SourceState(source=f"manuals/{obj['Key']}", key=obj["Key"], etag=obj["ETag"], size=obj["Size"])
+        for obj in objects
+    ]
+    engine.ingest_document.return_value = 3
+    return engine
+
+
+class TestIngestionWorker:
+    """IngestionWorkerのテストクラス"""
+
+    @pytest.fixture
+    def s3_client(self):
+        s3_client = Mock()
+        s3_client.client.head_object.return_value = {"ETag": '"e1"', "ContentLength": 10}
+        return s3_client
+
+    def build_worker(self, engine, s3_client, setting=None) -> IngestionWorker:
+        return IngestionWorker(engine, s3_client=s3_client, setting=setting, worker_id="worker-1", db=FakeDatabase())
+
+    def test_run_once_completes(self, s3_client):
+        """取得したマニュアルを埋め込み直して完了を記録するテスト（同じマニュアルは1回だけ取り込む）"""
+        engine = build_engine(FakeLoader())
+        worker = self.build_worker(engine, s3_client)
+        documents = [claimed(job_id=1), claimed(job_id=2)]
+
+        with patch('app.models.llm.ingestion_worker.IngestionJobRepository') as mock_repository, \
+            patch('app.models.llm.ingestion_worker.ManualRepository.get_by_company_id', return_value=[MANUAL]):
+            mock_repository.claim_documents.return_value = documents
+            mock_repository.complete_document.return_value = True
+            processed = worker.run_once()
+
+        assert processed == 2
+        s3_client.client.head_object.assert_called_once_with(Bucket="manuals", Key=KEY)
+        engine.ingest_document.assert_called_once()
+        state, result = engine.ingest_document.call_args.args
+        assert (state.key, state.etag, result.content_hash) == (KEY, '"e1"', "h1")
+        assert [call.kwargs for call in mock_repository.complete_document.call_args_list] == [
+            {"job_document_id": 10, "worker_id": "worker-1", "chunks": 3},
+            {"job_document_id": 20, "worker_id": "worker-1", "chunks": 3},
+        ]
+        mock_repository.fail_document.assert_not_called()
+        assert mock_repository.claim_documents.call_args.kwargs["max_attempts"] == DEFAULT_JOB_SETTING["max_attempts"]
+        assert mock_repository.renew_lease.call_args.kwargs["job_document_ids"] == [10, 20]
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "上限未満の場合はバックオフ後に再試行する",
+            "attempts": 2,
+            "expected_retry_seconds": (48, 60),
+        },
+        {
+            "description": "上限に達した場合は再試行しない",
+            "attempts": 5,
+            "expected_retry_seconds": None,
+        },
+    ], ids=lambda x: x["description"])
+    def test_run_once_fails(self, s3_client, test_case):
+        """読み込みに失敗したマニュアルの失敗を記録するテスト"""
+        engine = build_engine(FakeLoader(error=FileNotFoundError(KEY)))
+        worker = self.build_worker(engine, s3_client, {"backoff_base_seconds": 30, "max_attempts": 5})
+
+        with patch('app.models.llm.ingestion_worker.IngestionJobRepository') as mock_repository, \
+            patch('app.models.llm.ingestion_worker.ManualRepository.get_by_company_id', return_value=[MANUAL]):
+            mock_repository.claim_documents.return_value = [claimed(attempts=test_case["attempts"])]
+            started_at = datetime.now()
+            worker.run_once()
+
+        engine.ingest_document.assert_not_called()
+        mock_repository.complete_document.assert_not_called()
+        kwargs = mock_repository.fail_document.call_args.kwargs
+        assert kwargs["error"] == KEY
+        if test_case["expected_retry_seconds"] is None:
+            assert kwargs["retry_at"] is None
+        else:
+            low, high = test_case["expected_retry_seconds"]
+            retry_seconds = (kwargs["retry_at"] - started_at).total_seconds()
+            assert low - 1 <= retry_seconds <= high + 1
+
+    def test_run_once_removes_deleted_manual(self, s3_client):
+        """登録後に削除されたマニュアルはベクトルを削除して完了とするテスト"""
+        engine = build_engine(FakeLoader())
+        worker = self.build_worker(engine, s3_client)
+
+        with patch('app.models.llm.ingestion_worker.IngestionJobRepository') as mock_repository, \
+            patch('app.models.llm.ingestion_worker.ManualRepository.get_by_company_id', return_value=[]):
+            mock_repository.claim_documents.return_value = [claimed()]
+            worker.run_once()
+
+        engine.remove_document.assert_called_once_with(f"manuals/{KEY}")
+        s3_client.client.head_object.assert_not_called()
+        engine.ingest_document.assert_not_called()
+        assert mock_repository.complete_document.call_args.kwargs["chunks"] == 0
+
+    def test_run_once_skips_lost_lease(self, s3_client):
+        """取り込む直前に期限を延長できない（他のワーカーが取得し直した）マニュアルは取り込まないテスト"""
+        engine = build_engine(FakeLoader())
+        worker = self.build_worker(engine, s3_client)
+
+        with patch('app.models.llm.ingestion_worker.IngestionJobRepository') as mock_repository, \
+            patch('app.models.llm.ingestion_worker.ManualRepository.get_by_company_id', return_value=[MANUAL]):
+            mock_repository.claim_documents.return_value = [claimed()]
+            mock_repository.renew_lease.return_value = 0
+            worker.run_once()
+
+        engine.ingest_document.assert_not_called()
+        mock_repository.complete_document.assert_not_called()
+        mock_repository.fail_document.assert_not_called()
+
+    def test_run_once_keeps_leases(self, s3_client):
+        """取り込みの間は lease_seconds / 3 毎に処理中の期限を延長するテスト"""
+        engine = build_engine(FakeLoader())
+        worker = self.build_worker(engine, s3_client, {"lease_seconds": 0.03})
+        renewed = threading.Event()
+
+        def ingest_document(state, result):
+            # 取り込みに時間が掛かる間に、別スレッドで期限が延長される
+            assert renewed.wait(5)
+            return 3
+
+        engine.ingest_document.side_effect = ingest_document
+        with patch('app.models.llm.ingestion_worker.IngestionJobRepository') as mock_repository, \
+            patch('app.models.llm.ingestion_worker.ManualRepository.get_by_company_id', return_value=[MANUAL]):
+            mock_repository.claim_documents.return_value = [claimed()]
+
+            def renew_lease(session, **kwargs):
+                if threading.current_thread() is not threading.main_thread():
+                    renewed.set()
+                return 1
+
+            mock_repository.renew_lease.side_effect = renew_lease
+            worker.run_once()
+
+        # 取り込む直前の延長と、別スレッドでの延長
+        assert mock_repository.renew_lease.call_count >= 2
+        assert mock_repository.renew_lease.call_args.kwargs == {
+            "job_document_ids": [10], "worker_id": "worker-1", "lease_seconds": 0.03
+        }
+        mock_repository.complete_document.assert_called_once()
+
+    def test_run_stops(self, s3_client):
+        """処理するマニュアルが無い場合は待機し、stop_event で停止するテスト"""
+        worker = self.build_worker(build_engine(FakeLoader()), s3_client, {"poll_interval_seconds": 0})
+        stop_event = threading.Event()
+
+        def run_once():
+            stop_event.set()
+            return 0
+
+        with patch.object(worker, 'run_once', side_effect=run_once) as mock_run_once:
+            worker.run(stop_event)
+
+        mock_run_once.assert_called_once()
+
+    @pytest.mark.parametrize("test_case", [
+        {"description": "1回目は基準の秒数", "attempts": 1, "expected": 30},
+        {"description": "試行毎に2倍にする", "attempts": 3, "expected": 120},
+        {"description": "上限で打ち切る", "attempts": 10, "expected": 3600},
+    ], ids=lambda x: x["description"])
+    def test_backoff_seconds(self, test_case):
+        """再試行までの秒数のテスト（揺らぎは0.8倍〜1倍）"""
+        worker = IngestionWorker(Mock(), s3_client=Mock(), setting=DEFAULT_JOB_SETTING, db=FakeDatabase())
+
+        seconds = worker.backoff_seconds(test_case["attempts"])
+
+        assert test_case["expected"] * 0.8 <= seconds <= test_case["expected"]
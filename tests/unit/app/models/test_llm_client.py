@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.models.llm.llm_client import LLMClientManager
+from app.core.metrics import NaviApiMetrics
+
+
+class _ChatCompletionHandler(BaseHTTPRequestHandler):
+    """OpenAI互換の /chat/completions を返すテスト用ハンドラ（keep-alive対応）"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "test-model",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "テスト回答"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestLLMClientManager:
+    """LLMClientManagerのテストクラス"""
+
+    @pytest.fixture
+    def llm_server(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _ChatCompletionHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_port}/v1"
+        server.shutdown()
+        server.server_close()
+
+    @pytest.fixture(autouse=True)
+    def setup_manager(self):
+        LLMClientManager.clear()
+        NaviApiMetrics.reset()
+        yield
+        LLMClientManager.clear()
+        NaviApiMetrics.reset()
+
+    def _llm_setting(self, base_url: str, **overrides) -> dict:
+        return {
+            "model_name": "test-model",
+            "base_url": base_url,
+            "api_key": "test-api-key",
+            "temperature": 0.7,
+            **overrides,
+        }
+
+    def test_get_llm_is_shared_per_model_and_base_url(self):
+        """同じ (model, base_url) には同じクライアントを返すテスト"""
+        llm1 = LLMClientManager.get_llm(self._llm_setting("http://localhost:11434/v1"))
+        llm2 = LLMClientManager.get_llm(self._llm_setting("http://localhost:11434/v1"))
+        llm3 = LLMClientManager.get_llm(self._llm_setting("http://localhost:11435/v1"))
+
+        assert llm1 is llm2
+        assert llm1 is not llm3
+        assert LLMClientManager.stats()["clients"] == 2
+
+    def test_get_llm_recreates_client_when_setting_changes(self):
+        """設定値が変わった場合はクライアントを作り直すテスト"""
+        llm1 = LLMClientManager.get_llm(self._llm_setting("http://localhost:11434/v1"))
+        llm2 = LLMClientManager.get_llm(self._llm_setting("http://localhost:11434/v1", temperature=0.1))
+
+        assert llm1 is not llm2
+        assert llm2.temperature == 0.1
+        assert LLMClientManager.stats()["clients"] == 1
+
+    def test_http_setting_is_applied(self):
+        """llm_setting.http のタイムアウト・上限がクライアントに反映されるテスト"""
+        llm = LLMClientManager.get_llm(self._llm_setting(
+            "http://localhost:11434/v1",
+            http={"connect_timeout": 1.5, "read_timeout": 30.0, "http2": False}
+        ))
+
+        assert llm.http_client.timeout.connect == 1.5
+        assert llm.http_client.timeout.read == 30.0
+        assert llm.http_async_client.timeout.read == 30.0
+
+    def test_connection_is_reused(self, llm_server):
+        """2回目以降のリクエストで接続が再利用され、メトリクスに記録されるテスト"""
+        llm = LLMClientManager.get_llm(self._llm_setting(llm_server))
+
+        assert llm.invoke("質問1").content == "テスト回答"
+        assert llm.invoke("質問2").content == "テスト回答"
+        assert LLMClientManager.get_llm(self._llm_setting(llm_server)).invoke("質問3").content == "テスト回答"
+
+        stats = LLMClientManager.stats()
+        assert stats["requests"] == 3
+        assert stats["connections_opened"] == 1
+        assert stats["connection_reuse_rate"] == round(2 / 3, 4)
+
+    def test_async_connection_is_reused(self, llm_server):
+        """非同期クライアントでも接続が再利用されるテスト"""
+        llm = LLMClientManager.get_llm(self._llm_setting(llm_server))
+
+        async def run():
+            await llm.ainvoke("質問1")
+            await llm.ainvoke("質問2")
+
+        asyncio.run(run())
+
+        assert NaviApiMetrics.get_counter(LLMClientManager.METRIC_REQUESTS, labels={"connection": "new"}) == 1
+        assert NaviApiMetrics.get_counter(LLMClientManager.METRIC_REQUESTS, labels={"connection": "reused"}) == 1
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.models.llm.llm_client import LLMClientManager
+from app.models.llm.llm_router import LLMRouter
+from app.core.metrics import NaviApiMetrics
+
+
+class _FakeBackendHandler(BaseHTTPRequestHandler):
+    """応答の遅延と内容を指定できる、OpenAI互換の /chat/completions のテスト用ハンドラ"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        if self.server.status != 200:
+            body = json.dumps({"error": {"message": "overloaded"}}).encode("utf-8")
+            self._send(self.server.status, body, "application/json")
+            return
+        if request.get("stream"):
+            chunks = [
+                {"index": 0, "delta": {"role": "assistant", "content": self.server.answer}, "finish_reason": None},
+                {"index": 0, "delta": {}, "finish_reason": "stop"},
+            ]
+            body = "".join(
+                "data: " + json.dumps({
+                    "id": "chatcmpl-test",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": "test-model",
+                    "choices": [choice],
+                }) + "\n\n"
+                for choice in chunks
+            ) + "data: [DONE]\n\n"
+            self._send(200, body.encode("utf-8"), "text/event-stream")
+            return
+        body = json.dumps({
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "test-model",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.server.answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode("utf-8")
+        self._send(200, body, "application/json")
+
+    def _send(self, status, body, content_type):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # ヘッジで採用されずにキャンセルされたリクエスト
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestLLMRouter:
+    """LLMRouterのテストクラス"""
+
+    @pytest.fixture
+    def start_backend(self):
+        servers = []
+
+        def start(answer, delay=0.0, status=200):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeBackendHandler)
+            server.answer = answer
+            server.delay = delay
+            server.status = status
+            server.requests = 0
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            servers.append(server)
+            return server, f"http://127.0.0.1:{server.server_port}/v1"
+
+        yield start
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    @pytest.fixture(autouse=True)
+    def setup_manager(self):
+        LLMClientManager.clear()
+        NaviApiMetrics.reset()
+        yield
+        LLMClientManager.clear()
+        NaviApiMetrics.reset()
+
+    def _llm_setting(self, base_urls, hedge=None) -> dict:
+        return {
+            "model_name": "test-model",
+            "api_key": "test-api-key",
+            "temperature": 0.7,
+            # エラー時にopenaiクライアントが再試行しないようにする
+            "max_retries": 0,
+            "backends": [{"base_url": base_url} for base_url in base_urls],
+            "routing": {"hedge": hedge or {"enabled": False}},
+        }
+
+    def test_get_llm_returns_router_for_backends(self):
+        """backends が指定された場合は共有の LLMRouter を返すテスト"""
+        setting = self._llm_setting(["http://localhost:11434/v1", "http://localhost:11435/v1"])
+
+        router = LLMClientManager.get_llm(setting)
+
+        assert isinstance(router, LLMRouter)
+        assert router.model_name == "test-model"
+        assert [backend.name for backend in router.backends] == ["http://localhost:11434/v1", "http://localhost:11435/v1"]
+        assert LLMClientManager.get_llm(setting) is router
+        assert LLMClientManager.stats()["clients"] == 2
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "バックエンドが複数の場合は再試行しない",
+            "base_urls": ["http://localhost:11434/v1", "http://localhost:11435/v1"],
+            "setting": {},
+            "expected": [0, 0],
+        },
+        {
+            "description": "バックエンドが1つの場合は openai クライアントの既定",
+            "base_urls": ["http://localhost:11434/v1"],
+            "setting": {},
+            "expected": [2],
+        },
+        {
+            "description": "設定した値を優先する",
+            "base_urls": ["http://localhost:11434/v1", "http://localhost:11435/v1"],
+            "setting": {"max_retries": 1},
+            "expected": [1, 1],
+        },
+    ], ids=lambda x: x["description"])
+    def test_router_max_retries(self, test_case):
+        """ルーティング時のバックエンド毎の max_retries のテスト"""
+        setting = self._llm_setting(test_case["base_urls"])
+        del setting["max_retries"]
+
+        router = LLMClientManager.get_llm({**setting, **test_case["setting"]})
+
+        assert [backend.llm.max_retries for backend in router.backends] == test_case["expected"]
+
+    def test_least_outstanding_balancing(self, start_backend):
+        """実行中リクエスト数が最も少ないバックエンドに振り分けられるテスト"""
+        server1, url1 = start_backend("回答1", delay=0.3)
+        server2, url2 = start_backend("回答2", delay=0.3)
+        router = LLMClientManager.get_llm(self._llm_setting([url1, url2]))
+
+        async def run():
+            return await asyncio.gather(*[router.ainvoke(f"質問{i}") for i in range(4)])
+
+        answers = [message.content for message in asyncio.run(run())]
+
+        assert sorted(answers) == ["回答1", "回答1", "回答2", "回答2"]
+        assert (server1.requests, server2.requests) == (2, 2)
+        assert [backend.outstanding for backend in router.backends] == [0, 0]
+
+    def test_latency_is_tracked_per_backend(self, start_backend):
+        """バックエンド毎にレイテンシが記録されるテスト"""
+        _, url1 = start_backend("回答1", delay=0.2)
+        _, url2 = start_backend("回答2")
+        router = LLMClientManager.get_llm(self._llm_setting([url1, url2]))
+
+        for i in range(4):
+            router.invoke(f"質問{i}")
+
+        stats = {backend["backend"]: backend for backend in LLMClientManager.stats()["routers"][0]["backends"]}
+        assert stats[url1]["latency_samples"] == 2
+        assert stats[url1]["latency_p95_ms"] >= 200
+        assert stats[url2]["latency_p95_ms"] < 200
+        snapshot = NaviApiMetrics.snapshot()
+        assert snapshot["observations"][f"llm.router.latency_ms{{backend={url1}}}"]["count"] == 2
+
+    def test_hedge_uses_faster_backend(self, start_backend):
+        """最初のバックエンドが遅い場合はヘッジしたバックエンドの応答を採用するテスト"""
+        _, slow_url = start_backend("遅い回答", delay=1.0)
+        _, fast_url = start_backend("速い回答")
+        router = LLMClientManager.get_llm(self._llm_setting(
+            [slow_url, fast_url], hedge={"enabled": True, "delay_ms": 100, "min_delay_ms": 0}
+        ))
+
+        started = time.perf_counter()
+        answer = router.invoke("質問").content
+        elapsed = time.perf_counter() - started
+
+        assert answer == "速い回答"
+        assert elapsed < 0.9
+        assert NaviApiMetrics.get_counter("llm.router.hedges", labels={"reason": "slow"}) == 1
+        assert NaviApiMetrics.get_counter("llm.router.hedge_wins", labels={"backend": fast_url}) == 1
+
+    def test_async_hedge_cancels_loser(self, start_backend):
+        """非同期版では採用されなかったリクエストがキャンセルされるテスト"""
+        _, slow_url = start_backend("遅い回答", delay=1.0)
+        _, fast_url = start_backend("速い回答")
+        router = LLMClientManager.get_llm(self._llm_setting(
+            [slow_url, fast_url], hedge={"enabled": True, "delay_ms": 100, "min_delay_ms": 0}
+        ))
+
+        async def run():
+            answer = await router.ainvoke("質問")
+            # キャンセルがタスクに伝わるのを待つ
+            await asyncio.sleep(0.05)
+            return answer.content
+
+        assert asyncio.run(run()) == "速い回答"
+        assert NaviApiMetrics.get_counter("llm.router.requests", labels={"backend": slow_url, "outcome": "cancelled"}) == 1
+        assert router.backends[0].outstanding == 0
+
+    def test_hedge_on_error(self, start_backend):
+        """最初のバックエンドがエラーの場合は待機せずに別のバックエンドに送るテスト"""
+        _, error_url = start_backend("", status=503)
+        _, ok_url = start_backend("回答")
+        router = LLMClientManager.get_llm(self._llm_setting(
+            [error_url, ok_url], hedge={"enabled": True, "delay_ms": 5000}
+        ))
+
+        started = time.perf_counter()
+        assert router.invoke("質問").content == "回答"
+        assert time.perf_counter() - started < 4
+        assert NaviApiMetrics.get_counter("llm.router.hedges", labels={"reason": "error"}) == 1
+        assert router.backends[0].errors == 1
+
+    def test_hedge_delay_uses_percentile(self):
+        """ヘッジまでの待機時間はレイテンシのパーセンタイルから決まるテスト"""
+        router = LLMClientManager.get_llm(self._llm_setting(
+            ["http://localhost:11434/v1", "http://localhost:11435/v1"],
+            hedge={"enabled": True, "percentile": 95, "initial_delay_ms": 3000, "min_delay_ms": 200, "min_samples": 20}
+        ))
+        backend = router.backends[0]
+
+        assert router._hedge_delay_seconds(backend) == 3.0
+        backend.latencies.extend(range(1, 1001, 50))
+        assert router._hedge_delay_seconds(backend) == 0.901
+        backend.latencies.clear()
+        backend.latencies.extend([10] * 20)
+        assert router._hedge_delay_seconds(backend) == 0.2
+
+    def test_stream_passes_through_backend(self, start_backend):
+        """ストリーミングは選択したバックエンドのチャンクをそのまま返すテスト"""
+        _, url1 = start_backend("回答")
+        _, url2 = start_backend("回答")
+        router = LLMClientManager.get_llm(self._llm_setting([url1, url2]))
+
+        content = "".join(chunk.content for chunk in router.stream("質問"))
+
+        assert content == "回答"
+        assert sum(backend.requests for backend in router.backends) == 1
+        assert [backend.outstanding for backend in router.backends] == [0, 0]
@@ -0,0 +1,231 @@
+import asyncio
+import pytest
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from app.core.metrics import NaviApiMetrics
+from app.core.utils.admission_controller import AdmissionController
+from app.models.llm.context_packer import ContextPacker, TokenCounter
+from app.models.llm.first_token_callback import FirstTokenLatencyHandler
+from app.models.llm.model_routing_policy import ModelRoutingPolicy, RoutingDecision, RoutingSignals
+from app.models.llm.prompt_layout import PromptLayout
+from app.models.llm.question_llm_model import QuestionLLMModel, State
+
+
+ROUTING_SETTING = {
+    "enabled": True,
+    "max_queue_depth": 2,
+    "max_latency_ms": 10000,
+    "max_question_chars": 20,
+    "min_retrieval_score": 0.6,
+}
+
+
+class TestModelRoutingPolicy:
+    """ModelRoutingPolicyのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def setup_metrics(self):
+        NaviApiMetrics.reset()
+        yield
+        NaviApiMetrics.reset()
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "混雑していない場合は primary",
+            "signals": RoutingSignals(queue_depth=1, latency_ms=3000, question_chars=10, retrieval_score=0.9),
+            "expected": RoutingDecision("primary", "normal"),
+        },
+        {
+            "description": "実行待ちが多い場合は軽量モデル",
+            "signals": RoutingSignals(queue_depth=2, latency_ms=None, question_chars=10, retrieval_score=0.9),
+            "expected": RoutingDecision("lightweight", "queue_depth"),
+        },
+        {
+            "description": "処理時間が長い場合は軽量モデル",
+            "signals": RoutingSignals(queue_depth=0, latency_ms=12000, question_chars=10, retrieval_score=0.9),
+            "expected": RoutingDecision("lightweight", "latency"),
+        },
+        {
+            "description": "混雑時でも長い質問は primary",
+            "signals": RoutingSignals(queue_depth=5, latency_ms=None, question_chars=21, retrieval_score=0.9),
+            "expected": RoutingDecision("primary", "complex_question"),
+        },
+        {
+            "description": "混雑時でも検索結果の類似度が低い場合は primary",
+            "signals": RoutingSignals(queue_depth=5, latency_ms=None, question_chars=10, retrieval_score=0.4),
+            "expected": RoutingDecision("primary", "low_confidence"),
+        },
+        {
+            "description": "混雑時でも検索結果の類似度が不明な場合は primary",
+            "signals": RoutingSignals(queue_depth=5, latency_ms=None, question_chars=10, retrieval_score=None),
+            "expected": RoutingDecision("primary", "low_confidence"),
+        },
+    ], ids=lambda x: x["description"] if isinstance(x, dict) else "")
+    def test_decide(self, test_case):
+        """混雑状況・質問の長さ・検索結果の類似度からモデルを選ぶテスト"""
+        policy = ModelRoutingPolicy(ROUTING_SETTING)
+
+        assert policy.decide(test_case["signals"]) == test_case["expected"]
+
+    def test_disabled(self):
+        """無効の場合は混雑時でも primary を使うテスト"""
+        policy = ModelRoutingPolicy({**ROUTING_SETTING, "enabled": False})
+        signals = RoutingSignals(queue_depth=10, latency_ms=None, question_chars=1, retrieval_score=1.0)
+
+        assert policy.decide(signals) == RoutingDecision("primary", "disabled")
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "常に primary を使う企業",
+            "tenants": {"1": {"mode": "primary"}},
+            "queue_depth": 10,
+            "expected": RoutingDecision("primary", "tenant_override"),
+        },
+        {
+            "description": "常に軽量モデルを使う企業",
+            "tenants": {"1": {"mode": "lightweight"}},
+            "queue_depth": 0,
+            "expected": RoutingDecision("lightweight", "tenant_override"),
+        },
+        {
+            "description": "しきい値を上書きした企業",
+            "tenants": {"1": {"max_queue_depth": 0}},
+            "queue_depth": 0,
+            "expected": RoutingDecision("lightweight", "queue_depth"),
+        },
+        {
+            "description": "上書きの無い企業",
+            "tenants": {"2": {"mode": "lightweight"}},
+            "queue_depth": 0,
+            "expected": RoutingDecision("primary", "normal"),
+        },
+    ], ids=lambda x: x["description"])
+    def test_tenant_override(self, test_case):
+        """企業毎の上書きが反映されるテスト"""
+        policy = ModelRoutingPolicy({**ROUTING_SETTING, "tenants": test_case["tenants"]})
+        signals = RoutingSignals(
+            queue_depth=test_case["queue_depth"], latency_ms=None, question_chars=10, retrieval_score=0.9
+        )
+
+        assert policy.decide(signals, company_id=1) == test_case["expected"]
+
+    def test_record(self):
+        """判定結果がメトリクスに記録されるテスト"""
+        ModelRoutingPolicy.record(RoutingDecision("lightweight", "queue_depth"))
+
+        assert NaviApiMetrics.get_counter(
+            "llm.model_routing.requests", labels={"tier": "lightweight", "reason": "queue_depth"}
+        ) == 1
+
+
+class TestQuestionLLMModelRouting:
+    """QuestionLLMModelのモデル選択のテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        NaviApiMetrics.reset()
+        PromptLayout._prompts.clear()
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(TokenCounter, "_load_encoding", classmethod(lambda cls, *args: None))
+            yield
+        NaviApiMetrics.reset()
+        PromptLayout._prompts.clear()
+
+    def _build_model(self, routing_setting: dict, retrieval_score: float = 0.9) -> QuestionLLMModel:
+        """SSM・Vector Store を使わずに QuestionLLMModel を組み立てる"""
+        question_llm_setting = {
+            "system_context": "あなたはサポート担当です",
+            "prompt_context": "文脈: {context}\n質問: {question}",
+        }
+        results = [(Document(page_content="返品は30日以内です", metadata={"source": "m.pdf"}), retrieval_score)]
+        model = QuestionLLMModel.__new__(QuestionLLMModel)
+        model.company_id = 1
+        model.file_paths = ["m.pdf"]
+        model.question_llm_setting = question_llm_setting
+        model.llm = GenericFakeChatModel(messages=iter([AIMessage(content="primaryの回答")]))
+        model.lightweight_llm = GenericFakeChatModel(messages=iter([AIMessage(content="軽量 モデルの 回答")]))
+        model.admission = AdmissionController("primary", {"max_in_flight": 1})
+        model.lightweight_admission = AdmissionController("lightweight", {"max_in_flight": 1})
+        model.model_routing = ModelRoutingPolicy(routing_setting)
+        model.embed_query = lambda text: [0.1]
+        model.search_with_score_by_vector = lambda embedding: results
+        model.context_packer = ContextPacker(model_name="test")
+        model.prompt_layout = PromptLayout(question_llm_setting)
+        model.prompt = model.prompt_layout.build_prompt()
+        model.first_token_handler = FirstTokenLatencyHandler()
+        return model
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "混雑時は軽量モデルで回答する",
+            "routing_setting": {**ROUTING_SETTING, "max_queue_depth": 0},
+            "retrieval_score": 0.9,
+            "expected_answer": "軽量 モデルの 回答",
+            "expected_tier": "lightweight",
+            "expected_reason": "queue_depth",
+        },
+        {
+            "description": "混雑時でも類似度が低い場合は primary で回答する",
+            "routing_setting": {**ROUTING_SETTING, "max_queue_depth": 0},
+            "retrieval_score": 0.3,
+            "expected_answer": "primaryの回答",
+            "expected_tier": "primary",
+            "expected_reason": "low_confidence",
+        },
+        {
+            "description": "混雑していない場合は primary で回答する",
+            "routing_setting": ROUTING_SETTING,
+            "retrieval_score": 0.9,
+            "expected_answer": "primaryの回答",
+            "expected_tier": "primary",
+            "expected_reason": "normal",
+        },
+    ], ids=lambda x: x["description"])
+    def test_llm_response_routes_by_load(self, test_case):
+        """検索後にモデルを選び、選んだモデルの実行枠で回答するテスト"""
+        model = self._build_model(test_case["routing_setting"], retrieval_score=test_case["retrieval_score"])
+
+        result = model.llm_response(State(query="返品できますか"))
+
+        assert result["messages"][0].content == test_case["expected_answer"]
+        assert NaviApiMetrics.get_counter(
+            "llm.model_routing.requests",
+            labels={"tier": test_case["expected_tier"], "reason": test_case["expected_reason"]}
+        ) == 1
+        snapshot = NaviApiMetrics.snapshot()
+        # 使用したモデルの実行枠のみを取得する
+        wait_key = f"llm.admission.wait_ms{{name={test_case['expected_tier']}}}"
+        assert snapshot["observations"][wait_key]["count"] == 1
+        assert len([key for key in snapshot["observations"] if key.startswith("llm.admission.wait_ms")]) == 1
+
+    def test_allm_response_routes_by_load(self):
+        """非同期版でも混雑時は軽量モデルで回答するテスト"""
+        model = self._build_model({**ROUTING_SETTING, "max_queue_depth": 0})
+
+        async def asearch(embedding):
+            return model.search_with_score_by_vector(embedding)
+
+        async def aembed_query(text):
+            return [0.1]
+
+        model.asearch_with_score_by_vector = asearch
+        model.aembed_query = aembed_query
+
+        result = asyncio.run(model.allm_response(State(query="返品できますか")))
+
+        assert result["messages"][0].content == "軽量 モデルの 回答"
+
+    def test_stream_tokens_from_selected_model(self):
+        """ストリーミング時も選んだモデルのトークンが llm_response ノードから届くテスト"""
+        model = self._build_model({**ROUTING_SETTING, "max_queue_depth": 0})
+        graph = model.get_graph()
+
+        chunks = [
+            chunk.content
+            for chunk, metadata in graph.stream(State(query="返品できますか"), stream_mode="messages")
+            if isinstance(chunk, AIMessageChunk) and metadata.get("langgraph_node") == "llm_response"
+        ]
+
+        assert len(chunks) > 1
+        assert "".join(chunks) == "軽量 モデルの 回答"
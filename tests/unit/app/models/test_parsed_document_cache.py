@@ -0,0 +1,72 @@
+import pytest
+from langchain_core.documents import Document
+from app.models.llm.parsed_document_cache import ParsedDocumentCache, ParsedDocuments, parser_version
+from app.models.llm.pdf_extractor import PdfTextExtractor
+
+
+class TestParsedDocumentCache:
+    """ParsedDocumentCacheのテストクラス"""
+
+    def test_put_and_get(self, tmp_path):
+        """ページ毎のテキスト・メタデータとハッシュを保存して読み込むテスト"""
+        cache = ParsedDocumentCache({"directory": str(tmp_path)})
+        key = cache.key('"etag"', "v1")
+        parsed = ParsedDocuments(
+            documents=[
+                Document(page_content="ゴミの収集日は毎週火曜日です。", metadata={"page_number": 1, "extraction": "text_layer"}),
+                Document(page_content="", metadata={"page_number": 2, "extraction": "unstructured"}),
+            ],
+            content_hash="h1",
+        )
+
+        assert cache.get(key) is None
+        cache.put(key, parsed)
+
+        assert cache.get(key) == parsed
+        assert (cache.hits, cache.misses) == (1, 1)
+        # 圧縮して保存する
+        assert (tmp_path / key[:2] / f"{key}.json.gz").read_bytes()[:2] == b"\x1f\x8b"
+
+    def test_get_broken_entry(self, tmp_path):
+        """壊れたエントリは無いものとして扱うテスト"""
+        cache = ParsedDocumentCache({"directory": str(tmp_path)})
+        key = cache.key('"etag"', "v1")
+        (tmp_path / key[:2]).mkdir()
+        (tmp_path / key[:2] / f"{key}.json.gz").write_bytes(b"broken")
+
+        assert cache.get(key) is None
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "PDFの設定が変われば別のバージョン",
+            "other": (PdfTextExtractor({"min_chars_per_page": 5}), {}),
+            "expected_equal": False,
+        },
+        {
+            "description": "unstructured の引数が変われば別のバージョン",
+            "other": (PdfTextExtractor(), {"strategy": "hi_res"}),
+            "expected_equal": False,
+        },
+        {
+            "description": "同じ設定であれば同じバージョン",
+            "other": (PdfTextExtractor(), {}),
+            "expected_equal": True,
+        },
+    ], ids=lambda x: x["description"])
+    def test_parser_version(self, test_case):
+        """解析のバージョンのテスト"""
+        parser, unstructured_kwargs = test_case["other"]
+
+        equal = parser_version(PdfTextExtractor(), {}) == parser_version(parser, unstructured_kwargs)
+
+        assert equal == test_case["expected_equal"]
+
+    @pytest.mark.parametrize("test_case", [
+        {"description": "無効", "setting": {"enabled": False}, "expected": False},
+        {"description": "s3 で bucket が無い", "setting": {"backend": "s3"}, "expected": False},
+        {"description": "s3 で bucket がある", "setting": {"backend": "s3", "bucket": "manuals"}, "expected": True},
+        {"description": "local", "setting": {}, "expected": True},
+    ], ids=lambda x: x["description"])
+    def test_enabled(self, test_case):
+        """キャッシュを使うかどうかのテスト"""
+        assert ParsedDocumentCache(test_case["setting"]).enabled == test_case["expected"]
@@ -0,0 +1,182 @@
+import pytest
+from unittest.mock import patch
+from langchain_core.documents import Document
+from app.models.llm.pdf_extractor import PdfTextExtractor, is_low_quality
+
+pypdf = pytest.importorskip("pypdf")
+
+
+def build_pdf(path, page_texts: list[str]) -> None:
+    """ページ毎に1行のテキストレイヤーを持つPDFを作成する（空文字のページはテキスト無し）"""
+    page_count = len(page_texts)
+    font_id = 3 + page_count * 2
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        (
+            "<< /Type /Pages /Kids [" + " ".join(f"{3 + index * 2} 0 R" for index in range(page_count))
+            + f"] /Count {page_count} >>"
+        ).encode(),
+    ]
+    for index, text in enumerate(page_texts):
+        content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode() if text else b""
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + index * 2} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref_offset = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    body += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    body += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    with open(path, "wb") as f:
+        f.write(body)
+
+
+def partition_pages(local_path, unstructured_kwargs=None) -> list[Document]:
+    """unstructured の代わりに、渡されたPDFのページ数分のドキュメントを返す"""
+    page_count = len(pypdf.PdfReader(local_path).pages)
+    return [
+        Document(page_content=f"OCR {page_number}", metadata={"page_number": page_number})
+        for page_number in range(1, page_count + 1)
+    ]
+
+
+class TestPdfTextExtractor:
+    """PdfTextExtractorのテストクラス"""
+
+    SETTING = {"min_chars_per_page": 10, "max_invalid_ratio": 0.1, "pages_per_task": 2}
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "十分な文字数があれば使える",
+            "text": "ゴミの収集日は毎週火曜日です。",
+            "expected": False,
+        },
+        {
+            "description": "空白を除いた文字数が少なければ使えない",
+            "text": " 1 \n 2 \n",
+            "expected": True,
+        },
+        {
+            "description": "(cid:n) が多ければ使えない",
+            "text": "(cid:12)(cid:34)(cid:56)ゴミの収集日は毎週火曜日です",
+            "expected": True,
+        },
+        {
+            "description": "置換文字が多ければ使えない",
+            "text": "��ゴミの収集日は毎週火曜日です",
+            "expected": True,
+        },
+    ], ids=lambda x: x["description"])
+    def test_is_low_quality(self, test_case):
+        """テキストレイヤーの品質判定のテスト"""
+        assert is_low_quality(test_case["text"], {**self.SETTING, "min_chars_per_page": 5}) == test_case["expected"]
+
+    def test_extract_text_layer(self, tmp_path):
+        """テキストレイヤーのあるページは unstructured を使わずにページ毎に取り出すテスト"""
+        local_path = str(tmp_path / "manual.pdf")
+        build_pdf(local_path, ["Garbage collection is on Tuesday", "Parking is available for residents"])
+
+        with patch('app.models.llm.pdf_extractor.partition_file') as mock_partition:
+            documents = PdfTextExtractor(self.SETTING)(local_path)
+
+        mock_partition.assert_not_called()
+        assert [document.page_content for document in documents] == [
+            "Garbage collection is on Tuesday",
+            "Parking is available for residents",
+        ]
+        assert [document.metadata for document in documents] == [
+            {"page_number": 1, "extraction": "text_layer"},
+            {"page_number": 2, "extraction": "text_layer"},
+        ]
+
+    def test_extract_falls_back_for_low_quality_pages(self, tmp_path):
+        """テキストの無いページのみ unstructured で解析し、元のページ番号に戻すテスト"""
+        local_path = str(tmp_path / "manual.pdf")
+        build_pdf(local_path, ["Garbage collection is on Tuesday", "", "Parking is available for residents", ""])
+
+        with patch('app.models.llm.pdf_extractor.partition_file', side_effect=partition_pages) as mock_partition:
+            documents = PdfTextExtractor(self.SETTING).extract_pages(local_path, 1, 4)
+
+        # 2ページのみのPDFを1回だけ解析する
+        assert mock_partition.call_count == 1
+        assert [(document.metadata["page_number"], document.metadata["extraction"]) for document in documents] == [
+            (2, "unstructured"),
+            (3, "text_layer"),
+            (4, "unstructured"),
+        ]
+        assert [document.page_content for document in documents] == [
+            "OCR 1",
+            "Parking is available for residents",
+            "OCR 2",
+        ]
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "pages_per_task を超えるPDFはページ範囲に分ける",
+            "file_name": "manual.pdf",
+            "pages": 5,
+            "expected": [(0, 2), (2, 4), (4, 5)],
+        },
+        {
+            "description": "pages_per_task 以下のPDFは分けない",
+            "file_name": "manual.pdf",
+            "pages": 2,
+            "expected": [],
+        },
+        {
+            "description": "PDF以外は分けない",
+            "file_name": "manual.txt",
+            "pages": 5,
+            "expected": [],
+        },
+    ], ids=lambda x: x["description"])
+    def test_page_ranges(self, test_case, tmp_path):
+        """並列に解析するページ範囲のテスト"""
+        local_path = str(tmp_path / test_case["file_name"])
+        build_pdf(local_path, [f"Page {index}" for index in range(test_case["pages"])])
+
+        assert PdfTextExtractor(self.SETTING).page_ranges(local_path) == test_case["expected"]
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "PDF以外",
+            "file_name": "manual.docx",
+            "setting": {},
+            "content": b"docx",
+        },
+        {
+            "description": "テキストレイヤーを使わない設定",
+            "file_name": "manual.pdf",
+            "setting": {"text_layer_enabled": False},
+            "content": None,
+        },
+        {
+            "description": "pypdf で開けないPDF",
+            "file_name": "manual.pdf",
+            "setting": {},
+            "content": b"not a pdf",
+        },
+    ], ids=lambda x: x["description"])
+    def test_partition_whole_file(self, test_case, tmp_path):
+        """テキストレイヤーを使えない場合はファイル全体を unstructured で解析するテスト"""
+        local_path = str(tmp_path / test_case["file_name"])
+        if test_case["content"] is None:
+            build_pdf(local_path, ["Garbage collection is on Tuesday"])
+        else:
+            with open(local_path, "wb") as f:
+                f.write(test_case["content"])
+        expected = [Document(page_content="unstructured", metadata={})]
+
+        with patch('app.models.llm.pdf_extractor.partition_file', return_value=expected) as mock_partition:
+            documents = PdfTextExtractor({**self.SETTING, **test_case["setting"]})(local_path, {"strategy": "fast"})
+
+        assert documents == expected
+        mock_partition.assert_called_once_with(local_path, {"strategy": "fast"})
@@ -0,0 +1,128 @@
+import asyncio
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from app.models.llm.first_token_callback import FirstTokenLatencyHandler
+from app.models.llm.prompt_layout import PromptLayout
+from app.core.metrics import NaviApiMetrics
+
+
+QUESTION_LLM_SETTING = {
+    "system_context": "あなたは質問に最小限で回答するカスタマーオペレーターです",
+    "prompt_context": "以下の文脈だけを踏まえて質問に回答してください。\n文脈: {context}\n質問: {question}",
+}
+
+
+class TestPromptLayout:
+    """PromptLayoutのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def clear_prompts(self):
+        PromptLayout._prompts.clear()
+        yield
+        PromptLayout._prompts.clear()
+
+    def _setting(self, **prompt_layout) -> dict:
+        return {**QUESTION_LLM_SETTING, "prompt_layout": prompt_layout}
+
+    def test_inline_mode_keeps_prompt_context(self):
+        """未設定時は従来どおり prompt_context を1つのメッセージとして送るテスト"""
+        layout = PromptLayout(QUESTION_LLM_SETTING)
+
+        messages = layout.build_prompt().invoke({"context": "文脈1", "question": "質問1"}).to_messages()
+
+        assert layout.mode == "inline"
+        assert messages == [HumanMessage(content="以下の文脈だけを踏まえて質問に回答してください。\n文脈: 文脈1\n質問: 質問1")]
+
+    def test_prefix_stable_mode_places_static_prefix_first(self):
+        """prefix_stable では固定部分がシステムメッセージとして先頭に置かれるテスト"""
+        layout = PromptLayout(
+            self._setting(mode="prefix_stable", instructions="文脈だけを踏まえて回答してください。\n"),
+            tenant_preamble="株式会社テストのサポート窓口です。",
+        )
+
+        messages = layout.build_prompt().invoke({"context": "文脈1", "question": "質問1"}).to_messages()
+
+        assert messages == [
+            SystemMessage(content=(
+                "あなたは質問に最小限で回答するカスタマーオペレーターです\n\n"
+                "株式会社テストのサポート窓口です。\n\n"
+                "文脈だけを踏まえて回答してください。"
+            )),
+            HumanMessage(content="文脈:\n文脈1\n\n質問: 質問1"),
+        ]
+
+    def test_prefix_is_byte_stable_between_requests(self):
+        """検索結果・質問が変わっても先頭部分のバイト列が変わらないテスト"""
+        prompt = PromptLayout(self._setting(mode="prefix_stable", instructions="回答は簡潔に")).build_prompt()
+
+        first = prompt.invoke({"context": "返品は30日以内", "question": "返品できますか"}).to_messages()
+        second = prompt.invoke({"context": "送料は無料", "question": "送料はいくら"}).to_messages()
+
+        assert first[0].content.encode("utf-8") == second[0].content.encode("utf-8")
+        assert first[1].content != second[1].content
+
+    def test_static_prefix_is_not_treated_as_template(self):
+        """固定部分の波括弧はテンプレート変数として解釈されないテスト"""
+        setting = {**self._setting(mode="prefix_stable"), "system_context": "JSONの例: {\"answer\": \"...\"}"}
+
+        messages = PromptLayout(setting).build_prompt().invoke({"context": "文脈", "question": "質問"}).to_messages()
+
+        assert messages[0].content == "JSONの例: {\"answer\": \"...\"}"
+
+    def test_history_is_placed_between_prefix_and_question(self):
+        """会話履歴は固定部分の後ろ・今回の質問の前に置かれるテスト"""
+        prompt = PromptLayout(self._setting(mode="prefix_stable")).build_prompt()
+        history = [HumanMessage(content="前の質問"), AIMessage(content="前の回答")]
+
+        messages = prompt.invoke({"context": "文脈", "question": "質問", "history": history}).to_messages()
+
+        assert messages[1:3] == history
+        assert messages[3] == HumanMessage(content="文脈:\n文脈\n\n質問: 質問")
+
+    def test_build_prompt_is_reused(self):
+        """同じ設定のプロンプトは使い回されるテスト"""
+        setting = self._setting(mode="prefix_stable")
+
+        assert PromptLayout(setting).build_prompt() is PromptLayout(setting).build_prompt()
+        assert PromptLayout(setting).build_prompt() is not PromptLayout(QUESTION_LLM_SETTING).build_prompt()
+
+    def test_invalid_mode(self):
+        """不正なモードは ValueError となるテスト"""
+        with pytest.raises(ValueError):
+            PromptLayout(self._setting(mode="unknown"))
+
+
+class TestFirstTokenLatencyHandler:
+    """FirstTokenLatencyHandlerのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def setup_metrics(self):
+        NaviApiMetrics.reset()
+        yield
+        NaviApiMetrics.reset()
+
+    def _llm(self, handler):
+        model = GenericFakeChatModel(messages=iter([AIMessage(content="返品は 30日以内です")]))
+        return model.with_config(callbacks=[handler])
+
+    def test_records_streaming_first_token(self):
+        """ストリーミング時は最初のトークンまでの時間が記録されるテスト"""
+        handler = FirstTokenLatencyHandler(labels={"prompt_layout": "prefix_stable"})
+
+        chunks = [chunk.content for chunk in self._llm(handler).stream("質問")]
+
+        assert "".join(chunks) == "返品は 30日以内です"
+        observations = NaviApiMetrics.snapshot()["observations"]
+        assert observations["llm.first_token_ms{prompt_layout=prefix_stable,streaming=true}"]["count"] == 1
+        assert "llm.first_token_ms{prompt_layout=prefix_stable,streaming=false}" not in observations
+
+    def test_records_response_time_without_streaming(self):
+        """ストリーミングしない場合は応答全体の受信までの時間が記録されるテスト"""
+        handler = FirstTokenLatencyHandler(labels={"prompt_layout": "inline"})
+
+        asyncio.run(self._llm(handler).ainvoke("質問"))
+
+        observations = NaviApiMetrics.snapshot()["observations"]
+        assert observations["llm.first_token_ms{prompt_layout=inline,streaming=false}"]["count"] == 1
+        assert handler._started == {}
@@ -1,6 +1,7 @@
+import asyncio
 import pytest
 import json
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from app.models.llm.question_llm_model import QuestionLLMModel, State
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 
@@ -481,6 +482,63 @@ class TestQuestionLLMModel:
                             # 例外メッセージを確認
                             assert str(exc_info.value) == "回答の生成中にエラーが発生しました"
 
+    def test_allm_response_with_mock(
+        self,
+        managed_secret,
+        managed_parameter,
+        setup_postgresql_test_collection
+    ):
+        """allm_responseメソッドがチェーンを ainvoke で実行するテスト"""
+        postgresql_config = {
+            "user": "vector_user",
+            "password": "vector_password",
+            "host": "localhost",
+            "port": "5432",
+            "database": "vector_db"
+        }
+        llm_config = {
+            "model_name": "gpt-3.5-turbo",
+            "base_url": "http://localhost:8000",
+            "api_key": "test-api-key",
+            "temperature": 0.7
+        }
+        embedding_config = {
+            "model_name": "sentence-transformers/all-MiniLM-L6-v2",
+            "device": "cpu"
+        }
+        question_llm_config = {
+            "system_context": "あなたは親切なアシスタントです。",
+            "prompt_context": "質問: {question}\nコンテキスト: {context}\n回答:"
+        }
+        
+        with managed_secret("postgresql_setting", json.dumps(postgresql_config)):
+            with managed_parameter("llm_setting", json.dumps(llm_config)):
+                with managed_parameter("embedding_setting", json.dumps(embedding_config)):
+                    with managed_parameter("question_llm_setting", json.dumps(question_llm_config)):
+                        model = QuestionLLMModel(
+                            file_paths=["manual1.pdf"],
+                            collection_name=setup_postgresql_test_collection
+                        )
+                        
+                        state = State(
+                            query="テストクエリ",
+                            messages=[]
+                        )
+                        
+                        with patch('app.models.llm.question_llm_model.RunnableParallel') as mock_parallel, \
+                             patch.object(model, 'create_async_retriever') as mock_create_async_retriever:
+                            mock_chain = MagicMock()
+                            mock_chain.ainvoke = AsyncMock(return_value={"answer": "非同期の回答"})
+                            mock_parallel.return_value.assign.return_value = mock_chain
+                            
+                            result = asyncio.run(model.allm_response(state))
+                        
+                        # 検証
+                        mock_create_async_retriever.assert_called_once()
+                        mock_chain.ainvoke.assert_awaited_once()
+                        mock_chain.invoke.assert_not_called()
+                        assert result["messages"][0].content == "非同期の回答"
+
     def test_get_graph(
         self,
         managed_secret,
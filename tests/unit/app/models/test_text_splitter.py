@@ -0,0 +1,125 @@
+import pytest
+from unittest.mock import patch
+from langchain_core.documents import Document
+from app.models.llm.context_packer import TokenCounter
+from app.models.llm.text_splitter import JapaneseTextSplitter
+
+
+class TestJapaneseTextSplitter:
+    """JapaneseTextSplitterのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def setup_token_counter(self):
+        # 1文字=1トークンとして数える
+        TokenCounter._encodings.clear()
+        with patch.object(TokenCounter, '_load_encoding', return_value=None):
+            yield
+        TokenCounter._encodings.clear()
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "句点・感嘆符・疑問符で区切る",
+            "text": "ゴミは火曜日です。粗大ゴミは？予約が必要です！",
+            "expected": ["ゴミは火曜日です。", "粗大ゴミは？", "予約が必要です！"],
+        },
+        {
+            "description": "閉じ括弧は文末に含める",
+            "text": "「鍵を紛失した場合は管理会社へ連絡してください。」と記載があります。",
+            "expected": ["「鍵を紛失した場合は管理会社へ連絡してください。」", "と記載があります。"],
+        },
+        {
+            "description": "改行で区切り、空行は除外する",
+            "text": "第1章 はじめに\n\n本書は入居者向けです。\n",
+            "expected": ["第1章 はじめに\n\n", "本書は入居者向けです。"],
+        },
+        {
+            "description": "句点の無い末尾も1文とする",
+            "text": "連絡先 03-1234-5678",
+            "expected": ["連絡先 03-1234-5678"],
+        },
+    ], ids=lambda x: x["description"])
+    def test_split_sentences(self, test_case):
+        """文の区切りのテスト"""
+        assert JapaneseTextSplitter.split_sentences(test_case["text"]) == test_case["expected"]
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "上限まで文を詰める",
+            "setting": {"chunk_size": 10, "chunk_overlap": 0},
+            "text": "あいう。えお。かきくけこ。さし。",
+            "expected": ["あいう。えお。", "かきくけこ。さし。"],
+        },
+        {
+            "description": "前のチャンクの末尾の文を重ねる",
+            "setting": {"chunk_size": 10, "chunk_overlap": 3},
+            "text": "あいう。えお。かきくけこ。さし。",
+            "expected": ["あいう。えお。", "えお。かきくけこ。", "さし。"],
+        },
+        {
+            "description": "上限を超える文はトークン数で切る",
+            "setting": {"chunk_size": 4, "chunk_overlap": 0},
+            "text": "あいうえおかきくけ。",
+            "expected": ["あいうえ", "おかきく", "け。"],
+        },
+        {
+            "description": "上限以下の文章は1チャンク",
+            "setting": {"chunk_size": 100, "chunk_overlap": 10},
+            "text": "あいう。えお。",
+            "expected": ["あいう。えお。"],
+        },
+    ], ids=lambda x: x["description"])
+    def test_split_text(self, test_case):
+        """チャンクの大きさと重なりのテスト"""
+        splitter = JapaneseTextSplitter(test_case["setting"])
+
+        chunks = splitter.split_text(test_case["text"])
+
+        assert chunks == test_case["expected"]
+        assert all(len(chunk) <= test_case["setting"]["chunk_size"] for chunk in chunks)
+
+    def test_split_documents_metadata(self):
+        """チャンクに元のメタデータ・ページ番号・ファイル内の連番を設定するテスト"""
+        splitter = JapaneseTextSplitter({"chunk_size": 5, "chunk_overlap": 0})
+        documents = [
+            Document(page_content="あいう。えお。", metadata={"source": "manuals/1/1/1.pdf", "page_number": 1}),
+            Document(page_content="かきく。", metadata={"source": "manuals/1/1/1.pdf", "page_number": 2}),
+        ]
+
+        chunks = splitter(documents)
+
+        assert [chunk.page_content for chunk in chunks] == ["あいう。", "えお。", "かきく。"]
+        assert [chunk.metadata for chunk in chunks] == [
+            {"source": "manuals/1/1/1.pdf", "page_number": 1, "chunk_index": 0},
+            {"source": "manuals/1/1/1.pdf", "page_number": 1, "chunk_index": 1},
+            {"source": "manuals/1/1/1.pdf", "page_number": 2, "chunk_index": 2},
+        ]
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "有効な場合は分割器を返す",
+            "parameter": {"splitter": {"chunk_size": 300}},
+            "expected_chunk_size": 300,
+        },
+        {
+            "description": "無効な場合は分割しない",
+            "parameter": {"splitter": {"enabled": False}},
+            "expected_chunk_size": None,
+        },
+        {
+            "description": "未設定の場合は既定値",
+            "parameter": {},
+            "expected_chunk_size": 400,
+        },
+    ], ids=lambda x: x["description"])
+    def test_from_setting(self, test_case):
+        """ingestion_setting.splitter からの作成テスト"""
+        with patch(
+            'app.models.llm.text_splitter.SsmClient.get_cached_parameter',
+            return_value=test_case["parameter"]
+        ):
+            splitter = JapaneseTextSplitter.from_setting()
+
+        if test_case["expected_chunk_size"] is None:
+            assert splitter is None
+        else:
+            assert splitter.chunk_size == test_case["expected_chunk_size"]
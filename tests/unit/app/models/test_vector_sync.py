@@ -0,0 +1,291 @@
+from datetime import datetime
+import pytest
+from unittest.mock import MagicMock, Mock, patch
+from langchain_core.documents import Document
+from app.models.llm.chunk_dedup import ChunkDeduplicator, chunk_hash
+from app.models.llm.document_loader import LoadResult
+from app.models.llm.vector_sync import ManifestEntry, SourceState, VectorSyncEngine
+from app.repositories.manual_repository import ManualDto
+
+
+UPDATED_AT = datetime(2026, 1, 1)
+
+
+class FakeLoader:
+    """指定した内容とハッシュをファイル毎の結果として返すローダー"""
+
+    def __init__(self, contents: dict[str, tuple[str, str]], errors: tuple[str, ...] = ()):
+        self.contents = contents
+        self.errors = errors
+        self.requested = []
+
+    def iter_load(self, file_paths):
+        self.requested.extend(file_paths)
+        for file_path in file_paths:
+            if file_path in self.errors:
+                yield LoadResult(file_path=file_path, error=FileNotFoundError(file_path))
+                continue
+            text, content_hash = self.contents[file_path]
+            yield LoadResult(
+                file_path=file_path,
+                documents=[Document(page_content=text, metadata={"source": f"manuals/{file_path}"})],
+                content_hash=content_hash,
+            )
+
+
+def state(key: str, etag: str = "e1", size: int = 10, manual_updated_at=UPDATED_AT) -> SourceState:
+    return SourceState(source=f"manuals/{key}", key=key, etag=etag, size=size, manual_updated_at=manual_updated_at)
+
+
+def entry(key: str, etag: str = "e1", size: int = 10, content_hash: str = "h1", manual_updated_at=UPDATED_AT) -> ManifestEntry:
+    return ManifestEntry(
+        source=f"manuals/{key}",
+        etag=etag,
+        size=size,
+        content_hash=content_hash,
+        manual_updated_at=manual_updated_at,
+        chunks=1,
+    )
+
+
+class TestVectorSyncEngine:
+    """VectorSyncEngineのテストクラス"""
+
+    def create_engine(self, loader) -> VectorSyncEngine:
+        embeddings = Mock()
+        embeddings.embed_documents.side_effect = lambda texts: [[float(len(text))] for text in texts]
+        del embeddings.embed_queries
+        return VectorSyncEngine(
+            bucket_name="manuals",
+            vector_store=Mock(collection_name="manuals"),
+            embeddings=embeddings,
+            loader=loader,
+            setting={"batch_size": 2},
+        )
+
+    def test_build_states(self):
+        """MySQLに削除されていないマニュアルとして登録されているオブジェクトのみ同期対象とするテスト"""
+        engine = self.create_engine(FakeLoader({}))
+        objects = [
+            {"Key": "1/1/1.pdf", "ETag": '"abc"', "Size": 100},
+            {"Key": "1/1/2.pdf", "ETag": '"def"', "Size": 200},
+            {"Key": "1/1/memo.txt", "ETag": '"ghi"', "Size": 10},
+        ]
+        manuals = [
+            ManualDto(company_id=1, application_id=1, manual_id=1, file_extension="pdf", updated_at=UPDATED_AT),
+            ManualDto(company_id=1, application_id=1, manual_id=3, file_extension="pdf", updated_at=UPDATED_AT),
+        ]
+
+        states = engine.build_states(objects, manuals)
+
+        assert states == [state("1/1/1.pdf", etag="abc", size=100)]
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "マニフェストもベクトルも無ければ新規",
+            "state": state("1/1/1.pdf"),
+            "manifest": {},
+            "vector_sources": set(),
+            "expected": "added",
+        },
+        {
+            "description": "マニフェスト導入前に取り込んだものは変更あり",
+            "state": state("1/1/1.pdf"),
+            "manifest": {},
+            "vector_sources": {"manuals/1/1/1.pdf"},
+            "expected": "changed",
+        },
+        {
+            "description": "ETag・サイズ・更新日時が同じなら変更なし",
+            "state": state("1/1/1.pdf"),
+            "manifest": {"manuals/1/1/1.pdf": entry("1/1/1.pdf")},
+            "vector_sources": {"manuals/1/1/1.pdf"},
+            "expected": "unchanged",
+        },
+        {
+            "description": "ETagが変わったら変更あり",
+            "state": state("1/1/1.pdf", etag="e2"),
+            "manifest": {"manuals/1/1/1.pdf": entry("1/1/1.pdf")},
+            "vector_sources": {"manuals/1/1/1.pdf"},
+            "expected": "changed",
+        },
+        {
+            "description": "サイズが変わったら変更あり",
+            "state": state("1/1/1.pdf", size=11),
+            "manifest": {"manuals/1/1/1.pdf": entry("1/1/1.pdf")},
+            "vector_sources": {"manuals/1/1/1.pdf"},
+            "expected": "changed",
+        },
+        {
+            "description": "マニュアルの更新日時が変わったら変更あり",
+            "state": state("1/1/1.pdf", manual_updated_at=datetime(2026, 2, 1)),
+            "manifest": {"manuals/1/1/1.pdf": entry("1/1/1.pdf")},
+            "vector_sources": {"manuals/1/1/1.pdf"},
+            "expected": "changed",
+        },
+    ], ids=lambda x: x["description"])
+    def test_plan(self, test_case):
+        """マニフェストとの比較で新規・変更・変更なしを判定するテスト"""
+        plan = VectorSyncEngine.plan([test_case["state"]], test_case["manifest"], test_case["vector_sources"])
+
+        for name in ("added", "changed", "unchanged"):
+            expected = [test_case["state"]] if name == test_case["expected"] else []
+            assert getattr(plan, name) == expected
+        assert plan.removed == []
+
+    def test_plan_removed(self):
+        """同期対象から外れたマニュアルは、マニフェストのみ・ベクトルのみのものも含めて削除するテスト"""
+        manifest = {
+            "manuals/1/1/1.pdf": entry("1/1/1.pdf"),
+            "manuals/1/1/2.pdf": entry("1/1/2.pdf"),
+        }
+        vector_sources = {"manuals/1/1/1.pdf", "manuals/1/1/2.pdf", "manuals/1/1/legacy.pdf"}
+
+        plan = VectorSyncEngine.plan([state("1/1/1.pdf")], manifest, vector_sources)
+
+        assert plan.removed == ["manuals/1/1/2.pdf", "manuals/1/1/legacy.pdf"]
+
+    def test_sync(self):
+        """変更されたマニュアルのみ埋め込み直し、削除されたマニュアルのベクトルを削除するテスト"""
+        loader = FakeLoader(
+            contents={
+                "1/1/1.pdf": ("新しい本文", "h2"),
+                "1/1/2.pdf": ("同じ本文", "h1"),
+                "1/1/4.pdf": ("新規の本文", "h4"),
+            },
+            errors=("1/1/5.pdf",),
+        )
+        engine = self.create_engine(loader)
+        manuals = [
+            ManualDto(company_id=1, application_id=1, manual_id=manual_id, file_extension="pdf", updated_at=UPDATED_AT)
+            for manual_id in (1, 2, 3, 4, 5)
+        ]
+        objects = [{"Key": f"1/1/{manual_id}.pdf", "ETag": "e2", "Size": 10} for manual_id in (1, 2, 4, 5)]
+        objects.append({"Key": "1/1/3.pdf", "ETag": "e1", "Size": 10})
+        manifest = {
+            # 内容が変わった
+            "manuals/1/1/1.pdf": entry("1/1/1.pdf"),
+            # 再アップロードで ETag だけが変わった
+            "manuals/1/1/2.pdf": entry("1/1/2.pdf"),
+            # 変わっていない
+            "manuals/1/1/3.pdf": entry("1/1/3.pdf"),
+            # MySQLで論理削除された
+            "manuals/1/1/9.pdf": entry("1/1/9.pdf"),
+        }
+
+        with patch.object(VectorSyncEngine, "_ensure_manifest_table"), \
+                patch.object(VectorSyncEngine, "_load_manifest", return_value=manifest), \
+                patch.object(VectorSyncEngine, "_load_vector_sources", return_value=set(manifest)), \
+                patch.object(VectorSyncEngine, "_replace_document") as mock_replace, \
+                patch.object(VectorSyncEngine, "_touch_document") as mock_touch, \
+                patch.object(VectorSyncEngine, "remove_document") as mock_remove:
+            stats = engine.sync(objects, manuals)
+
+        # 変わっていないマニュアルはダウンロードしない
+        assert sorted(loader.requested) == ["1/1/1.pdf", "1/1/2.pdf", "1/1/4.pdf", "1/1/5.pdf"]
+        replaced = {call.args[0].key: call.args for call in mock_replace.call_args_list}
+        assert sorted(replaced) == ["1/1/1.pdf", "1/1/4.pdf"]
+        _, content_hash, chunks = replaced["1/1/1.pdf"]
+        assert content_hash == "h2"
+        assert [(chunk.page_content, vector) for chunk, vector in chunks] == [("新しい本文", [5.0])]
+        assert mock_touch.call_args.args[0].key == "1/1/2.pdf"
+        mock_remove.assert_called_once_with("manuals/1/1/9.pdf")
+        assert stats.added == 1
+        assert stats.updated == 1
+        assert stats.touched == 1
+        assert stats.unchanged == 1
+        assert stats.removed == 1
+        assert stats.failed_files == ["manuals/1/1/5.pdf"]
+
+    def test_sync_failure_is_isolated(self):
+        """1マニュアルの書き込みに失敗しても他のマニュアルの同期を続けるテスト"""
+        loader = FakeLoader(contents={"1/1/1.pdf": ("本文1", "h1"), "1/1/2.pdf": ("本文2", "h2")})
+        engine = self.create_engine(loader)
+        manuals = [
+            ManualDto(company_id=1, application_id=1, manual_id=manual_id, file_extension="pdf", updated_at=UPDATED_AT)
+            for manual_id in (1, 2)
+        ]
+        objects = [{"Key": f"1/1/{manual_id}.pdf", "ETag": "e1", "Size": 10} for manual_id in (1, 2)]
+
+        def replace_document(state, content_hash, chunks):
+            if state.key == "1/1/1.pdf":
+                raise RuntimeError("書き込みに失敗しました")
+
+        with patch.object(VectorSyncEngine, "_ensure_manifest_table"), \
+                patch.object(VectorSyncEngine, "_load_manifest", return_value={}), \
+                patch.object(VectorSyncEngine, "_load_vector_sources", return_value=set()), \
+                patch.object(VectorSyncEngine, "_replace_document", side_effect=replace_document) as mock_replace:
+            stats = engine.sync(objects, manuals)
+
+        assert mock_replace.call_count == 2
+        assert stats.added == 1
+        assert stats.failed_files == ["manuals/1/1/1.pdf"]
+
+    def test_replace_document_with_copy(self):
+        """ライターを指定した場合は削除・COPY・マニフェストの更新を同じトランザクションで行うテスト"""
+        engine = self.create_engine(FakeLoader(contents={}))
+        session = MagicMock()
+        session.__enter__.return_value = session
+        engine.vector_store.session_maker.return_value = session
+        engine.vector_store.get_collection.return_value = Mock(uuid="collection-uuid")
+        engine.writer = Mock(uses_copy=True)
+        chunks = [(Document(page_content="本文", metadata={"page_number": 1}), [0.1])]
+
+        with patch.object(VectorSyncEngine, "_delete_vectors") as mock_delete, \
+                patch.object(VectorSyncEngine, "_upsert_manifest") as mock_upsert:
+            engine._replace_document(state("1/1/1.pdf"), "h1", chunks)
+
+        mock_delete.assert_called_once_with(session, "manuals/1/1/1.pdf")
+        engine.writer.copy_rows.assert_called_once_with(session, "collection-uuid", [
+            ("本文", [0.1], {"page_number": 1, "source": "manuals/1/1/1.pdf"}),
+        ])
+        assert mock_upsert.call_args.args[1]["chunks"] == 1
+        session.execute.assert_not_called()
+        session.commit.assert_called_once()
+
+    def test_ingest_document_with_dedup(self):
+        """他のマニュアルが参照している内容のチャンクは埋め込まずに既存の行で参照するテスト"""
+        engine = self.create_engine(FakeLoader(contents={}))
+        engine.splitter = lambda documents: [
+            Document(page_content=text, metadata={}) for text in ["共通の注意事項", "固有の手順", "共通の注意事項"]
+        ]
+        engine.deduplicator = ChunkDeduplicator()
+        shared_hash = chunk_hash("manuals/1/1/2.pdf", "共通の注意事項")
+        result = LoadResult(file_path="1/1/2.pdf", documents=[Document(page_content="本文")], content_hash="h2")
+
+        with patch.object(VectorSyncEngine, "_find_shared", return_value={shared_hash}), \
+                patch.object(VectorSyncEngine, "_replace_document") as mock_replace:
+            chunks = engine.ingest_document(state("1/1/2.pdf"), result)
+
+        assert chunks == 2
+        assert engine.shared_chunks == 1
+        engine.embeddings.embed_documents.assert_called_once_with(["固有の手順"])
+        _, content_hash, embedded, shared_chunks = mock_replace.call_args.args
+        assert content_hash == "h2"
+        assert [chunk.page_content for chunk, _ in embedded] == ["固有の手順"]
+        assert [chunk.metadata["chunk_hash"] for chunk in shared_chunks] == [shared_hash]
+
+    def test_replace_document_with_shared_chunks(self):
+        """参照を追加できなかった共有チャンクは埋め込んで書き込み、マニフェストには全チャンク数を保存するテスト"""
+        engine = self.create_engine(FakeLoader(contents={}))
+        session = MagicMock()
+        session.__enter__.return_value = session
+        engine.vector_store.session_maker.return_value = session
+        engine.vector_store.get_collection.return_value = Mock(uuid="collection-uuid")
+        engine.writer = Mock(uses_copy=True)
+        chunks = [(Document(page_content="本文", metadata={"chunk_hash": "h0"}), [0.1])]
+        shared_chunks = [
+            Document(page_content="共有A", metadata={"chunk_hash": "h1"}),
+            Document(page_content="共有B", metadata={"chunk_hash": "h2"}),
+        ]
+
+        with patch.object(VectorSyncEngine, "_delete_vectors"), \
+                patch.object(VectorSyncEngine, "_upsert_manifest") as mock_upsert, \
+                patch.object(ChunkDeduplicator, "attach", return_value={"h1"}) as mock_attach:
+            engine._replace_document(state("1/1/2.pdf"), "h2", chunks, shared_chunks)
+
+        mock_attach.assert_called_once_with(session, "collection-uuid", ["h1", "h2"], "manuals/1/1/2.pdf")
+        rows = engine.writer.copy_rows.call_args.args[2]
+        assert [row[0] for row in rows] == ["本文", "共有B"]
+        assert mock_upsert.call_args.args[1]["chunks"] == 3
+        session.commit.assert_called_once()
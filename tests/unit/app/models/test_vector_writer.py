@@ -0,0 +1,238 @@
+import pytest
+from unittest.mock import MagicMock, Mock, patch
+from sqlalchemy.dialects import postgresql
+from app.models.llm.vector_writer import _ANN_INDEX_QUERY, PgVectorBulkWriter
+
+
+def create_vector_store(indexes: list[tuple[str, str, str]] = None) -> Mock:
+    """session_maker() のセッションと COPY のモックを持つベクターストア"""
+    vector_store = Mock()
+    session = MagicMock()
+    session.__enter__.return_value = session
+    session.execute.return_value.all.return_value = indexes or []
+    vector_store.session_maker.return_value = session
+    vector_store.get_collection.return_value = Mock(uuid="collection-uuid")
+    copy = MagicMock()
+    cursor = MagicMock()
+    cursor.__enter__.return_value = cursor
+    cursor.copy.return_value.__enter__.return_value = copy
+    session.connection.return_value.connection.dbapi_connection.cursor.return_value = cursor
+    vector_store.session = session
+    vector_store.cursor = cursor
+    vector_store.copy = copy
+    return vector_store
+
+
+def attach_index_database(vector_store: Mock, indexes: list[tuple[str, str, str]], deferred: list[tuple[str, str, str]] = None) -> dict:
+    """pg_indexes と ingestion_deferred_index を模した状態を session.execute・exec_driver_sql に設定する"""
+    database = {"indexes": list(indexes), "deferred": list(deferred or [])}
+    session = vector_store.session
+
+    def execute(statement):
+        result = Mock()
+        if statement is _ANN_INDEX_QUERY:
+            result.all.return_value = list(database["indexes"])
+        elif statement.is_select:
+            result.all.return_value = list(database["deferred"])
+        elif statement.is_insert:
+            params = statement.compile(dialect=postgresql.dialect()).params
+            database["deferred"].extend(
+                (params[f"schema_name_m{i}"], params[f"index_name_m{i}"], params[f"index_definition_m{i}"])
+                for i in range(len(database["indexes"]))
+            )
+        elif statement.is_delete:
+            database["deferred"].clear()
+        return result
+
+    def exec_driver_sql(sql):
+        if sql.startswith("DROP INDEX"):
+            database["indexes"] = [index for index in database["indexes"] if f'"{index[1]}"' not in sql]
+        else:
+            database["indexes"].extend(index for index in database["deferred"] if index[2] == sql)
+
+    session.execute.side_effect = execute
+    session.connection.return_value.exec_driver_sql.side_effect = exec_driver_sql
+    return database
+
+
+INDEX_DEFINITION = (
+    "CREATE INDEX ix_embedding_hnsw ON public.langchain_pg_embedding "
+    "USING hnsw (embedding vector_cosine_ops)"
+)
+
+
+class TestPgVectorBulkWriter:
+    """PgVectorBulkWriterのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def setup_register_vector(self):
+        with patch.object(PgVectorBulkWriter, '_register_vector'), \
+                patch.object(PgVectorBulkWriter, '_ensure_deferred_index_table'):
+            yield
+
+    def test_copy_rows(self):
+        """行をバイナリ形式の COPY で書き込み、コミットは呼び出し側に任せるテスト"""
+        vector_store = create_vector_store()
+        writer = PgVectorBulkWriter(vector_store)
+
+        written = writer.copy_rows(vector_store.session, "collection-uuid", [
+            ("本文1", [0.1, 0.2], {"source": "manuals/1/1/1.pdf"}),
+            ("本文2", [0.3, 0.4], {"source": "manuals/1/1/2.pdf"}),
+        ])
+
+        assert written == 2
+        statement = vector_store.cursor.copy.call_args.args[0]
+        assert statement.startswith("COPY langchain_pg_embedding (id, collection_id, embedding, document, cmetadata)")
+        assert "FORMAT BINARY" in statement
+        vector_store.copy.set_types.assert_called_once_with(["varchar", "uuid", "vector", "varchar", "jsonb"])
+        rows = [call.args[0] for call in vector_store.copy.write_row.call_args_list]
+        assert [row[1:] for row in rows] == [
+            ("collection-uuid", [0.1, 0.2], "本文1", {"source": "manuals/1/1/1.pdf"}),
+            ("collection-uuid", [0.3, 0.4], "本文2", {"source": "manuals/1/1/2.pdf"}),
+        ]
+        assert len({row[0] for row in rows}) == 2
+        vector_store.session.commit.assert_not_called()
+        assert writer.rows == 2
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "batch_size に達するまで溜めて1回で書き込む",
+            "batch_size": 3,
+            "batches": [2, 2, 1],
+            "expected_written": [0, 4, 0],
+            "expected_copies": [4, 1],
+        },
+        {
+            "description": "batch_size 以上のバッチはその都度書き込む",
+            "batch_size": 1,
+            "batches": [2, 1],
+            "expected_written": [2, 1],
+            "expected_copies": [2, 1],
+        },
+    ], ids=lambda x: x["description"])
+    def test_add_and_flush(self, test_case):
+        """行をバッファし、batch_size 毎と flush で書き込むテスト"""
+        vector_store = create_vector_store()
+        writer = PgVectorBulkWriter(vector_store, {"batch_size": test_case["batch_size"]})
+
+        with patch.object(writer, 'copy_rows', side_effect=lambda session, collection_id, rows: len(rows)) as mock_copy:
+            written = [
+                writer.add(["本文"] * size, [[0.1]] * size, [{}] * size)
+                for size in test_case["batches"]
+            ]
+            writer.flush()
+
+        assert written == test_case["expected_written"]
+        assert [len(call.args[2]) for call in mock_copy.call_args_list] == test_case["expected_copies"]
+        assert all(call.args[1] == "collection-uuid" for call in mock_copy.call_args_list)
+        assert vector_store.session.commit.call_count == len(test_case["expected_copies"])
+        vector_store.add_embeddings.assert_not_called()
+
+    def test_add_with_insert_method(self):
+        """method が insert の場合は add_embeddings でその都度書き込むテスト"""
+        vector_store = create_vector_store()
+        writer = PgVectorBulkWriter(vector_store, {"method": "insert"})
+
+        written = writer.add(["本文"], [[0.1]], [{"source": "manuals/1/1/1.pdf"}])
+
+        assert written == 1
+        assert writer.flush() == 0
+        vector_store.add_embeddings.assert_called_once_with(
+            texts=["本文"], embeddings=[[0.1]], metadatas=[{"source": "manuals/1/1/1.pdf"}]
+        )
+        vector_store.cursor.copy.assert_not_called()
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "正常終了",
+            "error": None,
+        },
+        {
+            "description": "失敗時も作成し直す",
+            "error": RuntimeError("書き込みに失敗"),
+        },
+    ], ids=lambda x: x["description"])
+    def test_deferred_ann_indexes(self, test_case):
+        """取り込みの間は定義を保存して ANN インデックスを削除し、最後に同じ定義で作成し直すテスト"""
+        vector_store = create_vector_store()
+        database = attach_index_database(vector_store, [("public", "ix_embedding_hnsw", INDEX_DEFINITION)])
+        writer = PgVectorBulkWriter(vector_store, {"defer_ann_index": True})
+        executed = vector_store.session.connection.return_value.exec_driver_sql
+
+        def run():
+            with writer.deferred_ann_indexes():
+                assert [call.args[0] for call in executed.call_args_list] == [
+                    'DROP INDEX IF EXISTS "public"."ix_embedding_hnsw"'
+                ]
+                # 削除している間は定義が保存されている
+                assert database["deferred"] == [("public", "ix_embedding_hnsw", INDEX_DEFINITION)]
+                if test_case["error"] is not None:
+                    raise test_case["error"]
+
+        if test_case["error"] is None:
+            run()
+        else:
+            with pytest.raises(RuntimeError):
+                run()
+
+        assert executed.call_args_list[-1].args[0] == INDEX_DEFINITION
+        assert database["indexes"] == [("public", "ix_embedding_hnsw", INDEX_DEFINITION)]
+        assert database["deferred"] == []
+        assert vector_store.session.commit.call_count == 2
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "インデックスが無い場合は作成し直す",
+            "indexes": [],
+            "expected_sql": [INDEX_DEFINITION],
+        },
+        {
+            "description": "インデックスが既にある場合は作成しない",
+            "indexes": [("public", "ix_embedding_hnsw", INDEX_DEFINITION)],
+            "expected_sql": [],
+        },
+    ], ids=lambda x: x["description"])
+    def test_deferred_ann_indexes_restores_previous_run(self, test_case):
+        """前回の取り込みが異常終了して定義が残っている場合は、開始時に存在しないインデックスを作成し直すテスト"""
+        vector_store = create_vector_store()
+        database = attach_index_database(
+            vector_store, test_case["indexes"], deferred=[("public", "ix_embedding_hnsw", INDEX_DEFINITION)]
+        )
+        writer = PgVectorBulkWriter(vector_store)
+        executed = vector_store.session.connection.return_value.exec_driver_sql
+
+        with writer.deferred_ann_indexes():
+            assert [call.args[0] for call in executed.call_args_list] == test_case["expected_sql"]
+
+        assert database["indexes"] == [("public", "ix_embedding_hnsw", INDEX_DEFINITION)]
+        assert database["deferred"] == []
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "既定の設定の場合",
+            "setting": {},
+            "enabled": True,
+        },
+        {
+            "description": "呼び出し側で無効にした場合",
+            "setting": {"defer_ann_index": True},
+            "enabled": False,
+        },
+        {
+            "description": "設定で無効にした場合",
+            "setting": {"defer_ann_index": False},
+            "enabled": True,
+        },
+    ], ids=lambda x: x["description"])
+    def test_deferred_ann_indexes_disabled(self, test_case):
+        """無効な場合はインデックスを削除しないテスト"""
+        vector_store = create_vector_store()
+        database = attach_index_database(vector_store, [("public", "ix_embedding_hnsw", INDEX_DEFINITION)])
+        writer = PgVectorBulkWriter(vector_store, test_case["setting"])
+
+        with writer.deferred_ann_indexes(enabled=test_case["enabled"]):
+            pass
+
+        vector_store.session.connection.return_value.exec_driver_sql.assert_not_called()
+        assert database["indexes"] == [("public", "ix_embedding_hnsw", INDEX_DEFINITION)]
+        assert database["deferred"] == []
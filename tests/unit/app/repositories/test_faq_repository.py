@@ -0,0 +1,32 @@
+import pytest
+from app.repositories.faq_repository import FaqRepository
+
+
+class TestFaqRepository:
+    @pytest.fixture(autouse=True)
+    def insert_faqs(self, insert_test_data):
+        insert_test_data(["faqs.sql"])
+
+    @pytest.mark.parametrize("company_id, application_id, expected_count", [
+        (101, None, 1),
+        (999, None, 0),
+        (101, 101, 1),
+        (101, 999, 0),
+    ])
+    def test_get_by_company_id(self, session, company_id, application_id, expected_count):
+        result = FaqRepository.get_by_company_id(session, company_id, application_id)
+
+        assert len(result) == expected_count
+
+        if expected_count > 0:
+            assert result[0].faq_id == 101
+            assert result[0].question == "営業時間を教えてください"
+            assert result[0].answer == "平日9時から18時までです。"
+
+    def test_get_version(self, session):
+        version = FaqRepository.get_version(session, 101, 101)
+
+        # 削除済みの質問は件数に含めない
+        assert version.startswith("1@")
+        # よくある質問が無い場合
+        assert FaqRepository.get_version(session, 999) == "0@"
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+from app.repositories.ingestion_job_repository import LEASE_EXPIRED_ERROR, IngestionJobRepository
+from app.repositories.manual_repository import ManualRepository
+
+
+class TestIngestionJobRepository:
+    NOW = datetime(2026, 1, 1, 9, 0, 0)
+
+    def create_job(self, session) -> int:
+        manuals = ManualRepository.get_by_company_id(session, 101, 101)
+        return IngestionJobRepository.create_job(session, 101, manuals, application_id=101, now=self.NOW)
+
+    def test_create_job(self, session):
+        job_id = self.create_job(session)
+
+        # 削除済みのマニュアルは含めない
+        progress = IngestionJobRepository.get_progress(session, job_id, 101)
+        assert progress.total == 1
+        assert progress.pending == 1
+        assert progress.started == 0
+        # 同じ対象で完了していないジョブ
+        assert IngestionJobRepository.find_active_job(session, 101, application_id=101) == job_id
+        assert IngestionJobRepository.find_active_job(session, 101) is None
+        # 他の企業のジョブは取得できない
+        assert IngestionJobRepository.get_progress(session, job_id, 102) is None
+
+    def test_lock_company(self, session):
+        assert IngestionJobRepository.lock_company(session, 101)
+        assert not IngestionJobRepository.lock_company(session, 999)
+
+    def test_claim_and_complete(self, session):
+        job_id = self.create_job(session)
+
+        claimed = IngestionJobRepository.claim_documents(session, "worker-1", 10, 60, now=self.NOW)
+
+        assert [(document.job_id, document.manual.manual_id, document.attempts) for document in claimed] == [
+            (job_id, 101, 1)
+        ]
+        assert claimed[0].manual.company_id == 101
+        # 処理中のマニュアルは期限内であれば取得されない
+        assert IngestionJobRepository.claim_documents(session, "worker-2", 10, 60, now=self.NOW) == []
+        # 他のワーカーは完了を記録できない
+        assert not IngestionJobRepository.complete_document(session, claimed[0].job_document_id, "worker-2", 5)
+
+        assert IngestionJobRepository.complete_document(session, claimed[0].job_document_id, "worker-1", 5)
+
+        progress = IngestionJobRepository.get_progress(session, job_id, 101)
+        assert (progress.succeeded, progress.started, progress.chunks) == (1, 1, 5)
+        assert IngestionJobRepository.find_active_job(session, 101, application_id=101) is None
+
+    def test_claim_expired_lease(self, session):
+        self.create_job(session)
+        claimed = IngestionJobRepository.claim_documents(session, "worker-1", 10, 60, now=self.NOW)
+
+        # 期限が切れた場合は他のワーカーが取得し直す
+        reclaimed = IngestionJobRepository.claim_documents(
+            session, "worker-2", 10, 60, now=self.NOW + timedelta(seconds=61)
+        )
+
+        assert [document.job_document_id for document in reclaimed] == [claimed[0].job_document_id]
+        assert reclaimed[0].attempts == 2
+        # 期限が切れたワーカーは完了を記録できない
+        assert not IngestionJobRepository.complete_document(session, claimed[0].job_document_id, "worker-1", 5)
+
+    def test_claim_expired_lease_at_max_attempts(self, session):
+        job_id = self.create_job(session)
+        claimed = IngestionJobRepository.claim_documents(session, "worker-1", 10, 60, max_attempts=1, now=self.NOW)
+
+        # 期限が切れて試行回数が上限に達したマニュアルは取得し直さずに failed とする
+        reclaimed = IngestionJobRepository.claim_documents(
+            session, "worker-2", 10, 60, max_attempts=1, now=self.NOW + timedelta(seconds=61)
+        )
+
+        assert reclaimed == []
+        assert not IngestionJobRepository.complete_document(session, claimed[0].job_document_id, "worker-1", 5)
+        progress = IngestionJobRepository.get_progress(session, job_id, 101)
+        assert (progress.failed, progress.running) == (1, 0)
+        assert [(error.status, error.attempts, error.last_error) for error in progress.errors] == [
+            ("failed", 1, LEASE_EXPIRED_ERROR)
+        ]
+
+    def test_renew_lease(self, session):
+        self.create_job(session)
+        claimed = IngestionJobRepository.claim_documents(session, "worker-1", 10, 60, now=self.NOW)
+        job_document_ids = [document.job_document_id for document in claimed]
+
+        # 他のワーカーは延長できない
+        assert IngestionJobRepository.renew_lease(session, job_document_ids, "worker-2", 60, now=self.NOW) == 0
+        assert IngestionJobRepository.renew_lease(
+            session, job_document_ids, "worker-1", 60, now=self.NOW + timedelta(seconds=50)
+        ) == 1
+
+        # 延長した期限までは他のワーカーが取得し直さない
+        assert IngestionJobRepository.claim_documents(
+            session, "worker-2", 10, 60, now=self.NOW + timedelta(seconds=61)
+        ) == []
+        # 完了を記録したマニュアルは延長しない
+        assert IngestionJobRepository.complete_document(session, job_document_ids[0], "worker-1", 5)
+        assert IngestionJobRepository.renew_lease(session, job_document_ids, "worker-1", 60, now=self.NOW) == 0
+
+    def test_fail_document(self, session):
+        job_id = self.create_job(session)
+        claimed = IngestionJobRepository.claim_documents(session, "worker-1", 10, 60, now=self.NOW)
+        retry_at = self.NOW + timedelta(seconds=30)
+
+        assert IngestionJobRepository.fail_document(session, claimed[0].job_document_id, "worker-1", "error", retry_at)
+
+        # 再試行の時刻までは取得されない
+        assert IngestionJobRepository.claim_documents(session, "worker-1", 10, 60, now=self.NOW) == []
+        claimed = IngestionJobRepository.claim_documents(session, "worker-1", 10, 60, now=retry_at)
+        assert claimed[0].attempts == 2
+
+        # 再試行しない場合は failed とする
+        assert IngestionJobRepository.fail_document(session, claimed[0].job_document_id, "worker-1", "error", None)
+
+        progress = IngestionJobRepository.get_progress(session, job_id, 101)
+        assert (progress.failed, progress.pending, progress.running) == (1, 0, 0)
+        assert [(error.manual_id, error.status, error.attempts, error.last_error) for error in progress.errors] == [
+            (101, "failed", 2, "error")
+        ]
@@ -1,5 +1,6 @@
 import pytest
-from app.repositories.manual_repository import ManualRepository
+from datetime import datetime
+from app.repositories.manual_repository import ManualRepository, ManualDto
 
 class TestManualRepository:
     @pytest.mark.parametrize("company_id, application_id, expected_count", [
@@ -17,3 +18,30 @@ class TestManualRepository:
             assert result[0].company_id == company_id
             if application_id:
                 assert result[0].application_id == application_id
+
+    @pytest.mark.parametrize("company_id", [None, 0])
+    def test_get_by_company_id_without_company(self, session, company_id):
+        # 企業IDを指定しない場合も全企業のマニュアルは返さない
+        assert ManualRepository.get_by_company_id(session, company_id) == []
+
+    def test_get_all_active(self, session):
+        result = ManualRepository.get_all_active(session)
+
+        # 論理削除されたマニュアルは含まない
+        assert [manual.manual_id for manual in result] == [101]
+        assert result[0].company_id == 101
+
+    def test_build_corpus_version(self):
+        manuals = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf", updated_at=datetime(2026, 1, 1)),
+            ManualDto(company_id=1, application_id=10, manual_id=101, file_extension="pdf", updated_at=datetime(2026, 1, 1)),
+        ]
+        version = ManualRepository.build_corpus_version(manuals)
+
+        # 順序に依存しない
+        assert ManualRepository.build_corpus_version(list(reversed(manuals))) == version
+        # 更新日時が変わるとバージョンが変わる
+        updated = [manuals[0], ManualDto(company_id=1, application_id=10, manual_id=101, file_extension="pdf", updated_at=datetime(2026, 2, 1))]
+        assert ManualRepository.build_corpus_version(updated) != version
+        # マニュアルが削除されるとバージョンが変わる
+        assert ManualRepository.build_corpus_version(manuals[:1]) != version
@@ -0,0 +1,161 @@
+import pytest
+from datetime import datetime
+from unittest.mock import Mock, patch
+from app.models.requests.ingestion_job_request import IngestionJobRequest
+from app.repositories.ingestion_job_repository import IngestionJobErrorDto, IngestionJobProgressDto
+from app.repositories.manual_repository import ManualDto
+from app.services.ingestion_job_service import IngestionJobService
+
+
+def build_progress(**kwargs) -> IngestionJobProgressDto:
+    return IngestionJobProgressDto(
+        job_id=1,
+        company_id=1,
+        application_id=10,
+        manual_id=None,
+        created_at=datetime(2026, 1, 1, 9, 0, 0),
+        **kwargs
+    )
+
+
+class TestIngestionJobService:
+    """IngestionJobServiceのテストクラス"""
+
+    MANUALS = [
+        ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf"),
+        ManualDto(company_id=1, application_id=10, manual_id=101, file_extension="docx"),
+    ]
+
+    @pytest.fixture
+    def mock_session(self):
+        """モックセッションを返すフィクスチャ"""
+        return Mock()
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "完了していないジョブが無い場合は登録する",
+            "manual_id": None,
+            "active_job_id": None,
+            "expected_manual_ids": [100, 101],
+        },
+        {
+            "description": "マニュアルIDを指定した場合はそのマニュアルのみ登録する",
+            "manual_id": 101,
+            "active_job_id": None,
+            "expected_manual_ids": [101],
+        },
+        {
+            "description": "完了していないジョブがある場合は登録しない",
+            "manual_id": None,
+            "active_job_id": 1,
+            "expected_manual_ids": None,
+        },
+    ], ids=lambda x: x["description"])
+    def test_enqueue(self, mock_session, test_case):
+        """取り込みジョブの登録のテスト"""
+        job_request = IngestionJobRequest(application_id=10, manual_id=test_case["manual_id"])
+
+        with patch('app.services.ingestion_job_service.ManualRepository.get_by_company_id', return_value=self.MANUALS), \
+            patch('app.services.ingestion_job_service.IngestionJobRepository') as mock_repository:
+            mock_repository.find_active_job.return_value = test_case["active_job_id"]
+            mock_repository.create_job.return_value = 1
+            mock_repository.get_progress.return_value = build_progress(total=2, pending=2)
+            response = IngestionJobService().enqueue.__wrapped__(
+                IngestionJobService(), session=mock_session, job_request=job_request, company_id=1
+            )
+
+        assert response.job_id == 1
+        assert response.status == "queued"
+        if test_case["expected_manual_ids"] is None:
+            mock_repository.create_job.assert_not_called()
+        else:
+            manuals = mock_repository.create_job.call_args.kwargs["manuals"]
+            assert [manual.manual_id for manual in manuals] == test_case["expected_manual_ids"]
+        mock_repository.get_progress.assert_called_once_with(mock_session, 1, 1)
+
+    def test_enqueue_locks_company_first(self, mock_session):
+        """同時の登録でジョブが重複しないよう、他の読み取りより先に企業の行をロックするテスト"""
+        job_request = IngestionJobRequest(application_id=10)
+        calls = Mock()
+
+        with patch('app.services.ingestion_job_service.ManualRepository.get_by_company_id', return_value=self.MANUALS) as mock_get_manuals, \
+            patch('app.services.ingestion_job_service.IngestionJobRepository') as mock_repository:
+            calls.attach_mock(mock_get_manuals, "get_by_company_id")
+            calls.attach_mock(mock_repository, "repository")
+            mock_repository.find_active_job.return_value = None
+            mock_repository.create_job.return_value = 1
+            mock_repository.get_progress.return_value = build_progress(total=2, pending=2)
+            IngestionJobService().enqueue.__wrapped__(
+                IngestionJobService(), session=mock_session, job_request=job_request, company_id=1
+            )
+
+        assert [call[0] for call in calls.mock_calls] == [
+            "repository.lock_company",
+            "get_by_company_id",
+            "repository.find_active_job",
+            "repository.create_job",
+            "repository.get_progress",
+        ]
+        mock_repository.lock_company.assert_called_once_with(mock_session, company_id=1)
+
+    def test_enqueue_without_manuals(self, mock_session):
+        """対象のマニュアルが無い場合は登録せずに None を返すテスト"""
+        job_request = IngestionJobRequest(application_id=10, manual_id=999)
+
+        with patch('app.services.ingestion_job_service.ManualRepository.get_by_company_id', return_value=self.MANUALS), \
+            patch('app.services.ingestion_job_service.IngestionJobRepository') as mock_repository:
+            response = IngestionJobService().enqueue.__wrapped__(
+                IngestionJobService(), session=mock_session, job_request=job_request, company_id=1
+            )
+
+        assert response is None
+        mock_repository.create_job.assert_not_called()
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "取得されていない場合は queued",
+            "progress": {"total": 2, "pending": 2},
+            "expected_status": "queued",
+            "expected_progress": 0.0,
+        },
+        {
+            "description": "取得されたマニュアルが残っている場合は running",
+            "progress": {"total": 2, "pending": 1, "succeeded": 1, "started": 1},
+            "expected_status": "running",
+            "expected_progress": 0.5,
+        },
+        {
+            "description": "全て成功した場合は succeeded",
+            "progress": {"total": 2, "succeeded": 2, "started": 2},
+            "expected_status": "succeeded",
+            "expected_progress": 1.0,
+        },
+        {
+            "description": "失敗したマニュアルがある場合は failed",
+            "progress": {"total": 2, "succeeded": 1, "failed": 1, "started": 2},
+            "expected_status": "failed",
+            "expected_progress": 1.0,
+        },
+    ], ids=lambda x: x["description"])
+    def test_get_progress(self, mock_session, test_case):
+        """取り込みジョブの進捗のテスト"""
+        errors = [IngestionJobErrorDto(manual_id=100, status="failed", attempts=5, last_error="error")]
+        progress = build_progress(errors=errors, **test_case["progress"])
+
+        with patch('app.services.ingestion_job_service.IngestionJobRepository.get_progress', return_value=progress):
+            response = IngestionJobService().get_progress.__wrapped__(
+                IngestionJobService(), session=mock_session, job_id=1, company_id=1
+            )
+
+        assert response.status == test_case["expected_status"]
+        assert response.progress == test_case["expected_progress"]
+        assert [(error.manual_id, error.error) for error in response.errors] == [(100, "error")]
+
+    def test_get_progress_not_found(self, mock_session):
+        """存在しないジョブは None を返すテスト"""
+        with patch('app.services.ingestion_job_service.IngestionJobRepository.get_progress', return_value=None):
+            response = IngestionJobService().get_progress.__wrapped__(
+                IngestionJobService(), session=mock_session, job_id=1, company_id=1
+            )
+
+        assert response is None
@@ -1,9 +1,18 @@
+import asyncio
+import json
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 from app.models.requests.question_request import QuestionRequest
-from app.repositories.manual_repository import ManualDto
+from app.models.requests.question_batch_request import QuestionBatchRequest
+from app.models.responses.question_batch_response import QuestionBatchItemResponse
+from app.repositories.manual_repository import ManualDto, ManualRepository
 from app.models.responses.question_response import QuestionResponse
-from app.services.question_service import QuestionService
+from app.services.question_service import ANSWER_SINGLE_FLIGHT, QuestionService, ManualFiles
+from app.helpers.question_llm_helper import NOT_FOUND_MESSAGE
+from app.core.utils.admission_controller import AdmissionRejectedError
+from app.core.cache.faq_store import DEFAULT_FAQ_SETTING, FaqStore
+from app.repositories.faq_repository import FaqDto
 
 
 class TestQuestionService:
@@ -14,6 +23,50 @@ class TestQuestionService:
         """モックセッションを返すフィクスチャ"""
         return Mock()
 
+    @pytest.fixture(autouse=True)
+    def single_flight_setting(self):
+        """SSMを参照しないよう、同一質問の合流の設定を差し替えるフィクスチャ（既定は無効）"""
+        setting = {"enabled": False, "wait_timeout_seconds": 5, "lock_dir": None}
+        with patch.object(QuestionService, '_get_single_flight_setting', return_value=setting):
+            yield setting
+
+    @pytest.fixture(autouse=True)
+    def mock_async_db(self, mock_session):
+        """非同期版が取得の間のみ開くセッションとして mock_session を返し、SSMの先読みを行わないフィクスチャ"""
+        @asynccontextmanager
+        async def get_async_session():
+            mock_async_db.active += 1
+            try:
+                yield mock_session
+            finally:
+                mock_async_db.active -= 1
+
+        mock_async_db = MagicMock()
+        mock_async_db.active = 0
+        mock_async_db.get_async_session.side_effect = get_async_session
+        with patch('app.services.question_service.get_db', return_value=mock_async_db), \
+                patch('app.services.question_service.SsmClient.aprefetch_cached_parameters', new_callable=AsyncMock):
+            yield mock_async_db
+
+    @pytest.fixture(autouse=True)
+    def mock_embedder(self):
+        """埋め込みモデルをロードしないよう、質問の埋め込みのみを行うヘルパーを差し替えるフィクスチャ"""
+        with patch('app.services.question_service.QueryEmbeddingHelper') as mock_embedder_class:
+            mock_embedder = MagicMock()
+            mock_embedder.aembed_query = AsyncMock()
+            mock_embedder.aembed_queries = AsyncMock()
+            mock_embedder_class.return_value = mock_embedder
+            yield mock_embedder
+
+    @pytest.fixture(autouse=True)
+    def faq_setting(self):
+        """SSMを参照しないよう、よくある質問の設定を差し替えるフィクスチャ（既定は無効）"""
+        setting = {**DEFAULT_FAQ_SETTING, "enabled": False}
+        FaqStore.clear()
+        with patch.object(FaqStore, 'get_setting', return_value=setting):
+            yield setting
+        FaqStore.clear()
+
     @pytest.mark.parametrize(
         "company_id, application_id, question_text, manuals, expected_file_paths",
         [
@@ -66,12 +119,16 @@ class TestQuestionService:
         ],
         ids=lambda x: x if isinstance(x, str) else ""
     )
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=False)
     @patch('app.services.question_service.QuestionLLMHelper')
     @patch('app.services.question_service.ManualRepository.get_by_company_id')
     def test_answer_success(
         self,
         mock_get_manuals,
         mock_llm_helper_class,
+        mock_semantic_is_enabled,
+        mock_exact_is_enabled,
         mock_session,
         company_id,
         application_id,
@@ -114,11 +171,892 @@ class TestQuestionService:
 
         mock_llm_helper_class.assert_called_once_with(
             file_paths=expected_file_paths,
-            collection_name="manuals"
+            collection_name="manuals",
+            company_id=company_id
         )
 
         mock_llm_helper_instance.answer_question.assert_called_once_with(
-            question_text=question_text
+            question_text=question_text,
+            query_embedding=None
         )
 
         assert result == QuestionResponse(answer=expected_answer)
+
+    @staticmethod
+    def _parse_events(raw_events: list[str]) -> list[tuple[str, dict]]:
+        parsed = []
+        for raw in raw_events:
+            lines = raw.strip().split("\n")
+            event = lines[0].removeprefix("event: ")
+            data = json.loads(lines[1].removeprefix("data: "))
+            parsed.append((event, data))
+        return parsed
+
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.get_by_company_id')
+    def test_answer_stream_success(
+        self,
+        mock_get_manuals,
+        mock_llm_helper_class,
+        mock_session
+    ):
+        """answer_streamメソッドがtokenイベントとdoneイベントを返すテスト"""
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="使い方を教えてください")
+        mock_get_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf"),
+        ]
+
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.stream_answer.return_value = iter(["手順は", "以下です"])
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        with patch.object(
+            QuestionService,
+            "get_manual_files",
+            side_effect=lambda **kwargs: question_service._get_manual_files(session=mock_session, **kwargs)
+        ):
+            events = self._parse_events(list(question_service.answer_stream(
+                question_request=question_request,
+                company_id=1
+            )))
+
+        mock_llm_helper_class.assert_called_once_with(
+            file_paths=["manuals/1/10/100.pdf"],
+            collection_name="manuals",
+            company_id=1
+        )
+        mock_llm_helper_instance.stream_answer.assert_called_once_with(
+            question_text="使い方を教えてください"
+        )
+        assert events[0] == ("token", {"text": "手順は"})
+        assert events[1] == ("token", {"text": "以下です"})
+        event, metadata = events[2]
+        assert event == "done"
+        assert metadata["company_id"] == 1
+        assert metadata["application_id"] == 10
+        assert metadata["manual_count"] == 1
+        assert metadata["token_count"] == 2
+        assert metadata["answer_length"] == len("手順は以下です")
+
+    @patch('app.services.question_service.QuestionLLMHelper')
+    def test_answer_stream_error_event(self, mock_llm_helper_class):
+        """生成中に例外が発生した場合はerrorイベントで終了するテスト"""
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="質問")
+
+        def _failing_stream(question_text):
+            yield "途中まで"
+            raise RuntimeError("LLMエラー")
+
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.stream_answer.side_effect = _failing_stream
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        manual_files = ManualFiles(file_paths=["manuals/1/10/100.pdf"], corpus_version="v1")
+        with patch.object(QuestionService, "get_manual_files", return_value=manual_files):
+            events = self._parse_events(list(question_service.answer_stream(
+                question_request=question_request,
+                company_id=1
+            )))
+
+        assert events == [
+            ("token", {"text": "途中まで"}),
+            ("error", {"message": "回答の生成中にエラーが発生しました"}),
+        ]
+
+    @patch('app.services.question_service.QuestionLLMHelper')
+    def test_answer_stream_admission_rejected_event(self, mock_llm_helper_class):
+        """同時実行数の上限で拒否された場合は再試行までの秒数をerrorイベントで通知するテスト"""
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="質問")
+
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.stream_answer.side_effect = AdmissionRejectedError(
+            "現在リクエストが集中しています。", status_code=429, retry_after_seconds=7, reason="queue_full"
+        )
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        manual_files = ManualFiles(file_paths=["manuals/1/10/100.pdf"], corpus_version="v1")
+        with patch.object(QuestionService, "get_manual_files", return_value=manual_files):
+            events = self._parse_events(list(question_service.answer_stream(
+                question_request=question_request,
+                company_id=1
+            )))
+
+        assert events == [
+            ("error", {"message": "現在リクエストが集中しています。", "retry_after_seconds": 7}),
+        ]
+
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache')
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.get_by_company_id')
+    def test_answer_semantic_cache_hit(
+        self,
+        mock_get_manuals,
+        mock_llm_helper_class,
+        mock_semantic_cache,
+        mock_exact_is_enabled,
+        mock_session,
+        mock_embedder
+    ):
+        """セマンティックキャッシュにヒットした場合はLLMを呼び出さず、検索・LLMのヘルパーも初期化しないテスト"""
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="使い方は？")
+        manuals = [ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")]
+        mock_get_manuals.return_value = manuals
+        mock_embedder.embed_query.return_value = [0.1, 0.2]
+
+        mock_semantic_cache.is_enabled.return_value = True
+        mock_semantic_cache.lookup.return_value = "キャッシュ済みの回答"
+
+        result = question_service.answer.__wrapped__(
+            question_service,
+            session=mock_session,
+            question_request=question_request,
+            company_id=1
+        )
+
+        assert result == QuestionResponse(answer="キャッシュ済みの回答")
+        mock_semantic_cache.lookup.assert_called_once_with(
+            company_id=1,
+            application_id=10,
+            corpus_version=ManualRepository.build_corpus_version(manuals),
+            embedding=[0.1, 0.2],
+        )
+        mock_llm_helper_class.assert_not_called()
+        mock_semantic_cache.store.assert_not_called()
+
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache')
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.get_by_company_id')
+    def test_answer_semantic_cache_miss(
+        self,
+        mock_get_manuals,
+        mock_llm_helper_class,
+        mock_semantic_cache,
+        mock_exact_is_enabled,
+        mock_session,
+        mock_embedder
+    ):
+        """キャッシュミス時はクエリ埋め込みを再利用して回答し、キャッシュに登録するテスト"""
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="使い方は？")
+        manuals = [ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")]
+        mock_get_manuals.return_value = manuals
+        mock_embedder.embed_query.return_value = [0.1, 0.2]
+
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.answer_question.return_value = "新しい回答"
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        mock_semantic_cache.is_enabled.return_value = True
+        mock_semantic_cache.lookup.return_value = None
+
+        result = question_service.answer.__wrapped__(
+            question_service,
+            session=mock_session,
+            question_request=question_request,
+            company_id=1
+        )
+
+        assert result == QuestionResponse(answer="新しい回答")
+        mock_embedder.embed_query.assert_called_once_with("使い方は？")
+        mock_llm_helper_instance.answer_question.assert_called_once_with(
+            question_text="使い方は？",
+            query_embedding=[0.1, 0.2]
+        )
+        mock_semantic_cache.store.assert_called_once_with(
+            company_id=1,
+            application_id=10,
+            corpus_version=ManualRepository.build_corpus_version(manuals),
+            question="使い方は？",
+            embedding=[0.1, 0.2],
+            answer="新しい回答",
+        )
+
+    @patch('app.services.question_service.CorpusVersionRegistry.get', return_value="v1")
+    @patch('app.services.question_service.ExactAnswerCache')
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.get_by_company_id')
+    def test_answer_exact_cache_hit_skips_database(
+        self,
+        mock_get_manuals,
+        mock_llm_helper_class,
+        mock_exact_cache,
+        mock_registry_get,
+        mock_session
+    ):
+        """マニュアル構成のバージョンが有効な間はMySQL・LLMを使わずに完全一致キャッシュを返すテスト"""
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="使い方は？")
+        mock_exact_cache.is_enabled.return_value = True
+        mock_exact_cache.get.return_value = "キャッシュ済みの回答"
+
+        result = question_service.answer.__wrapped__(
+            question_service,
+            session=mock_session,
+            question_request=question_request,
+            company_id=1
+        )
+
+        assert result == QuestionResponse(answer="キャッシュ済みの回答")
+        mock_exact_cache.get.assert_called_once_with(
+            company_id=1,
+            application_id=10,
+            question="使い方は？",
+            corpus_version="v1",
+        )
+        mock_get_manuals.assert_not_called()
+        mock_llm_helper_class.assert_not_called()
+
+    @patch('app.services.question_service.CorpusVersionRegistry.get', return_value="v1")
+    @patch('app.services.question_service.ExactAnswerCache')
+    def test_answer_exact_cache_hit_skips_faq_refresh(
+        self,
+        mock_exact_cache,
+        mock_registry_get,
+        mock_session,
+        faq_setting
+    ):
+        """完全一致キャッシュにヒットした場合は、よくある質問の変更の確認でMySQLに問い合わせないテスト"""
+        faq_setting["enabled"] = True
+        question_service = QuestionService()
+        mock_exact_cache.is_enabled.return_value = True
+        mock_exact_cache.get.return_value = "キャッシュ済みの回答"
+
+        with patch('app.core.cache.faq_store.FaqRepository') as mock_faq_repository:
+            result = question_service.answer.__wrapped__(
+                question_service,
+                session=mock_session,
+                question_request=QuestionRequest(application_id=10, question="使い方は？"),
+                company_id=1
+            )
+
+        assert result == QuestionResponse(answer="キャッシュ済みの回答")
+        mock_faq_repository.get_version.assert_not_called()
+
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.CorpusVersionRegistry.get', return_value=None)
+    @patch('app.services.question_service.ExactAnswerCache')
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.get_by_company_id')
+    def test_answer_exact_cache_miss_stores_answer(
+        self,
+        mock_get_manuals,
+        mock_llm_helper_class,
+        mock_exact_cache,
+        mock_registry_get,
+        mock_semantic_is_enabled,
+        mock_session
+    ):
+        """完全一致キャッシュにない場合はマニュアル取得後に回答を生成して登録するテスト"""
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="使い方は？")
+        manuals = [ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")]
+        mock_get_manuals.return_value = manuals
+        corpus_version = ManualRepository.build_corpus_version(manuals)
+
+        mock_exact_cache.is_enabled.return_value = True
+        mock_exact_cache.get.return_value = None
+
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.answer_question.return_value = "新しい回答"
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        result = question_service.answer.__wrapped__(
+            question_service,
+            session=mock_session,
+            question_request=question_request,
+            company_id=1
+        )
+
+        assert result == QuestionResponse(answer="新しい回答")
+        mock_exact_cache.get.assert_called_once_with(
+            company_id=1,
+            application_id=10,
+            question="使い方は？",
+            corpus_version=corpus_version,
+        )
+        mock_exact_cache.set.assert_called_once_with(
+            company_id=1,
+            application_id=10,
+            question="使い方は？",
+            corpus_version=corpus_version,
+            answer="新しい回答",
+        )
+
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.aget_by_company_id', new_callable=AsyncMock)
+    def test_aanswer_success(
+        self,
+        mock_aget_manuals,
+        mock_llm_helper_class,
+        mock_semantic_is_enabled,
+        mock_exact_is_enabled,
+        mock_session
+    ):
+        """aanswerメソッドが非同期のマニュアル取得・回答生成を使用するテスト"""
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="使い方は？")
+        mock_aget_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")
+        ]
+
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.aanswer_question = AsyncMock(return_value="非同期の回答")
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        result = asyncio.run(
+            question_service.aanswer(
+                question_request=question_request,
+                company_id=1
+            )
+        )
+
+        assert result == QuestionResponse(answer="非同期の回答")
+        mock_aget_manuals.assert_awaited_once_with(
+            session=mock_session,
+            company_id=1,
+            application_id=10
+        )
+        mock_llm_helper_class.assert_called_once_with(
+            file_paths=["manuals/1/10/100.pdf"],
+            collection_name="manuals",
+            company_id=1
+        )
+        mock_llm_helper_instance.aanswer_question.assert_awaited_once_with(
+            question_text="使い方は？",
+            query_embedding=None
+        )
+        mock_llm_helper_instance.answer_question.assert_not_called()
+
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.aget_by_company_id', new_callable=AsyncMock)
+    def test_aanswer_releases_session_before_generation(
+        self,
+        mock_aget_manuals,
+        mock_llm_helper_class,
+        mock_semantic_is_enabled,
+        mock_exact_is_enabled,
+        mock_async_db
+    ):
+        """LLMの応答を待つ間はMySQLのセッションを保持しないテスト"""
+        question_service = QuestionService()
+        mock_aget_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")
+        ]
+        active_sessions = []
+
+        async def aanswer_question(**kwargs):
+            active_sessions.append(mock_async_db.active)
+            return "非同期の回答"
+
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.aanswer_question = AsyncMock(side_effect=aanswer_question)
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        result = asyncio.run(
+            question_service.aanswer(
+                question_request=QuestionRequest(application_id=10, question="使い方は？"),
+                company_id=1
+            )
+        )
+
+        assert result == QuestionResponse(answer="非同期の回答")
+        mock_aget_manuals.assert_awaited_once()
+        assert active_sessions == [0]
+
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache')
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.aget_by_company_id', new_callable=AsyncMock)
+    def test_aanswer_semantic_cache_hit(
+        self,
+        mock_aget_manuals,
+        mock_llm_helper_class,
+        mock_semantic_cache,
+        mock_exact_is_enabled,
+        mock_session,
+        mock_embedder
+    ):
+        """非同期版でもセマンティックキャッシュにヒットした場合はLLMのヘルパーを初期化しないテスト"""
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="使い方は？")
+        mock_aget_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")
+        ]
+        mock_semantic_cache.is_enabled.return_value = True
+        mock_semantic_cache.lookup.return_value = "キャッシュ済みの回答"
+        mock_embedder.aembed_query.return_value = [0.1, 0.2]
+
+        result = asyncio.run(
+            question_service.aanswer(
+                question_request=question_request,
+                company_id=1
+            )
+        )
+
+        assert result == QuestionResponse(answer="キャッシュ済みの回答")
+        mock_embedder.aembed_query.assert_awaited_once_with("使い方は？")
+        mock_llm_helper_class.assert_not_called()
+        mock_semantic_cache.store.assert_not_called()
+
+    @pytest.mark.parametrize("lock_dir", [None, "tmp"], ids=["ワーカー内のみ", "ワーカー間ロックあり"])
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.get_by_company_id')
+    def test_answer_single_flight(
+        self,
+        mock_get_manuals,
+        mock_llm_helper_class,
+        mock_semantic_is_enabled,
+        mock_exact_is_enabled,
+        lock_dir,
+        single_flight_setting,
+        mock_session,
+        tmp_path
+    ):
+        """合流が有効な場合は正規化した質問をキーとして SingleFlight 経由で回答を生成するテスト"""
+        single_flight_setting.update({"enabled": True, "lock_dir": str(tmp_path) if lock_dir else None})
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="  使い方は？")
+        mock_get_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")
+        ]
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.answer_question.return_value = "回答"
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        exact_setting = {"enabled": False, "persistent_path": str(tmp_path / "answer_cache.sqlite3")}
+        with patch('app.services.question_service.ANSWER_SINGLE_FLIGHT.do', wraps=ANSWER_SINGLE_FLIGHT.do) as mock_do, \
+                patch('app.services.question_service.ExactAnswerCache.get_setting', return_value=exact_setting):
+            result = question_service.answer.__wrapped__(
+                question_service,
+                session=mock_session,
+                question_request=question_request,
+                company_id=1
+            )
+
+        assert result == QuestionResponse(answer="回答")
+        assert mock_do.call_args.args[0] == (1, 10, "使い方は")
+        assert mock_do.call_args.kwargs["wait_timeout_seconds"] == 5
+        mock_llm_helper_instance.answer_question.assert_called_once()
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "lock_dir と永続層がある場合はロックする",
+            "lock_dir": "locks",
+            "exact_setting": {"enabled": True, "persistent_path": "answer_cache.sqlite3"},
+            "expected": True,
+        },
+        {
+            "description": "永続層が無い場合は他のワーカーの回答を再利用できないためロックしない",
+            "lock_dir": "locks",
+            "exact_setting": {"enabled": True, "persistent_path": None},
+            "expected": False,
+        },
+        {
+            "description": "完全一致キャッシュが無効の場合はロックしない",
+            "lock_dir": "locks",
+            "exact_setting": {"enabled": False, "persistent_path": "answer_cache.sqlite3"},
+            "expected": False,
+        },
+        {
+            "description": "lock_dir が無い場合はロックしない",
+            "lock_dir": None,
+            "exact_setting": {"enabled": True, "persistent_path": "answer_cache.sqlite3"},
+            "expected": False,
+        },
+    ], ids=lambda x: x["description"])
+    def test_use_worker_lock(self, test_case):
+        """ワーカー間のロックは完全一致キャッシュの永続層で回答を共有できる場合のみ使用するテスト"""
+        with patch('app.services.question_service.ExactAnswerCache.get_setting', return_value=test_case["exact_setting"]), \
+                patch('app.services.question_service.FileLock.is_supported', return_value=True):
+            result = QuestionService._use_worker_lock({"lock_dir": test_case["lock_dir"]})
+
+        assert result == test_case["expected"]
+
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.aget_by_company_id', new_callable=AsyncMock)
+    def test_aanswer_single_flight_shares_generation(
+        self,
+        mock_aget_manuals,
+        mock_llm_helper_class,
+        mock_semantic_is_enabled,
+        mock_exact_is_enabled,
+        single_flight_setting,
+        mock_session
+    ):
+        """同じ質問が同時に届いた場合はLLMの呼び出しが1回にまとめられるテスト"""
+        single_flight_setting["enabled"] = True
+        question_service = QuestionService()
+        mock_aget_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")
+        ]
+
+        async def run():
+            release = asyncio.Event()
+
+            async def aanswer_question(**kwargs):
+                await release.wait()
+                return "共有された回答"
+
+            mock_llm_helper_instance = MagicMock()
+            mock_llm_helper_instance.aanswer_question = AsyncMock(side_effect=aanswer_question)
+            mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+            tasks = [
+                asyncio.create_task(
+                    question_service.aanswer(
+                        question_request=QuestionRequest(application_id=10, question=question),
+                        company_id=1
+                    )
+                )
+                for question in ["使い方は？", "使い方は", "使い方は?"]
+            ]
+            # 先行するリクエストがLLMの応答待ちになるまで進める
+            while not mock_llm_helper_instance.aanswer_question.await_count:
+                await asyncio.sleep(0)
+            release.set()
+            return await asyncio.gather(*tasks), mock_llm_helper_instance
+
+        results, mock_llm_helper_instance = asyncio.run(run())
+
+        assert results == [QuestionResponse(answer="共有された回答")] * 3
+        assert mock_llm_helper_instance.aanswer_question.await_count == 1
+        mock_aget_manuals.assert_awaited_once()
+
+    @patch('app.services.question_service.ExactAnswerCache')
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.aget_by_company_id', new_callable=AsyncMock)
+    def test_aanswer_batch(
+        self,
+        mock_aget_manuals,
+        mock_llm_helper_class,
+        mock_semantic_is_enabled,
+        mock_exact_cache,
+        mock_session,
+        mock_embedder
+    ):
+        """aanswer_batchがマニュアル取得・埋め込みを1回で行い、質問毎の結果を返すテスト"""
+        question_service = QuestionService()
+        batch_request = QuestionBatchRequest(
+            application_id=10,
+            questions=["返品できますか", "送料は？", "", "返品できますか?", "保証期間は"]
+        )
+        mock_aget_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")
+        ]
+        mock_exact_cache.is_enabled.return_value = True
+        mock_exact_cache.get.side_effect = lambda question, **kwargs: "キャッシュの回答" if question == "送料は？" else None
+
+        async def aanswer_question(question_text, query_embedding):
+            if question_text == "保証期間は":
+                raise RuntimeError("LLMエラー")
+            return f"{question_text}の回答"
+
+        mock_embedder.aembed_queries.return_value = [[0.1], [0.2]]
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.aanswer_question = AsyncMock(side_effect=aanswer_question)
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        with patch.object(QuestionService, '_get_batch_setting', return_value={"max_concurrency": 2}):
+            result = asyncio.run(
+                question_service.aanswer_batch(
+                    batch_request=batch_request,
+                    company_id=1
+                )
+            )
+
+        assert result.results == [
+            QuestionBatchItemResponse(index=0, question="返品できますか", answer="返品できますかの回答"),
+            QuestionBatchItemResponse(index=1, question="送料は？", answer="キャッシュの回答"),
+            QuestionBatchItemResponse(index=2, question="", error="質問が空です"),
+            # 正規化後に同じ質問は1回だけ生成される
+            QuestionBatchItemResponse(index=3, question="返品できますか?", answer="返品できますかの回答"),
+            QuestionBatchItemResponse(index=4, question="保証期間は", error="回答の生成中にエラーが発生しました"),
+        ]
+        mock_aget_manuals.assert_awaited_once()
+        mock_llm_helper_class.assert_called_once()
+        mock_embedder.aembed_queries.assert_awaited_once_with(["返品できますか", "保証期間は"])
+        assert mock_llm_helper_instance.aanswer_question.await_count == 2
+        mock_llm_helper_instance.aanswer_question.assert_any_await(
+            question_text="返品できますか", query_embedding=[0.1]
+        )
+        # 失敗した質問はキャッシュに登録されない
+        mock_exact_cache.set.assert_called_once()
+
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.aget_by_company_id', new_callable=AsyncMock)
+    def test_aanswer_batch_limits_concurrency(
+        self,
+        mock_aget_manuals,
+        mock_llm_helper_class,
+        mock_semantic_is_enabled,
+        mock_exact_is_enabled,
+        mock_session,
+        mock_embedder
+    ):
+        """回答の生成が max_concurrency を超えて同時に実行されないテスト"""
+        question_service = QuestionService()
+        batch_request = QuestionBatchRequest(application_id=10, questions=[f"質問{i}" for i in range(6)])
+        mock_aget_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")
+        ]
+        running = 0
+        peak = 0
+
+        async def aanswer_question(question_text, query_embedding):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return "回答"
+
+        mock_embedder.aembed_queries.return_value = [[float(i)] for i in range(6)]
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.aanswer_question = AsyncMock(side_effect=aanswer_question)
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        with patch.object(QuestionService, '_get_batch_setting', return_value={"max_concurrency": 2}):
+            result = asyncio.run(
+                question_service.aanswer_batch(
+                    batch_request=batch_request,
+                    company_id=1
+                )
+            )
+
+        assert [item.answer for item in result.results] == ["回答"] * 6
+        assert peak == 2
+
+    @pytest.mark.parametrize("test_case", [
+        {
+            "description": "会話モードが有効",
+            "setting": {},
+            "expected_conversation_id": "1:10:c1",
+        },
+        {
+            "description": "会話モードが無効",
+            "setting": {"conversation": {"enabled": False}},
+            "expected_conversation_id": None,
+        },
+    ], ids=lambda x: x["description"])
+    @patch('app.services.question_service.SemanticAnswerCache')
+    @patch('app.services.question_service.ExactAnswerCache')
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.get_by_company_id')
+    def test_answer_conversation(
+        self,
+        mock_get_manuals,
+        mock_llm_helper_class,
+        mock_exact_cache,
+        mock_semantic_cache,
+        mock_session,
+        test_case
+    ):
+        """会話IDを指定した場合は企業・アプリ毎の thread_id で回答し、回答キャッシュを使わないテスト"""
+        question_service = QuestionService()
+        question_request = QuestionRequest(application_id=10, question="送料は？", conversation_id="c1")
+        mock_get_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf"),
+        ]
+        mock_exact_cache.is_enabled.return_value = False
+        mock_semantic_cache.is_enabled.return_value = False
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.answer_question.return_value = "会話の回答"
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+
+        with patch('app.services.question_service.SsmClient.get_cached_parameter', return_value=test_case["setting"]):
+            result = question_service.answer.__wrapped__(
+                question_service,
+                session=mock_session,
+                question_request=question_request,
+                company_id=1
+            )
+
+        assert result == QuestionResponse(answer="会話の回答")
+        if test_case["expected_conversation_id"] is None:
+            mock_llm_helper_instance.answer_question.assert_called_once_with(
+                question_text="送料は？",
+                query_embedding=None
+            )
+        else:
+            mock_llm_helper_instance.answer_question.assert_called_once_with(
+                question_text="送料は？",
+                conversation_id=test_case["expected_conversation_id"]
+            )
+            mock_exact_cache.is_enabled.assert_not_called()
+            mock_semantic_cache.is_enabled.assert_not_called()
+
+    @patch('app.services.question_service.ExactAnswerCache')
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.get_by_company_id')
+    def test_answer_faq_exact_match(
+        self,
+        mock_get_manuals,
+        mock_llm_helper_class,
+        mock_exact_cache,
+        mock_session,
+        faq_setting
+    ):
+        """正規化後の質問がよくある質問に一致する場合は、マニュアル取得・キャッシュ・LLMを使わずに回答するテスト"""
+        faq_setting["enabled"] = True
+        FaqStore.load(company_id=1, application_id=10, version="1@", faqs=[
+            FaqDto(application_id=10, faq_id=1, question="営業時間を教えてください", answer="平日9時から18時までです。")
+        ])
+        question_service = QuestionService()
+
+        result = question_service.answer.__wrapped__(
+            question_service,
+            session=mock_session,
+            question_request=QuestionRequest(application_id=10, question="営業時間を教えてください？"),
+            company_id=1
+        )
+
+        assert result == QuestionResponse(answer="平日9時から18時までです。")
+        mock_get_manuals.assert_not_called()
+        mock_llm_helper_class.assert_not_called()
+        mock_exact_cache.is_enabled.assert_not_called()
+
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.get_by_company_id')
+    def test_answer_faq_semantic_match(
+        self,
+        mock_get_manuals,
+        mock_llm_helper_class,
+        mock_semantic_is_enabled,
+        mock_exact_is_enabled,
+        mock_session,
+        faq_setting,
+        mock_embedder
+    ):
+        """質問の埋め込みがよくある質問に類似する場合は、検索・LLMを使わずに回答するテスト"""
+        faq_setting["enabled"] = True
+        FaqStore.load(company_id=1, application_id=10, version="1@", faqs=[
+            FaqDto(application_id=10, faq_id=1, question="営業時間を教えてください", answer="平日9時から18時までです。")
+        ])
+        mock_get_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")
+        ]
+        mock_embedder.embed_query.return_value = [1.0, 0.0]
+        mock_embedder.embed_queries.return_value = [[0.99, 0.05]]
+        question_service = QuestionService()
+
+        result = question_service.answer.__wrapped__(
+            question_service,
+            session=mock_session,
+            question_request=QuestionRequest(application_id=10, question="何時まで営業していますか"),
+            company_id=1
+        )
+
+        assert result == QuestionResponse(answer="平日9時から18時までです。")
+        mock_embedder.embed_queries.assert_called_once_with(["営業時間を教えてください"])
+        mock_llm_helper_class.assert_not_called()
+
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=False)
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.aget_by_company_id', new_callable=AsyncMock)
+    def test_aanswer_faq_miss_reuses_embedding(
+        self,
+        mock_aget_manuals,
+        mock_llm_helper_class,
+        mock_semantic_is_enabled,
+        mock_exact_is_enabled,
+        mock_session,
+        faq_setting,
+        mock_embedder
+    ):
+        """よくある質問に一致しない場合は、照合に使用した埋め込みを再利用して回答を生成するテスト"""
+        faq_setting["enabled"] = True
+        mock_aget_manuals.return_value = [
+            ManualDto(company_id=1, application_id=10, manual_id=100, file_extension="pdf")
+        ]
+        mock_embedder.aembed_query.return_value = [0.0, 1.0]
+        mock_embedder.aembed_queries.return_value = [[1.0, 0.0]]
+        mock_llm_helper_instance = MagicMock()
+        mock_llm_helper_instance.aanswer_question = AsyncMock(return_value="生成した回答")
+        mock_llm_helper_class.return_value = mock_llm_helper_instance
+        question_service = QuestionService()
+
+        with patch('app.core.cache.faq_store.FaqRepository') as mock_faq_repository:
+            mock_faq_repository.aget_version = AsyncMock(return_value="1@")
+            mock_faq_repository.aget_by_company_id = AsyncMock(return_value=[
+                FaqDto(application_id=10, faq_id=1, question="営業時間を教えてください", answer="平日9時から18時までです。")
+            ])
+            result = asyncio.run(
+                question_service.aanswer(
+                    question_request=QuestionRequest(application_id=10, question="返品できますか"),
+                    company_id=1
+                )
+            )
+
+        assert result == QuestionResponse(answer="生成した回答")
+        mock_faq_repository.aget_version.assert_awaited_once_with(session=mock_session, company_id=1, application_id=10)
+        mock_llm_helper_instance.aanswer_question.assert_awaited_once_with(
+            question_text="返品できますか",
+            query_embedding=[0.0, 1.0]
+        )
+
+    @patch('app.services.question_service.ExactAnswerCache.is_enabled', return_value=True)
+    @patch('app.services.question_service.SemanticAnswerCache.is_enabled', return_value=True)
+    @patch('app.services.question_service.QuestionLLMHelper')
+    @patch('app.services.question_service.ManualRepository.aget_by_company_id', new_callable=AsyncMock)
+    def test_aanswer_batch_faq_without_manuals(
+        self,
+        mock_aget_manuals,
+        mock_llm_helper_class,
+        mock_semantic_is_enabled,
+        mock_exact_is_enabled,
+        mock_session,
+        faq_setting,
+        mock_embedder
+    ):
+        """マニュアルが無くよくある質問がある場合は、LLMヘルパーを構築せずに質問毎の回答を返すテスト"""
+        faq_setting["enabled"] = True
+        mock_aget_manuals.return_value = []
+        # 1回目は質問の一括埋め込み、2回目はよくある質問の埋め込み
+        mock_embedder.aembed_queries.side_effect = [
+            [[0.99, 0.05], [0.0, 1.0]],
+            [[1.0, 0.0]],
+        ]
+        question_service = QuestionService()
+
+        with patch('app.core.cache.faq_store.FaqRepository') as mock_faq_repository, \
+                patch.object(QuestionService, '_get_batch_setting', return_value={"max_concurrency": 2}):
+            mock_faq_repository.aget_version = AsyncMock(return_value="1@")
+            mock_faq_repository.aget_by_company_id = AsyncMock(return_value=[
+                FaqDto(application_id=10, faq_id=1, question="営業時間を教えてください", answer="平日9時から18時までです。")
+            ])
+            result = asyncio.run(
+                question_service.aanswer_batch(
+                    batch_request=QuestionBatchRequest(
+                        application_id=10,
+                        questions=["何時まで営業していますか", "返品できますか", ""]
+                    ),
+                    company_id=1
+                )
+            )
+
+        assert result.results == [
+            QuestionBatchItemResponse(index=0, question="何時まで営業していますか", answer="平日9時から18時までです。"),
+            QuestionBatchItemResponse(index=1, question="返品できますか", answer=NOT_FOUND_MESSAGE),
+            QuestionBatchItemResponse(index=2, question="", error="質問が空です"),
+        ]
+        mock_llm_helper_class.assert_not_called()